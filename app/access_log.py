@@ -0,0 +1,142 @@
+"""
+ASGI middleware для access-лога и метрик HTTP запросов.
+
+На каждый запрос пишется одна запись (а не пара запрос/ответ). Маршрут
+определяется по шаблону пути (`/api/v1/requests/{request_id}`), что
+удобно для группировки и меток метрик. Служебные пути можно исключить,
+а для шумных маршрутов задать долю записываемых запросов. Ошибки 5xx и
+медленные запросы пишутся всегда.
+
+Каждый запрос — область учёта SQL (app.query_stats): число запросов к БД
+и время в БД попадают в запись лога и метрики по маршруту, а с
+db_queries_header — в заголовки ответа X-DB-Queries и X-DB-Time-Ms.
+Внутри трассы (app.tracing) запись содержит trace_id.
+"""
+import random
+import time
+from typing import Dict, Iterable, Optional
+
+import structlog
+
+from app.metrics import HTTP_DB_QUERIES, HTTP_DB_TIME, HTTP_REQUEST_DURATION
+from app.query_stats import query_scope
+from app.tracing import current_span
+
+logger = structlog.get_logger("access")
+
+UNMATCHED_ROUTE = "<unmatched>"
+
+
+def parse_route_sampling(value: str) -> Dict[str, float]:
+    """Разбор строки вида "/api/v1/requests/{request_id}=0.1,/=0" """
+    rates = {}
+    for item in value.split(","):
+        if "=" not in item:
+            continue
+        route, rate = item.rsplit("=", 1)
+        rates[route.strip()] = float(rate)
+    return rates
+
+
+class AccessLogMiddleware:
+    """Одна запись access-лога и метрика длительности на каждый HTTP запрос"""
+
+    def __init__(
+        self,
+        app,
+        sample_rate: float = 1.0,
+        route_sampling: Optional[Dict[str, float]] = None,
+        exclude: Iterable[str] = (),
+        slow_ms: float = 1000.0,
+        db_queries_header: bool = False,
+    ):
+        self.app = app
+        self.sample_rate = sample_rate
+        self.route_sampling = route_sampling or {}
+        self.exclude = frozenset(exclude)
+        self.slow_ms = slow_ms
+        self.db_queries_header = db_queries_header
+        self._routes: Dict[object, str] = {}
+
+    def _route_template(self, scope) -> str:
+        """Шаблон пути по endpoint, который роутер записал в scope"""
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return UNMATCHED_ROUTE
+        template = self._routes.get(endpoint)
+        if template is None:
+            template = UNMATCHED_ROUTE
+            for route in scope["app"].routes:
+                if getattr(route, "endpoint", None) is endpoint:
+                    template = route.path
+                    break
+            self._routes[endpoint] = template
+        return template
+
+    def _should_log(self, route: str, path: str, status: int, duration_ms: float) -> bool:
+        if status >= 500 or duration_ms >= self.slow_ms:
+            return True
+        if route in self.exclude or path in self.exclude:
+            return False
+        rate = self.route_sampling.get(route, self.sample_rate)
+        return rate >= 1.0 or random.random() < rate
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status_code = 500
+
+        with query_scope(scope["path"]) as db_stats:
+
+            async def send_wrapper(message):
+                nonlocal status_code
+                if message["type"] == "http.response.start":
+                    status_code = message["status"]
+                    if self.db_queries_header:
+                        # Учтены запросы до начала ответа (не тело SSE и не фоновые задачи)
+                        message = {
+                            **message,
+                            "headers": [
+                                *message.get("headers", []),
+                                (b"x-db-queries", str(db_stats.count).encode()),
+                                (b"x-db-time-ms", f"{db_stats.total_ms:.2f}".encode()),
+                            ],
+                        }
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                duration = time.perf_counter() - start
+                route = self._route_template(scope)
+                method = scope["method"]
+                HTTP_REQUEST_DURATION.labels(method, route, status_code).observe(duration)
+                HTTP_DB_QUERIES.labels(method, route).observe(db_stats.count)
+                HTTP_DB_TIME.labels(method, route).observe(db_stats.total_ms / 1000)
+
+                duration_ms = duration * 1000
+                path = scope["path"]
+                if self._should_log(route, path, status_code, duration_ms):
+                    client = scope.get("client")
+                    fields = {}
+                    if duration_ms >= self.slow_ms and db_stats.count:
+                        fields["db_slowest_ms"] = round(db_stats.slowest_ms, 2)
+                        fields["db_slowest_sql"] = db_stats.slowest_sql
+                    span = current_span()
+                    if span is not None:
+                        fields["trace_id"] = span.trace_id
+                    logger.info(
+                        "http_access",
+                        method=method,
+                        route=route,
+                        path=path,
+                        status_code=status_code,
+                        duration_ms=round(duration_ms, 2),
+                        db_queries=db_stats.count,
+                        db_ms=round(db_stats.total_ms, 2),
+                        client_ip=client[0] if client else None,
+                        **fields,
+                    )
@@ -0,0 +1,38 @@
+"""
+API endpoints для исполнителей
+"""
+from typing import Optional
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database.connection import get_db
+from app.database.models import RequestStatus
+from app.services.request_service import RequestService
+from app.schemas.requests import RequestListResponse
+from app.api.responses import PydanticJSONResponse, request_list_from_rows
+from app.config import settings
+
+router = APIRouter(prefix="/executors", tags=["executors"])
+
+
+@router.get("/{executor_id}/requests", response_model=RequestListResponse)
+async def get_executor_requests(
+    executor_id: int,
+    status: Optional[RequestStatus] = Query(None, description="Фильтр по статусу"),
+    page: int = Query(1, ge=1, description="Номер страницы"),
+    per_page: int = Query(10, ge=1, le=100, description="Количество на странице"),
+    db: AsyncSession = Depends(get_db)
+):
+    """Очередь исполнителя: назначенные ему заявки"""
+    service = RequestService(db)
+    if settings.api.fast_json:
+        rows, total = await service.get_requests_for_executor(executor_id, status, page, per_page, as_rows=True)
+        return PydanticJSONResponse(request_list_from_rows(rows, total, page, per_page))
+    
+    requests, total = await service.get_requests_for_executor(executor_id, status, page, per_page)
+    return RequestListResponse(
+        requests=requests,
+        total=total,
+        page=page,
+        per_page=per_page
+    )
@@ -0,0 +1,77 @@
+"""
+API endpoints для профилирования процесса API по запросу. Доступно только админам.
+
+  GET    /admin/profile/cpu?seconds=10   — collapsed stacks (flamegraph.pl, speedscope)
+  POST   /admin/profile/memory           — включить tracemalloc и снять базовый снимок
+  GET    /admin/profile/memory           — рост памяти относительно базового снимка
+  DELETE /admin/profile/memory           — выключить tracemalloc
+"""
+import asyncio
+import time
+
+from fastapi import APIRouter, HTTPException, Query, status
+from fastapi.responses import PlainTextResponse
+
+from app.config import settings
+from app.profiling import MAX_FRAMES, MAX_SECONDS, ProfilerBusy, memory_tracker, profile_cpu
+
+router = APIRouter(prefix="/admin/profile", tags=["profiling"])
+
+
+def _check_admin(admin_id: int) -> None:
+    if not settings.telegram or admin_id not in (settings.telegram.admin_ids or []):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Недостаточно прав")
+
+
+@router.get("/cpu", response_class=PlainTextResponse)
+async def cpu_profile(
+    admin_id: int = Query(..., description="Telegram ID администратора"),
+    seconds: float = Query(10.0, gt=0, le=MAX_SECONDS, description="Длительность профиля, с"),
+    interval_ms: float = Query(5.0, ge=1, le=1000, description="Интервал семплирования, мс"),
+    all_threads: bool = Query(False, description="Все потоки процесса, а не только цикл событий"),
+):
+    """Семплирующий CPU-профиль процесса API за seconds секунд"""
+    _check_admin(admin_id)
+    try:
+        profiler = await profile_cpu(seconds, interval_ms / 1000, all_threads)
+    except ProfilerBusy as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+    filename = f"api-cpu-{time.strftime('%Y%m%d-%H%M%S')}.collapsed"
+    return PlainTextResponse(
+        profiler.collapsed(),
+        headers={
+            "Content-Disposition": f'attachment; filename="{filename}"',
+            "X-Profile-Samples": str(profiler.samples),
+        },
+    )
+
+
+@router.post("/memory")
+async def memory_start(
+    admin_id: int = Query(..., description="Telegram ID администратора"),
+    frames: int = Query(10, ge=1, le=MAX_FRAMES, description="Глубина стека мест выделения"),
+):
+    """Включение tracemalloc (замедляет выделения памяти до DELETE)"""
+    _check_admin(admin_id)
+    await asyncio.to_thread(memory_tracker.start, frames)
+    return {"status": "started", "frames": frames}
+
+
+@router.get("/memory")
+async def memory_diff(
+    admin_id: int = Query(..., description="Telegram ID администратора"),
+    limit: int = Query(30, ge=1, le=500),
+    key: str = Query("lineno", pattern="^(lineno|filename|traceback)$", description="Группировка мест выделения"),
+):
+    """Топ мест выделения по росту памяти с момента POST"""
+    _check_admin(admin_id)
+    if not memory_tracker.active:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="tracemalloc не запущен")
+    return await asyncio.to_thread(memory_tracker.diff, limit, key)
+
+
+@router.delete("/memory")
+async def memory_stop(admin_id: int = Query(..., description="Telegram ID администратора")):
+    _check_admin(admin_id)
+    memory_tracker.stop()
+    return {"status": "stopped"}
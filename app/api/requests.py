@@ -1,42 +1,77 @@
 """
 API endpoints для работы с заявками
 """
-from typing import List, Optional
+from typing import List, Optional, Set
+import asyncio
 import random
 from datetime import datetime
-from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, status
+from fastapi.responses import JSONResponse, StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 
 from app.database.connection import get_db
-from app.services.request_service import RequestService
+from app.services.request_service import (
+    RequestService, IdempotentReplay, IdempotencyKeyInFlight, IdempotencyKeyMismatch, StatusConflict,
+)
+from app.services.telegram_sender import telegram_sender
+from app.events import event_hub
 from app.schemas.requests import (
     RequestCreate, 
     RequestResponse, 
     RequestUpdate, 
     RequestStatusUpdate,
     RequestListResponse,
+    RequestSearchResponse,
     RequestCommentCreate,
     RequestCommentResponse
 )
 from app.database.models import RequestStatus, User, WorkFormat, PreferredTime
+from app.api.responses import PydanticJSONResponse, request_list_from_rows, request_search_from_rows
 from app.config import settings
-import httpx
 import structlog
 
 router = APIRouter(prefix="/requests", tags=["requests"])
 logger = structlog.get_logger()
 
 
+async def _get_or_create_user(db: AsyncSession, telegram_id: int) -> User:
+    """Пользователь по telegram_id; создаётся минимальная запись, если его нет.
+
+    Параллельные первые запросы одного пользователя (двойное нажатие)
+    не падают на уникальности telegram_id: INSERT ... ON CONFLICT DO NOTHING.
+    """
+    result = await db.execute(select(User).where(User.telegram_id == telegram_id))
+    user = result.scalar_one_or_none()
+    if user is None:
+        await db.execute(
+            pg_insert(User)
+            .values(telegram_id=telegram_id)
+            .on_conflict_do_nothing(index_elements=[User.telegram_id])
+        )
+        await db.commit()
+        result = await db.execute(select(User).where(User.telegram_id == telegram_id))
+        user = result.scalar_one()
+    return user
+
+
 @router.post("/", response_model=RequestResponse, status_code=status.HTTP_201_CREATED)
 async def create_request(
     request_data: RequestCreate,
     user_id: Optional[int] = Query(None, description="ID пользователя в БД (или telegram_id для обратной совместимости)"),
     telegram_id: Optional[int] = Query(None, description="Telegram ID пользователя"),
+    idempotency_key: Optional[str] = Header(
+        None, alias="Idempotency-Key", max_length=255, description="Ключ повтора: тот же ключ вернёт исходный ответ"
+    ),
     db: AsyncSession = Depends(get_db)
 ):
     """Создание новой заявки.
 
+    С заголовком Idempotency-Key повтор запроса (двойное нажатие, ретрай
+    после таймаута) не создаёт заявку заново, а возвращает исходный ответ
+    с заголовком Idempotent-Replayed: true.
+
     Логика разрешения пользователя:
     - Если передан telegram_id: находим/создаём пользователя по telegram_id
     - Иначе если передан user_id:
@@ -49,15 +84,7 @@ async def create_request(
         resolved_user: Optional[User] = None
 
         if telegram_id is not None:
-            result = await db.execute(select(User).where(User.telegram_id == telegram_id))
-            resolved_user = result.scalar_one_or_none()
-            if resolved_user is None:
-                # Создаём минимального пользователя
-                new_user = User(telegram_id=telegram_id)
-                db.add(new_user)
-                await db.commit()
-                await db.refresh(new_user)
-                resolved_user = new_user
+            resolved_user = await _get_or_create_user(db, telegram_id)
         elif user_id is not None:
             # Сначала пробуем как внутренний ID
             result = await db.execute(select(User).where(User.id == user_id))
@@ -78,8 +105,19 @@ async def create_request(
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Не удалось определить пользователя")
 
         service = RequestService(db)
-        request = await service.create_request(resolved_user.id, request_data)
+        request = await service.create_request(resolved_user.id, request_data, idempotency_key)
+        if settings.api.fast_json:
+            return PydanticJSONResponse(
+                RequestResponse.model_validate(request),
+                status_code=status.HTTP_201_CREATED
+            )
         return request
+    except IdempotentReplay as e:
+        return JSONResponse(e.response, status_code=status.HTTP_201_CREATED, headers={"Idempotent-Replayed": "true"})
+    except IdempotencyKeyInFlight as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e), headers={"Retry-After": "1"})
+    except IdempotencyKeyMismatch as e:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e))
     except ValueError as e:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
     except HTTPException:
@@ -93,59 +131,58 @@ async def create_request(
         )
 
 
+# Фоновые отправки в Telegram (ссылки держатся до завершения задачи)
+_notifications: Set[asyncio.Task] = set()
+
+
+def _notify_in_background(coro) -> None:
+    """Отправка в Telegram без ожидания: повторы отправителя не держат HTTP-запрос"""
+    task = asyncio.create_task(coro)
+    _notifications.add(task)
+    task.add_done_callback(_notifications.discard)
+
+
 async def _send_service_log(text: str) -> None:
     """Отправка сообщения в сервисный чат (Telegram)."""
-    try:
-        token = settings.telegram.token if settings.telegram else None
-        chat_id = settings.telegram.requests_group_id if settings.telegram else None
-        if not token or not chat_id:
-            return
-        api_url = f"https://api.telegram.org/bot{token}/sendMessage"
-        payload = {"chat_id": chat_id, "text": text}
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            await client.post(api_url, json=payload)
-    except Exception:
-        # Без падения API
-        pass
-
-
-async def _send_request_to_channel(request) -> None:
-    """Отправка созданной заявки в сервисный чат (основной канал заявок)."""
-    try:
-        token = settings.telegram.token if settings.telegram else None
-        chat_id = settings.telegram.requests_group_id if settings.telegram else None
-        if not token or not chat_id:
-            return
-        # Подготовим безопасный текст без Markdown спецсимволов
-        def esc(s: str | None) -> str:
-            if s is None:
-                return ""
-            for ch in ("_", "*", "[", "]", "(", ")", "~", "`", ">", "#", "+", "-", "=", "|", "{", "}", ".", "!"):
-                s = s.replace(ch, f"\\{ch}")
-            return s
-
-        text = (
-            f"🆕 *Новая заявка #{esc(request.request_id)}*\n\n"
-            f"📝 *Категория:* {esc(request.category)}\n"
-            f"🔧 *Услуга:* {esc(request.service or 'Не указано')}\n"
-            f"📄 *Описание:* {esc(request.description or 'Не указано')}\n\n"
-            f"📍 *Детали:*\n"
-            f"• Формат: {esc(getattr(request.work_format, 'value', str(request.work_format)))}\n"
-            f"• Адрес: {esc(request.address or 'Не требуется')}\n"
-            f"• Время: {esc(getattr(request.preferred_time, 'value', str(request.preferred_time)))}\n"
-        )
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            await client.post(
-                f"https://api.telegram.org/bot{token}/sendMessage",
-                json={
-                    "chat_id": chat_id,
-                    "text": text,
-                    "parse_mode": "Markdown",
-                },
-            )
-    except Exception:
-        # Не роняем API
-        pass
+    chat_id = settings.telegram.requests_group_id if settings.telegram else None
+    if not chat_id:
+        return
+    # Ошибки учитываются в метриках отправителя и не роняют API
+    await telegram_sender.send_message(chat_id, text)
+
+
+def _request_channel_text(request) -> str:
+    """Текст созданной заявки для сервисного чата (основной канал заявок).
+
+    Собирается в запросе, пока сессия открыта: отправка идёт фоновой задачей.
+    """
+    # Подготовим безопасный текст без Markdown спецсимволов
+    def esc(s: str | None) -> str:
+        if s is None:
+            return ""
+        for ch in ("_", "*", "[", "]", "(", ")", "~", "`", ">", "#", "+", "-", "=", "|", "{", "}", ".", "!"):
+            s = s.replace(ch, f"\\{ch}")
+        return s
+
+    text = (
+        f"🆕 *Новая заявка #{esc(request.request_id)}*\n\n"
+        f"📝 *Категория:* {esc(request.category)}\n"
+        f"🔧 *Услуга:* {esc(request.service or 'Не указано')}\n"
+        f"📄 *Описание:* {esc(request.description or 'Не указано')}\n\n"
+        f"📍 *Детали:*\n"
+        f"• Формат: {esc(getattr(request.work_format, 'value', str(request.work_format)))}\n"
+        f"• Адрес: {esc(request.address or 'Не требуется')}\n"
+        f"• Время: {esc(getattr(request.preferred_time, 'value', str(request.preferred_time)))}\n"
+    )
+    return text
+
+
+async def _send_request_to_channel(text: str) -> None:
+    """Отправка заявки в сервисный чат (основной канал заявок)."""
+    chat_id = settings.telegram.requests_group_id if settings.telegram else None
+    if not chat_id:
+        return
+    await telegram_sender.send_message(chat_id, text, parse_mode="Markdown")
 
 
 @router.post("/check")
@@ -154,7 +191,8 @@ async def check_flow(admin_id: int = Query(..., description="Telegram ID адм
 
     Выбирает случайную категорию/услугу/формат/время, подставляет timestamp
     в описание и адрес (если требуется), создаёт заявку и помечает её завершённой.
-    Отправляет лог в сервисный чат с деталями успеха/ошибки.
+    Отправляет лог в сервисный чат с деталями успеха/ошибки — фоновыми
+    задачами, чтобы медленный Telegram не держал запрос.
     """
     if not settings.telegram or admin_id not in (settings.telegram.admin_ids or []):
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Недостаточно прав")
@@ -250,7 +288,7 @@ async def check_flow(admin_id: int = Query(..., description="Telegram ID адм
         )
 
         # Отправим созданную заявку в канал
-        await _send_request_to_channel(request)
+        _notify_in_background(_send_request_to_channel(_request_channel_text(request)))
 
         log_text = (
             "✅ CHECK OK\n"
@@ -258,7 +296,7 @@ async def check_flow(admin_id: int = Query(..., description="Telegram ID адм
             f"request_id: {request.request_id}\n"
             f"category: {category}\nservice: {service}\nformat: {work_format.value}\ntime: {preferred_time.value}"
         )
-        await _send_service_log(log_text)
+        _notify_in_background(_send_service_log(log_text))
         return {"ok": True, "request_id": request.request_id, "category": category, "service": service}
 
     except Exception as e:
@@ -267,10 +305,80 @@ async def check_flow(admin_id: int = Query(..., description="Telegram ID адм
             f"step: {step}\n"
             f"error: {str(e)}"
         )
-        await _send_service_log(err_text)
+        _notify_in_background(_send_service_log(err_text))
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Ошибка на шаге {step}: {e}")
 
 
+@router.get("/stream")
+async def stream_request_events(
+    admin_id: int = Query(..., description="Telegram ID администратора"),
+    status: Optional[List[RequestStatus]] = Query(None, description="Фильтр по статусу (можно несколько)"),
+    category: Optional[List[str]] = Query(None, description="Фильтр по категории (можно несколько)"),
+    last_event_id: Optional[int] = Header(None, alias="Last-Event-ID"),
+):
+    """Поток событий заявок (Server-Sent Events) для панелей менеджеров.
+
+    События: request_created, status_changed, comment_added. При
+    переподключении браузер передаёт Last-Event-ID, и пропущенные события
+    повторяются из буфера. Событие reset означает, что часть событий
+    потеряна и список заявок нужно перечитать. Доступно только админам.
+    """
+    if not settings.telegram or admin_id not in (settings.telegram.admin_ids or []):
+        raise HTTPException(status_code=403, detail="Недостаточно прав")
+    subscription = event_hub.subscribe(
+        last_event_id=last_event_id,
+        statuses=frozenset(s.value for s in status or ()),
+        categories=frozenset(category or ()),
+    )
+    heartbeat = settings.api.events_heartbeat
+
+    async def event_stream():
+        try:
+            # Интервал переподключения для EventSource (мс)
+            yield b"retry: 3000\n\n"
+            while True:
+                try:
+                    event = await asyncio.wait_for(subscription.get(), timeout=heartbeat)
+                except asyncio.TimeoutError:
+                    # Комментарий держит соединение открытым через прокси
+                    yield b": ping\n\n"
+                    continue
+                if event is None:
+                    return
+                yield event.encode()
+        finally:
+            event_hub.unsubscribe(subscription)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.get("/search", response_model=RequestSearchResponse)
+async def search_requests(
+    admin_id: int = Query(..., description="Telegram ID администратора"),
+    q: str = Query(..., min_length=2, max_length=200, description="Текст, фрагмент адреса или телефона"),
+    status: Optional[RequestStatus] = Query(None, description="Фильтр по статусу"),
+    limit: int = Query(20, ge=1, le=100, description="Количество на странице"),
+    cursor: Optional[str] = Query(None, description="next_cursor предыдущей страницы"),
+    db: AsyncSession = Depends(get_db)
+):
+    """Поиск заявок по описанию, услуге, категории, адресу и телефону. Доступно только админам."""
+    if not settings.telegram or admin_id not in (settings.telegram.admin_ids or []):
+        raise HTTPException(status_code=403, detail="Недостаточно прав")
+    service = RequestService(db)
+    try:
+        if settings.api.fast_json:
+            rows, next_cursor = await service.search_requests(q, limit, cursor, status, as_rows=True)
+            return PydanticJSONResponse(request_search_from_rows(rows, next_cursor))
+        requests, next_cursor = await service.search_requests(q, limit, cursor, status)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return RequestSearchResponse(requests=requests, next_cursor=next_cursor)
+
+
 @router.get("/{request_id}", response_model=RequestResponse)
 async def get_request(
     request_id: str,
@@ -283,6 +391,8 @@ async def get_request(
     if not request:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Заявка не найдена")
     
+    if settings.api.fast_json:
+        return PydanticJSONResponse(RequestResponse.model_validate(request))
     return request
 
 
@@ -296,6 +406,10 @@ async def get_user_requests(
 ):
     """Получение заявок пользователя"""
     service = RequestService(db)
+    if settings.api.fast_json:
+        rows, total = await service.get_requests(user_id=user_id, status=status, page=page, per_page=per_page, as_rows=True)
+        return PydanticJSONResponse(request_list_from_rows(rows, total, page, per_page))
+    
     requests, total = await service.get_user_requests(user_id, status, page, per_page)
     
     return RequestListResponse(
@@ -310,20 +424,59 @@ async def get_user_requests(
 async def update_request_status(
     request_id: str,
     status_update: RequestStatusUpdate,
-    changed_by: int = Query(..., description="ID пользователя, изменившего статус"),
+    changed_by: Optional[int] = Query(None, description="ID пользователя, изменившего статус"),
+    telegram_id: Optional[int] = Query(None, description="Telegram ID пользователя, изменившего статус (вместо changed_by)"),
     db: AsyncSession = Depends(get_db)
 ):
-    """Обновление статуса заявки"""
+    """Обновление статуса заявки.
+
+    Бот передаёт telegram_id менеджера, нажавшего кнопку в группе заявок,
+    и expected_status — статус, при котором кнопка была показана. Если
+    статус уже изменил другой менеджер, ответ 409 с текущим статусом в
+    заголовке X-Request-Status.
+    """
+    if changed_by is None and telegram_id is None:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Укажите changed_by или telegram_id")
     try:
+        if changed_by is None:
+            changed_by = (await _get_or_create_user(db, telegram_id)).id
         service = RequestService(db)
         request = await service.update_request_status(request_id, status_update, changed_by)
+        if settings.api.fast_json:
+            return PydanticJSONResponse(RequestResponse.model_validate(request))
         return request
+    except StatusConflict as e:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT, detail=str(e), headers={"X-Request-Status": e.current.value}
+        )
     except ValueError as e:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Ошибка обновления статуса")
 
 
+@router.post("/{request_id}/assign")
+async def assign_executor(
+    request_id: str,
+    admin_id: int = Query(..., description="Telegram ID администратора"),
+    assigned_by: int = Query(..., description="ID пользователя, назначившего исполнителя"),
+    executor_id: Optional[int] = Query(None, description="ID исполнителя (без него — автоподбор)"),
+    db: AsyncSession = Depends(get_db)
+):
+    """Назначение исполнителя на заявку (вручную или автоподбором). Доступно только админам."""
+    if not settings.telegram or admin_id not in (settings.telegram.admin_ids or []):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Недостаточно прав")
+
+    try:
+        service = RequestService(db)
+        assigned = await service.assign_executor(request_id, executor_id, assigned_by)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    if assigned is None:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Нет свободных исполнителей")
+    return {"request_id": request_id, "executor_id": assigned}
+
+
 @router.post("/{request_id}/comments", response_model=RequestCommentResponse, status_code=status.HTTP_201_CREATED)
 async def add_comment(
     request_id: str,
@@ -347,6 +500,47 @@ async def add_comment(
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Ошибка добавления комментария")
 
 
+@router.post("/claim", response_model=RequestResponse)
+async def claim_next_request(
+    admin_id: int = Query(..., description="Telegram ID администратора"),
+    claimed_by: int = Query(..., description="ID пользователя (менеджера), берущего заявку"),
+    category: Optional[str] = Query(None, description="Брать только заявки этой категории"),
+    db: AsyncSession = Depends(get_db)
+):
+    """Взять в работу следующую новую заявку (без двойного захвата). Доступно только админам."""
+    if not settings.telegram or admin_id not in (settings.telegram.admin_ids or []):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Недостаточно прав")
+
+    service = RequestService(db)
+    request = await service.claim_next_request(claimed_by, category)
+    if request is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Нет новых заявок")
+    if settings.api.fast_json:
+        return PydanticJSONResponse(RequestResponse.model_validate(request))
+    return request
+
+
+@router.post("/assign-backlog")
+async def assign_backlog(
+    admin_id: int = Query(..., description="Telegram ID администратора"),
+    limit: int = Query(100, ge=1, le=1000, description="Максимум заявок за вызов"),
+    db: AsyncSession = Depends(get_db)
+):
+    """Автоназначение исполнителей на новые заявки. Доступно только админам."""
+    if not settings.telegram or admin_id not in (settings.telegram.admin_ids or []):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Недостаточно прав")
+    
+    admin = await _get_or_create_user(db, admin_id)
+    service = RequestService(db)
+    assignments = await service.auto_assign_backlog(admin.id, limit)
+    return {
+        "assigned": [
+            {"request_id": request_id, "executor_id": executor_id}
+            for request_id, executor_id in assignments
+        ]
+    }
+
+
 @router.get("/", response_model=RequestListResponse)
 async def get_all_requests(
     status: Optional[RequestStatus] = Query(None, description="Фильтр по статусу"),
@@ -357,10 +551,14 @@ async def get_all_requests(
     """Получение всех заявок (для администраторов)"""
     # TODO: Добавить проверку прав администратора
     service = RequestService(db)
-    # Пока возвращаем пустой список, нужно реализовать метод в сервисе
+    if settings.api.fast_json:
+        rows, total = await service.get_requests(status=status, page=page, per_page=per_page, as_rows=True)
+        return PydanticJSONResponse(request_list_from_rows(rows, total, page, per_page))
+    
+    requests, total = await service.get_requests(status=status, page=page, per_page=per_page)
     return RequestListResponse(
-        requests=[],
-        total=0,
+        requests=requests,
+        total=total,
         page=page,
         per_page=per_page
     )
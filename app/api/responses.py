@@ -0,0 +1,52 @@
+"""
+Быстрая сериализация ответов API
+"""
+from typing import Any, Mapping, Optional, Sequence
+
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+from app.schemas.requests import RequestResponse, RequestListResponse, RequestSearchResponse
+
+
+class PydanticJSONResponse(JSONResponse):
+    """JSON ответ, сериализуемый напрямую через pydantic-core.
+
+    Минует jsonable_encoder и json.dumps, которые FastAPI использует
+    для response_model по умолчанию.
+    """
+
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, BaseModel):
+            return content.model_dump_json().encode("utf-8")
+        return super().render(content)
+
+
+def request_list_from_rows(
+    rows: Sequence[Mapping[str, Any]],
+    total: int,
+    page: int,
+    per_page: int,
+) -> RequestListResponse:
+    """Список заявок из строк БД без повторной валидации.
+
+    Строки уже прошли валидацию при записи и типизированы SQLAlchemy,
+    поэтому модели собираются через model_construct.
+    """
+    return RequestListResponse.model_construct(
+        requests=[RequestResponse.model_construct(**row) for row in rows],
+        total=total,
+        page=page,
+        per_page=per_page,
+    )
+
+
+def request_search_from_rows(
+    rows: Sequence[Mapping[str, Any]],
+    next_cursor: Optional[str],
+) -> RequestSearchResponse:
+    """Результаты поиска из строк БД без повторной валидации"""
+    return RequestSearchResponse.model_construct(
+        requests=[RequestResponse.model_construct(**row) for row in rows],
+        next_cursor=next_cursor,
+    )
@@ -0,0 +1,93 @@
+"""
+API endpoints для статистики по заявкам
+"""
+from datetime import date, datetime, time, timedelta
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database.connection import get_db
+from app.services.stats_service import StatsService, STATS_DIMENSIONS
+from app.schemas.stats import StatsResponse, StatsBackfillResponse
+from app.config import settings
+
+router = APIRouter(prefix="/stats", tags=["stats"])
+
+# Максимальный период одного запроса
+MAX_RANGE_DAYS = 366
+
+
+def _parse_group_by(values: Optional[List[str]]) -> List[str]:
+    """group_by=category&group_by=status или group_by=category,status"""
+    dimensions = []
+    for value in values or []:
+        for name in value.split(","):
+            name = name.strip()
+            if not name:
+                continue
+            if name not in STATS_DIMENSIONS:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=f"Неизвестный признак группировки: {name}"
+                )
+            if name not in dimensions:
+                dimensions.append(name)
+    return dimensions
+
+
+@router.get("", response_model=StatsResponse)
+async def get_stats(
+    admin_id: int = Query(..., description="Telegram ID администратора"),
+    date_from: Optional[date] = Query(None, description="Начало периода (по умолчанию 30 дней назад)"),
+    date_to: Optional[date] = Query(None, description="Конец периода включительно (по умолчанию сегодня)"),
+    granularity: str = Query("day", pattern="^(day|hour)$", description="Размер бакета: day или hour"),
+    group_by: Optional[List[str]] = Query(None, description="Признаки: " + ", ".join(STATS_DIMENSIONS)),
+    db: AsyncSession = Depends(get_db)
+):
+    """Количество заявок по дням/часам создания из предагрегированной таблицы. Доступно только админам."""
+    if not settings.telegram or admin_id not in (settings.telegram.admin_ids or []):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Недостаточно прав")
+    date_to = date_to or datetime.utcnow().date()
+    date_from = date_from or date_to - timedelta(days=30)
+    if date_from > date_to:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="date_from позже date_to")
+    if (date_to - date_from).days > MAX_RANGE_DAYS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Период не может превышать {MAX_RANGE_DAYS} дней"
+        )
+    dimensions = _parse_group_by(group_by)
+    
+    service = StatsService(db)
+    buckets = await service.get_stats(
+        datetime.combine(date_from, time.min),
+        datetime.combine(date_to + timedelta(days=1), time.min),
+        dimensions,
+        granularity,
+    )
+    return StatsResponse(
+        date_from=date_from,
+        date_to=date_to,
+        granularity=granularity,
+        group_by=dimensions,
+        total=sum(item["count"] for item in buckets),
+        buckets=buckets,
+    )
+
+
+@router.post("/backfill", response_model=StatsBackfillResponse)
+async def backfill_stats(
+    admin_id: int = Query(..., description="Telegram ID администратора"),
+    date_from: Optional[date] = Query(None, description="Начало периода (по умолчанию — с первой заявки)"),
+    date_to: Optional[date] = Query(None, description="Конец периода включительно (по умолчанию — по текущий час)"),
+    db: AsyncSession = Depends(get_db)
+):
+    """Пересчёт статистики из таблицы заявок. Доступно только админам."""
+    if not settings.telegram or admin_id not in (settings.telegram.admin_ids or []):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Недостаточно прав")
+    service = StatsService(db)
+    buckets = await service.backfill(
+        datetime.combine(date_from, time.min) if date_from else None,
+        datetime.combine(date_to + timedelta(days=1), time.min) if date_to else None,
+    )
+    return StatsBackfillResponse(buckets=buckets)
@@ -17,6 +17,8 @@ class DatabaseSettings(BaseSettings):
     password: str = Field(default="password", env="DB_PASSWORD")
     pool_size: int = Field(default=10, env="DB_POOL_SIZE")
     max_overflow: int = Field(default=20, env="DB_MAX_OVERFLOW")
+    # Сколько ждать готовности БД при старте API (секунды)
+    startup_timeout: float = Field(default=180.0, env="DB_STARTUP_TIMEOUT")
 
     def __init__(self, **kwargs):
         # Инициализируем из pydantic-settings (env, env_file)
@@ -27,6 +29,7 @@ class DatabaseSettings(BaseSettings):
         self.name = os.getenv("DB_NAME", self.name)
         self.user = os.getenv("DB_USER", self.user)
         self.password = os.getenv("DB_PASSWORD", self.password)
+        self.startup_timeout = float(os.getenv("DB_STARTUP_TIMEOUT", self.startup_timeout))
         # Безопасное логирование без секретов
         print("DEBUG: DatabaseSettings initialized:")
         print(f"  host: {self.host}")
@@ -65,6 +68,11 @@ class TelegramSettings(BaseSettings):
     token: str = Field(..., env="TELEGRAM_TOKEN")
     requests_group_id: int = Field(default=-1004796553922, env="REQUESTS_GROUP_ID")
     admin_ids: str = Field(default="", env="ADMIN_IDS")
+    # Адрес Bot API (можно указать локальный тестовый сервер)
+    api_url: str = Field(default="https://api.telegram.org", env="TELEGRAM_API_URL")
+    # Уведомления из API: одновременные запросы и число повторов
+    send_concurrency: int = Field(default=8, env="TELEGRAM_SEND_CONCURRENCY")
+    send_max_retries: int = Field(default=4, env="TELEGRAM_SEND_MAX_RETRIES")
     
     class Config:
         env_file = ".env"
@@ -83,7 +91,10 @@ class TelegramSettings(BaseSettings):
         env_data = {
             "token": os.getenv("TELEGRAM_TOKEN"),
             "requests_group_id": os.getenv("REQUESTS_GROUP_ID", "-1004796553922"),
-            "admin_ids": os.getenv("ADMIN_IDS", "")
+            "admin_ids": os.getenv("ADMIN_IDS", ""),
+            "api_url": os.getenv("TELEGRAM_API_URL", "https://api.telegram.org"),
+            "send_concurrency": os.getenv("TELEGRAM_SEND_CONCURRENCY", "8"),
+            "send_max_retries": os.getenv("TELEGRAM_SEND_MAX_RETRIES", "4"),
         }
         
         # Объединяем с переданными kwargs
@@ -102,12 +113,73 @@ class APISettings(BaseSettings):
     host: str = Field(default="0.0.0.0", env="API_HOST")
     port: int = Field(default=8000, env="API_PORT")
     debug: bool = Field(default=False, env="DEBUG")
+    # Сериализация ответов напрямую через pydantic-core (минуя jsonable_encoder)
+    fast_json: bool = Field(default=False, env="FAST_JSON")
+    # SSE поток событий заявок: буфер для Last-Event-ID, очередь клиента, heartbeat (секунды)
+    events_buffer_size: int = Field(default=1000, env="EVENTS_BUFFER_SIZE")
+    events_queue_size: int = Field(default=100, env="EVENTS_QUEUE_SIZE")
+    events_heartbeat: float = Field(default=15.0, env="EVENTS_HEARTBEAT")
+    # Поиск: сколько самых новых совпадений ранжировать
+    search_max_candidates: int = Field(default=1000, env="SEARCH_MAX_CANDIDATES")
+    # Поиск по фрагментам адреса и телефона (без pg_trgm это полный просмотр таблицы)
+    search_fragments: bool = Field(default=True, env="SEARCH_FRAGMENTS")
+    # Idempotency-Key для создания заявок: сколько часов хранить исходный ответ
+    idempotency_ttl_hours: float = Field(default=24.0, env="IDEMPOTENCY_TTL_HOURS")
 
 
 class MonitoringSettings(BaseSettings):
     """Настройки мониторинга"""
     prometheus_port: int = Field(default=9090, env="PROMETHEUS_PORT")
     enable_metrics: bool = Field(default=True, env="ENABLE_METRICS")
+    # Фоновая проверка БД для /health и /readyz
+    health_probe_interval: float = Field(default=5.0, env="HEALTH_PROBE_INTERVAL")
+    health_probe_timeout: float = Field(default=2.0, env="HEALTH_PROBE_TIMEOUT")
+    # Логирование
+    log_level: str = Field(default="INFO", env="LOG_LEVEL")
+    access_log_sample_rate: float = Field(default=1.0, env="ACCESS_LOG_SAMPLE_RATE")
+    # Маршруты/пути без access-лога, через запятую
+    access_log_exclude: str = Field(default="/health,/livez,/readyz,/metrics", env="ACCESS_LOG_EXCLUDE")
+    # Доля записываемых запросов по шаблону маршрута: "/api/v1/requests/{request_id}=0.1,..."
+    access_log_route_sampling: str = Field(default="", env="ACCESS_LOG_ROUTE_SAMPLING")
+    access_log_slow_ms: float = Field(default=1000.0, env="ACCESS_LOG_SLOW_MS")
+    # SQL: порог slow-query лога и отладочные заголовки X-DB-Queries/X-DB-Time-Ms
+    db_slow_query_ms: float = Field(default=200.0, env="DB_SLOW_QUERY_MS")
+    db_queries_header: bool = Field(default=False, env="DB_QUERIES_HEADER")
+    # Трассировка: экспорт (file | otlp | пусто — выключена), куда писать,
+    # порог медленной трассы (сохраняется всегда, как и трассы с ошибкой)
+    # и доля остальных трасс
+    trace_exporter: str = Field(default="", env="TRACE_EXPORTER")
+    trace_file: str = Field(default="logs/traces-api.jsonl", env="TRACE_FILE")
+    trace_otlp_url: str = Field(default="http://localhost:4318/v1/traces", env="TRACE_OTLP_URL")
+    trace_slow_ms: float = Field(default=500.0, env="TRACE_SLOW_MS")
+    trace_sample_rate: float = Field(default=0.01, env="TRACE_SAMPLE_RATE")
+    # Цикл событий: период замера задержки (с), порог остановки со снятием
+    # стека (мс), отладочный режим с поиском блокирующих вызовов
+    loop_lag_interval: float = Field(default=0.25, env="LOOP_LAG_INTERVAL")
+    loop_stall_ms: float = Field(default=100.0, env="LOOP_STALL_MS")
+    loop_debug: bool = Field(default=False, env="LOOP_DEBUG")
+
+
+class RateLimitSettings(BaseSettings):
+    """Настройки ограничения частоты запросов к API"""
+    enabled: bool = Field(default=True, env="RATE_LIMIT_ENABLED")
+    # memory — один процесс; redis — общее состояние для нескольких воркеров
+    backend: str = Field(default="memory", env="RATE_LIMIT_BACKEND")
+    # JSON: {"POST /api/v1/requests/": {"ip": "30/minute", "user": "10/minute"}, "*": {...}}
+    rules: str = Field(default="", env="RATE_LIMIT_RULES")
+    # Сети без ограничений (бот в том же контейнере)
+    exempt: str = Field(default="127.0.0.0/8,::1/128", env="RATE_LIMIT_EXEMPT")
+    # Внутренние сети (бот в docker-сети): запросы с telegram_id из них
+    # ограничиваются только по пользователю, без общей корзины IP
+    internal: str = Field(default="10.0.0.0/8,172.16.0.0/12,192.168.0.0/16", env="RATE_LIMIT_INTERNAL")
+    # Прокси, которым доверяем X-Real-IP / X-Forwarded-For (nginx)
+    trusted_proxies: str = Field(
+        default="127.0.0.0/8,::1/128,10.0.0.0/8,172.16.0.0/12,192.168.0.0/16",
+        env="RATE_LIMIT_TRUSTED_PROXIES"
+    )
+
+    class Config:
+        env_prefix = "RATE_LIMIT_"
 
 
 class Settings(BaseSettings):
@@ -118,11 +190,20 @@ class Settings(BaseSettings):
     telegram: Optional[TelegramSettings] = None
     api: APISettings = Field(default_factory=APISettings)
     monitoring: MonitoringSettings = Field(default_factory=MonitoringSettings)
+    rate_limit: RateLimitSettings = Field(default_factory=RateLimitSettings)
+    
+    # Redis (общее состояние для нескольких воркеров)
+    redis_url: str = Field(default="redis://redis:6379/0", env="REDIS_URL")
     
     # Лимиты и ограничения
     max_requests_per_user: int = Field(default=5, env="MAX_REQUESTS_PER_USER")
     max_description_length: int = Field(default=1000, env="MAX_DESCRIPTION_LENGTH")
     
+    # Назначение исполнителей: лимит активных заявок на исполнителя
+    # и период перечитывания индекса нагрузки из БД (секунды)
+    executor_max_open_requests: int = Field(default=5, env="EXECUTOR_MAX_OPEN_REQUESTS")
+    executor_index_refresh: float = Field(default=60.0, env="EXECUTOR_INDEX_REFRESH")
+    
     class Config:
         env_file = ".env"
     
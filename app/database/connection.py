@@ -6,7 +6,11 @@ from typing import AsyncGenerator
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
 from sqlalchemy.pool import NullPool
 from sqlalchemy import text
+import structlog
 from app.config import settings
+from app.database.models import REQUEST_SEARCH_VECTOR
+
+logger = structlog.get_logger()
 
 # Создаем асинхронный движок
 engine = create_async_engine(
@@ -34,12 +38,108 @@ async def get_db() -> AsyncGenerator[AsyncSession, None]:
             await session.close()
 
 
+# Идемпотентные изменения схемы для уже существующих БД.
+# create_all создаёт только отсутствующие таблицы и не добавляет
+# новые колонки/индексы в существующие, поэтому такие изменения
+# перечисляются здесь и выполняются при каждом старте.
+SCHEMA_UPGRADES = [
+    # Счётчик активных заявок пользователя (+ первичное заполнение)
+    """
+    DO $$
+    BEGIN
+        IF NOT EXISTS (
+            SELECT 1 FROM information_schema.columns
+            WHERE table_name = 'users' AND column_name = 'active_requests'
+        ) THEN
+            ALTER TABLE users ADD COLUMN active_requests INTEGER NOT NULL DEFAULT 0;
+            UPDATE users u
+            SET active_requests = c.cnt
+            FROM (
+                SELECT user_id, count(*) AS cnt
+                FROM requests
+                WHERE status IN ('NEW', 'IN_PROGRESS')
+                GROUP BY user_id
+            ) c
+            WHERE c.user_id = u.id;
+        END IF;
+    END
+    $$;
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_requests_user_id_status ON requests (user_id, status)",
+    # Общая нумерация событий заявок (SSE Last-Event-ID)
+    "CREATE SEQUENCE IF NOT EXISTS request_event_seq",
+    # Полнотекстовый поиск по заявкам
+    f"""
+    ALTER TABLE requests ADD COLUMN IF NOT EXISTS search_vector tsvector
+    GENERATED ALWAYS AS ({REQUEST_SEARCH_VECTOR}) STORED
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_requests_search_vector ON requests USING gin (search_vector)",
+    # Триграммы для поиска по фрагментам адреса и телефона. Если расширение
+    # pg_trgm недоступно, поиск работает без этих индексов (медленнее)
+    """
+    DO $$
+    BEGIN
+        CREATE EXTENSION IF NOT EXISTS pg_trgm;
+    EXCEPTION WHEN OTHERS THEN
+        RAISE NOTICE 'pg_trgm недоступно: %', SQLERRM;
+    END
+    $$;
+    """,
+    """
+    DO $$
+    BEGIN
+        IF EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm') THEN
+            CREATE INDEX IF NOT EXISTS ix_requests_address_trgm
+                ON requests USING gin (address gin_trgm_ops);
+            CREATE INDEX IF NOT EXISTS ix_users_phone_digits_trgm
+                ON users USING gin ((regexp_replace(phone, '\\D', '', 'g')) gin_trgm_ops);
+        END IF;
+    END
+    $$;
+    """,
+    # Очередь новых заявок для claim
+    """
+    CREATE INDEX IF NOT EXISTS ix_requests_new_queue
+    ON requests (priority DESC, created_at, id) WHERE status = 'NEW'
+    """,
+    # Назначения исполнителей
+    "CREATE INDEX IF NOT EXISTS ix_request_executors_executor_id_request_id ON request_executors (executor_id, request_id)",
+    "CREATE INDEX IF NOT EXISTS ix_request_executors_request_id ON request_executors (request_id)",
+    """
+    CREATE UNIQUE INDEX IF NOT EXISTS uq_request_executors_primary
+    ON request_executors (request_id) WHERE is_primary IS true
+    """,
+    # История и комментарии заявки (выборка по заявке и проверка FK при удалении)
+    "CREATE INDEX IF NOT EXISTS ix_request_status_history_request_id ON request_status_history (request_id)",
+    "CREATE INDEX IF NOT EXISTS ix_request_comments_request_id ON request_comments (request_id)",
+    # Пересчёт статистики по периодам создания
+    "CREATE INDEX IF NOT EXISTS ix_requests_created_at ON requests (created_at)",
+    # Первичное заполнение агрегата статистики (для БД, где таблица только что создана)
+    """
+    DO $$
+    BEGIN
+        IF NOT EXISTS (SELECT 1 FROM request_stats_hourly) THEN
+            INSERT INTO request_stats_hourly (bucket, category, service, work_format, preferred_time, status, count)
+            SELECT date_trunc('hour', created_at), category, coalesce(service, ''),
+                   work_format, preferred_time, status, count(*)
+            FROM requests
+            WHERE created_at IS NOT NULL AND status IS NOT NULL
+            GROUP BY 1, 2, 3, 4, 5, 6;
+        END IF;
+    END
+    $$;
+    """,
+]
+
+
 async def init_db():
     """Инициализация базы данных"""
     from app.database.models import Base
     
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+        for statement in SCHEMA_UPGRADES:
+            await conn.execute(text(statement))
 
 
 async def close_db():
@@ -51,13 +151,25 @@ async def close_db():
 async def check_db_connection() -> bool:
     """Проверка подключения к базе данных"""
     try:
-        print(f"DEBUG: Проверка подключения к БД: {settings.database.url}")
         async with engine.connect() as conn:
             result = await conn.execute(text("SELECT 1"))
             _ = result.scalar()  # Должно быть 1
-        print("DEBUG: Подключение к БД успешно!")
         return True
     except Exception as e:
-        print(f"DEBUG: Ошибка подключения к БД: {e}")
-        print(f"DEBUG: Тип ошибки: {type(e)}")
+        logger.warning("db_connection_check_failed", error=str(e), error_type=type(e).__name__)
         return False
+
+
+def get_pool_status() -> dict:
+    """Текущее состояние пула соединений (пусто для NullPool)"""
+    pool = engine.pool
+    if not hasattr(pool, "checkedout"):
+        return {}
+    capacity = settings.database.pool_size + settings.database.max_overflow
+    checked_out = pool.checkedout()
+    return {
+        "size": pool.size(),
+        "checked_out": checked_out,
+        "capacity": capacity,
+        "saturated": checked_out >= capacity,
+    }
@@ -3,10 +3,10 @@
 """
 from datetime import datetime
 from typing import Optional
-from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, ForeignKey, Enum, BigInteger
+from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, ForeignKey, Enum, BigInteger, Index, Computed
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import relationship
-from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.orm import relationship, deferred
+from sqlalchemy.dialects.postgresql import UUID, TSVECTOR, JSONB
 import enum
 
 Base = declarative_base()
@@ -21,6 +21,19 @@ class RequestStatus(str, enum.Enum):
     REJECTED = "rejected"
 
 
+# Статусы, которые учитываются в лимите активных заявок пользователя
+ACTIVE_STATUSES = (RequestStatus.NEW, RequestStatus.IN_PROGRESS)
+
+# Выражение для поискового вектора заявки (конфигурация russian).
+# Категория и услуга важнее описания, описание важнее адреса.
+REQUEST_SEARCH_VECTOR = (
+    "setweight(to_tsvector('russian', coalesce(category, '')), 'A') || "
+    "setweight(to_tsvector('russian', coalesce(service, '')), 'A') || "
+    "setweight(to_tsvector('russian', coalesce(description, '')), 'B') || "
+    "setweight(to_tsvector('russian', coalesce(address, '')), 'C')"
+)
+
+
 class WorkFormat(str, enum.Enum):
     """Форматы работы"""
     HOME_VISIT = "home_visit"
@@ -48,6 +61,9 @@ class User(Base):
     last_name = Column(String(100), nullable=True)
     phone = Column(String(20), nullable=True)
     is_admin = Column(Boolean, default=False)
+    # Денормализованный счётчик заявок в статусах ACTIVE_STATUSES.
+    # Поддерживается RequestService при создании заявки и смене статуса.
+    active_requests = Column(Integer, nullable=False, default=0, server_default="0")
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
@@ -76,18 +92,36 @@ class Request(Base):
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     completed_at = Column(DateTime, nullable=True)
     
+    # Полнотекстовый поиск; вычисляется БД, в обычных выборках не загружается
+    search_vector = deferred(Column(TSVECTOR, Computed(REQUEST_SEARCH_VECTOR, persisted=True)))
+    
     # Связи
     user = relationship("User", back_populates="requests")
     status_history = relationship("RequestStatusHistory", back_populates="request")
     comments = relationship("RequestComment", back_populates="request")
 
+    __table_args__ = (
+        Index("ix_requests_user_id_status", "user_id", "status"),
+        # Пересчёт статистики по периодам создания
+        Index("ix_requests_created_at", "created_at"),
+        Index("ix_requests_search_vector", "search_vector", postgresql_using="gin"),
+        # Очередь новых заявок для claim: приоритет, затем возраст
+        Index(
+            "ix_requests_new_queue",
+            priority.desc(),
+            "created_at",
+            "id",
+            postgresql_where=status == RequestStatus.NEW,
+        ),
+    )
+
 
 class RequestStatusHistory(Base):
     """История изменения статусов заявок"""
     __tablename__ = "request_status_history"
     
     id = Column(Integer, primary_key=True, index=True)
-    request_id = Column(Integer, ForeignKey("requests.id"), nullable=False)
+    request_id = Column(Integer, ForeignKey("requests.id"), nullable=False, index=True)
     old_status = Column(Enum(RequestStatus), nullable=True)
     new_status = Column(Enum(RequestStatus), nullable=False)
     changed_by = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -104,7 +138,7 @@ class RequestComment(Base):
     __tablename__ = "request_comments"
     
     id = Column(Integer, primary_key=True, index=True)
-    request_id = Column(Integer, ForeignKey("requests.id"), nullable=False)
+    request_id = Column(Integer, ForeignKey("requests.id"), nullable=False, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     comment = Column(Text, nullable=False)
     is_internal = Column(Boolean, default=False)  # Внутренний комментарий для менеджеров
@@ -143,3 +177,52 @@ class RequestExecutor(Base):
     # Связи
     request = relationship("Request")
     executor = relationship("Executor")
+
+    __table_args__ = (
+        # Очередь исполнителя и поиск исполнителей заявки
+        Index("ix_request_executors_executor_id_request_id", "executor_id", "request_id"),
+        Index("ix_request_executors_request_id", "request_id"),
+        # Не более одного основного исполнителя на заявку
+        Index(
+            "uq_request_executors_primary",
+            "request_id",
+            unique=True,
+            postgresql_where=is_primary.is_(True),
+        ),
+    )
+
+
+class RequestStatsHourly(Base):
+    """Почасовой агрегат заявок для статистики.
+
+    Строка — число заявок, созданных в часе bucket с данными признаками
+    и находящихся сейчас в статусе status. Поддерживается StatsService
+    при создании заявки и смене статуса.
+    """
+    __tablename__ = "request_stats_hourly"
+    
+    bucket = Column(DateTime, primary_key=True)  # начало часа (UTC)
+    category = Column(String(200), primary_key=True)
+    service = Column(String(200), primary_key=True, default="")  # "" — услуга не указана
+    work_format = Column(Enum(WorkFormat), primary_key=True)
+    preferred_time = Column(Enum(PreferredTime), primary_key=True)
+    status = Column(Enum(RequestStatus), primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+
+
+class IdempotencyKey(Base):
+    """Ключи идемпотентности POST /api/v1/requests/.
+
+    Первичный ключ (user_id, key) разрешает параллельные повторы: второй
+    INSERT с тем же ключом ждёт коммита первого и не создаёт заявку.
+    response — исходный ответ, отдаётся повторам до expires_at.
+    """
+    __tablename__ = "idempotency_keys"
+    
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    key = Column(String(255), primary_key=True)
+    fingerprint = Column(String(64), nullable=False)  # sha256 тела запроса
+    request_id = Column(Integer, ForeignKey("requests.id"), nullable=True)
+    response = Column(JSONB, nullable=True)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    expires_at = Column(DateTime, nullable=False, index=True)
@@ -0,0 +1,247 @@
+"""
+События жизненного цикла заявок для SSE (/api/v1/requests/stream).
+
+Сервис заявок публикует событие через pg_notify в той же транзакции, что и
+изменение данных: событие уходит только после коммита. Каждый процесс API
+держит одно отдельное соединение с LISTEN и раздаёт события всем своим
+подписчикам (fan-out). Номер события берётся из последовательности БД, поэтому
+одинаков во всех воркерах, а порядок доставки NOTIFY совпадает с порядком
+коммитов — повторное подключение с Last-Event-ID работает и к другому воркеру.
+
+Последние события хранятся в кольцевом буфере для повтора после
+переподключения. Подписчик, который не успевает читать и переполнил свою
+очередь, отключается: клиент переподключится с Last-Event-ID.
+"""
+import asyncio
+import json
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Deque, Dict, FrozenSet, Optional, Set
+
+import asyncpg
+import structlog
+from prometheus_client import Counter, Gauge
+from sqlalchemy import text
+
+from app.config import settings
+
+logger = structlog.get_logger()
+
+CHANNEL = "request_events"
+
+EVENTS_RECEIVED = Counter(
+    "fixfix_events_received_total",
+    "События заявок, полученные через LISTEN",
+    ["type"],
+)
+EVENT_SUBSCRIBERS = Gauge(
+    "fixfix_event_subscribers",
+    "Активные подписчики SSE",
+)
+EVENT_SUBSCRIBERS_DROPPED = Counter(
+    "fixfix_event_subscribers_dropped_total",
+    "Подписчики SSE, отключённые из-за переполнения очереди",
+)
+
+# NOTIFY: "<номер>:<json>"; номер из общей последовательности
+_NOTIFY_SQL = text(
+    "SELECT pg_notify(:channel, nextval('request_event_seq')::text || ':' || :payload)"
+)
+
+
+def _json_default(value: Any) -> str:
+    return value.isoformat() if hasattr(value, "isoformat") else str(value)
+
+
+async def publish_event(db, event_type: str, data: Dict[str, Any]) -> None:
+    """Публикация события в текущей транзакции (доставляется после коммита).
+
+    Payload NOTIFY ограничен 8000 байт, поэтому в событие кладутся только
+    ключевые поля заявки, без описания и адреса.
+    """
+    payload = json.dumps({"type": event_type, "data": data}, ensure_ascii=False, default=_json_default)
+    await db.execute(_NOTIFY_SQL, {"channel": CHANNEL, "payload": payload})
+
+
+@dataclass(frozen=True)
+class Event:
+    id: int
+    type: str
+    data: Dict[str, Any]
+
+    def encode(self) -> bytes:
+        """Событие в формате text/event-stream"""
+        body = json.dumps(self.data, ensure_ascii=False)
+        return f"id: {self.id}\nevent: {self.type}\ndata: {body}\n\n".encode("utf-8")
+
+
+# Тип события "часть событий потеряна, перечитайте состояние"
+RESET = "reset"
+
+
+class Subscription:
+    """Очередь событий одного клиента с фильтрами по статусу и категории"""
+
+    def __init__(self, queue_size: int, statuses: FrozenSet[str], categories: FrozenSet[str]):
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.statuses = statuses
+        self.categories = categories
+
+    def matches(self, event: Event) -> bool:
+        if self.statuses and event.data.get("status") not in self.statuses:
+            return False
+        if self.categories and event.data.get("category") not in self.categories:
+            return False
+        return True
+
+    async def get(self) -> Optional[Event]:
+        """Следующее событие; None — подписка закрыта"""
+        return await self.queue.get()
+
+
+class EventHub:
+    """Одно LISTEN соединение на процесс и раздача событий подписчикам"""
+
+    def __init__(self, buffer_size: int = 1000, queue_size: int = 100, reconnect_delay: float = 1.0):
+        self.queue_size = queue_size
+        self.reconnect_delay = reconnect_delay
+        self._buffer: Deque[Event] = deque(maxlen=buffer_size)
+        self._last_id = 0
+        self._subscribers: Set[Subscription] = set()
+        self._task: Optional[asyncio.Task] = None
+
+    def subscribe(
+        self,
+        last_event_id: Optional[int] = None,
+        statuses: FrozenSet[str] = frozenset(),
+        categories: FrozenSet[str] = frozenset(),
+    ) -> Subscription:
+        """Новая подписка; с last_event_id сначала повторяются пропущенные события"""
+        subscription = Subscription(self.queue_size, statuses, categories)
+        if last_event_id is not None:
+            missed = self._missed_since(last_event_id)
+            if missed is None:
+                self._offer(subscription, self._reset_event())
+            else:
+                for event in missed:
+                    if subscription.matches(event) and not self._offer(subscription, event):
+                        break
+        self._subscribers.add(subscription)
+        EVENT_SUBSCRIBERS.set(len(self._subscribers))
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        self._subscribers.discard(subscription)
+        EVENT_SUBSCRIBERS.set(len(self._subscribers))
+
+    def _missed_since(self, last_event_id: int) -> Optional[list]:
+        """События после last_event_id; None — его уже нет в буфере"""
+        if last_event_id == self._last_id:
+            return []
+        events = list(self._buffer)
+        for index in range(len(events) - 1, -1, -1):
+            if events[index].id == last_event_id:
+                return events[index + 1:]
+        return None
+
+    def _offer(self, subscription: Subscription, event: Event) -> bool:
+        """Кладёт событие в очередь; при переполнении закрывает подписку"""
+        try:
+            subscription.queue.put_nowait(event)
+            return True
+        except asyncio.QueueFull:
+            pass
+        # Медленный клиент: отключаем, он переподключится с Last-Event-ID
+        self._close(subscription)
+        EVENT_SUBSCRIBERS_DROPPED.inc()
+        return False
+
+    def _close(self, subscription: Subscription) -> None:
+        """Освобождает очередь и оставляет в ней только маркер закрытия"""
+        while not subscription.queue.empty():
+            subscription.queue.get_nowait()
+        subscription.queue.put_nowait(None)
+        self.unsubscribe(subscription)
+
+    def _reset_event(self) -> Event:
+        # Номер последнего известного события: после перечитывания клиент
+        # продолжает с него, а не получает reset повторно
+        return Event(id=self._last_id, type=RESET, data={})
+
+    def _reset_all(self) -> None:
+        """После обрыва LISTEN в буфере пропуск: сбрасываем его и уведомляем клиентов"""
+        self._buffer.clear()
+        event = self._reset_event()
+        for subscription in list(self._subscribers):
+            self._offer(subscription, event)
+
+    def publish(self, event: Event) -> None:
+        """Событие в буфер и всем подходящим подписчикам"""
+        self._buffer.append(event)
+        self._last_id = event.id
+        for subscription in list(self._subscribers):
+            if subscription.matches(event):
+                self._offer(subscription, event)
+
+    def _on_notify(self, connection, pid, channel, payload: str) -> None:
+        try:
+            event_id, body = payload.split(":", 1)
+            message = json.loads(body)
+            event = Event(id=int(event_id), type=message["type"], data=message["data"])
+        except (ValueError, KeyError) as e:
+            logger.warning("request_event_invalid", error=str(e))
+            return
+        EVENTS_RECEIVED.labels(event.type).inc()
+        self.publish(event)
+
+    async def _listen(self) -> None:
+        """LISTEN с переподключением при обрыве соединения"""
+        db = settings.database
+        listened = False
+        while True:
+            closed = asyncio.Event()
+            connection = None
+            try:
+                connection = await asyncpg.connect(
+                    host=db.host, port=db.port, user=db.user, password=db.password, database=db.name
+                )
+                connection.add_termination_listener(lambda _, done=closed: done.set())
+                await connection.add_listener(CHANNEL, self._on_notify)
+                logger.info("request_events_listening", channel=CHANNEL)
+                if listened:
+                    self._reset_all()
+                listened = True
+                await closed.wait()
+                logger.warning("request_events_connection_lost")
+            except asyncio.CancelledError:
+                if connection is not None:
+                    await connection.close()
+                raise
+            except Exception as e:
+                logger.warning("request_events_listen_failed", error=str(e))
+                if connection is not None:
+                    connection.terminate()
+            await asyncio.sleep(self.reconnect_delay)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._listen())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        # Завершаем открытые потоки клиентов
+        for subscription in list(self._subscribers):
+            self._close(subscription)
+
+
+# Глобальный экземпляр
+event_hub = EventHub(
+    buffer_size=settings.api.events_buffer_size,
+    queue_size=settings.api.events_queue_size,
+)
@@ -0,0 +1,153 @@
+"""
+Кэшированное состояние здоровья API.
+
+Проверка БД выполняется фоновой задачей с фиксированным интервалом,
+а /health, /readyz и /livez отдают последний снимок без обращения к БД.
+"""
+import asyncio
+import time
+from contextlib import AsyncExitStack
+from dataclasses import dataclass, asdict
+from typing import Optional, Tuple
+
+import structlog
+from sqlalchemy import text
+
+from app.config import settings
+from app.database.connection import engine, get_pool_status
+
+logger = structlog.get_logger()
+
+
+@dataclass
+class HealthSnapshot:
+    """Результат последней проверки"""
+    database_ok: bool = False
+    probe_latency_ms: Optional[float] = None
+    checked_at: Optional[float] = None
+    error: Optional[str] = None
+    pool_checked_out: Optional[int] = None
+    pool_capacity: Optional[int] = None
+    pool_saturated: bool = False
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+class HealthProber:
+    """Фоновая проверка БД и пула соединений"""
+
+    def __init__(self, interval: float, timeout: float):
+        self.interval = interval
+        self.timeout = timeout
+        self.snapshot = HealthSnapshot()
+        self._task: Optional[asyncio.Task] = None
+
+    async def probe(self) -> HealthSnapshot:
+        """Одна проверка: состояние пула и SELECT 1 с замером задержки"""
+        pool = get_pool_status()
+        snapshot = HealthSnapshot(
+            checked_at=time.time(),
+            pool_checked_out=pool.get("checked_out"),
+            pool_capacity=pool.get("capacity"),
+            pool_saturated=pool.get("saturated", False),
+        )
+
+        if snapshot.pool_saturated:
+            # Не встаём в очередь за соединением: пул и так исчерпан
+            snapshot.database_ok = self.snapshot.database_ok
+            snapshot.error = "connection pool saturated"
+        else:
+            started = time.perf_counter()
+            try:
+                await asyncio.wait_for(self._select_one(), timeout=self.timeout)
+                snapshot.database_ok = True
+            except asyncio.TimeoutError:
+                snapshot.error = f"probe timeout ({self.timeout}s)"
+            except Exception as e:
+                snapshot.error = f"{type(e).__name__}: {e}"
+            snapshot.probe_latency_ms = round((time.perf_counter() - started) * 1000, 2)
+
+        if snapshot.database_ok != self.snapshot.database_ok or snapshot.pool_saturated != self.snapshot.pool_saturated:
+            logger.info(
+                "health_state_changed",
+                database_ok=snapshot.database_ok,
+                pool_saturated=snapshot.pool_saturated,
+                error=snapshot.error,
+            )
+        self.snapshot = snapshot
+        return snapshot
+
+    async def _select_one(self) -> None:
+        async with engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.probe()
+            except Exception as e:
+                logger.error("health_probe_failed", error=str(e))
+            await asyncio.sleep(self.interval)
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def readiness(self) -> Tuple[bool, str]:
+        """Готовность принимать трафик и причина, если не готово"""
+        snapshot = self.snapshot
+        if snapshot.checked_at is None:
+            return False, "starting"
+        if time.time() - snapshot.checked_at > self.interval * 3 + self.timeout:
+            return False, "health snapshot is stale"
+        if snapshot.pool_saturated:
+            return False, "connection pool saturated"
+        if not snapshot.database_ok:
+            return False, snapshot.error or "database unavailable"
+        return True, "ok"
+
+
+async def warm_up_pool(connections: int, deadline: float) -> bool:
+    """Ожидание готовности БД и прогрев пула соединений.
+
+    Открывает `connections` соединений одновременно, чтобы пул создал их
+    заранее. Пока БД недоступна, повторяет попытки с экспоненциальной
+    задержкой (до 5 с), но не дольше `deadline` секунд.
+    """
+    started = time.monotonic()
+    delay = 0.5
+    attempt = 0
+    while True:
+        attempt += 1
+        try:
+            async with AsyncExitStack() as stack:
+                for _ in range(connections):
+                    conn = await stack.enter_async_context(engine.connect())
+                    await conn.execute(text("SELECT 1"))
+            logger.info("db_pool_warmed_up", connections=connections, attempts=attempt)
+            return True
+        except Exception as e:
+            logger.warning("db_not_ready", attempt=attempt, error=str(e))
+
+        if time.monotonic() - started + delay > deadline:
+            logger.error("db_not_ready_after_deadline", deadline=deadline, attempts=attempt)
+            return False
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, 5.0)
+
+
+# Глобальный экземпляр
+health_prober = HealthProber(
+    interval=settings.monitoring.health_probe_interval,
+    timeout=settings.monitoring.health_probe_timeout,
+)
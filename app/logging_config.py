@@ -0,0 +1,249 @@
+"""
+Настройка логирования с асинхронной записью (API и бот).
+
+structlog на event loop только собирает словарь события; рендеринг в JSON
+и запись в stdout выполняются в отдельном потоке QueueListener. Там же
+маскируются персональные данные: поля phone/address/description/text и
+номера телефонов в любых строках записи.
+
+Записи ниже WARNING можно семплировать по логгерам ("bot.handlers=0.1"),
+уровни и доли меняются на ходу (set_log_levels, set_log_sampling) без
+перезапуска процесса.
+"""
+import atexit
+import logging
+import queue
+import random
+import re
+import sys
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Iterable, Optional
+
+import structlog
+
+# Поля записи с персональными данными
+REDACTED_FIELDS = frozenset({"phone", "address", "description", "text"})
+
+# Номер телефона в свободном тексте: 10-15 цифр с разделителями
+# (не часть идентификатора, отрицательного числа или даты)
+_PHONE = re.compile(r"(?<![\w\-+])(?!\d{4}-\d\d-\d\d)\+?\d[\d\s()\-]{8,18}\d(?!\w)")
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """QueueHandler без форматирования в вызывающем потоке.
+
+    Стандартный QueueHandler.prepare() форматирует запись до постановки
+    в очередь; здесь запись передаётся как есть, а форматтер работает в
+    потоке слушателя. При переполнении очереди запись отбрасывается.
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def parse_logger_map(value: str) -> Dict[str, str]:
+    """Разбор "bot.handlers=DEBUG,httpx=WARNING"; значение без имени — корневой логгер"""
+    result = {}
+    for item in value.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        name, _, setting = item.rpartition("=")
+        result[name.strip()] = setting.strip()
+    return result
+
+
+def _mask_phone(match) -> str:
+    phone = match.group(0)
+    digits = sum(ch.isdigit() for ch in phone)
+    return f"<телефон ***{phone[-2:]}>" if 10 <= digits <= 15 else phone
+
+
+def _redact_value(key: str, value):
+    if key in REDACTED_FIELDS and value:
+        if key == "phone":
+            return f"***{str(value)[-2:]}"
+        return f"<скрыто, {len(str(value))} симв.>"
+    if isinstance(value, str):
+        return _PHONE.sub(_mask_phone, value)
+    return value
+
+
+def redact_pii(logger, method_name, event_dict):
+    """Маскирование персональных данных (в потоке записи)"""
+    return {key: _redact_value(key, value) for key, value in event_dict.items()}
+
+
+class SamplingFilter(logging.Filter):
+    """Доля записей ниже WARNING по логгерам; настройка логгера действует на дочерние"""
+
+    def __init__(self, rates: Optional[Dict[str, float]] = None):
+        super().__init__()
+        self.rates: Dict[str, float] = {}
+        self._cache: Dict[str, float] = {}
+        self.dropped = 0
+        self.set_rates(rates or {})
+
+    def set_rates(self, rates: Dict[str, float]) -> None:
+        self.rates = dict(rates)
+        self._cache = {}
+
+    def _rate(self, name: str) -> float:
+        rate = self._cache.get(name)
+        if rate is None:
+            rate = 1.0
+            lookup = name
+            while lookup:
+                if lookup in self.rates:
+                    rate = self.rates[lookup]
+                    break
+                lookup = lookup.rpartition(".")[0]
+            else:
+                rate = self.rates.get("", 1.0)
+            self._cache[name] = rate
+        return rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING or not self.rates:
+            return True
+        rate = self._rate(record.name)
+        if rate >= 1.0 or random.random() < rate:
+            return True
+        self.dropped += 1
+        return False
+
+
+def _capture_exc_info(logger, method_name, event_dict):
+    """Фиксирует exc_info=True в кортеж, пока исключение ещё доступно"""
+    if event_dict.get("exc_info") is True:
+        event_dict["exc_info"] = sys.exc_info()
+    return event_dict
+
+
+_listener: Optional[QueueListener] = None
+_queue_handler: Optional[NonBlockingQueueHandler] = None
+_sampling = SamplingFilter()
+# Логгеры, уровень которых менялся через set_log_levels
+_configured_levels: Dict[str, str] = {}
+
+
+def set_log_levels(spec: str) -> Dict[str, str]:
+    """Уровни логгеров на ходу: "DEBUG" или "bot.handlers=DEBUG,httpx=WARNING" """
+    levels = parse_logger_map(spec)
+    for name, level in levels.items():
+        if logging.getLevelName(level.upper()) not in range(0, 51):
+            raise ValueError(f"Неизвестный уровень логирования: {level}")
+    for name, level in levels.items():
+        logging.getLogger(name or None).setLevel(level.upper())
+        _configured_levels[name] = level.upper()
+    return levels
+
+
+def set_log_sampling(spec: str) -> Dict[str, float]:
+    """Доли записей ниже WARNING на ходу: "bot.handlers=0.1"; пустая строка — без семплирования"""
+    rates = {name: float(rate) for name, rate in parse_logger_map(spec).items()}
+    _sampling.set_rates(rates)
+    return rates
+
+
+def logging_state(names: Iterable[str] = ()) -> dict:
+    """Текущие уровни, доли семплирования и потери записей"""
+    levels = {"": logging.getLevelName(logging.getLogger().level)}
+    for name in (*_configured_levels, *names):
+        if name:
+            levels[name] = logging.getLevelName(logging.getLogger(name).getEffectiveLevel())
+    return {
+        "levels": levels,
+        "sampling": dict(_sampling.rates),
+        "sampled_out": _sampling.dropped,
+        "queue_dropped": _queue_handler.dropped if _queue_handler is not None else 0,
+    }
+
+
+def configure_logging(
+    level: str = "INFO", queue_size: int = 10000, stream=None, sampling: str = "",
+) -> NonBlockingQueueHandler:
+    """Настройка structlog и stdlib logging с записью через очередь.
+
+    Записи выводятся в `stream` (по умолчанию stdout). `level` — уровень
+    корневого логгера или карта уровней ("INFO,bot.handlers=DEBUG"),
+    `sampling` — доли записей ниже WARNING по логгерам. Повторный вызов
+    только меняет уровни.
+    """
+    global _listener, _queue_handler
+
+    set_log_levels(level)
+    if _queue_handler is not None:
+        return _queue_handler
+    root = logging.getLogger()
+
+    # httpx пишет полный URL (для Telegram в нём токен бота), а access-лог
+    # uvicorn дублирует AccessLogMiddleware
+    for noisy in ("httpx", "httpcore", "uvicorn.access"):
+        logging.getLogger(noisy).setLevel(logging.WARNING)
+
+    structlog.configure(
+        processors=[
+            structlog.stdlib.filter_by_level,
+            structlog.stdlib.add_logger_name,
+            structlog.stdlib.add_log_level,
+            structlog.stdlib.PositionalArgumentsFormatter(),
+            structlog.processors.TimeStamper(fmt="iso"),
+            structlog.processors.StackInfoRenderer(),
+            _capture_exc_info,
+            structlog.stdlib.ProcessorFormatter.wrap_for_formatter,
+        ],
+        context_class=dict,
+        logger_factory=structlog.stdlib.LoggerFactory(),
+        wrapper_class=structlog.stdlib.BoundLogger,
+        cache_logger_on_first_use=True,
+    )
+
+    formatter = structlog.stdlib.ProcessorFormatter(
+        processors=[
+            structlog.stdlib.ProcessorFormatter.remove_processors_meta,
+            structlog.processors.format_exc_info,
+            redact_pii,
+            structlog.processors.UnicodeDecoder(),
+            structlog.processors.JSONRenderer(ensure_ascii=False),
+        ],
+        # Записи сторонних библиотек (uvicorn, sqlalchemy) в том же формате
+        foreign_pre_chain=[
+            structlog.stdlib.add_logger_name,
+            structlog.stdlib.add_log_level,
+            structlog.processors.TimeStamper(fmt="iso"),
+        ],
+    )
+    stream_handler = logging.StreamHandler(stream or sys.stdout)
+    stream_handler.setFormatter(formatter)
+
+    _queue_handler = NonBlockingQueueHandler(queue.Queue(maxsize=queue_size))
+    set_log_sampling(sampling)
+    _queue_handler.addFilter(_sampling)
+    root.handlers = [_queue_handler]
+
+    _listener = QueueListener(_queue_handler.queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+    return _queue_handler
+
+
+def shutdown_logging() -> None:
+    """Остановка потока записи с выгрузкой оставшихся записей"""
+    global _listener, _queue_handler
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+    if _queue_handler is not None:
+        logging.getLogger().removeHandler(_queue_handler)
+        _queue_handler = None
@@ -0,0 +1,228 @@
+"""
+Задержка цикла событий и поиск блокирующих вызовов (API и бот).
+
+Задача-метроном каждые interval секунд засыпает и замеряет, насколько
+позже срока она проснулась: это время, на которое цикл был занят чужим
+синхронным кодом (задержка планирования). Задержки копятся в гистограмме
+fixfix_event_loop_lag_seconds.
+
+Сторожевой поток следит за отметками метронома: если отметки нет дольше
+interval + stall_ms, цикл стоит прямо сейчас — поток снимает стек потока
+цикла (sys._current_frames) и пишет event_loop_stall с местом, где цикл
+занят. После того как цикл отпустит, пишется event_loop_stall_ended
+с полной длительностью.
+
+Отладочный режим (debug) дополнительно:
+  - включает debug-режим asyncio: колбэки дольше stall_ms пишутся в лог
+    asyncio ("Executing <Task ...> took N seconds");
+  - ставит audit hook, который отмечает блокирующие вызовы из потока
+    цикла во время работы цикла: open, connect блокирующего сокета,
+    subprocess, os.system; time.sleep (audit-события у него нет)
+    подменяется обёрткой на время работы монитора. Каждое место вызова
+    пишется в лог один раз, счётчик fixfix_blocking_calls_total — на
+    каждый вызов. Audit hook нельзя снять, поэтому он ставится только
+    в отладочном режиме.
+
+Модуль не читает настройки app.config: его использует и бот.
+"""
+import asyncio
+import linecache
+import os
+import socket
+import sys
+import sysconfig
+import threading
+import time
+import traceback
+from typing import Optional, Set, Tuple
+
+import structlog
+from prometheus_client import Counter, Histogram
+
+logger = structlog.get_logger("loop")
+
+EVENT_LOOP_LAG = Histogram(
+    "fixfix_event_loop_lag_seconds",
+    "Задержка планирования цикла событий",
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+)
+EVENT_LOOP_STALLS = Counter(
+    "fixfix_event_loop_stalls_total",
+    "Остановки цикла событий дольше порога",
+)
+BLOCKING_CALLS = Counter(
+    "fixfix_blocking_calls_total",
+    "Блокирующие вызовы из потока цикла событий (отладочный режим)",
+    ["event"],
+)
+
+# Audit-события блокирующих вызовов
+BLOCKING_EVENTS = frozenset({"open", "socket.connect", "subprocess.Popen", "os.system", "os.posix_spawn"})
+
+STACK_LIMIT = 30
+
+_STDLIB = sysconfig.get_paths()["stdlib"]
+_active_monitor: Optional["LoopMonitor"] = None
+_hook_installed = False
+_original_sleep = time.sleep
+
+
+def _call_site(frame) -> Tuple[str, int]:
+    """Ближайший к вызову кадр вне стандартной библиотеки"""
+    first = frame
+    while frame is not None:
+        if not frame.f_code.co_filename.startswith(_STDLIB):
+            return frame.f_code.co_filename, frame.f_lineno
+        frame = frame.f_back
+    return first.f_code.co_filename, first.f_lineno
+
+
+def _from_linecache(frame) -> bool:
+    """open() исходника для трассировки стека (в т.ч. debug-режим asyncio)"""
+    for _ in range(4):
+        if frame is None:
+            return False
+        if frame.f_code.co_filename == linecache.__file__:
+            return True
+        frame = frame.f_back
+    return False
+
+
+def _in_loop_thread() -> Optional["LoopMonitor"]:
+    monitor = _active_monitor
+    if monitor is None or threading.get_ident() != monitor.thread_id:
+        return None
+    if asyncio._get_running_loop() is not monitor.loop:
+        return None
+    return monitor
+
+
+def _audit_hook(event: str, args: tuple) -> None:
+    if event not in BLOCKING_EVENTS:
+        return
+    monitor = _in_loop_thread()
+    if monitor is None:
+        return
+    if event == "socket.connect" and isinstance(args[0], socket.socket) and args[0].gettimeout() == 0.0:
+        # Неблокирующий сокет (loop.sock_connect)
+        return
+    frame = sys._getframe(1)
+    if event == "open" and (not isinstance(args[0], (str, bytes, os.PathLike)) or _from_linecache(frame)):
+        return
+    monitor.blocking_call(event, frame)
+
+
+def _checked_sleep(seconds: float) -> None:
+    monitor = _in_loop_thread()
+    if monitor is not None:
+        monitor.blocking_call("time.sleep", sys._getframe(1))
+    _original_sleep(seconds)
+
+
+class LoopMonitor:
+    """Метроном задержки цикла событий, сторожевой поток и отладочный режим"""
+
+    def __init__(self, interval: float = 0.25, stall_ms: float = 100.0, debug: bool = False):
+        self.interval = interval
+        self.stall = stall_ms / 1000
+        self.debug = debug
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.thread_id: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+        self._beat = 0.0
+        self._reported_beat = 0.0
+        self._sites: Set[Tuple[str, str, int]] = set()
+        self._reporting = False
+
+    async def _run(self) -> None:
+        loop = self.loop
+        while True:
+            self._beat = time.monotonic()
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - expected)
+            EVENT_LOOP_LAG.observe(lag)
+            if self._reported_beat == self._beat:
+                logger.warning("event_loop_stall_ended", lag_ms=round(lag * 1000, 1))
+
+    def _watch(self) -> None:
+        period = max(min(self.stall / 4, self.interval), 0.01)
+        while not self._stopped.wait(period):
+            beat = self._beat
+            stalled = time.monotonic() - beat - self.interval
+            if stalled < self.stall or beat == self._reported_beat:
+                continue
+            frame = sys._current_frames().get(self.thread_id)
+            if beat != self._beat or frame is None:
+                # Цикл успел проснуться
+                continue
+            self._reported_beat = beat
+            EVENT_LOOP_STALLS.inc()
+            logger.warning(
+                "event_loop_stall",
+                stalled_ms=round(stalled * 1000, 1),
+                stack="".join(traceback.format_stack(frame, limit=STACK_LIMIT)),
+            )
+
+    def blocking_call(self, event: str, frame) -> None:
+        if self._reporting:
+            # open() из linecache при форматировании стека
+            return
+        BLOCKING_CALLS.labels(event).inc()
+        filename, lineno = _call_site(frame)
+        site = (event, filename, lineno)
+        if site in self._sites:
+            return
+        self._sites.add(site)
+        self._reporting = True
+        try:
+            logger.warning(
+                "blocking_call",
+                call=event,
+                site=f"{filename}:{lineno}",
+                stack="".join(traceback.format_stack(frame, limit=STACK_LIMIT)),
+            )
+        finally:
+            self._reporting = False
+
+    def start(self) -> None:
+        """Запуск из работающего цикла событий"""
+        global _active_monitor, _hook_installed
+        if self._task is not None and not self._task.done():
+            return
+        self.loop = asyncio.get_running_loop()
+        self.thread_id = threading.get_ident()
+        self._beat = time.monotonic()
+        self._stopped.clear()
+        self._task = self.loop.create_task(self._run())
+        self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._watchdog.start()
+        if self.debug:
+            self.loop.set_debug(True)
+            self.loop.slow_callback_duration = self.stall
+            _active_monitor = self
+            time.sleep = _checked_sleep
+            if not _hook_installed:
+                sys.addaudithook(_audit_hook)
+                _hook_installed = True
+            logger.info("loop_debug_enabled", slow_callback_ms=round(self.stall * 1000, 1))
+
+    async def stop(self) -> None:
+        global _active_monitor
+        if _active_monitor is self:
+            _active_monitor = None
+            time.sleep = _original_sleep
+            self.loop.set_debug(False)
+        self._stopped.set()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._watchdog is not None:
+            await asyncio.to_thread(self._watchdog.join)
+            self._watchdog = None
@@ -1,59 +1,50 @@
 """
 Основное FastAPI приложение для FixFix Bot
 """
-import asyncio
 from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
 import structlog
 import time
 
 from app.config import settings
-from app.database.connection import init_db, close_db, check_db_connection
+from app.logging_config import configure_logging
+from app.access_log import AccessLogMiddleware, parse_route_sampling
+from app.rate_limit import RateLimitMiddleware, create_backend, parse_networks, parse_rules
+from app.metrics import render_metrics
+from app.database.connection import init_db, close_db, AsyncSessionLocal, engine
+from app.query_stats import install_query_hooks
+from app.tracing import TracingMiddleware, create_exporter, tracer
+from app.loop_monitor import LoopMonitor
+from app.health import health_prober, warm_up_pool
+from app.services.telegram_sender import telegram_sender
+from app.events import event_hub
+from app.services.assignment import executor_index
 from app.api.requests import router as requests_router
+from app.api.stats import router as stats_router
+from app.api.executors import router as executors_router
+from app.api.profiling import router as profiling_router
 
-# Настройка логирования
-structlog.configure(
-    processors=[
-        structlog.stdlib.filter_by_level,
-        structlog.stdlib.add_logger_name,
-        structlog.stdlib.add_log_level,
-        structlog.stdlib.PositionalArgumentsFormatter(),
-        structlog.processors.TimeStamper(fmt="iso"),
-        structlog.processors.StackInfoRenderer(),
-        structlog.processors.format_exc_info,
-        structlog.processors.UnicodeDecoder(),
-        structlog.processors.JSONRenderer()
-    ],
-    context_class=dict,
-    logger_factory=structlog.stdlib.LoggerFactory(),
-    wrapper_class=structlog.stdlib.BoundLogger,
-    cache_logger_on_first_use=True,
-)
+# Настройка логирования (рендеринг и запись вынесены из event loop)
+configure_logging("DEBUG" if settings.api.debug else settings.monitoring.log_level)
 
 logger = structlog.get_logger()
 
+# Учёт SQL-запросов по HTTP запросам и slow-query лог
+install_query_hooks(engine, settings.monitoring.db_slow_query_ms)
 
-async def wait_for_database(max_retries: int = 60, delay: float = 3.0):
-    """Ожидание готовности базы данных"""
-    logger.info("Ожидание готовности базы данных...")
-    
-    for attempt in range(max_retries):
-        try:
-            logger.info(f"Попытка подключения к БД {attempt + 1}/{max_retries}")
-            if await check_db_connection():
-                logger.info(f"✅ База данных готова (попытка {attempt + 1})")
-                return True
-        except Exception as e:
-            logger.warning(f"Попытка {attempt + 1}/{max_retries}: БД не готова: {e}")
-        
-        if attempt < max_retries - 1:
-            logger.info(f"Ожидание {delay} секунд перед следующей попыткой...")
-            await asyncio.sleep(delay)
-    
-    logger.error("❌ База данных не готова после всех попыток")
-    return False
+# Задержка цикла событий и остановки дольше порога (со стеком)
+loop_monitor = LoopMonitor(
+    interval=settings.monitoring.loop_lag_interval,
+    stall_ms=settings.monitoring.loop_stall_ms,
+    debug=settings.monitoring.loop_debug,
+)
+
+rate_limit_backend = (
+    create_backend(settings.rate_limit.backend, settings.redis_url)
+    if settings.rate_limit.enabled else None
+)
 
 
 @asynccontextmanager
@@ -61,9 +52,25 @@ async def lifespan(app: FastAPI):
     """Управление жизненным циклом приложения"""
     # Запуск
     logger.info("Запуск приложения FixFix Bot")
+    loop_monitor.start()
+    
+    # Трассировка запросов (продолжение трасс бота по traceparent)
+    trace_exporter = create_exporter(
+        settings.monitoring.trace_exporter,
+        settings.monitoring.trace_file,
+        settings.monitoring.trace_otlp_url,
+    )
+    if trace_exporter is not None:
+        tracer.configure(
+            "fixfix-api",
+            trace_exporter,
+            slow_ms=settings.monitoring.trace_slow_ms,
+            sample_rate=settings.monitoring.trace_sample_rate,
+        )
+        logger.info("Трассировка включена", exporter=settings.monitoring.trace_exporter)
     
-    # Ожидание готовности базы данных
-    if not await wait_for_database():
+    # Ожидание готовности базы данных и прогрев пула соединений
+    if not await warm_up_pool(settings.database.pool_size, settings.database.startup_timeout):
         logger.error("Не удалось подключиться к базе данных")
         raise RuntimeError("База данных недоступна")
     
@@ -75,11 +82,29 @@ async def lifespan(app: FastAPI):
         logger.error(f"Ошибка инициализации БД: {e}")
         raise
     
+    # Первая проверка синхронно, чтобы /readyz сразу отражал состояние
+    await health_prober.probe()
+    health_prober.start()
+    event_hub.start()
+    
+    # Индекс исполнителей и их нагрузки для автоназначения
+    async with AsyncSessionLocal() as db:
+        await executor_index.refresh(db)
+    executor_index.start()
+    
     yield
     
     # Завершение
     logger.info("Завершение работы приложения")
+    await health_prober.stop()
+    await event_hub.stop()
+    await executor_index.stop()
+    if rate_limit_backend is not None:
+        await rate_limit_backend.close()
+    await telegram_sender.close()
     await close_db()
+    tracer.shutdown()
+    await loop_monitor.stop()
 
 
 # Создание FastAPI приложения
@@ -101,33 +126,30 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Middleware для логирования запросов
-@app.middleware("http")
-async def log_requests(request: Request, call_next):
-    start_time = time.time()
-    
-    # Логируем запрос
-    logger.info(
-        "HTTP Request",
-        method=request.method,
-        url=str(request.url),
-        client_ip=request.client.host if request.client else None,
-        user_agent=request.headers.get("user-agent")
+# Ограничение частоты запросов (по IP и telegram_id)
+if rate_limit_backend is not None:
+    app.add_middleware(
+        RateLimitMiddleware,
+        backend=rate_limit_backend,
+        rules=parse_rules(settings.rate_limit.rules),
+        exempt_networks=parse_networks(settings.rate_limit.exempt),
+        trusted_proxies=parse_networks(settings.rate_limit.trusted_proxies),
+        internal_networks=parse_networks(settings.rate_limit.internal),
+        exclude=["/health", "/livez", "/readyz", "/metrics"],
     )
-    
-    response = await call_next(request)
-    
-    # Логируем ответ
-    process_time = time.time() - start_time
-    logger.info(
-        "HTTP Response",
-        method=request.method,
-        url=str(request.url),
-        status_code=response.status_code,
-        process_time=process_time
-    )
-    
-    return response
+
+# Access-лог и метрики запросов (одна запись на запрос, с семплированием)
+app.add_middleware(
+    AccessLogMiddleware,
+    sample_rate=settings.monitoring.access_log_sample_rate,
+    route_sampling=parse_route_sampling(settings.monitoring.access_log_route_sampling),
+    exclude=[p.strip() for p in settings.monitoring.access_log_exclude.split(",") if p.strip()],
+    slow_ms=settings.monitoring.access_log_slow_ms,
+    db_queries_header=settings.monitoring.db_queries_header,
+)
+
+# Трассировка — внешний слой: спан охватывает все middleware
+app.add_middleware(TracingMiddleware)
 
 
 # Обработчик ошибок
@@ -136,7 +158,7 @@ async def global_exception_handler(request: Request, exc: Exception):
     logger.error(
         "Unhandled exception",
         method=request.method,
-        url=str(request.url),
+        path=request.url.path,
         error=str(exc),
         exc_info=True
     )
@@ -149,21 +171,54 @@ async def global_exception_handler(request: Request, exc: Exception):
 
 # Подключение роутеров
 app.include_router(requests_router, prefix="/api/v1")
+app.include_router(stats_router, prefix="/api/v1")
+app.include_router(executors_router, prefix="/api/v1")
+app.include_router(profiling_router, prefix="/api/v1")
 
 
-# Health check endpoint
+# Health check endpoints (отдают кэшированный снимок фоновой проверки)
 @app.get("/health")
 async def health_check():
     """Проверка состояния приложения"""
-    db_status = await check_db_connection()
+    snapshot = health_prober.snapshot
+    ready, _ = health_prober.readiness()
     return {
-        "status": "healthy" if db_status else "unhealthy",
-        "database": "connected" if db_status else "disconnected",
+        "status": "healthy" if ready else "unhealthy",
+        "database": "connected" if snapshot.database_ok else "disconnected",
+        "probe": snapshot.to_dict(),
         "timestamp": time.time(),
         "version": "1.0.0"
     }
 
 
+@app.get("/livez")
+async def liveness_check():
+    """Процесс жив и обслуживает event loop (без обращения к БД)"""
+    return {"status": "alive"}
+
+
+@app.get("/readyz")
+async def readiness_check():
+    """Готовность принимать трафик: БД доступна, пул не исчерпан"""
+    ready, reason = health_prober.readiness()
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={
+            "status": "ready" if ready else "not_ready",
+            "reason": reason,
+            "probe": health_prober.snapshot.to_dict(),
+        }
+    )
+
+
+if settings.monitoring.enable_metrics:
+    @app.get("/metrics", include_in_schema=False)
+    async def metrics():
+        """Метрики для Prometheus"""
+        body, content_type = render_metrics()
+        return Response(content=body, media_type=content_type)
+
+
 # Root endpoint
 @app.get("/")
 async def root():
@@ -172,7 +227,9 @@ async def root():
         "message": "FixFix Bot API",
         "version": "1.0.0",
         "docs": "/docs",
-        "health": "/health"
+        "health": "/health",
+        "liveness": "/livez",
+        "readiness": "/readyz"
     }
 
 
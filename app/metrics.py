@@ -0,0 +1,48 @@
+"""
+Prometheus метрики API
+"""
+from prometheus_client import Gauge, Histogram, CONTENT_TYPE_LATEST, generate_latest
+
+from app.database.connection import get_pool_status
+
+
+HTTP_REQUEST_DURATION = Histogram(
+    "fixfix_http_request_duration_seconds",
+    "Длительность обработки HTTP запроса",
+    ["method", "route", "status"],
+)
+
+# SQL-запросы: длительность по типу запроса и число/время на HTTP запрос
+DB_STATEMENT_DURATION = Histogram(
+    "fixfix_db_statement_duration_seconds",
+    "Длительность SQL-запроса",
+    ["operation"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5),
+)
+HTTP_DB_QUERIES = Histogram(
+    "fixfix_http_db_queries",
+    "Число SQL-запросов на HTTP запрос",
+    ["method", "route"],
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55),
+)
+HTTP_DB_TIME = Histogram(
+    "fixfix_http_db_time_seconds",
+    "Суммарное время SQL-запросов на HTTP запрос",
+    ["method", "route"],
+)
+
+DB_POOL_CHECKED_OUT = Gauge(
+    "fixfix_db_pool_checked_out",
+    "Соединения пула БД, выданные сессиям",
+)
+DB_POOL_CAPACITY = Gauge(
+    "fixfix_db_pool_capacity",
+    "Предел соединений пула БД (pool_size + max_overflow)",
+)
+DB_POOL_CHECKED_OUT.set_function(lambda: get_pool_status().get("checked_out", 0))
+DB_POOL_CAPACITY.set_function(lambda: get_pool_status().get("capacity", 0))
+
+
+def render_metrics() -> tuple[bytes, str]:
+    """Текущие метрики в текстовом формате Prometheus"""
+    return generate_latest(), CONTENT_TYPE_LATEST
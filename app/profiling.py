@@ -0,0 +1,209 @@
+"""
+Профилирование работающего процесса по запросу (API и бот).
+
+CPU: раз в interval процессорного времени (SIGPROF) снимается стек
+потока цикла событий, одинаковые стеки считаются; режим all_threads
+снимает стеки всех потоков из отдельного потока. Результат — collapsed
+stacks, строка "поток;функция (файл:строка);... число", его принимают
+flamegraph.pl, speedscope и inferno. Таймер и обработчик сигнала
+ставятся только на время снятия профиля; в остальное время затрат нет.
+
+Память: tracemalloc включается командой start (с базовым снимком) и
+выключается stop; diff показывает рост выделенной памяти по местам
+выделения относительно базового снимка.
+
+Модуль не читает настройки app.config: его использует и бот.
+"""
+import asyncio
+import os
+import signal
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from typing import Dict, List, Optional
+
+# Ограничения на один запуск
+MAX_SECONDS = 120.0
+MIN_INTERVAL = 0.001
+MAX_FRAMES = 25
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class ProfilerBusy(RuntimeError):
+    """CPU-профиль уже снимается"""
+
+
+def _short_path(filename: str) -> str:
+    """Путь относительно проекта или site-packages"""
+    if filename.startswith(_ROOT):
+        return os.path.relpath(filename, _ROOT)
+    if "site-packages" + os.sep in filename:
+        return filename.split("site-packages" + os.sep, 1)[1]
+    return os.path.basename(filename)
+
+
+def _frame_label(code) -> str:
+    return f"{code.co_name} ({_short_path(code.co_filename)}:{code.co_firstlineno})"
+
+
+class _Stacks:
+    """Счётчик одинаковых стеков в формате collapsed stacks"""
+
+    def __init__(self, interval: float):
+        self.interval = max(interval, MIN_INTERVAL)
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._labels: Dict[object, str] = {}
+
+    def _record(self, frame, thread_name: str) -> None:
+        labels = []
+        cache = self._labels
+        while frame is not None:
+            code = frame.f_code
+            label = cache.get(code)
+            if label is None:
+                label = cache[code] = _frame_label(code)
+            labels.append(label)
+            frame = frame.f_back
+        labels.append(thread_name)
+        self.stacks[";".join(reversed(labels))] += 1
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+class SignalProfiler(_Stacks):
+    """Стеки потока цикла событий по SIGPROF (таймер процессорного времени).
+
+    Обработчик сигнала выполняется в главном потоке между инструкциями
+    байткода и видит прерванный кадр — профиль не смещён к местам, где
+    поток отпускает GIL, а ожидание в select не тратит CPU и в профиль не
+    попадает. Запуск и остановка — только из главного потока.
+    """
+
+    def _handle(self, signum, frame) -> None:
+        self._record(frame, "MainThread")
+        self.samples += 1
+
+    def start(self) -> None:
+        self._previous = signal.signal(signal.SIGPROF, self._handle)
+        signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+
+    def stop(self) -> None:
+        signal.setitimer(signal.ITIMER_PROF, 0)
+        signal.signal(signal.SIGPROF, self._previous)
+
+
+class ThreadProfiler(_Stacks):
+    """Стеки всех потоков процесса из отдельного потока (реальное время).
+
+    Поток-семплер получает GIL, когда его отпускает поток с кодом, поэтому
+    для потока цикла событий профиль смещён к вводу-выводу; режим нужен
+    для фоновых потоков (экспорт трасс, запись логов, to_thread).
+    """
+
+    def __init__(self, interval: float):
+        super().__init__(interval)
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _run(self) -> None:
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id != own:
+                    self._record(frame, names.get(thread_id, str(thread_id)))
+            self.samples += 1
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+
+_cpu_lock = asyncio.Lock()
+
+
+async def profile_cpu(seconds: float, interval: float = 0.005, all_threads: bool = False) -> _Stacks:
+    """Профиль CPU процесса за seconds секунд (цикл событий продолжает работу).
+
+    По умолчанию — поток цикла событий по SIGPROF; all_threads (или
+    платформа без setitimer) — все потоки из потока-семплера.
+    """
+    if _cpu_lock.locked():
+        raise ProfilerBusy("CPU-профиль уже снимается")
+    async with _cpu_lock:
+        use_signal = not all_threads and hasattr(signal, "setitimer") and threading.current_thread() is threading.main_thread()
+        profiler = SignalProfiler(interval) if use_signal else ThreadProfiler(interval)
+        profiler.start()
+        try:
+            await asyncio.sleep(min(seconds, MAX_SECONDS))
+        finally:
+            profiler.stop()
+        return profiler
+
+
+class MemoryTracker:
+    """tracemalloc с базовым снимком: рост памяти между start и diff"""
+
+    def __init__(self):
+        self.baseline: Optional[tracemalloc.Snapshot] = None
+        self.started_at: Optional[float] = None
+
+    @property
+    def active(self) -> bool:
+        return tracemalloc.is_tracing() and self.baseline is not None
+
+    def start(self, frames: int = 10) -> None:
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+        tracemalloc.start(min(max(frames, 1), MAX_FRAMES))
+        self.baseline = self._snapshot()
+        self.started_at = time.time()
+
+    def _snapshot(self) -> tracemalloc.Snapshot:
+        return tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            tracemalloc.Filter(False, "<unknown>"),
+        ))
+
+    def diff(self, limit: int = 30, key_type: str = "lineno") -> dict:
+        """Топ мест выделения по росту памяти относительно базового снимка"""
+        if not self.active:
+            raise RuntimeError("tracemalloc не запущен")
+        snapshot = self._snapshot()
+        stats = snapshot.compare_to(self.baseline, key_type)
+        current, peak = tracemalloc.get_traced_memory()
+        top: List[dict] = []
+        for stat in stats[:limit]:
+            top.append({
+                "size_diff_kb": round(stat.size_diff / 1024, 1),
+                "size_kb": round(stat.size / 1024, 1),
+                "count_diff": stat.count_diff,
+                "traceback": [f"{_short_path(frame.filename)}:{frame.lineno}" for frame in stat.traceback],
+            })
+        return {
+            "seconds": round(time.time() - self.started_at, 1),
+            "traced_kb": round(current / 1024, 1),
+            "peak_kb": round(peak / 1024, 1),
+            "tracemalloc_overhead_kb": round(tracemalloc.get_tracemalloc_memory() / 1024, 1),
+            "top": top,
+        }
+
+    def stop(self) -> None:
+        self.baseline = None
+        self.started_at = None
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+
+memory_tracker = MemoryTracker()
@@ -0,0 +1,162 @@
+"""
+Учёт SQL-запросов по HTTP запросам.
+
+Обработчики событий движка SQLAlchemy (before/after_cursor_execute)
+относят каждый выполненный запрос к текущей области учёта — HTTP запросу
+(AccessLogMiddleware) или блоку query_scope() в фоновой задаче и тестах.
+Область хранится в contextvars: сессия на asyncpg выполняет запросы в
+greenlet с контекстом вызывающей задачи, поэтому область видна в
+обработчиках событий.
+
+По области считаются число запросов, суммарное время в БД и самый
+медленный запрос. Запросы дольше порога пишутся в slow-query лог с
+нормализованным SQL (параметры и списки значений свёрнуты), чтобы
+одинаковые запросы группировались. Внутри трассы (app.tracing) запрос
+записывается дочерним спаном с тем же нормализованным SQL.
+"""
+import re
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import lru_cache
+from typing import Iterator, List, Optional
+
+import structlog
+from sqlalchemy import event
+
+from app.metrics import DB_STATEMENT_DURATION
+from app.tracing import CLIENT, current_span, tracer
+
+logger = structlog.get_logger("db")
+
+_OPERATIONS = ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH")
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+# asyncpg: $1::VARCHAR, $2::TIMESTAMP WITHOUT TIME ZONE
+_PARAM = re.compile(r"\$\d+(?:::(?:TIMESTAMP WITH(?:OUT)? TIME ZONE|DOUBLE PRECISION|[A-Z_]+)(?:\[\])?)?")
+_NUMBER = re.compile(r"(?<![\w$])-?\d+(?:\.\d+)?\b")
+_SPACE = re.compile(r"\s+")
+_LIST = re.compile(r"\(\?(?:, \?)+\)")
+_ROWS = re.compile(r"(\(\?(?:, \?)*\))(?:, \(\?(?:, \?)*\))+")
+
+
+@lru_cache(maxsize=1024)
+def normalize_sql(statement: str) -> str:
+    """SQL без значений: литералы и параметры -> ?, списки -> (?...)"""
+    sql = _SPACE.sub(" ", statement).strip()
+    sql = _STRING.sub("?", sql)
+    sql = _PARAM.sub("?", sql)
+    sql = _NUMBER.sub("?", sql)
+    sql = _ROWS.sub(r"\1, ...", sql)
+    return _LIST.sub("(?...)", sql)
+
+
+class QueryStats:
+    """Запросы одной области учёта"""
+
+    __slots__ = ("label", "count", "total_ms", "slowest_ms", "_slowest", "statements")
+
+    def __init__(self, label: str, keep_statements: bool = False):
+        self.label = label
+        self.count = 0
+        self.total_ms = 0.0
+        self.slowest_ms = 0.0
+        self._slowest: Optional[str] = None
+        # Нормализованный SQL каждого запроса — только для тестов и отладки
+        self.statements: Optional[List[str]] = [] if keep_statements else None
+
+    def add(self, statement: str, duration_ms: float) -> None:
+        self.count += 1
+        self.total_ms += duration_ms
+        if duration_ms > self.slowest_ms:
+            self.slowest_ms = duration_ms
+            self._slowest = statement
+        if self.statements is not None:
+            self.statements.append(normalize_sql(statement))
+
+    def merge(self, other: "QueryStats") -> None:
+        self.count += other.count
+        self.total_ms += other.total_ms
+        if other.slowest_ms > self.slowest_ms:
+            self.slowest_ms = other.slowest_ms
+            self._slowest = other._slowest
+        if self.statements is not None and other.statements is not None:
+            self.statements.extend(other.statements)
+
+    @property
+    def slowest_sql(self) -> Optional[str]:
+        return normalize_sql(self._slowest) if self._slowest else None
+
+    def to_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "total_ms": round(self.total_ms, 2),
+            "slowest_ms": round(self.slowest_ms, 2),
+            "slowest_sql": self.slowest_sql,
+        }
+
+
+_current: ContextVar[Optional[QueryStats]] = ContextVar("query_stats", default=None)
+
+
+def current_stats() -> Optional[QueryStats]:
+    return _current.get()
+
+
+@contextmanager
+def query_scope(label: str, keep_statements: bool = False) -> Iterator[QueryStats]:
+    """Область учёта запросов; вложенная область добавляется к внешней при выходе"""
+    parent = _current.get()
+    stats = QueryStats(label, keep_statements or (parent is not None and parent.statements is not None))
+    token = _current.set(stats)
+    try:
+        yield stats
+    finally:
+        _current.reset(token)
+        if parent is not None:
+            parent.merge(stats)
+
+
+def install_query_hooks(engine, slow_ms: float) -> None:
+    """Подключение учёта к движку (AsyncEngine или Engine)"""
+    sync_engine = getattr(engine, "sync_engine", engine)
+    observers = {operation: DB_STATEMENT_DURATION.labels(operation) for operation in _OPERATIONS}
+    other = DB_STATEMENT_DURATION.labels("OTHER")
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        duration = time.perf_counter() - conn.info["query_started"].pop()
+        head = statement.lstrip()[:8].split(None, 1)
+        operation = head[0].upper() if head else ""
+        observers.get(operation, other).observe(duration)
+        if current_span() is not None:
+            tracer.record(
+                f"SQL {operation if operation in observers else 'OTHER'}",
+                duration,
+                CLIENT,
+                {"db.system": "postgresql", "db.statement": normalize_sql(statement), "db.rows": cursor.rowcount},
+            )
+
+        duration_ms = duration * 1000
+        stats = _current.get()
+        if stats is not None:
+            stats.add(statement, duration_ms)
+        if duration_ms >= slow_ms:
+            logger.warning(
+                "slow_query",
+                sql=normalize_sql(statement),
+                duration_ms=round(duration_ms, 2),
+                rows=cursor.rowcount,
+                scope=stats.label if stats is not None else None,
+            )
+
+    @event.listens_for(sync_engine, "handle_error")
+    def _error(context):
+        # after_cursor_execute не вызывается для упавшего запроса
+        started = context.connection.info.get("query_started") if context.connection is not None else None
+        if started:
+            started.pop()
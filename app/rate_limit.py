@@ -0,0 +1,299 @@
+"""
+Ограничение частоты запросов к API (token bucket).
+
+Лимиты задаются по шаблону маршрута ("POST /api/v1/requests/") отдельно
+для IP клиента и для telegram_id пользователя. Состояние хранится в памяти
+процесса (один воркер) или в Redis (несколько воркеров/контейнеров).
+
+Все корзины запроса проверяются вместе: токены списываются, только если
+разрешают все, — отказ по лимиту пользователя не тратит лимит IP.
+Запросы с telegram_id из внутренних сетей (бот в соседнем контейнере)
+ограничиваются только по пользователю: иначе все пользователи бота
+делили бы одну корзину IP.
+"""
+import ipaddress
+import json
+import math
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+from urllib.parse import parse_qs
+
+import structlog
+from prometheus_client import Counter
+from starlette.routing import Match
+
+logger = structlog.get_logger()
+
+RATE_LIMIT_DECISIONS = Counter(
+    "fixfix_rate_limit_decisions_total",
+    "Решения rate limiter",
+    ["route", "key_type", "decision"],
+)
+
+# Лимиты по умолчанию; "*" применяется к маршрутам без своего правила
+DEFAULT_RULES = {
+    "*": {"ip": "120/minute"},
+    "POST /api/v1/requests/": {"ip": "30/minute", "user": "10/minute"},
+    "POST /api/v1/requests/check": {"ip": "10/minute", "user": "5/minute"},
+}
+
+_PERIODS = {"second": 1, "minute": 60, "hour": 3600}
+
+
+@dataclass(frozen=True)
+class Limit:
+    """Ёмкость корзины и скорость пополнения (токенов в секунду)"""
+    capacity: int
+    refill_rate: float
+
+    @classmethod
+    def parse(cls, value: str) -> "Limit":
+        """Разбор строки вида "30/minute" """
+        count, period = value.split("/", 1)
+        return cls(capacity=int(count), refill_rate=int(count) / _PERIODS[period.strip()])
+
+
+def parse_rules(value: str) -> Dict[str, Dict[str, Limit]]:
+    """Правила из JSON: {"POST /api/v1/requests/": {"ip": "30/minute", "user": "10/minute"}}"""
+    raw = json.loads(value) if value else DEFAULT_RULES
+    return {
+        route: {key_type: Limit.parse(limit) for key_type, limit in limits.items()}
+        for route, limits in raw.items()
+    }
+
+
+class MemoryBackend:
+    """Корзины в памяти процесса; при переполнении вытесняются давно не использованные"""
+
+    def __init__(self, max_keys: int = 100_000):
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+
+    async def take(self, keys: Sequence[str], limits: Sequence[Limit]) -> List[float]:
+        """Списывает по токену из каждой корзины, только если разрешают все.
+
+        Возвращает для каждой корзины, через сколько секунд повторить
+        (0 — токен есть); если есть ненулевые, ничего не списано.
+        """
+        now = time.monotonic()
+        levels = []
+        for key, limit in zip(keys, limits):
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                levels.append(float(limit.capacity))
+            else:
+                levels.append(min(limit.capacity, bucket[0] + (now - bucket[1]) * limit.refill_rate))
+        waits = [0.0 if tokens >= 1 else (1 - tokens) / limit.refill_rate for tokens, limit in zip(levels, limits)]
+        charge = 0 if any(waits) else 1
+        for key, tokens in zip(keys, levels):
+            self._store(key, tokens - charge, now)
+        return waits
+
+    def _store(self, key: str, tokens: float, now: float) -> None:
+        if key in self._buckets:
+            self._buckets.move_to_end(key)
+        elif len(self._buckets) >= self.max_keys:
+            # Вытесняем давно не использованные корзины: они уже успели пополниться
+            for _ in range(max(1, self.max_keys // 10)):
+                self._buckets.popitem(last=False)
+        self._buckets[key] = (tokens, now)
+
+    async def close(self) -> None:
+        pass
+
+
+# Атомарная проверка всех корзин запроса и списание, только если разрешают все;
+# время берётся из Redis, чтобы часы воркеров не расходились.
+# ARGV: пары (ёмкость, скорость пополнения) по порядку KEYS
+_TAKE_SCRIPT = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local levels = {}
+local waits = {}
+local rejected = false
+for i, key in ipairs(KEYS) do
+    local capacity = tonumber(ARGV[2 * i - 1])
+    local refill_rate = tonumber(ARGV[2 * i])
+    local bucket = redis.call('HMGET', key, 'tokens', 'ts')
+    local tokens = tonumber(bucket[1])
+    if tokens == nil then
+        tokens = capacity
+    else
+        tokens = math.min(capacity, tokens + (now - tonumber(bucket[2])) * refill_rate)
+    end
+    levels[i] = tokens
+    if tokens >= 1 then
+        waits[i] = '0'
+    else
+        waits[i] = tostring((1 - tokens) / refill_rate)
+        rejected = true
+    end
+end
+for i, key in ipairs(KEYS) do
+    local capacity = tonumber(ARGV[2 * i - 1])
+    local refill_rate = tonumber(ARGV[2 * i])
+    local tokens = levels[i]
+    if not rejected then
+        tokens = tokens - 1
+    end
+    redis.call('HSET', key, 'tokens', tostring(tokens), 'ts', tostring(now))
+    redis.call('EXPIRE', key, math.ceil(capacity / refill_rate) + 1)
+end
+return waits
+"""
+
+
+class RedisBackend:
+    """Корзины в Redis, общие для всех воркеров"""
+
+    def __init__(self, url: str, prefix: str = "rl:"):
+        try:
+            import redis.asyncio as redis
+        except ImportError as e:
+            raise RuntimeError("Для RATE_LIMIT_BACKEND=redis нужен пакет redis") from e
+        self.prefix = prefix
+        self._client = redis.Redis.from_url(url)
+        self._take = self._client.register_script(_TAKE_SCRIPT)
+
+    async def take(self, keys: Sequence[str], limits: Sequence[Limit]) -> List[float]:
+        args = []
+        for limit in limits:
+            args += [limit.capacity, limit.refill_rate]
+        waits = await self._take(keys=[self.prefix + key for key in keys], args=args)
+        return [float(wait) for wait in waits]
+
+    async def close(self) -> None:
+        await self._client.aclose()
+
+
+def parse_networks(value: str) -> Tuple[ipaddress._BaseNetwork, ...]:
+    """Список сетей из строки "127.0.0.0/8,10.0.0.0/8" """
+    return tuple(ipaddress.ip_network(item.strip()) for item in value.split(",") if item.strip())
+
+
+@lru_cache(maxsize=10_000)
+def _in_networks(ip: str, networks: Tuple[ipaddress._BaseNetwork, ...]) -> bool:
+    try:
+        address = ipaddress.ip_address(ip)
+    except ValueError:
+        return False
+    return any(address in network for network in networks)
+
+
+def _client_ip(scope, trusted_proxies) -> Optional[str]:
+    """IP клиента; заголовки прокси учитываются только от доверенных адресов"""
+    client = scope.get("client")
+    peer = client[0] if client else None
+    if peer is not None and _in_networks(peer, trusted_proxies):
+        for name, value in scope["headers"]:
+            if name == b"x-real-ip":
+                return value.decode("latin-1").strip()
+            if name == b"x-forwarded-for":
+                return value.decode("latin-1").split(",")[0].strip()
+    return peer
+
+
+def _telegram_id(scope) -> Optional[str]:
+    query = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+    for name in ("telegram_id", "user_id", "admin_id"):
+        if query.get(name):
+            return query[name][0]
+    return None
+
+
+class RateLimitMiddleware:
+    """ASGI middleware: 429 + Retry-After при исчерпании лимита"""
+
+    def __init__(
+        self,
+        app,
+        backend,
+        rules: Dict[str, Dict[str, Limit]],
+        exempt_networks: Tuple[ipaddress._BaseNetwork, ...] = (),
+        trusted_proxies: Tuple[ipaddress._BaseNetwork, ...] = (),
+        exclude: Iterable[str] = (),
+        internal_networks: Tuple[ipaddress._BaseNetwork, ...] = (),
+    ):
+        self.app = app
+        self.backend = backend
+        self.rules = rules
+        self.exempt_networks = exempt_networks
+        self.trusted_proxies = trusted_proxies
+        self.internal_networks = internal_networks
+        self.exclude = frozenset(exclude)
+
+    def _route_key(self, scope) -> str:
+        """ "METHOD шаблон" маршрута, который обработает запрос"""
+        for route in scope["app"].routes:
+            match, _ = route.matches(scope)
+            if match == Match.FULL:
+                return f"{scope['method']} {getattr(route, 'path', '')}"
+        return "*"
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.exclude:
+            await self.app(scope, receive, send)
+            return
+
+        client_ip = _client_ip(scope, self.trusted_proxies)
+        if client_ip is not None and _in_networks(client_ip, self.exempt_networks):
+            await self.app(scope, receive, send)
+            return
+
+        route = self._route_key(scope)
+        limits = self.rules.get(route) or self.rules.get("*", {})
+
+        telegram_id = _telegram_id(scope)
+        # Внутренний вызов от имени пользователя (бот): только лимит пользователя
+        internal = (
+            telegram_id is not None and client_ip is not None
+            and _in_networks(client_ip, self.internal_networks)
+        )
+        checks = []
+        for key_type, limit in limits.items():
+            key_value = telegram_id if key_type == "user" else client_ip
+            if key_value is None or (internal and key_type == "ip"):
+                continue
+            checks.append((key_type, f"{route}|{key_type}|{key_value}", limit))
+
+        retry_after = 0.0
+        if checks:
+            try:
+                waits = await self.backend.take([key for _, key, _ in checks], [limit for _, _, limit in checks])
+            except Exception as e:
+                # Недоступность хранилища не должна останавливать API
+                logger.warning("rate_limit_backend_error", error=str(e))
+                for key_type, _, _ in checks:
+                    RATE_LIMIT_DECISIONS.labels(route, key_type, "error").inc()
+                waits = []
+            for (key_type, _, _), wait in zip(checks, waits):
+                RATE_LIMIT_DECISIONS.labels(route, key_type, "rejected" if wait else "allowed").inc()
+                retry_after = max(retry_after, wait)
+
+        if retry_after > 0:
+            await self._reject(send, retry_after)
+            return
+        await self.app(scope, receive, send)
+
+    async def _reject(self, send, retry_after: float) -> None:
+        body = json.dumps({"detail": "Слишком много запросов, повторите позже"}, ensure_ascii=False).encode("utf-8")
+        await send({
+            "type": "http.response.start",
+            "status": 429,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(max(1, math.ceil(retry_after))).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+
+def create_backend(kind: str, redis_url: str):
+    """Хранилище лимитов по настройке RATE_LIMIT_BACKEND"""
+    if kind == "redis":
+        return RedisBackend(redis_url)
+    return MemoryBackend()
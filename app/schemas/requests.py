@@ -69,11 +69,20 @@ class RequestListResponse(BaseModel):
     per_page: int
 
 
+class RequestSearchResponse(BaseModel):
+    """Схема для результатов поиска (keyset пагинация)"""
+    requests: list[RequestResponse]
+    next_cursor: Optional[str] = Field(None, description="Курсор следующей страницы")
+
+
 class RequestStatusUpdate(BaseModel):
     """Схема для обновления статуса заявки"""
     status: RequestStatus
     comment: Optional[str] = Field(None, max_length=500)
     priority: Optional[int] = Field(None, ge=1, le=5)
+    expected_status: Optional[RequestStatus] = Field(
+        None, description="Статус, из которого разрешён переход; иначе 409 (кнопки менеджеров)"
+    )
 
 
 class RequestCommentCreate(BaseModel):
@@ -0,0 +1,33 @@
+"""
+Схемы для статистики заявок
+"""
+from datetime import date, datetime
+from typing import Optional
+from pydantic import BaseModel
+from app.database.models import RequestStatus, WorkFormat, PreferredTime
+
+
+class StatsBucket(BaseModel):
+    """Число заявок в бакете (признаки заполнены только при группировке по ним)"""
+    bucket: datetime
+    category: Optional[str] = None
+    service: Optional[str] = None
+    work_format: Optional[WorkFormat] = None
+    preferred_time: Optional[PreferredTime] = None
+    status: Optional[RequestStatus] = None
+    count: int
+
+
+class StatsResponse(BaseModel):
+    """Схема для ответа со статистикой"""
+    date_from: date
+    date_to: date
+    granularity: str
+    group_by: list[str]
+    total: int
+    buckets: list[StatsBucket]
+
+
+class StatsBackfillResponse(BaseModel):
+    """Результат пересчёта статистики"""
+    buckets: int
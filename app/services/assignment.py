@@ -0,0 +1,168 @@
+"""
+Подбор исполнителей для заявок.
+
+Индекс исполнителей хранится в памяти процесса: специализации разобраны
+на основы слов (инвертированный индекс "основа -> исполнители"), для
+каждого исполнителя известна текущая нагрузка — число назначенных ему
+активных заявок. Подбор исполнителя не обращается к БД. Индекс
+обновляется сервисом заявок после каждого назначения и закрытия заявки и
+периодически перечитывается из БД (назначения из других процессов).
+"""
+import asyncio
+import re
+from dataclasses import dataclass
+from typing import Dict, FrozenSet, Iterable, Optional, Set
+
+import structlog
+from sqlalchemy import func, select
+
+from app.config import settings
+from app.database.connection import AsyncSessionLocal
+from app.database.models import ACTIVE_STATUSES, Executor, Request, RequestExecutor
+
+logger = structlog.get_logger()
+
+# Длина основы слова: грубый стемминг без словарей ("принтер", "принтеры" -> "принт")
+STEM_LENGTH = 5
+_WORD_RE = re.compile(r"[0-9a-zа-яё]+")
+
+
+def stems(value: Optional[str]) -> FrozenSet[str]:
+    """Основы слов строки (регистр, эмодзи и пунктуация не учитываются)"""
+    if not value:
+        return frozenset()
+    return frozenset(
+        word[:STEM_LENGTH] for word in _WORD_RE.findall(value.lower()) if len(word) >= 3
+    )
+
+
+@dataclass
+class ExecutorInfo:
+    id: int
+    specialization: FrozenSet[str]
+    rating: int
+    is_active: bool
+    load: int = 0
+
+
+class ExecutorLoadIndex:
+    """Исполнители, их специализации и нагрузка в памяти процесса"""
+
+    def __init__(self, refresh_interval: float = 60.0):
+        self.refresh_interval = refresh_interval
+        self._executors: Dict[int, ExecutorInfo] = {}
+        self._by_stem: Dict[str, Set[int]] = {}
+        self._generalists: Set[int] = set()
+        self._task: Optional[asyncio.Task] = None
+
+    def _reset(self, executors: Iterable[ExecutorInfo]) -> None:
+        self._executors = {}
+        self._by_stem = {}
+        self._generalists = set()
+        for info in executors:
+            self.put(info)
+
+    def put(self, info: ExecutorInfo) -> None:
+        """Добавление или замена исполнителя"""
+        self.remove(info.id)
+        self._executors[info.id] = info
+        if not info.specialization:
+            self._generalists.add(info.id)
+        for stem in info.specialization:
+            self._by_stem.setdefault(stem, set()).add(info.id)
+
+    def remove(self, executor_id: int) -> None:
+        info = self._executors.pop(executor_id, None)
+        if info is None:
+            return
+        self._generalists.discard(executor_id)
+        for stem in info.specialization:
+            ids = self._by_stem.get(stem)
+            if ids is not None:
+                ids.discard(executor_id)
+                if not ids:
+                    del self._by_stem[stem]
+
+    def add_load(self, executor_id: int, delta: int = 1) -> None:
+        info = self._executors.get(executor_id)
+        if info is not None:
+            info.load = max(0, info.load + delta)
+
+    def pick(
+        self,
+        category: Optional[str],
+        service: Optional[str],
+        max_load: int,
+    ) -> Optional[int]:
+        """Лучший исполнитель для заявки или None.
+
+        Порядок: больше совпавших основ специализации, меньше нагрузка,
+        выше рейтинг. Без совпадений подходят исполнители без
+        специализации; если нет и их — любой активный.
+        """
+        wanted = stems(category) | stems(service)
+        matches: Dict[int, int] = {}
+        for stem in wanted:
+            for executor_id in self._by_stem.get(stem, ()):
+                matches[executor_id] = matches.get(executor_id, 0) + 1
+
+        for candidates in (matches.keys(), self._generalists, self._executors.keys()):
+            best = None
+            best_key = None
+            for executor_id in candidates:
+                info = self._executors[executor_id]
+                if not info.is_active or info.load >= max_load:
+                    continue
+                key = (-matches.get(executor_id, 0), info.load, -info.rating, executor_id)
+                if best_key is None or key < best_key:
+                    best, best_key = executor_id, key
+            if best is not None:
+                return best
+        return None
+
+    async def refresh(self, db) -> None:
+        """Перечитывание исполнителей и их нагрузки из БД"""
+        executors = (await db.execute(select(Executor))).scalars().all()
+        load_rows = await db.execute(
+            select(RequestExecutor.executor_id, func.count())
+            .join(Request, Request.id == RequestExecutor.request_id)
+            .where(Request.status.in_(ACTIVE_STATUSES))
+            .group_by(RequestExecutor.executor_id)
+        )
+        load = dict(load_rows.all())
+        self._reset(
+            ExecutorInfo(
+                id=executor.id,
+                specialization=stems(executor.specialization),
+                rating=executor.rating or 0,
+                is_active=bool(executor.is_active),
+                load=load.get(executor.id, 0),
+            )
+            for executor in executors
+        )
+
+    async def _refresh_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            try:
+                async with AsyncSessionLocal() as db:
+                    await self.refresh(db)
+            except Exception as e:
+                logger.warning("executor_index_refresh_failed", error=str(e))
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._refresh_loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+# Глобальный экземпляр
+executor_index = ExecutorLoadIndex(refresh_interval=settings.executor_index_refresh)
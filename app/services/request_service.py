@@ -1,15 +1,95 @@
 """
 Сервис для работы с заявками
 """
-from datetime import datetime
+import base64
+import hashlib
+import json
+import re
+import time
+from datetime import datetime, timedelta
 from typing import List, Optional, Tuple
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func, and_, or_
+from sqlalchemy import select, func, update, delete, union, tuple_, cast, literal_column, text, REAL
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.orm import selectinload
 
-from app.database.models import Request, User, RequestStatus, RequestStatusHistory, RequestComment
-from app.schemas.requests import RequestCreate, RequestUpdate, RequestStatusUpdate
+from app.database.models import (
+    Request, User, RequestStatus, RequestStatusHistory, RequestComment, Executor, RequestExecutor, ACTIVE_STATUSES,
+    IdempotencyKey
+)
+from app.schemas.requests import RequestCreate, RequestUpdate, RequestStatusUpdate, RequestResponse
 from app.config import settings
+from app.events import publish_event
+from app.services.stats_service import StatsService
+from app.services.assignment import executor_index
+from app.tracing import traced
+
+
+# Колонки, достаточные для RequestResponse (для выборки строк без ORM объектов)
+REQUEST_RESPONSE_COLUMNS = tuple(getattr(Request, name) for name in RequestResponse.model_fields)
+
+# Минимальная длина фрагмента для поиска по подстроке (триграммы)
+MIN_FRAGMENT_LENGTH = 3
+
+# Цифры телефона; литералы вместо параметров, чтобы выражение совпало
+# с индексом ix_users_phone_digits_trgm
+PHONE_DIGITS = func.regexp_replace(
+    User.phone, literal_column(r"'\D'"), literal_column("''"), literal_column("'g'")
+)
+
+
+# Удаление просроченных ключей идемпотентности не чаще раза в период (секунды)
+IDEMPOTENCY_PURGE_INTERVAL = 600
+_idempotency_purge_at = 0.0
+
+
+class IdempotentReplay(Exception):
+    """Повтор запроса с уже использованным Idempotency-Key: исходный ответ"""
+
+    def __init__(self, response: dict):
+        super().__init__("Повтор запроса")
+        self.response = response
+
+
+class IdempotencyKeyMismatch(ValueError):
+    """Idempotency-Key уже использован с другим телом запроса"""
+
+
+class IdempotencyKeyInFlight(Exception):
+    """Запрос с этим Idempotency-Key ещё обрабатывается: повтор позже"""
+
+
+class StatusConflict(Exception):
+    """Статус заявки уже не тот, из которого запрошен переход"""
+
+    def __init__(self, current: RequestStatus):
+        super().__init__(f"Статус заявки уже изменён: {current.value}")
+        self.current = current
+
+
+def request_fingerprint(request_data: RequestCreate) -> str:
+    raw = json.dumps(request_data.model_dump(mode="json"), sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _encode_cursor(rank: float, request_pk: int) -> str:
+    raw = json.dumps([rank, request_pk]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def _decode_cursor(cursor: str) -> Tuple[float, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        rank, request_pk = json.loads(raw)
+        return float(rank), int(request_pk)
+    except Exception:
+        raise ValueError("Некорректный курсор")
+
+
+def _like_pattern(fragment: str) -> str:
+    """Шаблон LIKE для подстроки с экранированием спецсимволов"""
+    escaped = fragment.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
 
 
 class RequestService:
@@ -18,11 +98,29 @@ class RequestService:
     def __init__(self, db: AsyncSession):
         self.db = db
     
-    async def create_request(self, user_id: int, request_data: RequestCreate) -> Request:
-        """Создание новой заявки"""
-        # Проверяем лимит заявок пользователя
-        active_requests = await self.get_user_active_requests_count(user_id)
-        if active_requests >= settings.max_requests_per_user:
+    @traced
+    async def create_request(
+        self,
+        user_id: int,
+        request_data: RequestCreate,
+        idempotency_key: Optional[str] = None
+    ) -> Request:
+        """Создание новой заявки.
+
+        Заявка и запись истории создаются в одной транзакции. Лимит активных
+        заявок резервируется условным UPDATE счётчика пользователя: строка
+        пользователя блокируется до коммита, поэтому параллельные создания
+        не могут одновременно пройти проверку лимита.
+
+        С idempotency_key ключ записывается первым в той же транзакции, а
+        ответ сохраняется при коммите. Повтор с тем же ключом бросает
+        IdempotentReplay с исходным ответом, с другим телом —
+        IdempotencyKeyMismatch.
+        """
+        if idempotency_key is not None:
+            await self._claim_idempotency_key(user_id, idempotency_key, request_fingerprint(request_data))
+        
+        if not await self._reserve_active_slot(user_id):
             raise ValueError(f"Превышен лимит активных заявок ({settings.max_requests_per_user})")
         
         # Генерируем уникальный ID заявки
@@ -34,10 +132,8 @@ class RequestService:
             user_id=user_id,
             **request_data.dict()
         )
-        
         self.db.add(db_request)
-        await self.db.commit()
-        await self.db.refresh(db_request)
+        await self.db.flush()
         
         # Создаем запись в истории статусов
         status_history = RequestStatusHistory(
@@ -47,10 +143,74 @@ class RequestService:
             comment="Заявка создана"
         )
         self.db.add(status_history)
+        await StatsService(self.db).record_created(db_request)
+        await publish_event(self.db, "request_created", self._event_data(db_request))
+        if idempotency_key is not None:
+            await self.db.execute(
+                update(IdempotencyKey)
+                .where(IdempotencyKey.user_id == user_id, IdempotencyKey.key == idempotency_key)
+                .values(
+                    request_id=db_request.id,
+                    response=RequestResponse.model_validate(db_request).model_dump(mode="json"),
+                )
+            )
         await self.db.commit()
         
+        if idempotency_key is not None:
+            await self._purge_idempotency_keys()
         return db_request
     
+    async def _claim_idempotency_key(self, user_id: int, key: str, fingerprint: str) -> None:
+        """Запись ключа идемпотентности в текущей транзакции.
+
+        Повторы разводит первичный ключ, без явных блокировок: параллельный
+        INSERT с тем же ключом ждёт коммита первой транзакции и ничего не
+        вставляет. Просроченный ключ перезаписывается.
+        """
+        now = datetime.utcnow()
+        stmt = insert(IdempotencyKey).values(
+            user_id=user_id,
+            key=key,
+            fingerprint=fingerprint,
+            created_at=now,
+            expires_at=now + timedelta(hours=settings.api.idempotency_ttl_hours),
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[IdempotencyKey.user_id, IdempotencyKey.key],
+            set_={
+                "fingerprint": stmt.excluded.fingerprint,
+                "request_id": None,
+                "response": None,
+                "created_at": stmt.excluded.created_at,
+                "expires_at": stmt.excluded.expires_at,
+            },
+            where=IdempotencyKey.expires_at < now,
+        ).returning(IdempotencyKey.key)
+        if (await self.db.execute(stmt)).first() is not None:
+            return
+        
+        # Ключ уже использован и ещё действует: отдаём сохранённый ответ
+        await self.db.rollback()
+        stored = (await self.db.execute(
+            select(IdempotencyKey.fingerprint, IdempotencyKey.response)
+            .where(IdempotencyKey.user_id == user_id, IdempotencyKey.key == key)
+        )).first()
+        if stored is None or stored.response is None:
+            raise IdempotencyKeyInFlight("Запрос с этим Idempotency-Key ещё обрабатывается, повторите позже")
+        if stored.fingerprint != fingerprint:
+            raise IdempotencyKeyMismatch("Idempotency-Key уже использован для другого запроса")
+        raise IdempotentReplay(stored.response)
+    
+    async def _purge_idempotency_keys(self) -> None:
+        """Удаление просроченных ключей (не чаще IDEMPOTENCY_PURGE_INTERVAL)"""
+        global _idempotency_purge_at
+        if time.monotonic() < _idempotency_purge_at:
+            return
+        _idempotency_purge_at = time.monotonic() + IDEMPOTENCY_PURGE_INTERVAL
+        await self.db.execute(delete(IdempotencyKey).where(IdempotencyKey.expires_at < datetime.utcnow()))
+        await self.db.commit()
+    
+    @traced
     async def get_request(self, request_id: str) -> Optional[Request]:
         """Получение заявки по ID"""
         result = await self.db.execute(
@@ -62,6 +222,7 @@ class RequestService:
         )
         return result.scalar_one_or_none()
     
+    @traced
     async def get_user_requests(
         self, 
         user_id: int, 
@@ -70,38 +231,191 @@ class RequestService:
         per_page: int = 10
     ) -> Tuple[List[Request], int]:
         """Получение заявок пользователя с пагинацией"""
-        # Базовый запрос
-        query = select(Request).where(Request.user_id == user_id)
-        
-        # Фильтр по статусу
+        return await self.get_requests(user_id=user_id, status=status, page=page, per_page=per_page)
+    
+    @traced
+    async def get_requests(
+        self,
+        user_id: Optional[int] = None,
+        status: Optional[RequestStatus] = None,
+        page: int = 1,
+        per_page: int = 10,
+        as_rows: bool = False
+    ) -> Tuple[list, int]:
+        """Получение заявок с фильтрами и пагинацией.
+
+        С as_rows=True возвращает строки-словари с полями RequestResponse
+        вместо ORM объектов (без identity map и загрузки связей).
+        """
+        conditions = []
+        if user_id is not None:
+            conditions.append(Request.user_id == user_id)
         if status:
-            query = query.where(Request.status == status)
+            conditions.append(Request.status == status)
         
         # Общее количество
-        count_query = select(func.count()).select_from(query.subquery())
-        total_result = await self.db.execute(count_query)
+        total_result = await self.db.execute(
+            select(func.count()).select_from(Request).where(*conditions)
+        )
         total = total_result.scalar()
         
         # Пагинация
-        query = query.offset((page - 1) * per_page).limit(per_page)
-        query = query.order_by(Request.created_at.desc())
-        
+        columns = REQUEST_RESPONSE_COLUMNS if as_rows else (Request,)
+        query = (
+            select(*columns)
+            .where(*conditions)
+            .order_by(Request.created_at.desc())
+            .offset((page - 1) * per_page)
+            .limit(per_page)
+        )
         result = await self.db.execute(query)
-        requests = result.scalars().all()
+        items = result.mappings().all() if as_rows else result.scalars().all()
         
-        return list(requests), total
+        return list(items), total
     
+    @traced
+    async def search_requests(
+        self,
+        query: str,
+        limit: int = 20,
+        cursor: Optional[str] = None,
+        status: Optional[RequestStatus] = None,
+        as_rows: bool = False
+    ) -> Tuple[list, Optional[str]]:
+        """Поиск заявок по тексту с ранжированием и keyset пагинацией.
+
+        Кандидаты собираются объединением трёх выборок: полнотекстовый
+        поиск (GIN по search_vector), подстрока адреса и цифры телефона
+        пользователя (триграммные индексы; отключается SEARCH_FRAGMENTS).
+        Из каждой берутся не более settings.api.search_max_candidates самых
+        новых совпадений, чтобы частые слова не заставляли ранжировать
+        значительную часть таблицы.
+        Результаты упорядочены по рангу ts_rank_cd, затем по id; курсор
+        хранит пару (ранг, id) последней строки страницы.
+        """
+        query = query.strip()
+        max_candidates = settings.api.search_max_candidates
+        ts_query = func.websearch_to_tsquery("russian", query)
+        conditions = [Request.search_vector.op("@@")(ts_query)]
+        fragments = settings.api.search_fragments
+        if fragments and len(query) >= MIN_FRAGMENT_LENGTH:
+            conditions.append(Request.address.ilike(_like_pattern(query)))
+        digits = re.sub(r"\D", "", query)
+        if fragments and len(digits) >= MIN_FRAGMENT_LENGTH:
+            conditions.append(
+                Request.user_id.in_(select(User.id).where(PHONE_DIGITS.like(f"%{digits}%")))
+            )
+        candidates = [
+            select(Request.id).where(condition).order_by(Request.id.desc()).limit(max_candidates)
+            for condition in conditions
+        ]
+        matched = (union(*candidates) if len(candidates) > 1 else candidates[0]).subquery()
+        
+        rank = func.ts_rank_cd(Request.search_vector, ts_query)
+        columns = REQUEST_RESPONSE_COLUMNS if as_rows else (Request,)
+        stmt = select(*columns, rank.label("rank")).where(Request.id.in_(select(matched.c.id)))
+        if status:
+            stmt = stmt.where(Request.status == status)
+        if cursor:
+            last_rank, last_pk = _decode_cursor(cursor)
+            stmt = stmt.where(tuple_(rank, Request.id) < tuple_(cast(last_rank, REAL), last_pk))
+        stmt = stmt.order_by(rank.desc(), Request.id.desc()).limit(limit + 1)
+        
+        # Параметризованный запрос с подготовленным выражением после нескольких
+        # выполнений получает общий план, в котором селективность @@ неизвестна,
+        # и вместо обхода по id с LIMIT перебираются все совпадения
+        await self.db.execute(text("SET LOCAL plan_cache_mode = force_custom_plan"))
+        result = await self.db.execute(stmt)
+        if as_rows:
+            rows = result.mappings().all()
+            page = [{key: row[key] for key in RequestResponse.model_fields} for row in rows[:limit]]
+            last = (rows[limit - 1]["rank"], rows[limit - 1]["id"]) if len(rows) > limit else None
+        else:
+            rows = result.all()
+            page = [row[0] for row in rows[:limit]]
+            last = (rows[limit - 1][1], rows[limit - 1][0].id) if len(rows) > limit else None
+        
+        next_cursor = _encode_cursor(*last) if last else None
+        return page, next_cursor
+    
+    @traced
     async def update_request_status(
         self, 
         request_id: str, 
         new_status: RequestStatusUpdate,
         changed_by: int
     ) -> Request:
-        """Обновление статуса заявки"""
-        request = await self.get_request(request_id)
+        """Обновление статуса заявки.
+
+        С expected_status смена проходит, только если заявка в этом статусе
+        (сравнение под блокировкой строки), иначе StatusConflict: из двух
+        менеджеров, одновременно нажавших «Принять в работу», заявку
+        получает один.
+        """
+        # Блокируем строку заявки, чтобы параллельные смены статуса
+        # не изменили счётчик активных заявок дважды
+        result = await self.db.execute(
+            select(Request)
+            .where(Request.request_id == request_id)
+            .with_for_update()
+        )
+        request = result.scalar_one_or_none()
         if not request:
             raise ValueError("Заявка не найдена")
+        if new_status.expected_status is not None and request.status != new_status.expected_status:
+            raise StatusConflict(request.status)
+        
+        old_status = await self._apply_status(request, new_status, changed_by)
+        await self.db.commit()
+        await self.db.refresh(request)
+        await self._sync_executor_load(request, old_status)
         
+        return request
+    
+    @traced
+    async def claim_next_request(self, claimed_by: int, category: Optional[str] = None) -> Optional[Request]:
+        """Взять в работу следующую новую заявку (наивысший приоритет, самая старая).
+
+        FOR UPDATE SKIP LOCKED пропускает заявки, которые в этот момент
+        забирают другие менеджеры: каждый получает свою заявку без
+        ожидания чужих транзакций и без повторного захвата.
+        Возвращает None, если новых заявок нет.
+        """
+        query = (
+            select(Request)
+            .where(Request.status == RequestStatus.NEW)
+            .order_by(Request.priority.desc(), Request.created_at, Request.id)
+            .limit(1)
+            .with_for_update(skip_locked=True)
+        )
+        if category:
+            query = query.where(Request.category == category)
+        result = await self.db.execute(query)
+        request = result.scalar_one_or_none()
+        if request is None:
+            await self.db.rollback()
+            return None
+        
+        await self._apply_status(
+            request,
+            RequestStatusUpdate(status=RequestStatus.IN_PROGRESS, comment="Принята в работу"),
+            claimed_by,
+        )
+        await self.db.commit()
+        await self.db.refresh(request)
+        return request
+    
+    async def _apply_status(
+        self,
+        request: Request,
+        new_status: RequestStatusUpdate,
+        changed_by: int
+    ) -> Optional[RequestStatus]:
+        """Смена статуса заблокированной заявки в текущей транзакции.
+
+        Обновляет счётчик активных заявок, историю, статистику и публикует
+        событие; возвращает прежний статус. Коммит — на вызывающей стороне.
+        """
         old_status = request.status
         request.status = new_status.status
         
@@ -113,6 +427,12 @@ class RequestService:
         
         request.updated_at = datetime.utcnow()
         
+        # Поддерживаем счётчик активных заявок пользователя
+        was_active = old_status in ACTIVE_STATUSES
+        is_active = new_status.status in ACTIVE_STATUSES
+        if was_active != is_active:
+            await self._adjust_active_counter(request.user_id, 1 if is_active else -1)
+        
         # Создаем запись в истории
         status_history = RequestStatusHistory(
             request_id=request.id,
@@ -123,11 +443,27 @@ class RequestService:
         )
         
         self.db.add(status_history)
-        await self.db.commit()
-        await self.db.refresh(request)
-        
-        return request
+        await StatsService(self.db).record_status_change(request, old_status)
+        await publish_event(
+            self.db,
+            "status_changed",
+            {**self._event_data(request), "old_status": old_status.value if old_status else None},
+        )
+        return old_status
     
+    async def _sync_executor_load(self, request: Request, old_status: Optional[RequestStatus]) -> None:
+        """Нагрузка исполнителей в индексе после закрытия/переоткрытия заявки"""
+        was_active = old_status in ACTIVE_STATUSES
+        is_active = request.status in ACTIVE_STATUSES
+        if was_active == is_active:
+            return
+        result = await self.db.execute(
+            select(RequestExecutor.executor_id).where(RequestExecutor.request_id == request.id)
+        )
+        for executor_id in result.scalars():
+            executor_index.add_load(executor_id, 1 if is_active else -1)
+    
+    @traced
     async def add_comment(
         self, 
         request_id: str, 
@@ -148,6 +484,12 @@ class RequestService:
         )
         
         self.db.add(db_comment)
+        await self.db.flush()
+        await publish_event(
+            self.db,
+            "comment_added",
+            {**self._event_data(request), "comment_id": db_comment.id, "is_internal": is_internal},
+        )
         await self.db.commit()
         await self.db.refresh(db_comment)
         
@@ -156,19 +498,48 @@ class RequestService:
     async def get_user_active_requests_count(self, user_id: int) -> int:
         """Получение количества активных заявок пользователя"""
         result = await self.db.execute(
-            select(func.count())
-            .select_from(Request)
+            select(User.active_requests).where(User.id == user_id)
+        )
+        return result.scalar() or 0
+    
+    @staticmethod
+    def _event_data(request: Request) -> dict:
+        """Ключевые поля заявки для события SSE (без описания и адреса)"""
+        return {
+            "request_id": request.request_id,
+            "status": request.status.value if request.status else None,
+            "category": request.category,
+            "service": request.service,
+            "priority": request.priority,
+            "user_id": request.user_id,
+            "updated_at": request.updated_at,
+        }
+    
+    async def _reserve_active_slot(self, user_id: int) -> bool:
+        """Атомарно увеличивает счётчик активных заявок, если лимит не достигнут.
+
+        Возвращает False, если лимит исчерпан (или пользователь не найден).
+        """
+        result = await self.db.execute(
+            update(User)
             .where(
-                and_(
-                    Request.user_id == user_id,
-                    or_(
-                        Request.status == RequestStatus.NEW,
-                        Request.status == RequestStatus.IN_PROGRESS
-                    )
-                )
+                User.id == user_id,
+                User.active_requests < settings.max_requests_per_user
             )
+            .values(active_requests=User.active_requests + 1)
+            .returning(User.active_requests)
+            .execution_options(synchronize_session=False)
+        )
+        return result.scalar_one_or_none() is not None
+    
+    async def _adjust_active_counter(self, user_id: int, delta: int) -> None:
+        """Изменение счётчика активных заявок без проверки лимита"""
+        await self.db.execute(
+            update(User)
+            .where(User.id == user_id)
+            .values(active_requests=func.greatest(User.active_requests + delta, 0))
+            .execution_options(synchronize_session=False)
         )
-        return result.scalar() or 0
     
     async def _generate_request_id(self) -> str:
         """Генерация уникального ID заявки"""
@@ -188,24 +559,160 @@ class RequestService:
             if not existing.scalar_one_or_none():
                 return request_id
     
+    @traced
     async def get_requests_for_executor(
         self,
         executor_id: int,
         status: Optional[RequestStatus] = None,
         page: int = 1,
-        per_page: int = 10
-    ) -> Tuple[List[Request], int]:
-        """Получение заявок для исполнителя"""
-        # TODO: Реализовать логику получения заявок для исполнителя
-        # Пока возвращаем пустой список
-        return [], 0
+        per_page: int = 10,
+        as_rows: bool = False
+    ) -> Tuple[list, int]:
+        """Очередь исполнителя: назначенные ему заявки, новые сверху.
+
+        Выборка идёт по индексу request_executors (executor_id, request_id)
+        с соединением по первичному ключу заявки.
+        """
+        conditions = [RequestExecutor.executor_id == executor_id]
+        if status:
+            conditions.append(Request.status == status)
+        
+        total_result = await self.db.execute(
+            select(func.count())
+            .select_from(RequestExecutor)
+            .join(Request, Request.id == RequestExecutor.request_id)
+            .where(*conditions)
+        )
+        total = total_result.scalar()
+        
+        columns = REQUEST_RESPONSE_COLUMNS if as_rows else (Request,)
+        query = (
+            select(*columns)
+            .join(RequestExecutor, RequestExecutor.request_id == Request.id)
+            .where(*conditions)
+            .order_by(Request.created_at.desc(), Request.id.desc())
+            .offset((page - 1) * per_page)
+            .limit(per_page)
+        )
+        result = await self.db.execute(query)
+        items = result.mappings().all() if as_rows else result.scalars().all()
+        
+        return list(items), total
     
+    @traced
     async def assign_executor(
         self, 
         request_id: str, 
-        executor_id: int,
+        executor_id: Optional[int],
         assigned_by: int
-    ) -> bool:
-        """Назначение исполнителя на заявку"""
-        # TODO: Реализовать назначение исполнителя
-        return True
+    ) -> Optional[int]:
+        """Назначение основного исполнителя на заявку.
+
+        Без executor_id исполнитель подбирается по индексу нагрузки.
+        Новая заявка при назначении переходит в работу. Возвращает ID
+        назначенного исполнителя или None, если подходящего нет.
+        """
+        result = await self.db.execute(
+            select(Request)
+            .where(Request.request_id == request_id)
+            .with_for_update()
+        )
+        request = result.scalar_one_or_none()
+        if not request:
+            raise ValueError("Заявка не найдена")
+        if request.status not in ACTIVE_STATUSES:
+            raise ValueError("Заявка уже закрыта")
+        
+        assigned = await self._assign(request, executor_id, assigned_by)
+        if assigned is None:
+            await self.db.rollback()
+            return None
+        await self.db.commit()
+        self._apply_assignment_load(*assigned)
+        return assigned[0]
+    
+    @traced
+    async def auto_assign_backlog(self, assigned_by: int, limit: int = 100) -> List[Tuple[str, int]]:
+        """Пакетное назначение исполнителей на новые заявки без исполнителя.
+
+        Заявки берутся по приоритету и возрасту с FOR UPDATE SKIP LOCKED,
+        поэтому параллельный запуск и ручные назначения не конфликтуют.
+        Останавливается, когда у всех исполнителей исчерпан лимит нагрузки.
+        """
+        unassigned = ~select(RequestExecutor.id).where(RequestExecutor.request_id == Request.id).exists()
+        result = await self.db.execute(
+            select(Request)
+            .where(Request.status == RequestStatus.NEW, unassigned)
+            .order_by(Request.priority.desc(), Request.created_at, Request.id)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+        assignments = []
+        applied = []
+        try:
+            for request in result.scalars().all():
+                assigned = await self._assign(request, None, assigned_by)
+                if assigned is None:
+                    break
+                # Сразу учитываем в индексе, чтобы следующая заявка пачки видела нагрузку
+                self._apply_assignment_load(*assigned)
+                applied.append(assigned)
+                assignments.append((request.request_id, assigned[0]))
+            await self.db.commit()
+        except Exception:
+            for assigned in applied:
+                self._apply_assignment_load(*assigned, sign=-1)
+            raise
+        return assignments
+    
+    async def _assign(
+        self,
+        request: Request,
+        executor_id: Optional[int],
+        assigned_by: int
+    ) -> Optional[Tuple[int, Optional[int]]]:
+        """Назначение в текущей транзакции; возвращает (новый, прежний исполнитель)"""
+        if executor_id is None:
+            executor_id = executor_index.pick(
+                request.category, request.service, settings.executor_max_open_requests
+            )
+            if executor_id is None:
+                return None
+        else:
+            executor = await self.db.get(Executor, executor_id)
+            if executor is None or not executor.is_active:
+                raise ValueError("Исполнитель не найден или неактивен")
+        
+        result = await self.db.execute(
+            select(RequestExecutor)
+            .where(RequestExecutor.request_id == request.id, RequestExecutor.is_primary.is_(True))
+        )
+        previous = result.scalar_one_or_none()
+        if previous is not None and previous.executor_id == executor_id:
+            return executor_id, executor_id
+        previous_id = None
+        if previous is not None:
+            # Переназначение меняет ту же строку: DELETE и INSERT в одном
+            # flush SQLAlchemy выполняет в порядке INSERT, DELETE, и вставка
+            # нарушила бы uq_request_executors_primary
+            previous_id = previous.executor_id
+            previous.executor_id = executor_id
+            previous.assigned_at = datetime.utcnow()
+        else:
+            self.db.add(RequestExecutor(request_id=request.id, executor_id=executor_id, is_primary=True))
+        
+        if request.status == RequestStatus.NEW:
+            await self._apply_status(
+                request,
+                RequestStatusUpdate(status=RequestStatus.IN_PROGRESS, comment=f"Назначен исполнитель #{executor_id}"),
+                assigned_by,
+            )
+        await self.db.flush()
+        return executor_id, previous_id
+    
+    @staticmethod
+    def _apply_assignment_load(executor_id: int, previous_id: Optional[int], sign: int = 1) -> None:
+        """Нагрузка в индексе после назначения (sign=-1 — откат)"""
+        if previous_id is not None:
+            executor_index.add_load(previous_id, -sign)
+        executor_index.add_load(executor_id, sign)
@@ -0,0 +1,138 @@
+"""
+Сервис агрегированной статистики по заявкам
+"""
+from datetime import datetime, timedelta
+from typing import List, Optional, Sequence
+
+from sqlalchemy import delete, func, select, text
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database.models import Request, RequestStatus, RequestStatsHourly
+from app.tracing import traced
+
+# Признаки, по которым можно группировать статистику
+STATS_DIMENSIONS = ("category", "service", "work_format", "preferred_time", "status")
+
+# Пересчёт агрегата по заявкам из таблицы requests
+_BACKFILL_SQL = """
+INSERT INTO request_stats_hourly (bucket, category, service, work_format, preferred_time, status, count)
+SELECT date_trunc('hour', created_at), category, coalesce(service, ''), work_format, preferred_time, status, count(*)
+FROM requests
+WHERE created_at >= :date_from AND created_at < :date_to AND status IS NOT NULL
+GROUP BY 1, 2, 3, 4, 5, 6
+"""
+
+# Период пересчёта в одной транзакции (блокировка записи в агрегат)
+BACKFILL_CHUNK = timedelta(days=1)
+
+
+def hour_bucket(moment: datetime) -> datetime:
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+
+class StatsService:
+    """Сервис статистики (почасовой агрегат request_stats_hourly)"""
+    
+    def __init__(self, db: AsyncSession):
+        self.db = db
+    
+    async def _add(self, request: Request, status: RequestStatus, delta: int) -> None:
+        """Изменение счётчика в бакете заявки (в текущей транзакции)"""
+        table = RequestStatsHourly.__table__
+        stmt = insert(table).values(
+            bucket=hour_bucket(request.created_at),
+            category=request.category,
+            service=request.service or "",
+            work_format=request.work_format,
+            preferred_time=request.preferred_time,
+            status=status,
+            count=delta,
+        )
+        await self.db.execute(
+            stmt.on_conflict_do_update(
+                index_elements=list(table.primary_key.columns),
+                set_={"count": table.c.count + stmt.excluded.count},
+            )
+        )
+    
+    async def record_created(self, request: Request) -> None:
+        await self._add(request, request.status or RequestStatus.NEW, 1)
+    
+    async def record_status_change(self, request: Request, old_status: RequestStatus) -> None:
+        if old_status == request.status:
+            return
+        # Строки бакета обновляются в одном порядке (по статусу): встречные
+        # переходы в одном бакете не блокируют друг друга крест-накрест
+        changes = sorted([(old_status, -1), (request.status, 1)], key=lambda change: change[0].value)
+        for status, delta in changes:
+            await self._add(request, status, delta)
+    
+    @traced
+    async def get_stats(
+        self,
+        date_from: datetime,
+        date_to: datetime,
+        group_by: Sequence[str] = (),
+        granularity: str = "day"
+    ) -> List[dict]:
+        """Число заявок по бакетам (день или час) и выбранным признакам"""
+        bucket = func.date_trunc(granularity, RequestStatsHourly.bucket).label("bucket")
+        dimensions = [getattr(RequestStatsHourly, name) for name in group_by]
+        query = (
+            select(bucket, *dimensions, func.sum(RequestStatsHourly.count).label("count"))
+            .where(
+                RequestStatsHourly.bucket >= date_from,
+                RequestStatsHourly.bucket < date_to,
+            )
+            .group_by(bucket, *dimensions)
+            .having(func.sum(RequestStatsHourly.count) != 0)
+            .order_by(bucket, *dimensions)
+        )
+        result = await self.db.execute(query)
+        rows = []
+        for row in result.mappings():
+            item = dict(row)
+            if "service" in item:
+                item["service"] = item["service"] or None
+            rows.append(item)
+        return rows
+    
+    async def backfill(
+        self,
+        date_from: Optional[datetime] = None,
+        date_to: Optional[datetime] = None,
+        chunk: timedelta = BACKFILL_CHUNK,
+    ) -> int:
+        """Пересчёт агрегата за период из таблицы requests.
+
+        Период пересчитывается кусками по chunk, каждый в своей короткой
+        транзакции. На время куска таблица агрегата блокируется от записи:
+        заявки, создаваемые в это время, дождутся коммита куска и учтутся
+        один раз. Возвращает число записанных бакетов.
+        """
+        if date_from is None:
+            date_from = (await self.db.execute(select(func.min(Request.created_at)))).scalar()
+            if date_from is None:
+                return 0
+        if date_to is None:
+            date_to = datetime.utcnow() + timedelta(hours=1)
+        date_from = hour_bucket(date_from)
+        date_to = hour_bucket(date_to - timedelta(microseconds=1)) + timedelta(hours=1)
+        
+        await self.db.commit()
+        buckets = 0
+        while date_from < date_to:
+            chunk_to = min(date_from + chunk, date_to)
+            await self.db.execute(text("LOCK TABLE request_stats_hourly IN EXCLUSIVE MODE"))
+            await self.db.execute(
+                delete(RequestStatsHourly).where(
+                    RequestStatsHourly.bucket >= date_from,
+                    RequestStatsHourly.bucket < chunk_to,
+                )
+            )
+            result = await self.db.execute(text(_BACKFILL_SQL), {"date_from": date_from, "date_to": chunk_to})
+            await self.db.commit()
+            buckets += result.rowcount
+            date_from = chunk_to
+        return buckets
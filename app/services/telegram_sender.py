@@ -0,0 +1,155 @@
+"""
+Отправка уведомлений в Telegram со стороны API.
+
+Один HTTP клиент на всё время жизни приложения (keep-alive, HTTP/2 при
+наличии пакета h2), ограничение числа одновременных запросов и повторы
+с экспоненциальной задержкой. Ответ 429 учитывает `retry_after` от Bot API.
+"""
+import asyncio
+import random
+from typing import Any, Optional
+
+import httpx
+import structlog
+from prometheus_client import Counter
+
+from app.config import settings
+
+logger = structlog.get_logger()
+
+TELEGRAM_SEND_TOTAL = Counter(
+    "fixfix_telegram_send_total",
+    "Вызовы Telegram Bot API из API",
+    ["method", "outcome"],
+)
+TELEGRAM_SEND_RETRIES = Counter(
+    "fixfix_telegram_send_retries_total",
+    "Повторные попытки вызова Telegram Bot API",
+    ["method", "reason"],
+)
+
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+
+class TelegramSender:
+    """Клиент Bot API для уведомлений из API"""
+
+    def __init__(
+        self,
+        token: Optional[str],
+        base_url: str = "https://api.telegram.org",
+        max_concurrency: int = 8,
+        max_retries: int = 4,
+        timeout: float = 10.0,
+        backoff_base: float = 0.5,
+        backoff_max: float = 30.0,
+        total_timeout: float = 60.0,
+    ):
+        self.token = token
+        self.base_url = base_url.rstrip("/")
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.total_timeout = total_timeout
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._max_concurrency = max_concurrency
+        self._client: Optional[httpx.AsyncClient] = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                base_url=f"{self.base_url}/bot{self.token}/",
+                http2=HTTP2_AVAILABLE,
+                timeout=self.timeout,
+                limits=httpx.Limits(
+                    max_connections=self._max_concurrency,
+                    max_keepalive_connections=self._max_concurrency,
+                ),
+            )
+        return self._client
+
+    async def close(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def _backoff(self, attempt: int) -> float:
+        delay = min(self.backoff_max, self.backoff_base * (2 ** attempt))
+        return delay * random.uniform(0.5, 1.0)
+
+    async def call(self, method: str, payload: dict) -> Optional[Any]:
+        """Вызов метода Bot API; при неустранимой ошибке возвращает None.
+
+        Разрешение семафора держится только на время HTTP-запроса: пауза
+        перед повтором не занимает место других уведомлений. retry_after из
+        429 выдерживается полностью; если он не укладывается в total_timeout,
+        вызов сразу завершается неудачей.
+        """
+        if not self.token:
+            return None
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.total_timeout
+        reason = None
+        for attempt in range(self.max_retries + 1):
+            retry_after = None
+            try:
+                async with self._semaphore:
+                    response = await self.client.post(method, json=payload)
+                data = response.json()
+                if response.status_code == 200 and data.get("ok"):
+                    TELEGRAM_SEND_TOTAL.labels(method, "ok").inc()
+                    return data.get("result")
+                if response.status_code == 429:
+                    reason = "rate_limited"
+                    retry_after = (data.get("parameters") or {}).get("retry_after")
+                elif response.status_code >= 500:
+                    reason = "server_error"
+                else:
+                    # 400/403 и т.п. — повтор не поможет
+                    TELEGRAM_SEND_TOTAL.labels(method, "rejected").inc()
+                    logger.warning(
+                        "telegram_call_rejected",
+                        method=method,
+                        status_code=response.status_code,
+                        description=data.get("description"),
+                    )
+                    return None
+            except (httpx.TransportError, ValueError) as e:
+                reason = type(e).__name__
+
+            if attempt == self.max_retries:
+                break
+            # retry_after соблюдается полностью: повтор раньше срока Telegram
+            # продлевает ограничение; backoff_max ограничивает только свою паузу
+            delay = float(retry_after) if retry_after is not None else self._backoff(attempt)
+            if loop.time() + delay > deadline:
+                reason = f"{reason}_deadline"
+                break
+            TELEGRAM_SEND_RETRIES.labels(method, reason).inc()
+            await asyncio.sleep(delay)
+
+        TELEGRAM_SEND_TOTAL.labels(method, "failed").inc()
+        logger.error("telegram_call_failed", method=method, attempts=attempt + 1, reason=reason)
+        return None
+
+    async def send_message(self, chat_id: int, text: str, **kwargs) -> Optional[dict]:
+        """sendMessage; дополнительные параметры передаются как есть"""
+        payload = {"chat_id": chat_id, "text": text}
+        payload.update({k: v for k, v in kwargs.items() if v is not None})
+        return await self.call("sendMessage", payload)
+
+
+# Глобальный экземпляр (закрывается при остановке API)
+telegram_sender = TelegramSender(
+    token=settings.telegram.token if settings.telegram else None,
+    base_url=settings.telegram.api_url if settings.telegram else "https://api.telegram.org",
+    max_concurrency=settings.telegram.send_concurrency if settings.telegram else 8,
+    max_retries=settings.telegram.send_max_retries if settings.telegram else 4,
+)
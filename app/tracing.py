@@ -0,0 +1,449 @@
+"""
+Распределённая трассировка бот -> API -> SQL (W3C Trace Context).
+
+Лёгкая реализация без внешних зависимостей, общая для API и бота (модуль
+не читает настройки app.config, конфигурация передаётся в
+Tracer.configure):
+  - контекст трассы передаётся заголовком traceparent
+    (00-<trace_id>-<span_id>-<flags>): бот добавляет его к вызовам API,
+    TracingMiddleware продолжает трассу на стороне API;
+  - текущий спан хранится в contextvars; дочерние спаны — обработчик бота,
+    вызовы API и Bot API, маршрут, методы сервисов (@traced) и SQL
+    (app.query_stats) — создаются только внутри трассы;
+  - спаны процесса копятся в сегменте до завершения его корневого спана,
+    затем хвостовое семплирование: сегмент сохраняется, если в нём есть
+    ошибка, корень дольше slow_ms или трасса отобрана в голове
+    (sample_rate, флаг sampled в traceparent — его соблюдают и
+    следующие сервисы);
+  - сохранённые сегменты выгружаются в фоновом потоке в формате OTLP/JSON:
+    в файл (строка на сегмент) или в OTLP/HTTP коллектор (например,
+    scripts/trace_collector.py, который склеивает сегменты сервисов).
+"""
+import functools
+import json
+import os
+import queue
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+import structlog
+
+logger = structlog.get_logger("tracing")
+
+TRACEPARENT = "traceparent"
+
+# Виды спанов OTLP
+INTERNAL, SERVER, CLIENT, CONSUMER = 1, 2, 3, 5
+
+_TRACEPARENT_RE = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+_ZERO_TRACE = "0" * 32
+_ZERO_SPAN = "0" * 16
+
+
+def parse_traceparent(value: Optional[str]) -> Optional[Tuple[str, str, bool]]:
+    """(trace_id, parent_span_id, sampled) из заголовка или None"""
+    if not value:
+        return None
+    match = _TRACEPARENT_RE.match(value.strip().lower())
+    if match is None:
+        return None
+    trace_id, span_id, flags = match.groups()
+    if trace_id == _ZERO_TRACE or span_id == _ZERO_SPAN:
+        return None
+    return trace_id, span_id, bool(int(flags, 16) & 1)
+
+
+class _Segment:
+    """Спаны одного процесса в одной трассе (от локального корня)"""
+
+    __slots__ = ("root", "spans", "dropped", "error", "closed")
+
+    def __init__(self):
+        self.root: Optional["Span"] = None
+        self.spans: List["Span"] = []
+        self.dropped = 0
+        self.error = False
+        self.closed = False
+
+
+class Span:
+    __slots__ = (
+        "trace_id", "span_id", "parent_id", "name", "kind", "attributes",
+        "start_ns", "end_ns", "_started", "error", "sampled", "_segment",
+    )
+
+    def __init__(self, name: str, kind: int, trace_id: str, parent_id: Optional[str], sampled: bool, segment: _Segment):
+        self.trace_id = trace_id
+        self.span_id = f"{random.getrandbits(64) or 1:016x}"
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.attributes: Dict[str, Any] = {}
+        self.start_ns = time.time_ns()
+        self._started = time.perf_counter_ns()
+        self.end_ns = 0
+        self.error: Optional[str] = None
+        self.sampled = sampled
+        self._segment = segment
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def record_error(self, error: Any) -> None:
+        if isinstance(error, BaseException):
+            error = f"{type(error).__name__}: {error}"
+        self.error = str(error)[:500]
+        self._segment.error = True
+
+    def _finish(self) -> None:
+        self.end_ns = self.start_ns + (time.perf_counter_ns() - self._started)
+
+    @property
+    def duration_ms(self) -> float:
+        return (self.end_ns - self.start_ns) / 1e6
+
+    @property
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-{'01' if self.sampled else '00'}"
+
+    def to_otlp(self) -> dict:
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": self.kind,
+            "flags": 1 if self.sampled else 0,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": [_otlp_attribute(key, value) for key, value in self.attributes.items()],
+            "status": {"code": 2, "message": self.error} if self.error else {"code": 0},
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        return span
+
+
+class _NoopSpan:
+    """Спан вне трассы или при выключенной трассировке"""
+
+    trace_id = None
+    traceparent = None
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        pass
+
+    def record_error(self, error: Any) -> None:
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+def _otlp_attribute(key: str, value: Any) -> dict:
+    if isinstance(value, bool):
+        typed = {"boolValue": value}
+    elif isinstance(value, int):
+        typed = {"intValue": str(value)}
+    elif isinstance(value, float):
+        typed = {"doubleValue": value}
+    else:
+        typed = {"stringValue": str(value)}
+    return {"key": key, "value": typed}
+
+
+def otlp_payload(service: str, spans: List[Span]) -> dict:
+    """Запрос ExportTraceServiceRequest (OTLP/JSON) для спанов одного сервиса"""
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": [_otlp_attribute("service.name", service)]},
+            "scopeSpans": [{"scope": {"name": "fixfix"}, "spans": [span.to_otlp() for span in spans]}],
+        }]
+    }
+
+
+_current: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+def current_span() -> Optional[Span]:
+    return _current.get()
+
+
+class Tracer:
+    """Создание спанов и хвостовое семплирование сегментов процесса"""
+
+    def __init__(self):
+        self.enabled = False
+        self.service = "fixfix"
+        self.exporter: Optional["SpanExporter"] = None
+        self.slow_ms = 500.0
+        self.sample_rate = 0.0
+        self.max_spans = 512
+
+    def configure(
+        self,
+        service: str,
+        exporter: "SpanExporter",
+        slow_ms: float = 500.0,
+        sample_rate: float = 0.0,
+        max_spans: int = 512,
+    ) -> None:
+        self.service = service
+        self.exporter = exporter
+        self.slow_ms = slow_ms
+        self.sample_rate = sample_rate
+        self.max_spans = max_spans
+        self.enabled = True
+
+    def shutdown(self) -> None:
+        self.enabled = False
+        if self.exporter is not None:
+            self.exporter.shutdown()
+            self.exporter = None
+
+    @contextmanager
+    def span(
+        self,
+        name: str,
+        kind: int = INTERNAL,
+        attributes: Optional[Dict[str, Any]] = None,
+        traceparent: Optional[str] = None,
+    ) -> Iterator[Any]:
+        """Спан в текущей трассе; без текущего спана — новая трасса
+        (продолжение удалённой, если передан traceparent)"""
+        if not self.enabled:
+            yield NOOP_SPAN
+            return
+        span = self._start(name, kind, _current.get(), parse_traceparent(traceparent))
+        if attributes:
+            span.attributes.update(attributes)
+        token = _current.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.record_error(e)
+            raise
+        finally:
+            _current.reset(token)
+            self._end(span)
+
+    @contextmanager
+    def child_span(self, name: str, kind: int = INTERNAL, attributes: Optional[Dict[str, Any]] = None) -> Iterator[Any]:
+        """Спан только внутри трассы: фоновые задачи новых трасс не начинают"""
+        if _current.get() is None:
+            yield NOOP_SPAN
+            return
+        with self.span(name, kind, attributes) as span:
+            yield span
+
+    def record(self, name: str, duration_s: float, kind: int = CLIENT, attributes: Optional[Dict[str, Any]] = None) -> None:
+        """Уже завершившаяся операция (SQL-запрос) как дочерний спан текущего"""
+        parent = _current.get()
+        if parent is None or not self.enabled:
+            return
+        span = self._start(name, kind, parent, None)
+        duration_ns = int(duration_s * 1e9)
+        span.start_ns -= duration_ns
+        span.end_ns = span.start_ns + duration_ns
+        if attributes:
+            span.attributes.update(attributes)
+        self._collect(span)
+
+    def _start(self, name: str, kind: int, parent: Optional[Span], remote: Optional[Tuple[str, str, bool]]) -> Span:
+        if parent is not None:
+            return Span(name, kind, parent.trace_id, parent.span_id, parent.sampled, parent._segment)
+        segment = _Segment()
+        if remote is not None:
+            trace_id, parent_id, sampled = remote
+        else:
+            trace_id = f"{random.getrandbits(128) or 1:032x}"
+            parent_id = None
+            sampled = random.random() < self.sample_rate
+        span = Span(name, kind, trace_id, parent_id, sampled, segment)
+        segment.root = span
+        return span
+
+    def _collect(self, span: Span) -> None:
+        segment = span._segment
+        if segment.closed:
+            # Задача, пережившая корень сегмента
+            return
+        if len(segment.spans) < self.max_spans:
+            segment.spans.append(span)
+        else:
+            segment.dropped += 1
+
+    def _end(self, span: Span) -> None:
+        span._finish()
+        self._collect(span)
+        segment = span._segment
+        if segment.root is not span:
+            return
+        segment.closed = True
+        if segment.error or span.sampled or span.duration_ms >= self.slow_ms:
+            if segment.dropped:
+                span.set_attribute("tracing.dropped_spans", segment.dropped)
+            if self.exporter is not None:
+                self.exporter.export(self.service, segment.spans)
+
+
+tracer = Tracer()
+
+
+def traced(func: Callable) -> Callable:
+    """Спан на вызов async-метода (только внутри трассы), имя — Класс.метод"""
+    name = func.__qualname__
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        if _current.get() is None:
+            return await func(*args, **kwargs)
+        with tracer.span(name):
+            return await func(*args, **kwargs)
+
+    return wrapper
+
+
+class TracingMiddleware:
+    """ASGI middleware: серверный спан на HTTP запрос с продолжением traceparent"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not tracer.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        traceparent = None
+        for key, value in scope.get("headers", ()):
+            if key == b"traceparent":
+                traceparent = value.decode("latin-1")
+                break
+        method = scope["method"]
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        attributes = {"http.method": method, "http.target": scope["path"]}
+        with tracer.span(f"{method} {scope['path']}", SERVER, attributes, traceparent) as span:
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                # Имя по шаблону маршрута (FastAPI записывает route в scope)
+                route = scope.get("route")
+                if route is not None:
+                    span.name = f"{method} {route.path}"
+                span.set_attribute("http.status_code", status_code)
+                if status_code >= 500:
+                    span.record_error(f"HTTP {status_code}")
+
+
+class SpanExporter:
+    """Фоновая выгрузка сохранённых сегментов (поток и ограниченная очередь)"""
+
+    def __init__(self, max_queue: int = 1000):
+        self._queue: "queue.Queue[Optional[Tuple[str, List[Span]]]]" = queue.Queue(max_queue)
+        self.dropped = 0
+        self._thread = threading.Thread(target=self._run, name=f"{type(self).__name__}", daemon=True)
+        self._thread.start()
+
+    def export(self, service: str, spans: List[Span]) -> None:
+        try:
+            self._queue.put_nowait((service, spans))
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            stop = item is None
+            batch = [] if stop else [otlp_payload(*item)]
+            while not stop:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                else:
+                    batch.append(otlp_payload(*item))
+            if batch:
+                try:
+                    self.write(batch)
+                except Exception as e:
+                    logger.warning("trace_export_failed", exporter=type(self).__name__, error=str(e))
+            if stop:
+                self.close()
+                return
+
+    def write(self, payloads: List[dict]) -> None:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+    def shutdown(self, timeout: float = 5.0) -> None:
+        try:
+            self._queue.put(None, timeout=timeout)
+        except queue.Full:
+            return
+        self._thread.join(timeout)
+
+
+class FileExporter(SpanExporter):
+    """OTLP/JSON в файл: строка на сегмент"""
+
+    def __init__(self, path: str, max_queue: int = 1000):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(path, "a", encoding="utf-8")
+        super().__init__(max_queue)
+
+    def write(self, payloads: List[dict]) -> None:
+        for payload in payloads:
+            self._file.write(json.dumps(payload, ensure_ascii=False) + "\n")
+        self._file.flush()
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class OtlpHttpExporter(SpanExporter):
+    """OTLP/HTTP (JSON) в коллектор: POST <url> пачкой сегментов"""
+
+    def __init__(self, url: str, timeout: float = 5.0, max_queue: int = 1000):
+        import httpx
+
+        self.url = url
+        self._client = httpx.Client(timeout=timeout)
+        super().__init__(max_queue)
+
+    def write(self, payloads: List[dict]) -> None:
+        body = {"resourceSpans": [item for payload in payloads for item in payload["resourceSpans"]]}
+        response = self._client.post(self.url, json=body)
+        response.raise_for_status()
+
+    def close(self) -> None:
+        self._client.close()
+
+
+def create_exporter(kind: str, path: str, url: str) -> Optional[SpanExporter]:
+    """file | otlp | пусто (трассировка выключена)"""
+    kind = kind.strip().lower()
+    if kind == "file":
+        return FileExporter(path)
+    if kind == "otlp":
+        return OtlpHttpExporter(url)
+    if kind:
+        raise ValueError(f"Неизвестный экспортёр трасс: {kind}")
+    return None
@@ -0,0 +1,147 @@
+"""
+Circuit breaker для вызовов API из бота.
+
+Пока API отвечает, автомат закрыт (closed). Если за последние window
+секунд доля неудачных вызовов (таймауты, ошибки соединения, 5xx) не меньше
+failure_rate при хотя бы min_calls вызовах, автомат размыкается (open): бот
+сразу уходит в fallback и журнал, не дожидаясь таймаута и не нагружая API.
+Через open_seconds автомат переходит в half_open и пропускает один пробный
+вызов: успех замыкает его, неудача снова размыкает.
+
+allow() выдаёт разрешение с эпохой состояния (номером перехода), и
+record() учитывает результат только текущей эпохи: ответ вызова, начатого
+до размыкания, не замкнёт автомат вместо пробного и не попадёт в новое окно.
+"""
+import time
+from collections import deque
+from typing import Callable, Deque, NamedTuple, Optional, Tuple
+
+import structlog
+from prometheus_client import Counter, Gauge
+
+logger = structlog.get_logger("bot.circuit")
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+CIRCUIT_STATE = Gauge(
+    "fixfix_bot_api_circuit_state",
+    "Состояние автомата вызовов API (0 — closed, 1 — half_open, 2 — open)",
+)
+CIRCUIT_TRANSITIONS = Counter(
+    "fixfix_bot_api_circuit_transitions_total",
+    "Переходы автомата вызовов API",
+    ["from_state", "to_state"],
+)
+CIRCUIT_REJECTED = Counter(
+    "fixfix_bot_api_circuit_rejected_total",
+    "Вызовы API, не выполненные из-за разомкнутого автомата",
+)
+
+
+class CircuitOpenError(Exception):
+    """Автомат разомкнут: вызов API не выполняется"""
+
+
+class Permit(NamedTuple):
+    """Разрешение на вызов от allow()"""
+    epoch: int
+    probe: bool
+
+
+class CircuitBreaker:
+    """Автомат closed/open/half_open с окном доли ошибок"""
+
+    def __init__(
+        self,
+        window: float = 60.0,
+        failure_rate: float = 0.5,
+        min_calls: int = 5,
+        open_seconds: float = 30.0,
+        on_change: Optional[Callable[[str, str], None]] = None,
+    ):
+        self.window = window
+        self.failure_rate = failure_rate
+        self.min_calls = min_calls
+        self.open_seconds = open_seconds
+        self.on_change = on_change
+        self.state = CLOSED
+        self._calls: Deque[Tuple[float, bool]] = deque()
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._epoch = 0
+        CIRCUIT_STATE.set(_STATE_VALUES[CLOSED])
+
+    def _transition(self, state: str) -> None:
+        if state == self.state:
+            return
+        previous, self.state = self.state, state
+        self._epoch += 1
+        CIRCUIT_STATE.set(_STATE_VALUES[state])
+        CIRCUIT_TRANSITIONS.labels(previous, state).inc()
+        logger.warning("api_circuit_changed", previous=previous, state=state)
+        if self.on_change is not None:
+            self.on_change(previous, state)
+
+    def allow(self) -> Optional[Permit]:
+        """Разрешение на вызов или None; в half_open — только один пробный"""
+        if self.state == OPEN:
+            if time.monotonic() - self._opened_at < self.open_seconds:
+                return None
+            self._transition(HALF_OPEN)
+        if self.state == HALF_OPEN:
+            if self._probe_in_flight:
+                return None
+            self._probe_in_flight = True
+            return Permit(self._epoch, probe=True)
+        return Permit(self._epoch, probe=False)
+
+    def check(self) -> Permit:
+        """allow() с исключением для разомкнутого автомата"""
+        permit = self.allow()
+        if permit is None:
+            CIRCUIT_REJECTED.inc()
+            raise CircuitOpenError("API временно недоступен (автомат разомкнут)")
+        return permit
+
+    def record(self, permit: Permit, success: bool) -> None:
+        """Результат вызова, разрешённого allow()"""
+        if permit.epoch != self._epoch:
+            # Вызов начат до смены состояния
+            logger.debug("api_circuit_stale_result", state=self.state, success=success)
+            return
+        now = time.monotonic()
+        if permit.probe:
+            self._probe_in_flight = False
+            if success:
+                self._calls.clear()
+                self._transition(CLOSED)
+            else:
+                self._open(now)
+            return
+
+        self._calls.append((now, success))
+        while self._calls and now - self._calls[0][0] > self.window:
+            self._calls.popleft()
+        if self.state == CLOSED and not success and len(self._calls) >= self.min_calls:
+            failures = sum(1 for _, ok in self._calls if not ok)
+            if failures / len(self._calls) >= self.failure_rate:
+                self._open(now)
+
+    def _open(self, now: float) -> None:
+        self._opened_at = now
+        self._calls.clear()
+        self._transition(OPEN)
+
+
+class Deadline:
+    """Общий бюджет времени на действие пользователя (несколько вызовов API)"""
+
+    def __init__(self, seconds: float):
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
@@ -7,6 +7,7 @@ import asyncio
 from telegram import Update
 from telegram.ext import ContextTypes
 from telegram import ReplyKeyboardMarkup
+from telegram.error import BadRequest
 from .keyboards import *
 
 # Загружаем переменные окружения
@@ -24,10 +25,41 @@ request_counter = 1
 # Добавляем импорт для работы с API
 import httpx
 import json
+import structlog
+
+# Логирование: app.logging_config (уровни, семплирование и маскирование
+# телефонов/адресов настраиваются в main.py и командой /log)
+logger = structlog.get_logger("bot.handlers")
 
 # URL API (должен быть настроен в .env)
 API_BASE_URL = os.getenv("API_BASE_URL", "http://localhost:8000")
 
+# Журнал заявок, не сохранённых через API (переотправляются в фоне)
+from .spool import RequestSpool, SpoolRejected
+BOT_SPOOL_PATH = os.getenv("BOT_SPOOL_PATH", "logs/request_spool.jsonl")
+BOT_SPOOL_REPLAY_INTERVAL = float(os.getenv("BOT_SPOOL_REPLAY_INTERVAL", "30"))
+request_spool = RequestSpool(BOT_SPOOL_PATH)
+
+# Вызовы API: общий бюджет времени на действие пользователя и автомат,
+# который при недоступном API сразу отправляет заявку в fallback и журнал
+from .circuit import CircuitBreaker, CircuitOpenError, Deadline, OPEN, CLOSED
+BOT_API_DEADLINE = float(os.getenv("BOT_API_DEADLINE", "8"))
+api_breaker = CircuitBreaker(
+    window=float(os.getenv("BOT_BREAKER_WINDOW", "60")),
+    failure_rate=float(os.getenv("BOT_BREAKER_FAILURE_RATE", "0.5")),
+    min_calls=int(os.getenv("BOT_BREAKER_MIN_CALLS", "5")),
+    open_seconds=float(os.getenv("BOT_BREAKER_OPEN_SECONDS", "30")),
+)
+_api_client = None
+
+# Трассировка вызовов API (bot/tracing.py включает её в main.py)
+from urllib.parse import urlsplit
+from app.tracing import CLIENT, TRACEPARENT, tracer
+
+# Профилирование по команде /profile (общий модуль с API)
+from app.profiling import MAX_SECONDS, ProfilerBusy, memory_tracker, profile_cpu
+from app.logging_config import logging_state, set_log_levels, set_log_sampling
+
 # ==============================================================================
 # ВСПОМОГАТЕЛЬНЫЕ ФУНКЦИИ
 # ==============================================================================
@@ -38,9 +70,9 @@ async def safe_send_message(update: Update, context: ContextTypes.DEFAULT_TYPE,
     except Exception as e:
         if "Can't parse entities" in str(e) or "parse entities" in str(e):
             await update.message.reply_text(text, reply_markup=reply_markup)
-            print(f"Предупреждение: Ошибка Markdown в сообщении: {e}")
+            logger.warning("markdown_fallback", error=str(e))
         else:
-            print(f"Ошибка отправки сообщения: {e}")
+            logger.error("send_message_failed", error=str(e))
             raise e
 
 def escape_markdown(text):
@@ -54,7 +86,86 @@ def get_safe_value(value, default="Не указано"):
         return default
     return value
 
-async def create_request_via_api(request_data: dict, user_id: int) -> dict:
+def get_api_client() -> httpx.AsyncClient:
+    """Общий клиент API: соединения переиспользуются между вызовами"""
+    global _api_client
+    if _api_client is None:
+        _api_client = httpx.AsyncClient()
+    return _api_client
+
+async def close_api_client():
+    global _api_client
+    if _api_client is not None:
+        await _api_client.aclose()
+        _api_client = None
+
+async def call_api(method: str, url: str, deadline: Deadline, **kwargs) -> httpx.Response:
+    """Вызов API через автомат в пределах оставшегося бюджета действия.
+
+    Таймауты, ошибки соединения и 5xx считаются неудачами автомата.
+    Внутри трассы вызов — дочерний спан, его traceparent передаётся в API.
+    """
+    remaining = deadline.remaining()
+    if remaining <= 0:
+        raise asyncio.TimeoutError("Бюджет времени действия исчерпан")
+    permit = api_breaker.check()
+    success = False
+    path = urlsplit(url).path
+    with tracer.child_span(f"API {method} {path}", CLIENT, {"http.method": method, "http.target": path}) as span:
+        if span.traceparent:
+            kwargs["headers"] = {**(kwargs.get("headers") or {}), TRACEPARENT: span.traceparent}
+        try:
+            response = await asyncio.wait_for(
+                get_api_client().request(method, url, timeout=remaining, **kwargs),
+                remaining
+            )
+            success = response.status_code < 500
+            span.set_attribute("http.status_code", response.status_code)
+            if not success:
+                span.record_error(f"HTTP {response.status_code}")
+            return response
+        finally:
+            api_breaker.record(permit, success)
+
+async def alert_admins_api_circuit(bot, previous: str, state: str):
+    """Уведомление администраторов о размыкании/замыкании автомата API"""
+    if state == OPEN:
+        text = "🚨 API не отвечает: вызовы приостановлены, новые заявки сохраняются в журнал бота"
+    elif state == CLOSED:
+        text = "✅ API снова доступен: заявки из журнала будут отправлены автоматически"
+    else:
+        return
+    for admin_id in ADMIN_IDS:
+        try:
+            await bot.send_message(admin_id, text)
+        except Exception as e:
+            logger.warning("admin_notify_failed", admin_id=admin_id, error=str(e))
+
+class ApiError(Exception):
+    """Ответ API с кодом ошибки"""
+
+    def __init__(self, message: str, status_code: int):
+        super().__init__(message)
+        self.status_code = status_code
+
+    @property
+    def permanent(self) -> bool:
+        """Отказ по данным запроса: 4xx, кроме таймаута, лимита частоты и 409
+        (запрос с этим ключом ещё обрабатывается) — повтор не поможет"""
+        return 400 <= self.status_code < 500 and self.status_code not in (408, 409, 429)
+
+def is_transient_failure(error: Exception) -> bool:
+    """Сбой, после которого API примет заявку при переотправке из журнала:
+    временный ответ API, таймаут, ошибка соединения, разомкнутый автомат"""
+    if isinstance(error, ApiError):
+        return not error.permanent
+    return isinstance(error, (asyncio.TimeoutError, httpx.TransportError, CircuitOpenError))
+
+def draft_idempotency_key(request: dict) -> str:
+    """Ключ идемпотентности черновика: одинаков для повторных нажатий и переотправки"""
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, f"fixfix:{request['user_id']}:{request['request_id']}:{request['created_at']}"))
+
+async def create_request_via_api(request_data: dict, user_id: int, idempotency_key: str = None, deadline: Deadline = None) -> dict:
     """Создание заявки через API"""
     try:
         # Преобразуем данные в формат API
@@ -70,45 +181,98 @@ async def create_request_via_api(request_data: dict, user_id: int) -> dict:
         # Убираем None значения
         api_request = {k: v for k, v in api_request.items() if v is not None}
         
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                f"{API_BASE_URL}/requests/",
-                params={"telegram_id": user_id},
-                json=api_request,
-                timeout=30.0
-            )
-            
-            if response.status_code == 201:
-                return response.json()
-            else:
-                # Пытаемся красиво разобрать ошибку FastAPI (422 Unprocessable Entity)
-                try:
-                    payload = response.json()
-                except Exception:
-                    payload = {"detail": response.text}
-
-                detail = payload.get("detail", "Неизвестная ошибка")
-
-                # Если detail — это список ошибок валидации
-                if isinstance(detail, list):
-                    messages = []
-                    for err in detail:
-                        loc = err.get("loc", [])
-                        # Убираем префиксы уровня
-                        loc = [str(x) for x in loc if x not in ("body", "query", "path")]
-                        path = ".".join(loc) if loc else "field"
-                        msg = err.get("msg", "invalid")
-                        messages.append(f"{path}: {msg}")
-                    formatted = "\n".join(messages)
-                    raise ValueError(f"Ошибка API {response.status_code}:\n{formatted}")
-
-                # Иначе выводим как есть
-                raise ValueError(f"Ошибка API {response.status_code}: {detail}")
+        headers = {"Idempotency-Key": idempotency_key} if idempotency_key else None
+        response = await call_api(
+            "POST",
+            f"{API_BASE_URL}/requests/",
+            deadline or Deadline(BOT_API_DEADLINE),
+            params={"telegram_id": user_id},
+            json=api_request,
+            headers=headers
+        )
+        
+        if response.status_code == 201:
+            return response.json()
+        else:
+            # Пытаемся красиво разобрать ошибку FastAPI (422 Unprocessable Entity)
+            try:
+                payload = response.json()
+            except Exception:
+                payload = {"detail": response.text}
+
+            detail = payload.get("detail", "Неизвестная ошибка")
+
+            # Если detail — это список ошибок валидации
+            if isinstance(detail, list):
+                messages = []
+                for err in detail:
+                    loc = err.get("loc", [])
+                    # Убираем префиксы уровня
+                    loc = [str(x) for x in loc if x not in ("body", "query", "path")]
+                    path = ".".join(loc) if loc else "field"
+                    msg = err.get("msg", "invalid")
+                    messages.append(f"{path}: {msg}")
+                formatted = "\n".join(messages)
+                raise ApiError(f"Ошибка API {response.status_code}:\n{formatted}", response.status_code)
+
+            # Иначе выводим как есть
+            raise ApiError(f"Ошибка API {response.status_code}: {detail}", response.status_code)
                 
     except Exception as e:
-        print(f"Ошибка создания заявки через API: {e}")
+        logger.error("api_create_request_failed", error=repr(e))
         raise e
 
+class StatusChanged(Exception):
+    """Статус заявки уже изменил другой менеджер (409 от API)"""
+
+    def __init__(self, current: str):
+        super().__init__(current)
+        self.current = current
+
+async def update_request_status_via_api(
+    request_id: str, new_status: str, telegram_id: int, expected_status: str = None
+) -> dict:
+    """Смена статуса заявки через API от имени менеджера.
+    С expected_status API меняет статус, только если заявка всё ещё в нём.
+    """
+    payload = {"status": new_status}
+    if expected_status:
+        payload["expected_status"] = expected_status
+    response = await call_api(
+        "PUT",
+        f"{API_BASE_URL}/requests/{request_id}/status",
+        Deadline(BOT_API_DEADLINE),
+        params={"telegram_id": telegram_id},
+        json=payload
+    )
+    if response.status_code == 200:
+        return response.json()
+    if response.status_code == 409:
+        raise StatusChanged(response.headers.get("x-request-status", ""))
+    try:
+        detail = response.json().get("detail", response.text)
+    except Exception:
+        detail = response.text
+    raise ValueError(f"Ошибка API {response.status_code}: {detail}")
+
+async def spool_request(request: dict, user_id: int) -> None:
+    """Сохраняет черновик в журнал до fallback-отправки в группу"""
+    try:
+        key = request.get("idempotency_key") or draft_idempotency_key(request)
+        await request_spool.add(key, user_id, dict(request))
+    except Exception as e:
+        logger.error("spool_write_failed", request_id=request.get("request_id"), error=str(e))
+
+async def submit_spooled_request(entry: dict) -> str:
+    """Переотправка заявки из журнала с исходным ключом идемпотентности"""
+    try:
+        response = await create_request_via_api(entry["draft"], entry["telegram_id"], entry["key"])
+    except ApiError as e:
+        if e.permanent:
+            raise SpoolRejected(str(e))
+        raise
+    return response.get("request_id")
+
 def map_work_format_to_enum(work_format: str) -> str:
     """Преобразование формата работы в enum для API"""
     mapping = {
@@ -160,19 +324,16 @@ async def send_request_to_channel(request: dict, context: ContextTypes.DEFAULT_T
             f"📊 *Статус:* {status}"
         )
         
-        # Создаем клавиатуру для менеджеров
-        keyboard = [
-            ["✅ Принять в работу", "❌ Отклонить"],
-            ["📞 Позвонить клиенту", "💬 Написать клиенту"],
-            ["📝 Добавить комментарий"]
-        ]
-        reply_markup = ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
+        # Кнопки менеджеров — только для заявок, сохранённых через API
+        reply_markup = None
+        if request.get('id') is not None:
+            reply_markup = request_actions_keyboard(request['request_id'], "new")
         
         # Проверяем ID группы
         if REQUESTS_GROUP_ID == 0 or REQUESTS_GROUP_ID is None:
             raise ValueError("ID группы не указан в переменной окружения REQUESTS_GROUP_ID")
         
-        print(f"Попытка отправить заявку в группу с ID: {REQUESTS_GROUP_ID}")
+        logger.debug("group_send_started", request_id=request["request_id"], chat_id=REQUESTS_GROUP_ID)
         
         # Отправляем сообщение в группу
         await context.bot.send_message(
@@ -182,11 +343,11 @@ async def send_request_to_channel(request: dict, context: ContextTypes.DEFAULT_T
             reply_markup=reply_markup
         )
         
-        print(f"✅ Заявка #{request['request_id']} успешно отправлена в группу {REQUESTS_GROUP_ID}")
+        logger.info("group_send_completed", request_id=request["request_id"], chat_id=REQUESTS_GROUP_ID)
         
     except Exception as e:
         error_message = f"❌ Ошибка отправки заявки #{request['request_id']}: {str(e)}"
-        print(error_message)
+        logger.error("group_send_failed", request_id=request["request_id"], chat_id=REQUESTS_GROUP_ID, error=str(e))
         
         # Дополнительная информация для отладки
         if "Chat not found" in str(e):
@@ -209,7 +370,72 @@ async def send_request_to_channel(request: dict, context: ContextTypes.DEFAULT_T
                     parse_mode="Markdown"
                 )
             except Exception as admin_error:
-                print(f"Не удалось отправить уведомление админу {admin_id}: {admin_error}")
+                logger.warning("admin_notify_failed", admin_id=admin_id, error=str(admin_error))
+# ==============================================================================
+# ДЕЙСТВИЯ МЕНЕДЖЕРОВ В ГРУППЕ ЗАЯВОК
+# ==============================================================================
+STATUS_LABELS = {
+    "new": "🆕 Новая",
+    "in_progress": "🔧 В работе",
+    "completed": "🏁 Выполнена",
+    "cancelled": "❌ Отменена",
+    "rejected": "❌ Отклонена",
+}
+
+def render_status_update(text: str, status: str, manager: str) -> str:
+    """Текст сообщения заявки с новым статусом и менеджером вместо прежних"""
+    head = text.split("\n📊 ", 1)[0]
+    return (
+        f"{head}\n"
+        f"📊 *Статус:* {STATUS_LABELS.get(status, status)}\n"
+        f"👨‍💼 *Менеджер:* {manager}"
+    )
+
+async def request_action_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Нажатие inline-кнопки под заявкой: смена статуса и правка этого же сообщения"""
+    query = update.callback_query
+    parts = query.data.split(":")
+    if len(parts) == 4:
+        _, request_id, expected_status, new_status = parts
+    elif len(parts) == 3:
+        # Кнопки сообщений, отправленных до проверки текущего статуса
+        (_, request_id, new_status), expected_status = parts, None
+    else:
+        await query.answer()
+        return
+
+    try:
+        result = await update_request_status_via_api(request_id, new_status, query.from_user.id, expected_status)
+    except StatusChanged as e:
+        logger.info("status_change_conflict", request_id=request_id, status=new_status, current=e.current)
+        await query.answer(
+            f"⚠️ Заявку уже обработал другой менеджер: {STATUS_LABELS.get(e.current, e.current)}",
+            show_alert=True
+        )
+        return
+    except Exception as e:
+        logger.warning("status_change_failed", request_id=request_id, status=new_status, error=str(e))
+        await query.answer(f"❌ Не удалось изменить статус: {e}", show_alert=True)
+        return
+
+    status = result.get("status", new_status)
+    await query.answer(STATUS_LABELS.get(status, status))
+    reply_markup = request_actions_keyboard(request_id, status)
+    try:
+        await query.edit_message_text(
+            render_status_update(query.message.text_markdown, status, query.from_user.mention_markdown()),
+            parse_mode="Markdown",
+            reply_markup=reply_markup
+        )
+    except BadRequest as e:
+        if "not modified" in str(e):
+            return
+        # Текст не разобрался как Markdown — правим без разметки
+        await query.edit_message_text(
+            render_status_update(query.message.text, status, query.from_user.full_name).replace("*", ""),
+            reply_markup=reply_markup
+        )
+
 # Обработчик для получения chat_id
 async def get_chat_id_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Получить ID текущего чата"""
@@ -312,6 +538,112 @@ async def check_command_handler(update: Update, context: ContextTypes.DEFAULT_TY
     except Exception as e:
         await safe_send_message(update, context, f"❌ Непредвиденная ошибка: {e}")
 
+PROFILE_USAGE = (
+    "Использование:\n"
+    "/profile cpu [сек] — CPU-профиль бота (collapsed stacks)\n"
+    "/profile api [сек] — CPU-профиль API\n"
+    "/profile mem start|diff|stop — рост памяти бота (tracemalloc)"
+)
+
+async def profile_command_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Профилирование /profile: доступно только администраторам.
+    Регистрируется с block=False: профиль снимается, пока бот обрабатывает обновления.
+    """
+    if update.effective_user.id not in ADMIN_IDS:
+        await safe_send_message(update, context, "❌ У вас нет прав для этой команды.")
+        return
+    args = context.args or []
+    target = args[0] if args else ""
+    try:
+        if target in ("cpu", "api"):
+            seconds = min(float(args[1]) if len(args) > 1 else 10.0, MAX_SECONDS)
+            await safe_send_message(update, context, f"⏱ Снимаю CPU-профиль {target} за {seconds:g} с…")
+            if target == "cpu":
+                profiler = await profile_cpu(seconds)
+                data, samples = profiler.collapsed(), profiler.samples
+            else:
+                response = await call_api(
+                    "GET",
+                    f"{API_BASE_URL}/admin/profile/cpu",
+                    Deadline(seconds + 15),
+                    params={"admin_id": update.effective_user.id, "seconds": seconds},
+                )
+                if response.status_code != 200:
+                    await safe_send_message(update, context, f"❌ API: HTTP {response.status_code} {response.text[:300]}")
+                    return
+                data, samples = response.text, response.headers.get("x-profile-samples", "?")
+            filename = f"{'bot' if target == 'cpu' else 'api'}-cpu-{datetime.now():%Y%m%d-%H%M%S}.collapsed"
+            await update.message.reply_document(
+                document=data.encode(),
+                filename=filename,
+                caption=f"Семплов: {samples}. flamegraph.pl {filename} > flame.svg или speedscope.app",
+            )
+        elif target == "mem" and len(args) > 1 and args[1] in ("start", "diff", "stop"):
+            action = args[1]
+            if action == "start":
+                await asyncio.to_thread(memory_tracker.start)
+                await safe_send_message(update, context, "🧠 tracemalloc включён, базовый снимок снят. /profile mem diff — рост памяти.")
+            elif action == "stop":
+                memory_tracker.stop()
+                await safe_send_message(update, context, "🧠 tracemalloc выключен.")
+            elif not memory_tracker.active:
+                await safe_send_message(update, context, "❌ tracemalloc не запущен: /profile mem start")
+            else:
+                report = await asyncio.to_thread(memory_tracker.diff, 10)
+                lines = [
+                    f"🧠 За {report['seconds']:g} с: отслеживается {report['traced_kb']:g} КБ "
+                    f"(пик {report['peak_kb']:g} КБ), черновиков в памяти: {len(user_requests)}",
+                ]
+                for item in report["top"]:
+                    lines.append(f"{item['size_diff_kb']:+g} КБ ({item['count_diff']:+d}) {item['traceback'][0]}")
+                await safe_send_message(update, context, "\n".join(lines))
+        else:
+            await safe_send_message(update, context, PROFILE_USAGE)
+    except ProfilerBusy as e:
+        await safe_send_message(update, context, f"❌ {e}")
+    except ValueError:
+        await safe_send_message(update, context, PROFILE_USAGE)
+    except Exception as e:
+        await safe_send_message(update, context, f"❌ Ошибка профилирования: {type(e).__name__}: {e}")
+
+
+LOG_USAGE = (
+    "Логирование бота:\n"
+    "/log — текущие уровни и семплирование\n"
+    "/log level DEBUG или /log level bot.handlers=DEBUG,httpx=WARNING\n"
+    "/log sample bot.handlers=0.1 — доля записей ниже WARNING; /log sample off — без семплирования"
+)
+# Логгеры бота, уровни которых показывает /log
+BOT_LOGGERS = ("bot.handlers", "bot.spool", "bot.circuit", "bot.recorder", "loop", "httpx")
+
+
+async def log_command_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Уровни и семплирование логов на ходу, без перезапуска: только для администраторов"""
+    if update.effective_user.id not in ADMIN_IDS:
+        await safe_send_message(update, context, "❌ У вас нет прав для этой команды.")
+        return
+    args = context.args or []
+    try:
+        if len(args) == 2 and args[0] == "level":
+            changed = set_log_levels(args[1])
+            logger.warning("log_levels_changed", levels=changed, admin_id=update.effective_user.id)
+        elif len(args) == 2 and args[0] == "sample":
+            changed = set_log_sampling("" if args[1] == "off" else args[1])
+            logger.warning("log_sampling_changed", sampling=changed, admin_id=update.effective_user.id)
+        elif args:
+            await safe_send_message(update, context, LOG_USAGE)
+            return
+    except ValueError as e:
+        await safe_send_message(update, context, f"❌ {e}\n\n{LOG_USAGE}")
+        return
+    state = logging_state(BOT_LOGGERS)
+    lines = ["📝 Уровни:"]
+    lines += [f"{name or 'root'}: {level}" for name, level in state["levels"].items()]
+    sampling = ", ".join(f"{name or 'root'}={rate:g}" for name, rate in state["sampling"].items()) or "нет"
+    lines.append(f"Семплирование: {sampling}")
+    lines.append(f"Отброшено семплированием: {state['sampled_out']}, при переполнении очереди: {state['queue_dropped']}")
+    await safe_send_message(update, context, "\n".join(lines))
+
 # ==============================================================================
 # ОСНОВНЫЕ ОБРАБОТЧИКИ
 # ==============================================================================
@@ -354,7 +686,7 @@ async def category_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await safe_send_message(update, context, "📷 Какое устройство нужно настроить?", reply_markup=device_setup_menu())
     elif "🚀 Хочу апгрейд" in category:
         await safe_send_message(update, context, "🚀 Что хотите улучшить?", reply_markup=upgrade_menu())
-    elif "🌐 Wi-Fi" in category:
+    elif "Wi-Fi" in category:
         await safe_send_message(update, context, "🌐 Какая помощь с Wi-Fi?", reply_markup=wifi_menu())
     elif "🔒 VPN" in category:
         await safe_send_message(update, context, "🔒 Какую услугу безопасности?", reply_markup=security_menu())
@@ -367,7 +699,7 @@ async def service_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     service = update.message.text
     user_id = update.effective_user.id
     
-    print(f"DEBUG: service_handler вызван для пользователя {user_id} с услугой: {service}")
+    logger.debug("service_selected", user_id=user_id, service=service)
     
     if user_id in user_requests:
         user_requests[user_id]["service"] = service
@@ -388,7 +720,7 @@ async def description_handler(update: Update, context: ContextTypes.DEFAULT_TYPE
     description = update.message.text
     user_id = update.effective_user.id
     
-    print(f"DEBUG: description_handler вызван для пользователя {user_id} с описанием: {description}")
+    logger.debug("description_received", user_id=user_id, description=description)
     
     if user_id in user_requests:
         # Ранняя валидация длины описания
@@ -409,7 +741,7 @@ async def work_format_handler(update: Update, context: ContextTypes.DEFAULT_TYPE
     work_format = update.message.text
     user_id = update.effective_user.id
     
-    print(f"DEBUG: work_format_handler вызван для пользователя {user_id} с форматом: {work_format}")
+    logger.debug("work_format_selected", user_id=user_id, work_format=work_format)
     
     if user_id in user_requests:
         user_requests[user_id]["work_format"] = work_format
@@ -431,7 +763,7 @@ async def time_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     time_preference = update.message.text
     user_id = update.effective_user.id
     
-    print(f"DEBUG: time_handler вызван для пользователя {user_id} с временем: {time_preference}")
+    logger.debug("time_selected", user_id=user_id, preferred_time=time_preference)
     
     if user_id in user_requests:
         user_requests[user_id]["preferred_time"] = time_preference
@@ -441,15 +773,11 @@ async def contact_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обработчик контактов"""
     user_id = update.effective_user.id
     
-    print(f"DEBUG: contact_handler вызван для пользователя {user_id}")
-    print(f"DEBUG: Тип сообщения: {'контакт' if update.message.contact else 'текст'}")
-    
     if update.message.contact:
         phone = update.message.contact.phone_number
-        print(f"DEBUG: Получен контакт: {phone}")
     else:
         phone = update.message.text
-        print(f"DEBUG: Получен текст: {phone}")
+    logger.debug("phone_received", user_id=user_id, source="contact" if update.message.contact else "text", phone=phone)
     
     if user_id in user_requests:
         user_requests[user_id]["phone"] = phone
@@ -474,7 +802,7 @@ async def confirm_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
     action = update.message.text
     
-    print(f"DEBUG: confirm_handler вызван для пользователя {user_id} с действием: {action}")
+    logger.debug("confirm_action", user_id=user_id, action=action)
     
     if user_id not in user_requests:
         await safe_send_message(update, context, "❌ Ошибка: нет активной заявки", reply_markup=main_menu())
@@ -513,7 +841,11 @@ async def confirm_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
         
         try:
             # Создаем заявку через API
-            api_response = await create_request_via_api(request, user_id)
+            # Ключ фиксируется до вызова: ответ API перезапишет request_id черновика
+            request.setdefault("idempotency_key", draft_idempotency_key(request))
+            api_response = await create_request_via_api(
+                request, user_id, request["idempotency_key"], Deadline(BOT_API_DEADLINE)
+            )
             
             # Обновляем локальные данные
             request.update(api_response)
@@ -534,63 +866,51 @@ async def confirm_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
             # Очищаем временные данные
             del user_requests[user_id]
             
-        except ValueError as e:
-            # Ошибка валидации API – оформляем заявку как "fallback" без БД, чтобы не потерять клиента
-            try:
-                request = user_requests[user_id]
-                request["status"] = "новая (fallback)"
-                request["updated_at"] = datetime.now().isoformat()
-                await send_request_to_channel(request, context)
-                await safe_send_message(update, context,
-                    "✅ Заявка принята!\n"
-                    "Наш менеджер свяжется с вами в ближайшее время.\n"
-                    "Примечание: были проблемы с обработкой данных, но мы уже получили вашу заявку.",
-                    reply_markup=main_menu()
-                )
-                # Уведомим админов о причине
-                for admin_id in ADMIN_IDS:
-                    try:
-                        await context.bot.send_message(admin_id, f"⚠️ Fallback-заявка: ошибка валидации API: {e}")
-                    except Exception:
-                        pass
-                del user_requests[user_id]
-            except Exception as inner_e:
-                print(f"Fallback error (validation): {inner_e}")
-                await safe_send_message(update, context,
-                    f"❌ Ошибка валидации данных: {str(e)}\n"
-                    "Пожалуйста, исправьте данные и попробуйте снова.",
-                    reply_markup=back_menu()
-                )
-            print(f"Ошибка валидации API: {e}")
-            
         except Exception as e:
-            # Общая ошибка – оформляем заявку в канал, чтобы не потерять клиента
+            # Отказ API по данным (4xx) или сбой (5xx, сеть, открытый автомат) –
+            # оформляем заявку как "fallback" без БД, чтобы не потерять клиента
+            rejected = isinstance(e, ApiError) and e.permanent
             try:
                 request = user_requests[user_id]
+                # В журнал — только то, что API сможет принять позже
+                if is_transient_failure(e):
+                    await spool_request(request, user_id)
                 request["status"] = "новая (fallback)"
                 request["updated_at"] = datetime.now().isoformat()
                 await send_request_to_channel(request, context)
+                note = "были проблемы с обработкой данных" if rejected else "на сервере возникла ошибка"
                 await safe_send_message(update, context,
                     "✅ Заявка принята!\n"
                     "Наш менеджер свяжется с вами в ближайшее время.\n"
-                    "Примечание: на сервере возникла ошибка, но мы уже получили вашу заявку.",
+                    f"Примечание: {note}, но мы уже получили вашу заявку.",
                     reply_markup=main_menu()
                 )
                 # Уведомим админов о причине
+                alert = f"⚠️ Fallback-заявка: ошибка валидации API: {e}" if rejected else f"🚨 Fallback-заявка: серверная ошибка: {e}"
                 for admin_id in ADMIN_IDS:
                     try:
-                        await context.bot.send_message(admin_id, f"🚨 Fallback-заявка: серверная ошибка: {e}")
+                        await context.bot.send_message(admin_id, alert)
                     except Exception:
                         pass
                 del user_requests[user_id]
             except Exception as inner_e:
-                print(f"Fallback error (general): {inner_e}")
-                await safe_send_message(update, context,
-                    "⚠️ Произошла ошибка при создании заявки.\n"
-                    "Пожалуйста, попробуйте позже или свяжитесь с поддержкой.",
-                    reply_markup=main_menu()
-                )
-            print(f"Ошибка при создании заявки: {e}")
+                logger.error("fallback_failed", reason="validation" if rejected else "general", error=str(inner_e))
+                if rejected:
+                    await safe_send_message(update, context,
+                        f"❌ Ошибка валидации данных: {str(e)}\n"
+                        "Пожалуйста, исправьте данные и попробуйте снова.",
+                        reply_markup=back_menu()
+                    )
+                else:
+                    await safe_send_message(update, context,
+                        "⚠️ Произошла ошибка при создании заявки.\n"
+                        "Пожалуйста, попробуйте позже или свяжитесь с поддержкой.",
+                        reply_markup=main_menu()
+                    )
+            if rejected:
+                logger.warning("api_validation_failed", user_id=user_id, error=str(e))
+            else:
+                logger.error("create_request_failed", user_id=user_id, error=str(e))
     
     elif action == "🔄 Изменить данные":
         # Возвращаемся в главное меню для изменения данных
@@ -605,7 +925,7 @@ async def back_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Универсальный обработчик 'Назад'"""
     user_id = update.effective_user.id
     
-    print(f"DEBUG: back_handler вызван для пользователя {user_id}")
+    logger.debug("back_pressed", user_id=user_id)
     
     if user_id not in user_requests:
         await safe_send_message(update, context, "🔧 Главное меню:", reply_markup=main_menu())
@@ -681,7 +1001,7 @@ async def back_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
             await safe_send_message(update, context, "📷 Какое устройство нужно настроить?", reply_markup=device_setup_menu())
         elif "🚀 Хочу апгрейд" in category:
             await safe_send_message(update, context, "🚀 Что хотите улучшить?", reply_markup=upgrade_menu())
-        elif "🌐 Wi-Fi" in category:
+        elif "Wi-Fi" in category:
             await safe_send_message(update, context, "🌐 Какая помощь с Wi-Fi?", reply_markup=wifi_menu())
         elif "🔒 VPN" in category:
             await safe_send_message(update, context, "🔒 Какую услугу безопасности?", reply_markup=security_menu())
@@ -701,7 +1021,7 @@ async def back_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
             await safe_send_message(update, context, "📷 Какое устройство нужно настроить?", reply_markup=device_setup_menu())
         elif "🚀 Хочу апгрейд" in category:
             await safe_send_message(update, context, "🚀 Что хотите улучшить?", reply_markup=upgrade_menu())
-        elif "🌐 Wi-Fi" in category:
+        elif "Wi-Fi" in category:
             await safe_send_message(update, context, "🌐 Какая помощь с Wi-Fi?", reply_markup=wifi_menu())
         elif "🔒 VPN" in category:
             await safe_send_message(update, context, "🔒 Какую услугу безопасности?", reply_markup=security_menu())
@@ -726,7 +1046,7 @@ async def text_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
     text = update.message.text
     
-    print(f"DEBUG: text_handler вызван для пользователя {user_id} с текстом: {text}")
+    logger.debug("text_received", user_id=user_id, text=text)
     
     # Если нет активной заявки
     if user_id not in user_requests:
@@ -823,7 +1143,7 @@ async def my_requests_handler(update: Update, context: ContextTypes.DEFAULT_TYPE
     user_id = update.effective_user.id
     text = update.message.text
     
-    print(f"DEBUG: my_requests_handler вызван для пользователя {user_id} с текстом: {text}")
+    logger.debug("my_requests_menu", user_id=user_id, action=text)
     
     # Обработка кнопок в меню "Мои заявки"
     if text == "📋 Активные заявки":
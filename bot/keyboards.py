@@ -1,4 +1,4 @@
-from telegram import ReplyKeyboardMarkup, ReplyKeyboardRemove, KeyboardButton
+from telegram import ReplyKeyboardMarkup, ReplyKeyboardRemove, KeyboardButton, InlineKeyboardButton, InlineKeyboardMarkup
 # ==============================================================================
 # ГЛАВНОЕ МЕНЮ
 # ==============================================================================
@@ -77,7 +77,7 @@ def pc_build_menu():
 def wifi_menu():
     """Слабый Wi-Fi / новый роутер"""
     keyboard = [
-        ["📶 Настроить Wi-Fi роутer", "🌐 Усилить сигнал"],
+        ["📶 Настроить Wi-Fi роутер", "🌐 Усилить сигнал"],
         ["🔐 Установить пароль", "📡 Новый роутер"],
         ["📱 Подключить устройства", "✍️ Свой вариант"],
         ["⬅️ Назад"]
@@ -149,6 +149,29 @@ def contact_menu():
     ]
     return ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
 # ==============================================================================
+# КНОПКИ МЕНЕДЖЕРОВ В ГРУППЕ ЗАЯВОК
+# ==============================================================================
+# callback_data: "req:<request_id>:<текущий статус>:<новый статус>" (не длиннее 64 байт);
+# текущий статус проверяется API: второе нажатие по той же кнопке получит отказ
+REQUEST_ACTION_PREFIX = "req"
+
+# Доступные действия по текущему статусу заявки
+REQUEST_ACTIONS = {
+    "new": [("✅ Принять в работу", "in_progress"), ("❌ Отклонить", "rejected")],
+    "in_progress": [("🏁 Выполнена", "completed"), ("❌ Отменить", "cancelled")],
+}
+
+def request_actions_keyboard(request_id: str, status: str):
+    """Inline-кнопки под сообщением заявки; None — действий больше нет"""
+    actions = REQUEST_ACTIONS.get(status)
+    if not actions:
+        return None
+    buttons = [
+        InlineKeyboardButton(label, callback_data=f"{REQUEST_ACTION_PREFIX}:{request_id}:{status}:{new_status}")
+        for label, new_status in actions
+    ]
+    return InlineKeyboardMarkup([buttons])
+# ==============================================================================
 # УНИВЕРСАЛЬНЫЕ МЕНЮ
 # ==============================================================================
 def back_menu():
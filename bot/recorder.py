@@ -0,0 +1,251 @@
+"""
+Запись входящих обновлений бота для последующего воспроизведения.
+
+Включается переменной BOT_RECORD_DIR. Каждое обновление вместе со временем
+обработки пишется в JSONL, сжатый gzip, с ротацией по размеру
+(BOT_RECORD_MAX_BYTES). Запись и сжатие идут в отдельном потоке, обработчики
+не ждут диска.
+
+Персональные данные вычищаются до записи:
+  - id пользователей и личных чатов заменяются псевдонимами (HMAC с солью,
+    общей для всех файлов одного запуска бота: диалог, пересекающий ротацию
+    по размеру, воспроизводится как один). Соль меняется раз в
+    BOT_RECORD_SALT_HOURS часов, с началом нового файла;
+  - имена и username заменяются на user<псевдоним>;
+  - свободный текст (описание, адрес, телефон) маскируется с сохранением
+    длины и формы: буквы -> "x", цифры -> "0". Кнопки меню и команды
+    остаются как есть, поэтому при воспроизведении срабатывают те же
+    обработчики и те же проверки длины.
+
+Воспроизведение: scripts/replay_updates.py.
+"""
+import glob
+import gzip
+import hashlib
+import hmac
+import json
+import os
+import queue
+import secrets
+import threading
+import time
+from typing import Any, Awaitable, Callable, Iterator, List, Optional
+
+import structlog
+from telegram import ReplyKeyboardMarkup
+from telegram.ext import SimpleUpdateProcessor
+
+from . import keyboards
+
+logger = structlog.get_logger("bot.recorder")
+
+_PSEUDONYM_BASE = 1_000_000_000
+_PSEUDONYM_RANGE = 1_000_000_000
+_known_texts: Optional[frozenset] = None
+
+
+def known_texts() -> frozenset:
+    """Тексты всех кнопок меню бота (их записываем без маскирования)"""
+    global _known_texts
+    if _known_texts is None:
+        texts = set()
+        for name in dir(keyboards):
+            factory = getattr(keyboards, name)
+            if not callable(factory) or not name.endswith("_menu"):
+                continue
+            markup = factory()
+            if isinstance(markup, ReplyKeyboardMarkup):
+                for row in markup.keyboard:
+                    texts.update(button.text for button in row)
+        _known_texts = frozenset(texts)
+    return _known_texts
+
+
+def mask_text(text: str) -> str:
+    """Маскирование свободного текста с сохранением длины и формы"""
+    if text in known_texts() or text.startswith("/"):
+        return text
+    return "".join("0" if char.isdigit() else "x" if char.isalpha() else char for char in text)
+
+
+class Scrubber:
+    """Удаление персональных данных из обновления (dict в формате Bot API)"""
+
+    def __init__(self, salt: bytes):
+        self.salt = salt
+
+    def pseudonym(self, value: int) -> int:
+        digest = hmac.new(self.salt, str(value).encode(), hashlib.sha256).digest()
+        return _PSEUDONYM_BASE + int.from_bytes(digest[:8], "big") % _PSEUDONYM_RANGE
+
+    def _user(self, user: dict) -> dict:
+        pseudo = self.pseudonym(user["id"])
+        scrubbed = {"id": pseudo, "is_bot": user.get("is_bot", False), "first_name": f"user{pseudo}"}
+        if user.get("username"):
+            scrubbed["username"] = f"user{pseudo}"
+        if user.get("language_code"):
+            scrubbed["language_code"] = user["language_code"]
+        return scrubbed
+
+    def _chat(self, chat: dict) -> dict:
+        if chat.get("type") == "private":
+            pseudo = self.pseudonym(chat["id"])
+            return {"id": pseudo, "type": "private", "first_name": f"user{pseudo}"}
+        # Группы менеджеров — не персональные данные
+        return {key: chat[key] for key in ("id", "type", "title") if key in chat}
+
+    def _entity(self, entity: dict) -> dict:
+        # Только разметка: url (text_link) и user (text_mention) — персональные данные
+        scrubbed = {key: entity[key] for key in ("type", "offset", "length") if key in entity}
+        if "user" in entity:
+            scrubbed["user"] = self._user(entity["user"])
+        return scrubbed
+
+    def _message(self, message: dict) -> dict:
+        scrubbed = {key: message[key] for key in ("message_id", "date") if key in message}
+        if "entities" in message:
+            scrubbed["entities"] = [self._entity(entity) for entity in message["entities"]]
+        if "chat" in message:
+            scrubbed["chat"] = self._chat(message["chat"])
+        if "from" in message:
+            scrubbed["from"] = self._user(message["from"])
+        if "text" in message:
+            scrubbed["text"] = mask_text(message["text"])
+        if "contact" in message:
+            contact = message["contact"]
+            scrubbed["contact"] = {
+                "phone_number": mask_text(contact.get("phone_number", "")),
+                "first_name": "contact",
+            }
+            if contact.get("user_id"):
+                scrubbed["contact"]["user_id"] = self.pseudonym(contact["user_id"])
+        return scrubbed
+
+    def scrub(self, update: dict) -> dict:
+        scrubbed: dict = {"update_id": update["update_id"]}
+        for key in ("message", "edited_message"):
+            if key in update:
+                scrubbed[key] = self._message(update[key])
+        if "callback_query" in update:
+            query = update["callback_query"]
+            scrubbed["callback_query"] = {
+                "id": query["id"],
+                "chat_instance": query.get("chat_instance", ""),
+                "from": self._user(query["from"]),
+                "data": query.get("data"),
+            }
+            if "message" in query:
+                scrubbed["callback_query"]["message"] = self._message(query["message"])
+        return scrubbed
+
+
+class UpdateRecorder:
+    """Журнал обновлений: фоновая запись в gzip JSONL с ротацией по размеру"""
+
+    def __init__(self, directory: str, max_bytes: int = 50 * 1024 * 1024, salt_ttl: float = 24 * 3600):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.salt_ttl = salt_ttl
+        self._queue: "queue.SimpleQueue[Optional[dict]]" = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._writer, name="update-recorder", daemon=True)
+        self._file = None
+        self._scrubber: Optional[Scrubber] = None
+        self._salt_at = 0.0
+        self._written = 0
+        os.makedirs(directory, exist_ok=True)
+        self._thread.start()
+
+    def record(self, update: dict, started: float, duration_ms: float) -> None:
+        """Постановка записи в очередь (из обработчика; без ожидания диска)"""
+        self._queue.put({"ts": started, "duration_ms": round(duration_ms, 3), "update": update})
+
+    def _open(self) -> None:
+        if self._file is not None:
+            self._file.close()
+        name = time.strftime("updates-%Y%m%d-%H%M%S", time.gmtime())
+        path = os.path.join(self.directory, f"{name}-{secrets.token_hex(3)}.jsonl.gz")
+        self._file = gzip.open(path, "wt", encoding="utf-8")
+        self._written = 0
+
+    def _rotate_salt(self) -> None:
+        """Новая соль: псевдонимы не связываются между периодами salt_ttl"""
+        self._scrubber = Scrubber(secrets.token_bytes(16))
+        self._salt_at = time.monotonic()
+
+    def _writer(self) -> None:
+        while True:
+            entry = self._queue.get()
+            if entry is None:
+                break
+            if self._scrubber is None or time.monotonic() - self._salt_at >= self.salt_ttl:
+                # Файл начинается вместе с солью: в одном файле один набор псевдонимов
+                self._rotate_salt()
+                self._open()
+            elif self._written >= self.max_bytes:
+                self._open()
+            try:
+                entry["update"] = self._scrubber.scrub(entry["update"])
+                line = json.dumps(entry, ensure_ascii=False) + "\n"
+            except Exception as e:
+                logger.warning("update_record_failed", error=str(e))
+                continue
+            self._file.write(line)
+            self._written += len(line.encode("utf-8"))
+            if self._queue.empty():
+                self._file.flush()
+        if self._file is not None:
+            self._file.close()
+
+    def close(self) -> None:
+        self._queue.put(None)
+        self._thread.join(timeout=10)
+
+
+class RecordingUpdateProcessor(SimpleUpdateProcessor):
+    """Обработка обновлений как по умолчанию (по одному) с замером времени.
+
+    on_processed(update, started, duration_ms) вызывается после каждого
+    обновления: запись в журнал или сбор статистики при воспроизведении.
+    """
+
+    def __init__(self, on_processed: Callable[[Any, float, float], None], max_concurrent_updates: int = 1):
+        super().__init__(max_concurrent_updates)
+        self.on_processed = on_processed
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        started = time.time()
+        began = time.perf_counter()
+        try:
+            await coroutine
+        finally:
+            self.on_processed(update, started, (time.perf_counter() - began) * 1000)
+
+
+def recording_processor(recorder: UpdateRecorder) -> RecordingUpdateProcessor:
+    def on_processed(update, started, duration_ms):
+        if hasattr(update, "to_dict"):
+            recorder.record(update.to_dict(), started, duration_ms)
+
+    return RecordingUpdateProcessor(on_processed)
+
+
+def read_log(paths: List[str]) -> Iterator[dict]:
+    """Записи журналов (файлы или каталоги) в порядке времени обработки"""
+    files: List[str] = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(glob.glob(os.path.join(path, "*.jsonl.gz"))))
+        else:
+            files.append(path)
+    entries = []
+    for path in files:
+        opener = gzip.open if path.endswith(".gz") else open
+        with opener(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    # Недописанная строка (процесс остановлен во время записи)
+                    continue
+    entries.sort(key=lambda entry: entry["ts"])
+    return iter(entries)
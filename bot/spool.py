@@ -0,0 +1,194 @@
+"""
+Локальный журнал заявок, которые не удалось сохранить через API.
+
+Если API недоступен, заявка уходит в группу как "fallback" и записывается
+в журнал (JSONL, только дозапись, fsync после каждой записи). Фоновая
+задача переотправляет записи в API, как только он снова отвечает, с тем же
+Idempotency-Key, что и исходная попытка: заявка, которую API всё-таки
+успел сохранить, не задвоится.
+
+Записи журнала:
+  {"op": "add", "key": ..., "telegram_id": ..., "draft": {...}, "ts": ...}
+  {"op": "done", "key": ..., "request_id": ..., "ts": ...}   — сохранена в БД
+  {"op": "dead", "key": ..., "error": ..., "ts": ...}        — API отклонил данные,
+                                                              черновик копируется в <путь>.dead
+
+Журнал сжимается (переписывается только с ожидающими записями), когда
+ожидающих не остаётся или накапливается много завершённых. Запись и fsync
+выполняются в отдельном потоке под блокировкой, не останавливая цикл событий.
+
+Черновики содержат персональные данные (телефон, адрес), поэтому файлы
+журнала создаются с правами 0600. Хранение: черновик остаётся в журнале,
+пока заявка не сохранена в БД или не отклонена, и удаляется при ближайшем
+сжатии. Отклонённые черновики копятся в <путь>.dead до ручного разбора —
+после обработки файл нужно удалить.
+"""
+import asyncio
+import json
+import os
+import time
+from typing import Awaitable, Callable, Dict, Optional
+
+import structlog
+from prometheus_client import Counter, Gauge
+
+logger = structlog.get_logger("bot.spool")
+
+SPOOL_DEPTH = Gauge(
+    "fixfix_bot_spool_depth",
+    "Заявки в локальном журнале, ожидающие отправки в API",
+)
+SPOOL_OLDEST_AGE = Gauge(
+    "fixfix_bot_spool_oldest_age_seconds",
+    "Возраст самой старой ожидающей заявки в журнале",
+)
+SPOOL_REPLAYED = Counter(
+    "fixfix_bot_spool_replayed_total",
+    "Переотправки заявок из журнала",
+    ["result"],
+)
+
+
+class SpoolRejected(Exception):
+    """API отклонил заявку окончательно (повтор не поможет)"""
+
+
+class RequestSpool:
+    """Журнал неотправленных заявок на диске"""
+
+    def __init__(self, path: str, compact_after: int = 1000):
+        self.path = path
+        self.compact_after = compact_after
+        self._pending: Dict[str, dict] = {}
+        self._finished = 0
+        self._lock = asyncio.Lock()
+        self._load()
+        SPOOL_DEPTH.set_function(lambda: len(self._pending))
+        SPOOL_OLDEST_AGE.set_function(self.oldest_age)
+
+    def _load(self) -> None:
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "rb") as f:
+            data = f.read()
+        complete = data.rfind(b"\n") + 1
+        if complete < len(data):
+            # Недописанная строка после сбоя отрезается: иначе следующая запись склеится с ней
+            logger.warning("spool_tail_truncated", size=len(data) - complete)
+            with open(self.path, "r+b") as f:
+                f.truncate(complete)
+        for line in data[:complete].splitlines():
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                # Испорченная строка
+                continue
+            if entry.get("op") == "add":
+                self._pending[entry["key"]] = entry
+            else:
+                self._pending.pop(entry.get("key"), None)
+                self._finished += 1
+
+    @staticmethod
+    def _write(path: str, entries: list, mode: int) -> None:
+        """Запись строк с fsync; файл создаётся с правами 0600 (вызывается в потоке)"""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | mode, 0o600)
+        # Файл мог остаться от версии, создававшей его с правами по умолчанию
+        os.fchmod(fd, 0o600)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write("".join(json.dumps(entry, ensure_ascii=False) + "\n" for entry in entries))
+            f.flush()
+            os.fsync(f.fileno())
+
+    async def _append(self, entry: dict, path: Optional[str] = None) -> None:
+        await asyncio.to_thread(self._write, path or self.path, [entry], os.O_APPEND)
+
+    async def add(self, key: str, telegram_id: int, draft: dict) -> None:
+        """Запись заявки в журнал; после возврата она переживёт перезапуск"""
+        async with self._lock:
+            if key in self._pending:
+                return
+            entry = {"op": "add", "key": key, "telegram_id": telegram_id, "draft": draft, "ts": time.time()}
+            await self._append(entry)
+            self._pending[key] = entry
+
+    async def _finish(self, key: str, entry: dict) -> None:
+        await self._append(entry)
+        self._pending.pop(key, None)
+        self._finished += 1
+        if not self._pending or self._finished >= self.compact_after:
+            await asyncio.to_thread(self._compact)
+
+    async def mark_done(self, key: str, request_id: Optional[str]) -> None:
+        async with self._lock:
+            await self._finish(key, {"op": "done", "key": key, "request_id": request_id, "ts": time.time()})
+
+    async def mark_dead(self, key: str, error: str) -> None:
+        async with self._lock:
+            # Черновик сохраняется отдельно для ручного разбора: сжатие журнала его не удалит
+            entry = self._pending.get(key)
+            if entry is not None:
+                await self._append({**entry, "op": "dead", "error": error}, f"{self.path}.dead")
+            await self._finish(key, {"op": "dead", "key": key, "error": error, "ts": time.time()})
+
+    async def compact(self) -> None:
+        """Переписывает журнал, оставляя только ожидающие записи"""
+        async with self._lock:
+            await asyncio.to_thread(self._compact)
+
+    def _compact(self) -> None:
+        tmp_path = f"{self.path}.tmp"
+        self._write(tmp_path, list(self._pending.values()), os.O_TRUNC)
+        os.replace(tmp_path, self.path)
+        directory_fd = os.open(os.path.dirname(os.path.abspath(self.path)), os.O_RDONLY)
+        try:
+            os.fsync(directory_fd)
+        finally:
+            os.close(directory_fd)
+        self._finished = 0
+
+    def pending(self) -> list:
+        """Ожидающие записи в порядке поступления"""
+        return list(self._pending.values())
+
+    def oldest_age(self) -> float:
+        if not self._pending:
+            return 0.0
+        return time.time() - min(entry["ts"] for entry in self._pending.values())
+
+    async def replay_once(self, submit: Callable[[dict], Awaitable[Optional[str]]]) -> int:
+        """Переотправка ожидающих записей; до первой временной ошибки.
+
+        submit возвращает request_id сохранённой заявки, бросает SpoolRejected,
+        если данные отклонены, и любое другое исключение — если API пока недоступен.
+        Возвращает число сохранённых заявок.
+        """
+        saved = 0
+        for entry in self.pending():
+            try:
+                request_id = await submit(entry)
+            except SpoolRejected as e:
+                await self.mark_dead(entry["key"], str(e))
+                SPOOL_REPLAYED.labels("rejected").inc()
+                logger.warning("spool_entry_rejected", key=entry["key"], error=str(e))
+                continue
+            except Exception as e:
+                SPOOL_REPLAYED.labels("retry").inc()
+                logger.info("spool_replay_postponed", error=str(e))
+                break
+            await self.mark_done(entry["key"], request_id)
+            SPOOL_REPLAYED.labels("saved").inc()
+            saved += 1
+        return saved
+
+    async def run(self, submit: Callable[[dict], Awaitable[Optional[str]]], interval: float = 30.0) -> None:
+        """Фоновая переотправка журнала каждые interval секунд"""
+        while True:
+            if self._pending:
+                saved = await self.replay_once(submit)
+                if saved:
+                    logger.info("spool_replayed", saved=saved, pending=len(self._pending))
+            await asyncio.sleep(interval)
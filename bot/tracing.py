@@ -0,0 +1,77 @@
+"""
+Трассировка бота: обработчик обновления -> вызовы API и Bot API.
+
+Включается переменной BOT_TRACE_EXPORTER (file | otlp). Каждый обработчик
+обновления — корневой спан трассы; вызовы API (call_api) — дочерние спаны,
+их traceparent передаётся в API, и трасса продолжается там до SQL.
+Вызовы Bot API — дочерние спаны "telegram <метод>" (URL с токеном не
+записывается). Спаны, семплирование и выгрузка — app.tracing.
+"""
+import os
+from typing import Tuple
+
+from telegram.ext import Application
+from telegram.request import HTTPXRequest
+
+from app.tracing import CLIENT, CONSUMER, create_exporter, tracer
+
+
+def configure_from_env() -> bool:
+    """Настройка трассировки по переменным BOT_TRACE_*; True — включена"""
+    exporter = create_exporter(
+        os.getenv("BOT_TRACE_EXPORTER", ""),
+        os.getenv("BOT_TRACE_FILE", "logs/traces-bot.jsonl"),
+        os.getenv("BOT_TRACE_OTLP_URL", "http://localhost:4318/v1/traces"),
+    )
+    if exporter is None:
+        return False
+    tracer.configure(
+        "fixfix-bot",
+        exporter,
+        slow_ms=float(os.getenv("BOT_TRACE_SLOW_MS", "1000")),
+        sample_rate=float(os.getenv("BOT_TRACE_SAMPLE_RATE", "0.01")),
+    )
+    return True
+
+
+def _update_kind(update) -> str:
+    for kind in ("message", "callback_query", "edited_message", "channel_post", "my_chat_member"):
+        if getattr(update, kind, None) is not None:
+            return kind
+    return "other"
+
+
+def _traced_callback(callback):
+    name = f"bot {getattr(callback, '__name__', type(callback).__name__)}"
+
+    async def wrapper(update, context):
+        attributes = {
+            "bot.update_id": getattr(update, "update_id", 0),
+            "bot.update_kind": _update_kind(update),
+        }
+        with tracer.span(name, CONSUMER, attributes):
+            return await callback(update, context)
+
+    wrapper.__name__ = getattr(callback, "__name__", "callback")
+    return wrapper
+
+
+def trace_handlers(application: Application) -> None:
+    """Корневой спан на каждый вызов зарегистрированного обработчика"""
+    for handlers in application.handlers.values():
+        for handler in handlers:
+            handler.callback = _traced_callback(handler.callback)
+
+
+class TracingRequest(HTTPXRequest):
+    """HTTPXRequest со спаном на вызов Bot API"""
+
+    async def do_request(self, url: str, method: str, request_data=None, **kwargs) -> Tuple[int, bytes]:
+        # url — .../bot<token>/<метод>: в спан попадает только имя метода
+        api_method = url.rsplit("/", 1)[-1]
+        with tracer.child_span(f"telegram {api_method}", CLIENT, {"telegram.method": api_method}) as span:
+            code, payload = await super().do_request(url, method, request_data, **kwargs)
+            span.set_attribute("http.status_code", code)
+            if code >= 500:
+                span.record_error(f"HTTP {code}")
+            return code, payload
@@ -661,7 +661,14 @@ async def main():
         return
     
     # Создаем приложение
-    application = Application.builder().token(token).build()
+    api_url = settings.telegram.api_url.rstrip("/")
+    application = (
+        Application.builder()
+        .token(token)
+        .base_url(f"{api_url}/bot")
+        .base_file_url(f"{api_url}/file/bot")
+        .build()
+    )
     
     # Команды
     application.add_handler(CommandHandler("start", start_handler))
@@ -0,0 +1,30 @@
+"""
+Общие фикстуры pytest
+"""
+from contextlib import contextmanager
+
+import pytest
+
+
+@pytest.fixture
+def query_budget():
+    """Бюджет SQL-запросов на блок кода.
+
+        with query_budget(3, "GET /requests/{id}"):
+            response = await client.get(...)
+
+    Считаются все запросы движка app.database.connection в блоке, включая
+    выполненные внутри ASGI-приложения (httpx.ASGITransport работает в той
+    же задаче). При превышении тест падает со списком нормализованного SQL.
+    """
+    from app.query_stats import query_scope
+
+    @contextmanager
+    def budget(limit: int, label: str = "test"):
+        with query_scope(label, keep_statements=True) as stats:
+            yield stats
+        assert stats.count <= limit, (
+            f"{label}: {stats.count} SQL-запросов при бюджете {limit}:\n  " + "\n  ".join(stats.statements)
+        )
+
+    return budget
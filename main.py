@@ -1,34 +1,67 @@
 import sys
 import os
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+import asyncio
 import logging
 from dotenv import load_dotenv
+from prometheus_client import start_http_server
 from telegram import Update
-from telegram.ext import Application, CommandHandler, MessageHandler, filters
+from telegram.ext import Application, CallbackQueryHandler, CommandHandler, MessageHandler, filters
 from bot.handlers import *
 from bot.keyboards import *
+from bot.recorder import UpdateRecorder, recording_processor
+from bot.tracing import TracingRequest, configure_from_env, trace_handlers, tracer
+from app.logging_config import configure_logging
+from app.loop_monitor import LoopMonitor
 
 # Загрузка переменных окружения
 load_dotenv()
 
-# Включаем логирование
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.INFO
-)
+# Включаем логирование: JSON через очередь, уровни и семплирование меняются командой /log
+configure_logging(os.getenv("BOT_LOG_LEVEL", "INFO"), sampling=os.getenv("BOT_LOG_SAMPLING", ""))
 logger = logging.getLogger(__name__)
 
-def main():
-    """Запуск бота"""
-    # Получаем токен
-    token = os.getenv("TELEGRAM_TOKEN")
-    if not token:
-        logger.error("Токен не найден!")
-        return
-    
-    # Создаем приложение
-    application = Application.builder().token(token).build()
-    
+async def on_startup(application: Application):
+    """Метрики бота, монитор цикла событий, уведомления об автомате API и фоновая переотправка журнала"""
+    metrics_port = os.getenv("BOT_METRICS_PORT")
+    if metrics_port:
+        start_http_server(int(metrics_port))
+    # Задержка цикла событий; BOT_LOOP_DEBUG — поиск блокирующих вызовов в обработчиках
+    loop_monitor = LoopMonitor(
+        interval=float(os.getenv("BOT_LOOP_LAG_INTERVAL", "0.25")),
+        stall_ms=float(os.getenv("BOT_LOOP_STALL_MS", "100")),
+        debug=os.getenv("BOT_LOOP_DEBUG", "false").lower() in ("1", "true", "yes"),
+    )
+    loop_monitor.start()
+    application.bot_data["loop_monitor"] = loop_monitor
+    api_breaker.on_change = lambda previous, state: application.create_task(
+        alert_admins_api_circuit(application.bot, previous, state)
+    )
+    application.bot_data["spool_task"] = asyncio.create_task(
+        request_spool.run(submit_spooled_request, BOT_SPOOL_REPLAY_INTERVAL)
+    )
+
+async def on_shutdown(application: Application):
+    task = application.bot_data.pop("spool_task", None)
+    if task is not None:
+        # Переотправка завершается до закрытия клиента API
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+    await close_api_client()
+    loop_monitor = application.bot_data.pop("loop_monitor", None)
+    if loop_monitor is not None:
+        await loop_monitor.stop()
+    recorder = application.bot_data.pop("update_recorder", None)
+    if recorder is not None:
+        recorder.close()
+    tracer.shutdown()
+
+def add_handlers(application: Application):
+    """Регистрация обработчиков (общая для бота и scripts/replay_updates.py)"""
+
     # Команды
     application.add_handler(CommandHandler("start", start_handler))
     application.add_handler(CommandHandler("test", test_specific_handler))
@@ -36,6 +69,8 @@ def main():
     application.add_handler(CommandHandler("config", check_config_handler))
     application.add_handler(CommandHandler("debug", debug_state_handler))
     application.add_handler(CommandHandler("check", check_command_handler))
+    application.add_handler(CommandHandler("profile", profile_command_handler, block=False))
+    application.add_handler(CommandHandler("log", log_command_handler))
     
     # Обработчики главного меню
     application.add_handler(MessageHandler(filters.Regex(r'^🔴 Компьютер глючит/не работает$'), category_handler))
@@ -70,10 +105,55 @@ def main():
     # Обработчик кнопки "Назад"
     application.add_handler(MessageHandler(filters.Regex(r'^⬅️ Назад$'), back_handler))
     
+    # Inline-кнопки менеджеров под заявками в группе
+    application.add_handler(CallbackQueryHandler(request_action_handler, pattern=rf"^{REQUEST_ACTION_PREFIX}:"))
+    
     # Обработчик текстовых сообщений (должен быть последним)
     application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, text_handler))
     # Обработчик для получения chat_id
     application.add_handler(CommandHandler("chatid", get_chat_id_handler))
+
+def main():
+    """Запуск бота"""
+    # Получаем токен
+    token = os.getenv("TELEGRAM_TOKEN")
+    if not token:
+        logger.error("Токен не найден!")
+        return
+    
+    # Создаем приложение
+    # TELEGRAM_API_URL — адрес Bot API (например, локальная замена scripts/fake_telegram_api.py)
+    api_url = os.getenv("TELEGRAM_API_URL", "https://api.telegram.org").rstrip("/")
+    builder = (
+        Application.builder()
+        .token(token)
+        .base_url(f"{api_url}/bot")
+        .base_file_url(f"{api_url}/file/bot")
+        .post_init(on_startup)
+        .post_shutdown(on_shutdown)
+    )
+    # BOT_RECORD_DIR — запись входящих обновлений для воспроизведения (bot/recorder.py)
+    record_dir = os.getenv("BOT_RECORD_DIR")
+    recorder = None
+    if record_dir:
+        recorder = UpdateRecorder(
+            record_dir,
+            int(os.getenv("BOT_RECORD_MAX_BYTES", str(50 * 1024 * 1024))),
+            float(os.getenv("BOT_RECORD_SALT_HOURS", "24")) * 3600,
+        )
+        builder = builder.concurrent_updates(recording_processor(recorder))
+        logger.info("Запись обновлений в %s", record_dir)
+    # BOT_TRACE_EXPORTER — трассировка обработчиков и вызовов API/Bot API (bot/tracing.py)
+    tracing = configure_from_env()
+    if tracing:
+        builder = builder.request(TracingRequest(connection_pool_size=256))
+        logger.info("Трассировка включена: %s", os.getenv("BOT_TRACE_EXPORTER"))
+    application = builder.build()
+    if recorder is not None:
+        application.bot_data["update_recorder"] = recorder
+    add_handlers(application)
+    if tracing:
+        trace_handlers(application)
     
     # Запускаем бота
     application.run_polling()
@@ -0,0 +1,53 @@
+"""
+Общие утилиты бенчмарков: прямой вызов ASGI приложения без сети.
+"""
+import asyncio
+import time
+from typing import Callable
+
+
+def make_scope(path: str, method: str = "GET", query_string: bytes = b"") -> dict:
+    """HTTP scope, как его формирует uvicorn"""
+    return {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "server": ("bench", 80),
+        "client": ("127.0.0.1", 50000),
+        "root_path": "",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": query_string,
+        "headers": [(b"host", b"bench"), (b"user-agent", b"bench/1.0")],
+    }
+
+
+async def drive(app, requests: int, make_path: Callable[[int], str], warmup: int = 200) -> float:
+    """Последовательный прогон запросов, возвращает среднее время (мкс) на запрос"""
+    never = asyncio.Event()
+
+    def make_receive():
+        sent = False
+
+        async def receive():
+            nonlocal sent
+            if not sent:
+                sent = True
+                return {"type": "http.request", "body": b"", "more_body": False}
+            # Как у настоящего сервера: ждём отключения клиента
+            await never.wait()
+
+        return receive
+
+    async def send(message):
+        pass
+
+    for i in range(warmup):
+        await app(make_scope(make_path(i)), make_receive(), send)
+
+    started = time.perf_counter()
+    for i in range(requests):
+        await app(make_scope(make_path(i)), make_receive(), send)
+    return (time.perf_counter() - started) / requests * 1_000_000
@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+"""
+Пересчёт агрегата статистики заявок (request_stats_hourly) из таблицы requests.
+
+Нужен после ручных правок заявок в БД или восстановления из бэкапа.
+Период пересчитывается по суткам в коротких транзакциях; на время
+пересчёта суток запись в агрегат ждёт.
+
+Как запускать (в контейнере):
+  docker-compose exec app python scripts/backfill_stats.py
+  docker-compose exec app python scripts/backfill_stats.py --from 2024-01-01 --to 2024-01-31
+"""
+import argparse
+import asyncio
+import os
+import sys
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.database.connection import AsyncSessionLocal, close_db, init_db
+from app.services.stats_service import StatsService
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--from", dest="date_from", help="Начало периода YYYY-MM-DD (по умолчанию — с первой заявки)")
+    parser.add_argument("--to", dest="date_to", help="Конец периода YYYY-MM-DD включительно (по умолчанию — сейчас)")
+    args = parser.parse_args()
+
+    date_from = datetime.strptime(args.date_from, "%Y-%m-%d") if args.date_from else None
+    date_to = datetime.strptime(args.date_to, "%Y-%m-%d") + timedelta(days=1) if args.date_to else None
+
+    try:
+        await init_db()
+        async with AsyncSessionLocal() as db:
+            buckets = await StatsService(db).backfill(date_from, date_to)
+        print(f"Пересчитано бакетов: {buckets}")
+    finally:
+        await close_db()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
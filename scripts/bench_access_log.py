@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк накладных расходов логирования HTTP запросов.
+
+Сравнивает на минимальном FastAPI приложении (без БД и сети):
+  - bare    — без middleware логирования
+  - legacy  — прежний log_requests: две JSON-записи structlog, рендеринг
+              и запись синхронно на event loop
+  - access  — AccessLogMiddleware с записью через очередь
+
+Запросы подаются напрямую в ASGI приложение, логи пишутся в /dev/null.
+
+Как запускать:
+  python scripts/bench_access_log.py --requests 20000
+"""
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import structlog
+from fastapi import FastAPI, Request
+
+from app.access_log import AccessLogMiddleware
+from app.logging_config import configure_logging, shutdown_logging
+from asgi_bench import drive
+
+
+def build_app(variant: str, devnull) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/api/v1/requests/{request_id}")
+    async def get_request(request_id: str):
+        return {"request_id": request_id}
+
+    if variant == "legacy":
+        handler = logging.StreamHandler(devnull)
+        legacy_stdlib = logging.getLogger("bench.legacy")
+        legacy_stdlib.handlers = [handler]
+        legacy_stdlib.propagate = False
+        legacy_stdlib.setLevel(logging.INFO)
+        logger = structlog.wrap_logger(
+            legacy_stdlib,
+            processors=[
+                structlog.stdlib.filter_by_level,
+                structlog.stdlib.add_logger_name,
+                structlog.stdlib.add_log_level,
+                structlog.stdlib.PositionalArgumentsFormatter(),
+                structlog.processors.TimeStamper(fmt="iso"),
+                structlog.processors.StackInfoRenderer(),
+                structlog.processors.format_exc_info,
+                structlog.processors.UnicodeDecoder(),
+                structlog.processors.JSONRenderer(),
+            ],
+            wrapper_class=structlog.stdlib.BoundLogger,
+        )
+
+        @app.middleware("http")
+        async def log_requests(request: Request, call_next):
+            start_time = time.time()
+            logger.info(
+                "HTTP Request",
+                method=request.method,
+                url=str(request.url),
+                client_ip=request.client.host if request.client else None,
+                user_agent=request.headers.get("user-agent"),
+            )
+            response = await call_next(request)
+            logger.info(
+                "HTTP Response",
+                method=request.method,
+                url=str(request.url),
+                status_code=response.status_code,
+                process_time=time.time() - start_time,
+            )
+            return response
+
+    elif variant == "access":
+        app.add_middleware(AccessLogMiddleware)
+
+    return app
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=20000, help="Количество запросов на вариант")
+    args = parser.parse_args()
+
+    with open(os.devnull, "w") as devnull:
+        configure_logging("INFO", stream=devnull)
+        results = {}
+        for variant in ("bare", "legacy", "access"):
+            app = build_app(variant, devnull)
+            results[variant] = asyncio.run(drive(app, args.requests, lambda i: f"/api/v1/requests/FF-{i:08d}"))
+        shutdown_logging()
+
+    bare = results["bare"]
+    print(f"{'variant':<8} {'us/request':>12} {'overhead us':>12}")
+    for variant, per_request in results.items():
+        print(f"{variant:<8} {per_request:>12.1f} {per_request - bare:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+Сквозной бенчмарк бота без Telegram: поддельный Bot API + сценарии пользователей.
+
+Поднимает scripts/fake_telegram_api.py в этом процессе, запускает бота
+(main.py) отдельным процессом с TELEGRAM_API_URL на поддельный сервер и
+прогоняет --users пользователей по сценарию создания заявки: каждое
+сообщение пользователя подкладывается в getUpdates, шаг завершается
+ответом бота в чат пользователя. Печатает updates/s и p50/p95/p99 времени
+от обновления до ответа — по шагам и в целом, а также вызовы Bot API.
+
+API заявок берётся из API_BASE_URL (как у бота). Если API не запущен,
+подтверждение проходит по fallback-пути (журнал во временном файле).
+
+Как запускать:
+  python scripts/bench_bot_flow.py --users 200 --ramp-ms 20
+  python scripts/bench_bot_flow.py --users 100 --latency-ms 40 --jitter-ms 20 --rate-429 0.01
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_telegram_api import (
+    FakeTelegramServer,
+    add_arguments,
+    build_server,
+    launch_bot,
+    start_http,
+    stop_bot,
+    wait_for_polling,
+)
+
+USER_ID_BASE = 700_000_000
+GROUP_ID = -100_000_000_001
+
+# Сценарии: (шаг, текст пользователя)
+FLOWS = {
+    "remote": [
+        ("start", "/start"),
+        ("category", "🚀 Хочу апгрейд"),
+        ("service", "💾 Увеличить оперативную память"),
+        ("description", "Нужно увеличить память ноутбука до 32 ГБ"),
+        ("work_format", "💻 Удаленная помощь"),
+        ("phone", "+7 999 000-11-22"),
+        ("confirm", "✅ Подтвердить заявку"),
+    ],
+    "home_visit": [
+        ("start", "/start"),
+        ("category", "🔴 Компьютер глючит/не работает"),
+        ("service", "💻 Тормозит/Не включается"),
+        ("description", "Компьютер не включается после грозы"),
+        ("work_format", "🏠 Выезд на дом"),
+        ("address", "ул. Тестовая, д. 1, кв. 2"),
+        ("time", "☀️ День (12:00-18:00)"),
+        ("phone", "+7 999 000-33-44"),
+        ("confirm", "✅ Подтвердить заявку"),
+    ],
+}
+
+
+def make_update(user_id: int, text: str) -> dict:
+    message = {
+        "message_id": random.randint(1, 2**31),
+        "date": int(time.time()),
+        "chat": {"id": user_id, "type": "private"},
+        "from": {"id": user_id, "is_bot": False, "first_name": f"User{user_id}", "username": f"user{user_id}"},
+        "text": text,
+    }
+    if text.startswith("/"):
+        message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+    return {"message": message}
+
+
+def percentile(values: list, pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+async def run_user(server: FakeTelegramServer, index: int, flow: list, args, latencies: dict, outcome: Counter) -> None:
+    user_id = USER_ID_BASE + index
+    for step, text in flow:
+        reply = server.wait_for_message(user_id)
+        started = time.perf_counter()
+        server.push_update(make_update(user_id, text))
+        try:
+            await asyncio.wait_for(reply, args.step_timeout)
+        except asyncio.TimeoutError:
+            outcome[f"timeout:{step}"] += 1
+            return
+        latencies[step].append((time.perf_counter() - started) * 1000)
+        if args.think_ms:
+            await asyncio.sleep(random.uniform(0, 2 * args.think_ms) / 1000)
+    outcome["completed"] += 1
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=100, help="Число пользователей")
+    parser.add_argument("--ramp-ms", type=float, default=10.0, help="Интервал между стартами пользователей, мс")
+    parser.add_argument("--think-ms", type=float, default=0.0, help="Средняя пауза пользователя между шагами, мс")
+    parser.add_argument("--step-timeout", type=float, default=15.0, help="Ожидание ответа бота на шаг, с")
+    parser.add_argument("--port", type=int, default=8081, help="Порт поддельного Bot API")
+    parser.add_argument("--bot-log", default=os.devnull, help="Файл для stdout/stderr бота")
+    parser.add_argument("--json", action="store_true", help="Отчёт в JSON")
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    server = build_server(args)
+    http_server, server_task = await start_http(server, args.port)
+
+    spool_dir = tempfile.mkdtemp(prefix="bench_bot_flow_")
+    env = {
+        "REQUESTS_GROUP_ID": str(GROUP_ID),
+        "ADMIN_IDS": "1",
+        "BOT_SPOOL_PATH": os.path.join(spool_dir, "spool.jsonl"),
+    }
+    log = open(args.bot_log, "w")
+    process = await launch_bot(args.port, log, env)
+    try:
+        await wait_for_polling(server, process)
+        latencies = defaultdict(list)
+        outcome: Counter = Counter()
+        flows = list(FLOWS.values())
+        calls_before = len(server.calls)
+
+        async def delayed(index: int) -> None:
+            await asyncio.sleep(index * args.ramp_ms / 1000)
+            await run_user(server, index, flows[index % len(flows)], args, latencies, outcome)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(delayed(index) for index in range(args.users)))
+        elapsed = time.perf_counter() - started
+    finally:
+        await stop_bot(process)
+        log.close()
+        http_server.should_exit = True
+        await server_task
+
+    all_latencies = [value for values in latencies.values() for value in values]
+    calls = Counter(
+        (call["method"], call["status"]) for call in server.calls[calls_before:] if call["method"] != "getUpdates"
+    )
+    report = {
+        "users": args.users,
+        "elapsed_s": round(elapsed, 3),
+        "updates": len(all_latencies),
+        "updates_per_s": round(len(all_latencies) / elapsed, 1) if elapsed else 0.0,
+        "outcome": dict(outcome),
+        "latency_ms": {
+            step: {
+                "count": len(values),
+                "p50": round(statistics.median(values), 1),
+                "p95": round(percentile(values, 95), 1),
+                "p99": round(percentile(values, 99), 1),
+            }
+            for step, values in list(latencies.items()) + [("all", all_latencies)]
+            if values
+        },
+        "bot_api_calls": {f"{method} {status}": count for (method, status), count in sorted(calls.items())},
+    }
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+        return
+
+    print(f"Пользователей: {args.users}, обновлений: {report['updates']}, за {elapsed:.1f} с "
+          f"-> {report['updates_per_s']} updates/s")
+    print(f"Итоги: {dict(outcome)}")
+    print(f"\n{'step':<12} {'count':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for step, stats in report["latency_ms"].items():
+        print(f"{step:<12} {stats['count']:>6} {stats['p50']:>8.1f} {stats['p95']:>8.1f} {stats['p99']:>8.1f}")
+    print("\nВызовы Bot API:")
+    for name, count in report["bot_api_calls"].items():
+        print(f"  {name:<28} {count:>6}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
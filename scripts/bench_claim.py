@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк конкурентного захвата заявок (POST /api/v1/requests/claim).
+
+Создаёт очередь новых синтетических заявок и запускает N "менеджеров",
+каждый со своей сессией БД, которые забирают заявки до опустошения
+очереди. Сравниваются:
+  - skip_locked — RequestService.claim_next_request (FOR UPDATE SKIP LOCKED)
+  - for_update  — тот же выбор с обычным FOR UPDATE: менеджеры ждут
+                  транзакцию, держащую первую заявку очереди, и после её
+                  коммита перечитывают очередь
+
+Для каждого варианта печатается пропускная способность и проверяется,
+что ни одна заявка не захвачена дважды. --hold-ms добавляет задержку
+внутри транзакции с заблокированной заявкой (сетевые задержки до БД на
+проде): на одном ядре без неё упор идёт в CPU, а не в блокировки.
+
+Синтетические заявки помечаются префиксом request_id "BC-", удаляются после прогона.
+
+Как запускать (нужна БД с применённой схемой, см. init_db):
+  python scripts/bench_claim.py --requests 2000 --managers 1,2,4,8,16
+  python scripts/bench_claim.py --requests 500 --hold-ms 20
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import select, text
+
+from app.database.connection import AsyncSessionLocal, close_db, init_db
+from app.database.models import Request, RequestStatus, User
+from app.schemas.requests import RequestStatusUpdate
+from app.services.request_service import RequestService
+
+BENCH_TELEGRAM_ID = 8_999_999_999
+HOLD_SECONDS = 0.0
+
+SEED_SQL = """
+INSERT INTO requests (request_id, user_id, category, service, description, work_format,
+                      preferred_time, status, priority, created_at, updated_at)
+SELECT 'BC-' || lpad(g::text, 8, '0'), CAST(:user_id AS integer),
+       (ARRAY['🔴 Компьютер глючит/не работает', '🚀 Хочу апгрейд', '🔒 VPN и Защита данных'])[1 + g % 3],
+       NULL, 'Синтетическая заявка ' || g, 'REMOTE', 'ANY', 'NEW', 1 + g % 5,
+       now() - (g || ' seconds')::interval, now()
+FROM generate_series(1, CAST(:count AS integer)) g
+"""
+
+
+async def prepare(count: int) -> int:
+    """Пустая очередь из count новых заявок; возвращает ID пользователя-менеджера"""
+    async with AsyncSessionLocal() as db:
+        await cleanup(db)
+        user = (await db.execute(select(User).where(User.telegram_id == BENCH_TELEGRAM_ID))).scalar_one_or_none()
+        if user is None:
+            user = User(telegram_id=BENCH_TELEGRAM_ID)
+            db.add(user)
+            await db.flush()
+        # Прочие новые заявки не должны попасть в прогон
+        existing = (await db.execute(
+            select(Request.id).where(Request.status == RequestStatus.NEW, ~Request.request_id.like("BC-%"))
+        )).first()
+        if existing is not None:
+            raise SystemExit("В БД есть новые заявки вне бенчмарка: запускайте на тестовой БД")
+        await db.execute(text(SEED_SQL), {"user_id": user.id, "count": count})
+        await db.commit()
+        return user.id
+
+
+async def cleanup(db) -> None:
+    ids = "SELECT id FROM requests WHERE request_id LIKE 'BC-%'"
+    await db.execute(text(f"DELETE FROM request_status_history WHERE request_id IN ({ids})"))
+    await db.execute(text("DELETE FROM requests WHERE request_id LIKE 'BC-%'"))
+    await db.commit()
+
+
+class BenchRequestService(RequestService):
+    """Сервис с задержкой, пока заявка заблокирована транзакцией"""
+
+    async def _apply_status(self, request, new_status, changed_by):
+        if HOLD_SECONDS:
+            await asyncio.sleep(HOLD_SECONDS)
+        return await super()._apply_status(request, new_status, changed_by)
+
+
+async def claim_skip_locked(db, user_id: int):
+    request = await BenchRequestService(db).claim_next_request(user_id)
+    return request.id if request else None
+
+
+async def claim_for_update(db, user_id: int):
+    """Захват без SKIP LOCKED: ожидание блокировки и повтор, если заявку уже забрали"""
+    service = BenchRequestService(db)
+    while True:
+        request = (await db.execute(
+            select(Request)
+            .where(Request.status == RequestStatus.NEW)
+            .order_by(Request.priority.desc(), Request.created_at, Request.id)
+            .limit(1)
+            .with_for_update()
+        )).scalar_one_or_none()
+        if request is None:
+            await db.rollback()
+            return None
+        if request.status != RequestStatus.NEW:
+            # После ожидания строка перечитана: её уже взял другой менеджер
+            await db.rollback()
+            continue
+        await service._apply_status(
+            request, RequestStatusUpdate(status=RequestStatus.IN_PROGRESS, comment="Принята в работу"), user_id
+        )
+        await db.commit()
+        return request.id
+
+
+async def manager(claim, user_id: int, claimed: list) -> None:
+    async with AsyncSessionLocal() as db:
+        while True:
+            request_pk = await claim(db, user_id)
+            if request_pk is None:
+                return
+            claimed.append(request_pk)
+
+
+async def run(variant: str, managers: int, count: int) -> float:
+    user_id = await prepare(count)
+    claim = claim_skip_locked if variant == "skip_locked" else claim_for_update
+    claimed: list = []
+    started = time.perf_counter()
+    await asyncio.gather(*(manager(claim, user_id, claimed) for _ in range(managers)))
+    elapsed = time.perf_counter() - started
+
+    async with AsyncSessionLocal() as db:
+        in_progress = (await db.execute(text(
+            "SELECT count(*) FROM request_status_history h JOIN requests r ON r.id = h.request_id "
+            "WHERE r.request_id LIKE 'BC-%' AND h.new_status = 'IN_PROGRESS'"
+        ))).scalar()
+    if len(claimed) != count or len(set(claimed)) != count or in_progress != count:
+        raise SystemExit(f"Ошибка: захвачено {len(claimed)} ({len(set(claimed))} уникальных), история {in_progress}")
+    return count / elapsed
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000, help="Размер очереди на прогон")
+    parser.add_argument("--managers", default="1,2,4,8,16", help="Числа параллельных менеджеров")
+    parser.add_argument("--hold-ms", type=float, default=0.0, help="Задержка в транзакции захвата, мс")
+    args = parser.parse_args()
+    global HOLD_SECONDS
+    HOLD_SECONDS = args.hold_ms / 1000
+    counts = [int(value) for value in args.managers.split(",")]
+
+    try:
+        await init_db()
+        print(f"{'managers':>8} {'skip_locked/s':>14} {'for_update/s':>13}")
+        for managers in counts:
+            skip_locked = await run("skip_locked", managers, args.requests)
+            for_update = await run("for_update", managers, args.requests)
+            print(f"{managers:>8} {skip_locked:>14.0f} {for_update:>13.0f}")
+        async with AsyncSessionLocal() as db:
+            await cleanup(db)
+    finally:
+        await close_db()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк сериализации списка заявок (страница из 100 элементов).
+
+Сравнивает на FastAPI приложении без БД:
+  - default — ORM объекты через response_model (валидация, jsonable_encoder, json.dumps)
+  - fast    — строки БД -> model_construct -> PydanticJSONResponse (режим FAST_JSON)
+
+Как запускать:
+  python scripts/bench_json_response.py --requests 2000
+"""
+import argparse
+import asyncio
+import os
+import sys
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi import FastAPI
+
+from app.api.responses import PydanticJSONResponse, request_list_from_rows
+from app.database.models import Request, RequestStatus, WorkFormat, PreferredTime
+from app.schemas.requests import RequestListResponse, RequestResponse
+from asgi_bench import drive
+
+PAGE_SIZE = 100
+
+
+def build_rows() -> list[dict]:
+    """Строки в том виде, в каком их возвращает get_requests(as_rows=True)"""
+    now = datetime(2024, 1, 1, 12, 0, 0)
+    rows = []
+    for i in range(PAGE_SIZE):
+        rows.append({
+            "category": "🔴 Компьютер глючит/не работает",
+            "service": "💻 Тормозит/Не включается",
+            "description": f"Компьютер очень медленно работает, заявка номер {i}",
+            "work_format": WorkFormat.HOME_VISIT,
+            "address": "г. Москва, ул. Тестовая, д. 1, кв. 1",
+            "preferred_time": PreferredTime.EVENING,
+            "id": i + 1,
+            "request_id": f"FF-20240101-{i:04d}",
+            "user_id": 1,
+            "status": RequestStatus.NEW,
+            "priority": 1,
+            "created_at": now + timedelta(minutes=i),
+            "updated_at": now + timedelta(minutes=i),
+            "completed_at": None,
+        })
+    return rows
+
+
+def build_app() -> FastAPI:
+    rows = build_rows()
+    orm_objects = [Request(**row) for row in rows]
+    app = FastAPI()
+
+    @app.get("/default", response_model=RequestListResponse)
+    async def default_path():
+        return RequestListResponse(requests=orm_objects, total=len(rows), page=1, per_page=PAGE_SIZE)
+
+    @app.get("/fast", response_model=RequestListResponse)
+    async def fast_path():
+        return PydanticJSONResponse(request_list_from_rows(rows, len(rows), 1, PAGE_SIZE))
+
+    return app
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000, help="Количество запросов на вариант")
+    args = parser.parse_args()
+
+    app = build_app()
+    results = {}
+    for variant in ("default", "fast"):
+        results[variant] = asyncio.run(drive(app, args.requests, lambda i, v=variant: f"/{v}", warmup=50))
+
+    print(f"page size: {PAGE_SIZE}")
+    print(f"{'variant':<8} {'us/request':>12} {'requests/s':>12}")
+    for variant, per_request in results.items():
+        print(f"{variant:<8} {per_request:>12.1f} {1_000_000 / per_request:>12.0f}")
+    print(f"speedup: {results['default'] / results['fast']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк поиска заявок (GET /api/v1/requests/search).
+
+Заполняет БД синтетическими заявками (если их меньше --rows), затем
+выполняет набор типичных запросов через RequestService.search_requests
+и печатает p50/p95 по каждому запросу. Цель — p95 < 50 мс.
+
+Синтетические данные помечаются префиксом request_id "BS-" и
+telegram_id от 9_000_000_000, удаляются флагом --cleanup.
+
+Как запускать (нужна БД с применённой схемой, см. init_db):
+  python scripts/bench_search.py --rows 500000 --iterations 50
+  python scripts/bench_search.py --cleanup
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text
+
+from app.database.connection import AsyncSessionLocal, close_db, init_db
+from app.services.request_service import RequestService
+
+TELEGRAM_ID_BASE = 9_000_000_000
+BENCH_USERS = 5000
+
+QUERIES = [
+    "принтер",                      # частое слово
+    "не включается ноутбук",        # несколько слов
+    "\"синий экран\"",              # фраза
+    "роутер -пароль",               # исключение
+    "видеокарты",                   # словоформа
+    "Ленина",                       # фрагмент адреса
+    "919-01",                       # фрагмент телефона
+]
+
+SEED_SQL = [
+    f"""
+    INSERT INTO users (telegram_id, username, phone, is_admin, active_requests, created_at, updated_at)
+    SELECT {TELEGRAM_ID_BASE} + g, 'bench_' || g,
+           '+7 9' || lpad((g % 100)::text, 2, '0') || ' ' || lpad((g * 7919 % 1000)::text, 3, '0')
+               || '-' || lpad((g % 100)::text, 2, '0') || '-' || lpad((g * 31 % 100)::text, 2, '0'),
+           false, 0, now(), now()
+    FROM generate_series(1, {BENCH_USERS}) g
+    ON CONFLICT (telegram_id) DO NOTHING
+    """,
+    """
+    WITH words AS (
+        SELECT
+            ARRAY['🔴 Компьютер глючит/не работает', '⚙️ Установить/Настроить программу',
+                  '📷 Подключить/Настроить устройство', '🚀 Хочу апгрейд',
+                  '🌐 «Слабый Wi-Fi / новый роутер»', '🔒 VPN и Защита данных'] AS categories,
+            ARRAY['💻 Тормозит/Не включается', '🖨️ Настроить принтер/сканер', '📶 Настроить Wi-Fi роутер',
+                  '🎮 Установить видеокарту', '🛡️ Проверка на вирусы', '📦 Установить программу'] AS services,
+            ARRAY['Ноутбук не включается после обновления', 'Принтер печатает полосами и зажёвывает бумагу',
+                  'Синий экран при запуске игр', 'Роутер постоянно теряет соединение',
+                  'Нужно поставить пароль на Wi-Fi', 'Компьютер сильно шумит и греется',
+                  'Выскакивает реклама в браузере', 'Хочу собрать игровой компьютер',
+                  'Не видит вторую видеокарту', 'Пропал звук после установки драйверов'] AS phrases,
+            ARRAY['ул. Ленина', 'пр. Мира', 'ул. Гагарина', 'ул. Садовая', 'наб. Фонтанки', 'ул. Тестовая'] AS streets
+    )
+    INSERT INTO requests (request_id, user_id, category, service, description, work_format, address,
+                          preferred_time, status, priority, created_at, updated_at)
+    SELECT
+        'BS-' || lpad(g::text, 8, '0'),
+        u.id,
+        categories[1 + g % 6],
+        services[1 + (g / 7) % 6],
+        phrases[1 + g % 10] || '. ' || phrases[1 + (g / 10) % 10] || ', заявка ' || g,
+        (ARRAY['HOME_VISIT', 'REMOTE', 'PICKUP', 'OFFICE'])[1 + g % 4]::workformat,
+        CASE WHEN g % 4 IN (0, 2)
+             THEN 'г. Москва, ' || streets[1 + (g / 3) % 6] || ', д. ' || (1 + g % 120) || ', кв. ' || (1 + g % 300)
+        END,
+        (ARRAY['MORNING', 'DAY', 'EVENING', 'ANY'])[1 + (g / 4) % 4]::preferredtime,
+        (ARRAY['NEW', 'IN_PROGRESS', 'COMPLETED', 'COMPLETED', 'CANCELLED'])[1 + g % 5]::requeststatus,
+        1 + g % 5,
+        now() - (g || ' minutes')::interval,
+        now() - (g || ' minutes')::interval
+    FROM words, generate_series(CAST(:start AS integer), CAST(:stop AS integer)) g
+    JOIN users u ON u.telegram_id = CAST(:telegram_id_base AS bigint) + 1 + g % CAST(:users AS integer)
+    """,
+]
+
+
+async def seed(rows: int) -> None:
+    async with AsyncSessionLocal() as db:
+        existing = (await db.execute(text("SELECT count(*) FROM requests WHERE request_id LIKE 'BS-%'"))).scalar()
+        if existing >= rows:
+            print(f"Синтетических заявок уже {existing}")
+            return
+        print(f"Заполнение: {existing} -> {rows} заявок")
+        await db.execute(text(SEED_SQL[0]))
+        started = time.perf_counter()
+        batch = 50_000
+        for start in range(existing + 1, rows + 1, batch):
+            await db.execute(text(SEED_SQL[1]), {
+                "start": start,
+                "stop": min(rows, start + batch - 1),
+                "telegram_id_base": TELEGRAM_ID_BASE,
+                "users": BENCH_USERS,
+            })
+            await db.commit()
+        await db.execute(text("ANALYZE requests"))
+        await db.execute(text("ANALYZE users"))
+        await db.commit()
+        print(f"Заполнено за {time.perf_counter() - started:.1f} с")
+
+
+async def cleanup() -> None:
+    async with AsyncSessionLocal() as db:
+        await db.execute(text("DELETE FROM requests WHERE request_id LIKE 'BS-%'"))
+        await db.execute(text("DELETE FROM users WHERE telegram_id > :base"), {"base": TELEGRAM_ID_BASE})
+        await db.commit()
+
+
+def percentile(values: list, pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+async def run(iterations: int, limit: int, pages: int) -> list:
+    all_timings = []
+    print(f"{'query':<28} {'p50 ms':>8} {'p95 ms':>8} {'found':>6}")
+    async with AsyncSessionLocal() as db:
+        service = RequestService(db)
+        for query in QUERIES:
+            timings = []
+            found = 0
+            for _ in range(iterations):
+                cursor = None
+                found = 0
+                for _ in range(pages):
+                    started = time.perf_counter()
+                    rows, cursor = await service.search_requests(query, limit, cursor, as_rows=True)
+                    timings.append((time.perf_counter() - started) * 1000)
+                    found += len(rows)
+                    if cursor is None:
+                        break
+            all_timings.extend(timings)
+            print(f"{query:<28} {statistics.median(timings):>8.1f} {percentile(timings, 95):>8.1f} {found:>6}")
+    return all_timings
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=500_000, help="Количество синтетических заявок")
+    parser.add_argument("--iterations", type=int, default=30, help="Повторов каждого запроса")
+    parser.add_argument("--limit", type=int, default=20, help="Размер страницы")
+    parser.add_argument("--pages", type=int, default=3, help="Страниц на запрос (keyset пагинация)")
+    parser.add_argument("--cleanup", action="store_true", help="Удалить синтетические данные и выйти")
+    args = parser.parse_args()
+
+    try:
+        await init_db()
+        if args.cleanup:
+            await cleanup()
+            return
+        await seed(args.rows)
+        timings = await run(args.iterations, args.limit, args.pages)
+        p95 = percentile(timings, 95)
+        print(f"\nВсего: p50 {statistics.median(timings):.1f} мс, p95 {p95:.1f} мс "
+              f"({'OK' if p95 < 50 else 'выше цели 50 мс'})")
+    finally:
+        await close_db()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
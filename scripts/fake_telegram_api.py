@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+"""
+Локальная замена Telegram Bot API для офлайн-прогонов бота и API.
+
+Реализует методы, которые использует бот: getMe, getUpdates (long polling),
+setWebhook/deleteWebhook, sendMessage, editMessageText, answerCallbackQuery;
+остальные методы отвечают {"ok": true, "result": true}. Добавляет задержку
+ответа и случайные 429 (с retry_after), записывает каждый вызов.
+
+Входящие обновления подкладываются методом push_update() (в том же процессе)
+или POST /_control/updates (из другого процесса). Записанные вызовы — GET
+/_control/calls.
+
+Бот и API подключаются через TELEGRAM_API_URL:
+  python scripts/fake_telegram_api.py --port 8081 --latency-ms 40 --rate-429 0.01
+  TELEGRAM_API_URL=http://127.0.0.1:8081 python main.py
+
+Для прогонов в одном процессе (без HTTP) приложение бота собирается с
+InProcessRequest(server).
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import signal
+import sys
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+from telegram.request import BaseRequest, RequestData
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BOT_USER = {"id": 100000001, "is_bot": True, "first_name": "FixFix", "username": "fixfix_fake_bot"}
+
+# Методы, к которым применяются задержка и 429 (исходящие действия бота)
+THROTTLED_METHODS = {"sendMessage", "editMessageText", "answerCallbackQuery", "editMessageReplyMarkup"}
+
+
+def _coerce(value: Any) -> Any:
+    """Значения form-data: числа и JSON (reply_markup, entities) как у Bot API"""
+    if not isinstance(value, str):
+        return value
+    if value.lstrip("-").isdigit():
+        return int(value)
+    if value[:1] in "{[":
+        try:
+            return json.loads(value)
+        except ValueError:
+            return value
+    return value
+
+
+class FakeTelegramServer:
+    """Состояние и ASGI-приложение поддельного Bot API"""
+
+    def __init__(self, latency_ms: float = 0.0, jitter_ms: float = 0.0, rate_429: float = 0.0, retry_after: int = 1):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.rate_429 = rate_429
+        self.retry_after = retry_after
+        self.calls: List[dict] = []
+        self._updates: Deque[dict] = deque()
+        self._update_id = 0
+        self._message_id = 0
+        self._new_updates = asyncio.Event()
+        self._waiters: Dict[int, Deque[asyncio.Future]] = {}
+        self.app = self._build_app()
+
+    # --- Входящие обновления ---------------------------------------------
+
+    def push_update(self, update: dict) -> int:
+        """Кладёт обновление в очередь getUpdates; update_id назначается здесь"""
+        self._update_id += 1
+        update = {**update, "update_id": self._update_id}
+        self._updates.append(update)
+        self._new_updates.set()
+        return self._update_id
+
+    async def _get_updates(self, params: dict) -> list:
+        offset = params.get("offset")
+        limit = params.get("limit") or 100
+        timeout = float(params.get("timeout") or 0)
+        if offset is not None:
+            while self._updates and self._updates[0]["update_id"] < offset:
+                self._updates.popleft()
+        if not self._updates and timeout > 0:
+            self._new_updates.clear()
+            try:
+                await asyncio.wait_for(self._new_updates.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return list(self._updates)[:limit]
+
+    # --- Ответы бота -----------------------------------------------------
+
+    def wait_for_message(self, chat_id: int) -> asyncio.Future:
+        """Future следующего sendMessage/editMessageText в чат chat_id"""
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault(chat_id, deque()).append(future)
+        return future
+
+    def _message(self, params: dict, message_id: Optional[int] = None) -> dict:
+        if message_id is None:
+            self._message_id += 1
+            message_id = self._message_id
+        chat_id = params.get("chat_id")
+        message = {
+            "message_id": message_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private" if isinstance(chat_id, int) and chat_id > 0 else "group"},
+            "from": BOT_USER,
+            "text": params.get("text", ""),
+        }
+        if isinstance(params.get("reply_markup"), dict) and "inline_keyboard" in params["reply_markup"]:
+            message["reply_markup"] = params["reply_markup"]
+        waiters = self._waiters.get(chat_id)
+        while waiters:
+            future = waiters.popleft()
+            if not future.done():
+                future.set_result(message)
+                break
+        return message
+
+    async def handle(self, method: str, params: dict):
+        started = time.perf_counter()
+        record = {
+            "ts": time.time(),
+            "method": method,
+            "chat_id": params.get("chat_id"),
+            "text": params.get("text"),
+            "status": 200,
+        }
+        self.calls.append(record)
+
+        if method in THROTTLED_METHODS:
+            delay = self.latency_ms + random.uniform(0, self.jitter_ms)
+            if delay:
+                await asyncio.sleep(delay / 1000)
+            if self.rate_429 and random.random() < self.rate_429:
+                record["status"] = 429
+                record["duration_ms"] = (time.perf_counter() - started) * 1000
+                return JSONResponse(
+                    {
+                        "ok": False,
+                        "error_code": 429,
+                        "description": f"Too Many Requests: retry after {self.retry_after}",
+                        "parameters": {"retry_after": self.retry_after},
+                    },
+                    status_code=429,
+                )
+
+        if method == "getMe":
+            result: Any = BOT_USER
+        elif method == "getUpdates":
+            result = await self._get_updates(params)
+        elif method == "sendMessage":
+            result = self._message(params)
+        elif method == "editMessageText":
+            result = self._message(params, message_id=params.get("message_id"))
+        else:
+            result = True
+        record["duration_ms"] = (time.perf_counter() - started) * 1000
+        return JSONResponse({"ok": True, "result": result})
+
+    # --- ASGI ------------------------------------------------------------
+
+    def _build_app(self) -> FastAPI:
+        app = FastAPI(title="Fake Telegram Bot API", docs_url=None, redoc_url=None)
+
+        @app.api_route("/bot{token}/{method}", methods=["GET", "POST"])
+        async def bot_method(token: str, method: str, request: Request):
+            params: Dict[str, Any] = dict(request.query_params)
+            content_type = request.headers.get("content-type", "")
+            if "application/json" in content_type:
+                params.update(await request.json())
+            elif "application/x-www-form-urlencoded" in content_type:
+                # Так отправляет python-telegram-bot (без файлов)
+                params.update(parse_qsl((await request.body()).decode("utf-8"), keep_blank_values=True))
+            return await self.handle(method, {key: _coerce(value) for key, value in params.items()})
+
+        @app.post("/_control/updates")
+        async def control_updates(request: Request):
+            body = await request.json()
+            updates = body if isinstance(body, list) else [body]
+            return {"update_ids": [self.push_update(update) for update in updates]}
+
+        @app.get("/_control/calls")
+        async def control_calls():
+            return self.calls
+
+        return app
+
+
+class InProcessRequest(BaseRequest):
+    """Запросы бота (python-telegram-bot) прямо в FakeTelegramServer, без HTTP"""
+
+    def __init__(self, server: FakeTelegramServer):
+        self.server = server
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    async def do_request(
+        self, url: str, method: str, request_data: Optional[RequestData] = None, **timeouts: Any
+    ) -> Tuple[int, bytes]:
+        params = request_data.parameters if request_data is not None else {}
+        response = await self.server.handle(url.rsplit("/", 1)[-1], dict(params))
+        return response.status_code, response.body
+
+
+async def start_http(server: FakeTelegramServer, port: int):
+    """Запуск сервера в текущем цикле событий; возвращает (uvicorn.Server, задача)"""
+    import uvicorn
+
+    config = uvicorn.Config(server.app, host="127.0.0.1", port=port, log_level="warning", lifespan="off")
+    http_server = uvicorn.Server(config)
+    task = asyncio.create_task(http_server.serve())
+    while not http_server.started:
+        await asyncio.sleep(0.05)
+    return http_server, task
+
+
+async def launch_bot(port: int, log, env: Optional[Dict[str, str]] = None):
+    """Бот (main.py) отдельным процессом с TELEGRAM_API_URL на поддельный сервер"""
+    bot_env = {
+        **os.environ,
+        "TELEGRAM_TOKEN": "123456:fake",
+        "TELEGRAM_API_URL": f"http://127.0.0.1:{port}",
+        "PYTHONUNBUFFERED": "1",
+        **(env or {}),
+    }
+    bot_env.pop("BOT_METRICS_PORT", None)
+    return await asyncio.create_subprocess_exec(
+        sys.executable, os.path.join(ROOT, "main.py"), cwd=ROOT, env=bot_env, stdout=log, stderr=log
+    )
+
+
+async def wait_for_polling(server: FakeTelegramServer, process, timeout: float = 60.0) -> None:
+    deadline = time.monotonic() + timeout
+    while not any(call["method"] == "getUpdates" for call in server.calls):
+        if process.returncode is not None:
+            raise SystemExit(f"Бот завершился с кодом {process.returncode}")
+        if time.monotonic() > deadline:
+            raise SystemExit("Бот не начал опрос getUpdates")
+        await asyncio.sleep(0.1)
+
+
+async def stop_bot(process, timeout: float = 15.0) -> None:
+    process.send_signal(signal.SIGINT)
+    try:
+        await asyncio.wait_for(process.wait(), timeout)
+    except asyncio.TimeoutError:
+        process.kill()
+
+
+def build_server(args) -> FakeTelegramServer:
+    return FakeTelegramServer(
+        latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, rate_429=args.rate_429, retry_after=args.retry_after
+    )
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Задержка ответа на действия бота, мс")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="Случайная добавка к задержке, мс")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="Доля ответов 429 Too Many Requests")
+    parser.add_argument("--retry-after", type=int, default=1, help="retry_after в ответах 429, с")
+
+
+def main() -> None:
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    add_arguments(parser)
+    args = parser.parse_args()
+    server = build_server(args)
+    print(f"Fake Bot API: TELEGRAM_API_URL=http://{args.host}:{args.port}")
+    uvicorn.run(server.app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -18,7 +18,8 @@ from typing import Dict, List, Tuple
 
 from sqlalchemy import select
 
-from app.database.connection import get_db, init_db
+# Подключение к БД и сервисы импортируются при запуске: матрицу заявок
+# (build_catalog и др.) использует scripts/load_api.py без настроек app
 from app.database.models import (
     User,
     Request,
@@ -26,7 +27,6 @@ from app.database.models import (
     PreferredTime,
     RequestStatus,
 )
-from app.services.request_service import RequestService
 from app.schemas.requests import RequestCreate, RequestStatusUpdate
 
 
@@ -124,6 +124,8 @@ def make_address() -> str:
 
 async def ensure_test_user() -> Tuple[int, User]:
     """Создаёт или возвращает тестового пользователя. Возвращает (db_user_id, User)."""
+    from app.database.connection import get_db
+
     async for db in get_db():
         result = await db.execute(select(User).where(User.telegram_id == TEST_TELEGRAM_ID))
         user: User | None = result.scalar_one_or_none()
@@ -141,6 +143,9 @@ async def ensure_test_user() -> Tuple[int, User]:
 
 
 async def create_all_requests() -> None:
+    from app.database.connection import get_db, init_db
+    from app.services.request_service import RequestService
+
     # Инициализация БД (на случай, если таблицы ещё не созданы)
     await init_db()
 
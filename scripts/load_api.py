@@ -0,0 +1,485 @@
+#!/usr/bin/env python3
+"""
+Нагрузочный прогон HTTP API по матрице заявок из generate_all_requests.py.
+
+Каждый сценарий — одна строка матрицы категории × услуги × форматы × время:
+  POST /requests/ (с Idempotency-Key) -> GET /requests/{id}
+  -> GET /requests/user/{user_id} -> PUT /requests/{id}/status (completed)
+Заявка сразу закрывается, чтобы пользователь не упёрся в лимит активных.
+
+Режимы нагрузки:
+  --rate R         открытая модель: сценарии стартуют с частотой R/с
+                   (--arrival constant|poisson) независимо от ответов API;
+                   задержка первого запроса считается от запланированного
+                   старта (без coordinated omission). Сверх --max-in-flight
+                   одновременных сценариев новые не запускаются и считаются
+                   ошибкой client_saturated;
+  --rate 0         закрытая модель: --concurrency сценариев подряд.
+
+Пользователи — --users синтетических telegram_id от 8_000_000_000 (удаление:
+--cleanup, нужен доступ к БД из настроек app).
+
+Отчёт: для каждого эндпоинта HDR-гистограмма задержек (логарифмически-
+линейные корзины, точность ~1%: p50/p90/p99/p99.9/max и сами корзины),
+классы ошибок (timeout, connect, http_4xx/5xx по кодам, ...), насыщение пула
+соединений БД по /metrics (fixfix_db_pool_checked_out / _capacity). JSON
+(--out) содержит коммит и параметры прогона; --compare печатает разницу с
+прошлым отчётом.
+
+Как запускать (API уже запущен):
+  python scripts/load_api.py --base-url http://localhost:8000/api/v1 --rate 50 --duration 60 --out load.json
+  python scripts/load_api.py --rate 0 --concurrency 32 --scenarios 2000 --compare load.json
+  python scripts/load_api.py --cleanup
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import subprocess
+import sys
+import time
+import uuid
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+
+from generate_all_requests import build_catalog, build_formats, build_times, make_address, make_description
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TELEGRAM_ID_BASE = 8_000_000_000
+FREE_TEXT_CATEGORY = "✍️ Описать запрос своими словами"
+ADDRESS_FORMATS = {"home_visit", "pickup"}
+
+ENDPOINTS = [
+    "POST /requests/",
+    "GET /requests/{id}",
+    "GET /requests/user/{user_id}",
+    "PUT /requests/{id}/status",
+]
+
+
+class LatencyHistogram:
+    """Гистограмма задержек в стиле HDR: логарифмически-линейные корзины.
+
+    Значения хранятся в микросекундах; в каждой степени двойки 2**SUB_BUCKET_BITS
+    корзин, поэтому относительная погрешность не больше 1/128. Гистограммы
+    складываются и сериализуются без потери точности.
+    """
+
+    SUB_BUCKET_BITS = 8
+
+    def __init__(self):
+        self.counts: Counter = Counter()
+        self.count = 0
+        self.total_us = 0
+        self.min_us: Optional[int] = None
+        self.max_us = 0
+
+    @classmethod
+    def _shift(cls, value: int) -> int:
+        return max(0, value.bit_length() - cls.SUB_BUCKET_BITS)
+
+    def record(self, seconds: float) -> None:
+        value = max(1, int(seconds * 1_000_000))
+        shift = self._shift(value)
+        self.counts[(value >> shift) << shift] += 1
+        self.count += 1
+        self.total_us += value
+        self.min_us = value if self.min_us is None else min(self.min_us, value)
+        self.max_us = max(self.max_us, value)
+
+    def merge(self, other: "LatencyHistogram") -> None:
+        self.counts.update(other.counts)
+        self.count += other.count
+        self.total_us += other.total_us
+        if other.min_us is not None:
+            self.min_us = other.min_us if self.min_us is None else min(self.min_us, other.min_us)
+        self.max_us = max(self.max_us, other.max_us)
+
+    def percentile(self, pct: float) -> float:
+        """Верхняя граница корзины, в которую попадает процентиль, мс"""
+        if not self.count:
+            return 0.0
+        rank = max(1, int(round(pct / 100 * self.count)))
+        seen = 0
+        for lower in sorted(self.counts):
+            seen += self.counts[lower]
+            if seen >= rank:
+                upper = lower + (1 << self._shift(lower)) - 1
+                return min(upper, self.max_us) / 1000
+        return self.max_us / 1000
+
+    def to_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "min_ms": round((self.min_us or 0) / 1000, 3),
+            "mean_ms": round(self.total_us / self.count / 1000, 3) if self.count else 0.0,
+            "p50_ms": round(self.percentile(50), 3),
+            "p90_ms": round(self.percentile(90), 3),
+            "p99_ms": round(self.percentile(99), 3),
+            "p999_ms": round(self.percentile(99.9), 3),
+            "max_ms": round(self.max_us / 1000, 3),
+            "buckets_us": [[lower, self.counts[lower]] for lower in sorted(self.counts)],
+        }
+
+
+def build_matrix() -> List[dict]:
+    """Строки матрицы generate_all_requests.py в виде тел POST /requests/"""
+    rows = []
+    catalog = build_catalog()
+    catalog[FREE_TEXT_CATEGORY] = ["✍️ Свой вариант"]
+    for category, services in catalog.items():
+        for service in services:
+            for work_format in build_formats():
+                for preferred_time in build_times():
+                    row = {
+                        "category": category,
+                        "service": service,
+                        "description": make_description(category, service),
+                        "work_format": work_format.value,
+                        "preferred_time": preferred_time.value,
+                    }
+                    if work_format.value in ADDRESS_FORMATS:
+                        row["address"] = make_address()
+                    rows.append(row)
+    return rows
+
+
+def classify(error: BaseException) -> str:
+    if isinstance(error, httpx.TimeoutException):
+        return "timeout"
+    if isinstance(error, httpx.ConnectError):
+        return "connect"
+    if isinstance(error, httpx.TransportError):
+        return f"transport:{type(error).__name__}"
+    return f"client:{type(error).__name__}"
+
+
+class Stats:
+    """Результаты прогона: гистограммы и ошибки по эндпоинтам"""
+
+    def __init__(self):
+        self.latency: Dict[str, LatencyHistogram] = defaultdict(LatencyHistogram)
+        self.errors: Dict[str, Counter] = defaultdict(Counter)
+        self.scenario_latency = LatencyHistogram()
+        self.scenarios: Counter = Counter()
+
+
+class LoadRunner:
+    def __init__(self, args, matrix: List[dict]):
+        self.args = args
+        self.matrix = matrix
+        self.stats = Stats()
+        self.client = httpx.AsyncClient(
+            base_url=args.base_url.rstrip("/"),
+            timeout=args.timeout,
+            limits=httpx.Limits(max_connections=args.connections, max_keepalive_connections=args.connections),
+        )
+        self.in_flight = 0
+        self.peak_in_flight = 0
+
+    async def call(self, endpoint: str, method: str, url: str, started: Optional[float] = None, **kwargs):
+        """Запрос с замером; started — запланированное время старта (открытая модель)"""
+        started = started if started is not None else time.perf_counter()
+        try:
+            response = await self.client.request(method, url, **kwargs)
+        except Exception as e:
+            self.stats.errors[endpoint][classify(e)] += 1
+            return None
+        self.stats.latency[endpoint].record(time.perf_counter() - started)
+        if response.status_code >= 400:
+            self.stats.errors[endpoint][f"http_{response.status_code // 100}xx:{response.status_code}"] += 1
+            return None
+        try:
+            return response.json()
+        except ValueError:
+            self.stats.errors[endpoint]["bad_body"] += 1
+            return None
+
+    async def scenario(self, index: int, scheduled: Optional[float] = None) -> None:
+        started = scheduled if scheduled is not None else time.perf_counter()
+        telegram_id = TELEGRAM_ID_BASE + index % self.args.users
+        body = self.matrix[index % len(self.matrix)]
+        created = await self.call(
+            ENDPOINTS[0],
+            "POST",
+            "/requests/",
+            started=started,
+            params={"telegram_id": telegram_id},
+            json=body,
+            headers={"Idempotency-Key": str(uuid.uuid4())},
+        )
+        if created is None:
+            self.stats.scenarios["failed"] += 1
+            return
+        request_id = created["request_id"]
+        ok = await self.call(ENDPOINTS[1], "GET", f"/requests/{request_id}") is not None
+        ok &= await self.call(ENDPOINTS[2], "GET", f"/requests/user/{created['user_id']}") is not None
+        ok &= await self.call(
+            ENDPOINTS[3],
+            "PUT",
+            f"/requests/{request_id}/status",
+            params={"telegram_id": telegram_id},
+            json={"status": "completed"},
+        ) is not None
+        self.stats.scenario_latency.record(time.perf_counter() - started)
+        self.stats.scenarios["completed" if ok else "failed"] += 1
+
+    async def _tracked(self, index: int, scheduled: Optional[float]) -> None:
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        try:
+            await self.scenario(index, scheduled)
+        finally:
+            self.in_flight -= 1
+
+    async def open_loop(self) -> None:
+        args = self.args
+        rng = random.Random(args.seed)
+        tasks = set()
+        started = time.perf_counter()
+        next_at = started
+        index = 0
+        while self._more(index, started):
+            delay = next_at - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            if self.in_flight >= args.max_in_flight:
+                self.stats.errors[ENDPOINTS[0]]["client_saturated"] += 1
+                self.stats.scenarios["dropped"] += 1
+            else:
+                task = asyncio.create_task(self._tracked(index, next_at))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            index += 1
+            interval = 1 / args.rate
+            next_at += rng.expovariate(args.rate) if args.arrival == "poisson" else interval
+        if tasks:
+            await asyncio.gather(*tasks)
+
+    async def closed_loop(self) -> None:
+        started = time.perf_counter()
+        counter = iter(range(sys.maxsize))
+
+        async def worker() -> None:
+            while True:
+                index = next(counter)
+                if not self._more(index, started):
+                    return
+                await self._tracked(index, None)
+
+        await asyncio.gather(*(worker() for _ in range(self.args.concurrency)))
+
+    def _more(self, index: int, started: float) -> bool:
+        if self.args.scenarios and index >= self.args.scenarios:
+            return False
+        if self.args.duration and time.perf_counter() - started >= self.args.duration:
+            return False
+        return True
+
+
+class PoolSampler:
+    """Насыщение пула соединений БД по метрикам API"""
+
+    _LINE = re.compile(r"^(fixfix_db_pool_checked_out|fixfix_db_pool_capacity)\s+([0-9.eE+-]+)$", re.M)
+
+    def __init__(self, url: str, interval: float):
+        self.url = url
+        self.interval = interval
+        self.samples: List[Tuple[float, float]] = []
+        self.error: Optional[str] = None
+
+    async def run(self) -> None:
+        async with httpx.AsyncClient(timeout=5) as client:
+            while True:
+                try:
+                    response = await client.get(self.url)
+                    values = dict(self._LINE.findall(response.text))
+                    if "fixfix_db_pool_capacity" in values:
+                        self.samples.append(
+                            (float(values["fixfix_db_pool_checked_out"]), float(values["fixfix_db_pool_capacity"]))
+                        )
+                    else:
+                        self.error = "в /metrics нет fixfix_db_pool_* (NullPool или метрики выключены)"
+                except Exception as e:
+                    self.error = f"{type(e).__name__}: {e}"
+                await asyncio.sleep(self.interval)
+
+    def report(self) -> dict:
+        if not self.samples:
+            return {"samples": 0, "error": self.error}
+        capacity = max(sample[1] for sample in self.samples)
+        checked_out = [sample[0] for sample in self.samples]
+        return {
+            "samples": len(self.samples),
+            "capacity": capacity,
+            "max_checked_out": max(checked_out),
+            "mean_utilization": round(sum(checked_out) / len(checked_out) / capacity, 3) if capacity else None,
+            "saturated_fraction": round(sum(1 for value, cap in self.samples if value >= cap) / len(self.samples), 3),
+        }
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+def compare(previous: dict, current: dict) -> List[str]:
+    """Разница с прошлым отчётом: пропускная способность и p50/p99 по эндпоинтам"""
+    lines = [
+        f"Сравнение с {previous['meta'].get('commit')} ({previous['meta'].get('started_at')}):",
+        f"  scenarios/s: {previous['scenarios_per_s']} -> {current['scenarios_per_s']}",
+    ]
+    for endpoint in ENDPOINTS:
+        old = previous["endpoints"].get(endpoint, {}).get("latency")
+        new = current["endpoints"].get(endpoint, {}).get("latency")
+        if not old or not new or not old["count"] or not new["count"]:
+            continue
+        parts = []
+        for key in ("p50_ms", "p99_ms"):
+            delta = (new[key] - old[key]) / old[key] * 100 if old[key] else 0.0
+            parts.append(f"{key[:-3]} {old[key]:.1f} -> {new[key]:.1f} мс ({delta:+.0f}%)")
+        old_errors = sum(previous["endpoints"][endpoint]["errors"].values())
+        new_errors = sum(current["endpoints"][endpoint]["errors"].values())
+        lines.append(f"  {endpoint:<30} {', '.join(parts)}, ошибок {old_errors} -> {new_errors}")
+    return lines
+
+
+async def cleanup() -> None:
+    from sqlalchemy import text
+
+    from app.database.connection import AsyncSessionLocal, close_db
+
+    users = "SELECT id FROM users WHERE telegram_id >= :base AND telegram_id < :base + 1000000000"
+    requests = f"SELECT id FROM requests WHERE user_id IN ({users})"
+    statements = [
+        f"DELETE FROM idempotency_keys WHERE user_id IN ({users})",
+        f"DELETE FROM request_status_history WHERE request_id IN ({requests}) OR changed_by IN ({users})",
+        f"DELETE FROM request_comments WHERE request_id IN ({requests})",
+        f"DELETE FROM request_executors WHERE request_id IN ({requests})",
+        f"DELETE FROM requests WHERE user_id IN ({users})",
+        "DELETE FROM users WHERE telegram_id >= :base AND telegram_id < :base + 1000000000",
+    ]
+    try:
+        async with AsyncSessionLocal() as db:
+            for statement in statements:
+                await db.execute(text(statement), {"base": TELEGRAM_ID_BASE})
+            await db.commit()
+    finally:
+        await close_db()
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default=os.getenv("API_BASE_URL", "http://localhost:8000/api/v1"))
+    parser.add_argument("--metrics-url", help="Адрес /metrics (по умолчанию — от --base-url)")
+    parser.add_argument("--rate", type=float, default=20.0, help="Сценариев в секунду (0 — закрытая модель)")
+    parser.add_argument("--arrival", choices=["constant", "poisson"], default="poisson")
+    parser.add_argument("--concurrency", type=int, default=16, help="Параллельных сценариев (закрытая модель)")
+    parser.add_argument("--max-in-flight", type=int, default=1000, help="Предел одновременных сценариев (открытая)")
+    parser.add_argument("--users", type=int, default=1000, help="Синтетических пользователей")
+    parser.add_argument("--duration", type=float, default=30.0, help="Длительность, с (0 — без ограничения)")
+    parser.add_argument("--scenarios", type=int, default=0, help="Число сценариев (0 — без ограничения)")
+    parser.add_argument("--connections", type=int, default=100, help="HTTP-соединений к API")
+    parser.add_argument("--timeout", type=float, default=10.0, help="Таймаут запроса, с")
+    parser.add_argument("--sample-interval", type=float, default=0.5, help="Период опроса /metrics, с")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--out", help="Сохранить отчёт в JSON")
+    parser.add_argument("--compare", help="Сравнить с прошлым JSON-отчётом")
+    parser.add_argument("--json", action="store_true", help="Печатать отчёт в JSON")
+    parser.add_argument("--cleanup", action="store_true", help="Удалить синтетических пользователей и их заявки")
+    args = parser.parse_args()
+
+    if args.cleanup:
+        await cleanup()
+        print("Синтетические данные удалены")
+        return
+    if not args.duration and not args.scenarios:
+        parser.error("Укажите --duration или --scenarios")
+
+    matrix = build_matrix()
+    runner = LoadRunner(args, matrix)
+    base = urlsplit(args.base_url)
+    sampler = PoolSampler(args.metrics_url or f"{base.scheme}://{base.netloc}/metrics", args.sample_interval)
+    sampling = asyncio.create_task(sampler.run())
+    started_at = time.strftime("%Y-%m-%dT%H:%M:%S")
+    started = time.perf_counter()
+    try:
+        if args.rate > 0:
+            await runner.open_loop()
+        else:
+            await runner.closed_loop()
+    finally:
+        elapsed = time.perf_counter() - started
+        sampling.cancel()
+        await runner.client.aclose()
+
+    stats = runner.stats
+    completed = stats.scenarios["completed"]
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "started_at": started_at,
+            "base_url": args.base_url,
+            "mode": "open" if args.rate > 0 else "closed",
+            "args": {key: value for key, value in vars(args).items() if key not in ("out", "compare", "json", "cleanup")},
+            "matrix_rows": len(matrix),
+        },
+        "elapsed_s": round(elapsed, 3),
+        "scenarios": dict(stats.scenarios),
+        "scenarios_per_s": round(completed / elapsed, 2) if elapsed else 0.0,
+        "requests_per_s": round(sum(h.count for h in stats.latency.values()) / elapsed, 2) if elapsed else 0.0,
+        "peak_in_flight": runner.peak_in_flight,
+        "scenario_latency": stats.scenario_latency.to_dict(),
+        "endpoints": {
+            endpoint: {"latency": stats.latency[endpoint].to_dict(), "errors": dict(stats.errors[endpoint])}
+            for endpoint in ENDPOINTS
+        },
+        "db_pool": sampler.report(),
+    }
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=1)
+
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    else:
+        print(f"{report['meta']['mode']}: {dict(stats.scenarios)} за {elapsed:.1f} с -> "
+              f"{report['scenarios_per_s']} сценариев/с, {report['requests_per_s']} запросов/с, "
+              f"одновременно до {runner.peak_in_flight}")
+        print(f"\n{'endpoint':<30} {'count':>7} {'p50':>8} {'p90':>8} {'p99':>8} {'p99.9':>8} {'max':>8}  ошибки")
+        for endpoint in ENDPOINTS:
+            h = report["endpoints"][endpoint]["latency"]
+            errors = report["endpoints"][endpoint]["errors"]
+            print(f"{endpoint:<30} {h['count']:>7} {h['p50_ms']:>8.1f} {h['p90_ms']:>8.1f} {h['p99_ms']:>8.1f} "
+                  f"{h['p999_ms']:>8.1f} {h['max_ms']:>8.1f}  {errors or ''}")
+        h = report["scenario_latency"]
+        print(f"{'сценарий целиком':<30} {h['count']:>7} {h['p50_ms']:>8.1f} {h['p90_ms']:>8.1f} {h['p99_ms']:>8.1f} "
+              f"{h['p999_ms']:>8.1f} {h['max_ms']:>8.1f}")
+        pool = report["db_pool"]
+        if pool["samples"]:
+            print(f"\nПул БД: до {pool['max_checked_out']:.0f} из {pool['capacity']:.0f} соединений, "
+                  f"в среднем {pool['mean_utilization']:.0%}, насыщен {pool['saturated_fraction']:.0%} замеров")
+        else:
+            print(f"\nПул БД: нет данных ({pool['error']})")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            previous = json.load(f)
+        print()
+        for line in compare(previous, report):
+            print(line)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
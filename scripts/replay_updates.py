@@ -0,0 +1,325 @@
+#!/usr/bin/env python3
+"""
+Воспроизведение записанного потока обновлений бота (bot/recorder.py).
+
+Журнал (файлы *.jsonl.gz или каталог BOT_RECORD_DIR) подаётся в обработчики
+бота с исходными интервалами между обновлениями, ускоренно (--speed N) или
+без пауз (--speed max). Два режима:
+
+  --mode offline  приложение бота собирается в этом процессе с теми же
+                  обработчиками, что и main.py; запросы к Bot API уходят в
+                  поддельный сервер без HTTP (InProcessRequest);
+  --mode fake     бот (main.py) запускается отдельным процессом против
+                  scripts/fake_telegram_api.py, как в bench_bot_flow.py.
+
+Отчёт: updates/s, p50/p95/p99 задержки (от подачи обновления до окончания
+обработки) и времени обработки — по видам обновлений, рядом с временем
+обработки из исходной записи.
+
+Поведение прогона — ответы бота по чатам (метод и текст, цифры заменены на 0)
+— сохраняется в --save-behavior и сравнивается с прошлым прогоном через
+--diff (например, до и после изменения обработчиков).
+
+API заявок берётся из API_BASE_URL (как у бота). Если API не запущен,
+подтверждения проходят по fallback-пути (журнал во временном файле).
+
+Как запускать:
+  BOT_RECORD_DIR=logs/updates python main.py           # запись
+  python scripts/replay_updates.py logs/updates --speed 10 --save-behavior before.json
+  python scripts/replay_updates.py logs/updates --speed max --diff before.json
+  python scripts/replay_updates.py logs/updates --mode fake --latency-ms 40
+"""
+import argparse
+import asyncio
+import json
+import os
+import re
+import statistics
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_telegram_api import (
+    FakeTelegramServer,
+    InProcessRequest,
+    add_arguments,
+    build_server,
+    launch_bot,
+    start_http,
+    stop_bot,
+    wait_for_polling,
+)
+
+GROUP_ID = -100_000_000_001
+_DIGITS = re.compile(r"\d")
+
+
+def update_kind(update: dict) -> str:
+    """Вид обновления для отчёта: command, button, text, contact, callback"""
+    from bot.recorder import known_texts
+
+    if "callback_query" in update:
+        return "callback"
+    message = update.get("message") or update.get("edited_message") or {}
+    if "contact" in message:
+        return "contact"
+    text = message.get("text", "")
+    if text.startswith("/"):
+        return "command"
+    if text in known_texts():
+        return "button"
+    return "text"
+
+
+def percentile(values: list, pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def summarize(values: list) -> dict:
+    return {
+        "count": len(values),
+        "p50": round(statistics.median(values), 1),
+        "p95": round(percentile(values, 95), 1),
+        "p99": round(percentile(values, 99), 1),
+    }
+
+
+def behavior(server: FakeTelegramServer, since: int) -> dict:
+    """Ответы бота по чатам: ["метод: текст", ...], без повторов после 429"""
+    chats = defaultdict(list)
+    for call in server.calls[since:]:
+        if call["method"] == "getUpdates" or call["status"] != 200 or call["chat_id"] is None:
+            continue
+        text = _DIGITS.sub("0", str(call.get("text") or "")).split("\n", 1)[0]
+        chats[str(call["chat_id"])].append(f"{call['method']}: {text}".rstrip(": "))
+    return dict(chats)
+
+
+def diff_behavior(before: dict, after: dict, limit: int = 20) -> list:
+    """Различия поведения двух прогонов: строки для печати"""
+    lines = []
+    for chat in sorted(set(before) | set(after)):
+        old, new = before.get(chat, []), after.get(chat, [])
+        if old == new:
+            continue
+        position = next((i for i, (a, b) in enumerate(zip(old, new)) if a != b), min(len(old), len(new)))
+        lines.append(f"чат {chat}: шаг {position + 1} из {len(old)}/{len(new)}")
+        lines.append(f"  было:  {old[position] if position < len(old) else '—'}")
+        lines.append(f"  стало: {new[position] if position < len(new) else '—'}")
+        if len(lines) >= limit * 3:
+            lines.append("...")
+            break
+    return lines
+
+
+async def feed(entries: list, speed: float, submit) -> float:
+    """Подача обновлений с исходными интервалами / speed; возвращает время старта"""
+    started = time.time()
+    first_ts = entries[0]["ts"]
+    for entry in entries:
+        if speed > 0:
+            delay = (entry["ts"] - first_ts) / speed - (time.time() - started)
+            if delay > 0:
+                await asyncio.sleep(delay)
+        await submit(entry)
+    return started
+
+
+async def run_offline(entries: list, args, server: FakeTelegramServer) -> dict:
+    from telegram import Update
+    from telegram.ext import Application
+
+    import main as bot_main
+    from bot.recorder import RecordingUpdateProcessor
+
+    submitted = {}
+    results = {}
+    done = asyncio.Event()
+
+    def on_processed(update, started, duration_ms):
+        finished = time.time()
+        results[update.update_id] = (finished - submitted[update.update_id]) * 1000, duration_ms
+        if len(results) == len(entries):
+            done.set()
+
+    application = (
+        Application.builder()
+        .token("123456:fake")
+        .request(InProcessRequest(server))
+        .get_updates_request(InProcessRequest(server))
+        .updater(None)
+        .concurrent_updates(RecordingUpdateProcessor(on_processed, args.concurrency))
+        .build()
+    )
+    bot_main.add_handlers(application)
+
+    async def submit(entry):
+        update = Update.de_json(entry["update"], application.bot)
+        submitted[update.update_id] = time.time()
+        await application.update_queue.put(update)
+
+    async with application:
+        await application.start()
+        started = await feed(entries, args.speed, submit)
+        try:
+            await asyncio.wait_for(done.wait(), args.drain_timeout)
+        except asyncio.TimeoutError:
+            pass
+        elapsed = time.time() - started
+        await application.stop()
+    return {"elapsed": elapsed, "results": results}
+
+
+async def run_fake(entries: list, args, server: FakeTelegramServer, spool_dir: str) -> dict:
+    from bot.recorder import read_log
+
+    http_server, server_task = await start_http(server, args.port)
+    record_dir = os.path.join(spool_dir, "record")
+    env = {
+        "REQUESTS_GROUP_ID": os.getenv("REQUESTS_GROUP_ID", str(GROUP_ID)),
+        "BOT_SPOOL_PATH": os.path.join(spool_dir, "spool.jsonl"),
+        "BOT_RECORD_DIR": record_dir,
+    }
+    submitted = {}
+    log = open(args.bot_log, "w")
+    process = await launch_bot(args.port, log, env)
+    try:
+        await wait_for_polling(server, process)
+
+        async def submit(entry):
+            update = {key: value for key, value in entry["update"].items() if key != "update_id"}
+            submitted[server.push_update(update)] = time.time()
+
+        started = await feed(entries, args.speed, submit)
+        # Ждём, пока бот заберёт все обновления и перестанет отвечать
+        deadline = time.monotonic() + args.drain_timeout
+        quiet_since = time.monotonic()
+        seen = len(server.calls)
+        while time.monotonic() < deadline:
+            await asyncio.sleep(0.2)
+            answers = sum(1 for call in server.calls if call["method"] != "getUpdates")
+            if answers != seen:
+                seen, quiet_since = answers, time.monotonic()
+            elif not server._updates and time.monotonic() - quiet_since > 1.0:
+                break
+    finally:
+        await stop_bot(process)
+        log.close()
+        http_server.should_exit = True
+        await server_task
+
+    # Время обработки берётся из записи, которую сделал сам бот во время прогона
+    results = {}
+    last_finished = started
+    for entry in read_log([record_dir]) if os.path.isdir(record_dir) else []:
+        update_id = entry["update"]["update_id"]
+        if update_id not in submitted:
+            continue
+        finished = entry["ts"] + entry["duration_ms"] / 1000
+        last_finished = max(last_finished, finished)
+        results[update_id] = ((finished - submitted[update_id]) * 1000, entry["duration_ms"])
+    return {"elapsed": last_finished - started, "results": results}
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("paths", nargs="+", help="Файлы журнала или каталоги с *.jsonl.gz")
+    parser.add_argument("--mode", choices=["offline", "fake"], default="offline")
+    parser.add_argument("--speed", default="1", help="Множитель скорости (1, 10, ...) или max — без пауз")
+    parser.add_argument("--limit", type=int, default=0, help="Воспроизвести только первые N обновлений")
+    parser.add_argument("--concurrency", type=int, default=1, help="Одновременно обрабатываемых обновлений (offline)")
+    parser.add_argument("--drain-timeout", type=float, default=60.0, help="Ожидание окончания обработки, с")
+    parser.add_argument("--port", type=int, default=8081, help="Порт поддельного Bot API (--mode fake)")
+    parser.add_argument("--bot-log", default=os.devnull, help="Файл для stdout/stderr бота (--mode fake)")
+    parser.add_argument("--save-behavior", help="Сохранить ответы бота по чатам в JSON")
+    parser.add_argument("--diff", help="Сравнить ответы бота с сохранённым прогоном")
+    parser.add_argument("--json", action="store_true", help="Отчёт в JSON")
+    add_arguments(parser)
+    args = parser.parse_args()
+    args.speed = 0.0 if args.speed == "max" else float(args.speed)
+
+    from bot.recorder import read_log
+
+    entries = list(read_log(args.paths))
+    if args.limit:
+        entries = entries[: args.limit]
+    if not entries:
+        raise SystemExit("В журнале нет обновлений")
+
+    spool_dir = tempfile.mkdtemp(prefix="replay_updates_")
+    if args.mode == "offline":
+        # Обработчики читают настройки при импорте: журнал fallback — во временный файл
+        os.environ["BOT_SPOOL_PATH"] = os.path.join(spool_dir, "spool.jsonl")
+        os.environ.setdefault("REQUESTS_GROUP_ID", str(GROUP_ID))
+
+    server = build_server(args)
+    if args.mode == "offline":
+        run = await run_offline(entries, args, server)
+    else:
+        run = await run_fake(entries, args, server, spool_dir)
+
+    by_id = {entry["update"]["update_id"]: entry for entry in entries}
+    results = run["results"]
+    latency, processing, recorded = defaultdict(list), defaultdict(list), defaultdict(list)
+    for entry in entries:
+        recorded[update_kind(entry["update"])].append(entry["duration_ms"])
+    if args.mode == "offline":
+        kinds = {update_id: update_kind(entry["update"]) for update_id, entry in by_id.items()}
+    else:
+        # В режиме fake update_id назначает поддельный сервер, по порядку подачи
+        kinds = {index + 1: update_kind(entry["update"]) for index, entry in enumerate(entries)}
+    for update_id, (latency_ms, duration_ms) in results.items():
+        kind = kinds.get(update_id, "other")
+        for bucket in (kind, "all"):
+            latency[bucket].append(latency_ms)
+            processing[bucket].append(duration_ms)
+    recorded["all"] = [entry["duration_ms"] for entry in entries]
+
+    elapsed = run["elapsed"]
+    current = behavior(server, 0)
+    report = {
+        "mode": args.mode,
+        "speed": args.speed or "max",
+        "updates": len(entries),
+        "processed": len(results),
+        "elapsed_s": round(elapsed, 3),
+        "updates_per_s": round(len(results) / elapsed, 1) if elapsed else 0.0,
+        "latency_ms": {kind: summarize(values) for kind, values in latency.items()},
+        "processing_ms": {kind: summarize(values) for kind, values in processing.items()},
+        "recorded_processing_ms": {kind: summarize(values) for kind, values in recorded.items() if values},
+        "chats": len(current),
+    }
+    if args.diff:
+        with open(args.diff, "r", encoding="utf-8") as f:
+            before = json.load(f)
+        report["behavior_diff"] = diff_behavior(before, current)
+    if args.save_behavior:
+        with open(args.save_behavior, "w", encoding="utf-8") as f:
+            json.dump(current, f, ensure_ascii=False, indent=1)
+
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+        return
+
+    print(f"Режим {args.mode}, скорость {report['speed']}: обработано {len(results)} из {len(entries)} "
+          f"за {elapsed:.1f} с -> {report['updates_per_s']} updates/s")
+    print(f"\n{'kind':<10} {'count':>6} {'lat p50':>8} {'lat p95':>8} {'lat p99':>8}"
+          f" {'proc p50':>9} {'proc p95':>9} {'rec p50':>8} {'rec p95':>8}")
+    for kind in sorted(latency, key=lambda name: (name == "all", name)):
+        lat, proc = report["latency_ms"][kind], report["processing_ms"][kind]
+        rec = report["recorded_processing_ms"].get(kind, {"p50": 0.0, "p95": 0.0})
+        print(f"{kind:<10} {lat['count']:>6} {lat['p50']:>8.1f} {lat['p95']:>8.1f} {lat['p99']:>8.1f}"
+              f" {proc['p50']:>9.1f} {proc['p95']:>9.1f} {rec['p50']:>8.1f} {rec['p95']:>8.1f}")
+    if args.diff:
+        diff = report["behavior_diff"]
+        print(f"\nПоведение относительно {args.diff}: " + ("без изменений" if not diff else "есть различия"))
+        for line in diff:
+            print(line)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
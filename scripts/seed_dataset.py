@@ -0,0 +1,606 @@
+#!/usr/bin/env python3
+"""
+Синтетический набор данных большого объёма для работы над пагинацией,
+поиском и аналитикой.
+
+Пользователи, заявки, история статусов и комментарии генерируются с
+реалистичными распределениями и загружаются в Postgres через COPY
+(asyncpg copy_records_to_table), минуя ORM и RequestService:
+  - категории и услуги — из каталога бота (generate_all_requests.py) с
+    весами, близкими к реальному потоку; формат работы, время и приоритет
+    тоже взвешены, адрес — только для выезда и самовывоза;
+  - время создания — за последние --days дней с ростом потока к концу
+    периода, дневным профилем по часам и провалом в выходные;
+  - статус зависит от возраста заявки (свежие — новые и в работе, старые —
+    в основном выполнены); история статусов повторяет переходы, которые
+    делает RequestService, с правдоподобными интервалами;
+  - заявок на пользователя — с длинным хвостом, активных не больше
+    лимита (MAX_REQUESTS_PER_USER); users.active_requests пересчитывается;
+  - комментарии — от автора заявки и менеджеров, у закрытых заявок больше.
+
+Один и тот же --seed (и --end) даёт одинаковые данные. Всё загружается
+одной транзакцией; агрегат request_stats_hourly пересчитывается за период
+(см. scripts/backfill_stats.py).
+
+Синтетические данные помечаются префиксом request_id "SD-" и telegram_id
+от 7_000_000_000, удаляются флагом --cleanup.
+
+Как запускать (нужна БД с применённой схемой, см. init_db):
+  python scripts/seed_dataset.py --requests 1M --seed 42
+  python scripts/seed_dataset.py --requests 200k --days 90 --end 2024-06-01
+  python scripts/seed_dataset.py --cleanup
+"""
+import argparse
+import asyncio
+import bisect
+import itertools
+import math
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Tuple
+
+import asyncpg
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from generate_all_requests import build_catalog
+
+TELEGRAM_ID_BASE = 7_000_000_000
+REQUEST_PREFIX = "SD-"
+FREE_TEXT_CATEGORY = "✍️ Описать запрос своими словами"
+OWN_VARIANT = "✍️ Свой вариант"
+CHUNK = 20_000
+SEEDED_USERS = "SELECT id FROM users WHERE telegram_id > $1 AND telegram_id < $2"
+USER_BOUNDS = (TELEGRAM_ID_BASE, TELEGRAM_ID_BASE + 1_000_000_000)
+
+USER_COLUMNS = [
+    "id", "telegram_id", "username", "first_name", "last_name", "phone",
+    "is_admin", "active_requests", "created_at", "updated_at",
+]
+REQUEST_COLUMNS = [
+    "id", "request_id", "user_id", "category", "service", "description", "work_format",
+    "address", "preferred_time", "status", "priority", "created_at", "updated_at", "completed_at",
+]
+HISTORY_COLUMNS = ["id", "request_id", "old_status", "new_status", "changed_by", "comment", "created_at"]
+COMMENT_COLUMNS = ["id", "request_id", "user_id", "comment", "is_internal", "created_at"]
+
+# Доли категорий в потоке заявок
+CATEGORY_WEIGHTS = {
+    "🔴 Компьютер глючит/не работает": 30,
+    "⚙️ Установить/Настроить программу": 17,
+    "📷 Подключить/Настроить устройство": 14,
+    "🚀 Хочу апгрейд": 12,
+    "🌐 «Слабый Wi-Fi / новый роутер»": 12,
+    "🔒 VPN и Защита данных": 7,
+    FREE_TEXT_CATEGORY: 8,
+}
+# «Свой вариант» выбирают реже типовых услуг
+OWN_VARIANT_WEIGHT = 0.3
+
+# Значения enum в БД хранятся по имени
+WORK_FORMAT_WEIGHTS = {"REMOTE": 38, "HOME_VISIT": 34, "PICKUP": 16, "OFFICE": 12}
+ADDRESS_FORMATS = {"HOME_VISIT", "PICKUP"}
+PREFERRED_TIME_WEIGHTS = {"ANY": 35, "EVENING": 30, "DAY": 20, "MORNING": 15}
+PRIORITY_WEIGHTS = {1: 50, 2: 25, 3: 14, 4: 8, 5: 3}
+
+# Распределение статусов по возрасту заявки (часы):
+# NEW, IN_PROGRESS, COMPLETED, CANCELLED, REJECTED
+STATUSES = ("NEW", "IN_PROGRESS", "COMPLETED", "CANCELLED", "REJECTED")
+ACTIVE = ("NEW", "IN_PROGRESS")
+STATUS_BY_AGE = [
+    (6, (70, 20, 4, 5, 1)),
+    (48, (25, 40, 25, 8, 2)),
+    (24 * 7, (6, 24, 55, 11, 4)),
+    (24 * 30, (2, 6, 74, 13, 5)),
+    (math.inf, (0.3, 0.7, 81, 13, 5)),
+]
+
+# Поток заявок по часам суток (UTC, рабочий день смещён к вечеру)
+HOUR_WEIGHTS = [1, 1, 1, 1, 1, 2, 4, 6, 8, 9, 9, 9, 8, 8, 8, 8, 9, 10, 10, 9, 7, 5, 3, 2]
+WEEKEND_FACTOR = 0.6
+
+PHRASES = {
+    "🔴 Компьютер глючит/не работает": [
+        "Ноутбук не включается после обновления",
+        "Компьютер сильно тормозит при запуске",
+        "Синий экран при запуске игр",
+        "Компьютер сильно шумит и греется",
+        "Выскакивает реклама в браузере",
+        "Пропал звук после установки драйверов",
+        "Не загружается Windows, крутится значок",
+    ],
+    "⚙️ Установить/Настроить программу": [
+        "Нужно установить офисный пакет",
+        "Не работает интернет после переустановки системы",
+        "Не устанавливается программа для бухгалтерии",
+        "Настроить почту на двух компьютерах",
+        "Переустановить Windows с сохранением файлов",
+    ],
+    "📷 Подключить/Настроить устройство": [
+        "Принтер печатает полосами и зажёвывает бумагу",
+        "Сканер не определяется компьютером",
+        "Подключить приставку к телевизору",
+        "Телефон не видит компьютер по кабелю",
+        "Беспроводная мышь постоянно отключается",
+    ],
+    "🚀 Хочу апгрейд": [
+        "Хочу собрать игровой компьютер",
+        "Поставить SSD вместо старого диска",
+        "Не видит вторую видеокарту",
+        "Добавить оперативной памяти в ноутбук",
+        "Подобрать комплектующие под монтаж видео",
+    ],
+    "🌐 «Слабый Wi-Fi / новый роутер»": [
+        "Роутер постоянно теряет соединение",
+        "Нужно поставить пароль на Wi-Fi",
+        "Слабый сигнал в дальней комнате",
+        "Купили новый роутер, нужно настроить",
+        "Телевизор не подключается к Wi-Fi",
+    ],
+    "🔒 VPN и Защита данных": [
+        "Настроить VPN на ноутбуке и телефоне",
+        "Восстановить файлы с флешки",
+        "Проверить компьютер на вирусы",
+        "Зашифровать рабочий диск",
+        "Поставить пароли на учётные записи",
+    ],
+}
+DETAILS = [
+    "Началось на прошлой неделе",
+    "Уже пробовал перезагружать, не помогает",
+    "Срочно, нужен для работы",
+    "Модель примерно пятилетней давности",
+    "Гарантия закончилась",
+    "Могу прислать фото ошибки",
+    "Нужна консультация, что лучше купить",
+    "Есть второй компьютер для проверки",
+]
+STREETS = [
+    "ул. Ленина", "пр. Мира", "ул. Гагарина", "ул. Садовая", "ул. Профсоюзная",
+    "Ленинский пр.", "ул. Тверская", "ул. Новослободская", "Кутузовский пр.", "ул. Бауманская",
+]
+FIRST_NAMES = [
+    ("Алексей", "alexey"), ("Мария", "maria"), ("Иван", "ivan"), ("Ольга", "olga"),
+    ("Дмитрий", "dmitry"), ("Анна", "anna"), ("Сергей", "sergey"), ("Елена", "elena"),
+    ("Андрей", "andrey"), ("Наталья", "natalia"), ("Павел", "pavel"), ("Татьяна", "tatiana"),
+]
+LAST_NAMES = ["Иванов", "Смирнов", "Кузнецов", "Попов", "Васильев", "Петров", "Соколов", "Михайлов", None]
+USER_COMMENTS = [
+    "Когда приедет мастер?",
+    "Удобно после 18:00",
+    "Проблема повторилась",
+    "Спасибо, всё работает!",
+    "Можно перенести на завтра?",
+    "Добавил фото в чат",
+]
+MANAGER_COMMENTS = [
+    "Связались с клиентом, согласовали время",
+    "Нужна запчасть, ждём поставку",
+    "Передано мастеру",
+    "Клиент не отвечает на звонки",
+    "Работы выполнены, клиент доволен",
+    "Требуется повторный выезд",
+]
+STATUS_COMMENTS = {
+    "IN_PROGRESS": "Заявка взята в работу",
+    "COMPLETED": "Работы выполнены",
+    "CANCELLED": "Отменена клиентом",
+    "REJECTED": "Не наш профиль",
+}
+
+
+class Weighted:
+    """Выбор из взвешенного набора за O(log n)"""
+
+    def __init__(self, weights: Dict):
+        self.values = list(weights)
+        self.cumulative = list(itertools.accumulate(weights.values()))
+        self.total = self.cumulative[-1]
+
+    def pick(self, rng: random.Random):
+        return self.values[bisect.bisect_right(self.cumulative, rng.random() * self.total)]
+
+
+def parse_count(value: str) -> int:
+    """Число с суффиксом: 500k, 2M"""
+    value = value.strip().lower().replace("_", "")
+    multiplier = {"k": 1_000, "m": 1_000_000}.get(value[-1:], 1)
+    return int(float(value.rstrip("km")) * multiplier)
+
+
+def database_dsn() -> str:
+    from app.config import settings
+
+    return settings.database.url.replace("postgresql+asyncpg://", "postgresql://", 1)
+
+
+class DatasetGenerator:
+    """Детерминированный генератор строк для COPY.
+
+    Идентификаторы строк назначаются при загрузке (nextval последовательностей),
+    поэтому генератор оперирует номерами: пользователь — индекс в списке,
+    заявка — порядковый номер.
+    """
+
+    def __init__(
+        self,
+        seed: int,
+        requests: int,
+        users: int,
+        managers: int,
+        days: int,
+        end: datetime,
+        comments_mean: float,
+        max_active: int,
+    ):
+        self.rng = random.Random(seed)
+        self.requests = requests
+        self.users = users
+        self.managers = managers
+        self.days = days
+        self.end = end
+        self.start = end - timedelta(days=days)
+        self.comments_mean = comments_mean
+        self.max_active = max_active
+        self.active = [0] * users
+        self.categories = Weighted(CATEGORY_WEIGHTS)
+        catalog = build_catalog()
+        self.services = {
+            category: Weighted({s: OWN_VARIANT_WEIGHT if s == OWN_VARIANT else 1 for s in services})
+            for category, services in catalog.items()
+        }
+        self.work_formats = Weighted(WORK_FORMAT_WEIGHTS)
+        self.preferred_times = Weighted(PREFERRED_TIME_WEIGHTS)
+        self.priorities = Weighted(PRIORITY_WEIGHTS)
+        self.status_by_age = [(hours, Weighted(dict(zip(STATUSES, weights)))) for hours, weights in STATUS_BY_AGE]
+        self.hours = Weighted(dict(enumerate(HOUR_WEIGHTS)))
+
+    # --- Пользователи ----------------------------------------------------
+
+    def user_rows(self) -> List[tuple]:
+        """Строки users без id: сначала клиенты, затем менеджеры (is_admin)"""
+        rng = self.rng
+        rows = []
+        for index in range(self.users + self.managers):
+            first_name, latin = rng.choice(FIRST_NAMES)
+            last_name = rng.choice(LAST_NAMES)
+            if last_name and first_name[-1] in "ая":
+                last_name += "а"
+            is_manager = index >= self.users
+            phone = None
+            if is_manager or rng.random() < 0.8:
+                phone = f"+7 9{rng.randrange(100):02d} {rng.randrange(1000):03d}-{rng.randrange(100):02d}-{rng.randrange(100):02d}"
+            # Первая заявка может быть раньше: created_at поправляется после загрузки
+            created = self.start - timedelta(days=30) + timedelta(seconds=rng.randrange((self.days + 30) * 86400))
+            rows.append((
+                TELEGRAM_ID_BASE + 1 + index,
+                f"{latin}_{index}" if is_manager or rng.random() < 0.6 else None,
+                first_name,
+                last_name,
+                phone,
+                is_manager,
+                0,
+                created,
+                created,
+            ))
+        return rows
+
+    def _user_index(self) -> int:
+        # Квадрат равномерной величины: немногие пользователи дают много заявок
+        return int(self.users * self.rng.random() ** 2)
+
+    # --- Заявки ----------------------------------------------------------
+
+    def _created_at(self) -> datetime:
+        rng = self.rng
+        while True:
+            # Плотность растёт линейно к концу периода (рост потока)
+            day = int(self.days * math.sqrt(rng.random()))
+            moment = self.start + timedelta(days=day, hours=self.hours.pick(rng), seconds=rng.randrange(3600))
+            if moment >= self.end:
+                continue
+            if moment.weekday() < 5 or rng.random() < WEEKEND_FACTOR:
+                return moment
+
+    def _status(self, age_hours: float) -> str:
+        for hours, weights in self.status_by_age:
+            if age_hours < hours:
+                return weights.pick(self.rng)
+        raise AssertionError("unreachable")
+
+    def _after(self, moment: datetime, mean_hours: float, limit: datetime) -> datetime:
+        """Момент через экспоненциальный интервал, не позже limit"""
+        delay = timedelta(hours=self.rng.expovariate(1 / mean_hours))
+        return min(moment + delay, moment + (limit - moment) * 0.9)
+
+    def _description(self, category: str) -> str:
+        rng = self.rng
+        if category == FREE_TEXT_CATEGORY:
+            phrases = PHRASES[rng.choice(list(PHRASES))]
+        else:
+            phrases = PHRASES[category]
+        parts = [rng.choice(phrases)]
+        for _ in range(rng.choice((0, 0, 1, 1, 2))):
+            parts.append(rng.choice(DETAILS))
+        return ". ".join(parts) + "."
+
+    def _address(self) -> str:
+        rng = self.rng
+        address = f"г. Москва, {rng.choice(STREETS)}, д. {rng.randint(1, 150)}"
+        if rng.random() < 0.85:
+            address += f", кв. {rng.randint(1, 400)}"
+        return address
+
+    def _comment_count(self, status: str) -> int:
+        # Геометрическое распределение; у закрытых заявок переписка длиннее
+        mean = self.comments_mean * (1.5 if status not in ACTIVE else 0.6)
+        if mean <= 0:
+            return 0
+        p = 1 / (1 + mean)
+        return int(math.log(1 - self.rng.random()) / math.log(1 - p))
+
+    def request_chunk(self, numbers: range) -> Tuple[List[tuple], List[tuple], List[tuple]]:
+        """Строки заявок, истории и комментариев для номеров заявок numbers.
+
+        Заявки — (номер, user_index, ...); история и комментарии ссылаются
+        на номер заявки и индекс пользователя (-1 — случайный менеджер).
+        """
+        rng = self.rng
+        requests, history, comments = [], [], []
+        for number in numbers:
+            created = self._created_at()
+            status = self._status((self.end - created).total_seconds() / 3600)
+            user = self._user_index()
+            if status in ACTIVE:
+                # Лимит активных заявок: другой пользователь или закрытая заявка
+                for _ in range(5):
+                    if self.active[user] < self.max_active:
+                        break
+                    user = self._user_index()
+                else:
+                    status = "CANCELLED"
+            if status in ACTIVE:
+                self.active[user] += 1
+
+            category = self.categories.pick(rng)
+            service = OWN_VARIANT if category == FREE_TEXT_CATEGORY else self.services[category].pick(rng)
+            work_format = self.work_formats.pick(rng)
+            address = self._address() if work_format in ADDRESS_FORMATS else None
+
+            history.append((number, None, "NEW", user, "Заявка создана", created))
+            updated = created
+            completed_at = None
+            manager = -1 - rng.randrange(self.managers)
+            if status in ("IN_PROGRESS", "COMPLETED") or (status == "CANCELLED" and rng.random() < 0.3):
+                updated = self._after(created, 3, self.end)
+                history.append((number, "NEW", "IN_PROGRESS", manager, STATUS_COMMENTS["IN_PROGRESS"], updated))
+            if status not in ACTIVE:
+                old_status = "IN_PROGRESS" if updated > created else "NEW"
+                mean_hours = {"COMPLETED": 30, "CANCELLED": 8, "REJECTED": 2}[status]
+                updated = self._after(updated, mean_hours, self.end)
+                changed_by = user if status == "CANCELLED" else manager
+                history.append((number, old_status, status, changed_by, STATUS_COMMENTS[status], updated))
+                if status == "COMPLETED":
+                    completed_at = updated
+
+            last_activity = updated if status not in ACTIVE else self.end
+            for _ in range(self._comment_count(status)):
+                moment = created + (last_activity - created) * rng.random()
+                if rng.random() < 0.45:
+                    comments.append((number, user, rng.choice(USER_COMMENTS), False, moment))
+                else:
+                    comments.append((number, manager, rng.choice(MANAGER_COMMENTS), rng.random() < 0.5, moment))
+
+            requests.append((
+                number,
+                user,
+                category,
+                service,
+                self._description(category),
+                work_format,
+                address,
+                self.preferred_times.pick(rng),
+                status,
+                self.priorities.pick(rng),
+                created,
+                updated,
+                completed_at,
+            ))
+        return requests, history, comments
+
+
+async def next_ids(conn: asyncpg.Connection, table: str, count: int) -> List[int]:
+    """count значений последовательности id таблицы (без блокировок, как у INSERT)"""
+    if count == 0:
+        return []
+    return await conn.fetchval(
+        "SELECT array_agg(nextval(pg_get_serial_sequence($1, 'id'))) FROM generate_series(1, $2)",
+        table,
+        count,
+    )
+
+
+async def seed(args) -> None:
+    from app.config import settings
+
+    users = args.users or max(1, args.requests // 6)
+    generator = DatasetGenerator(
+        seed=args.seed,
+        requests=args.requests,
+        users=users,
+        managers=args.managers,
+        days=args.days,
+        end=args.end,
+        comments_mean=args.comments_mean,
+        max_active=settings.max_requests_per_user,
+    )
+    conn = await asyncpg.connect(database_dsn())
+    try:
+        existing = await conn.fetchval(
+            "SELECT count(*) FROM requests WHERE request_id LIKE $1", REQUEST_PREFIX + "%"
+        )
+        if existing:
+            raise SystemExit(f"Синтетических заявок уже {existing}: сначала --cleanup")
+
+        print(f"Генерация: {args.requests} заявок, {users} пользователей, {args.managers} менеджеров, seed {args.seed}")
+        started = time.perf_counter()
+        totals = {"users": 0, "requests": 0, "request_status_history": 0, "request_comments": 0}
+        async with conn.transaction():
+            user_rows = generator.user_rows()
+            user_ids = await next_ids(conn, "users", len(user_rows))
+            await conn.copy_records_to_table(
+                "users", records=[(user_id, *row) for user_id, row in zip(user_ids, user_rows)], columns=USER_COLUMNS
+            )
+            totals["users"] = len(user_rows)
+            # Индекс пользователя -> id; отрицательные индексы — менеджеры с конца
+            client_ids, manager_ids = user_ids[:users], user_ids[users:]
+
+            def user_id(index: int) -> int:
+                return client_ids[index] if index >= 0 else manager_ids[-1 - index]
+
+            for offset in range(0, args.requests, CHUNK):
+                numbers = range(offset, min(args.requests, offset + CHUNK))
+                requests, history, comments = generator.request_chunk(numbers)
+                request_ids = await next_ids(conn, "requests", len(requests))
+                pk = dict(zip(numbers, request_ids))
+                await conn.copy_records_to_table(
+                    "requests",
+                    records=[
+                        (pk[number], f"{REQUEST_PREFIX}{number + 1:09d}", user_id(user), *rest)
+                        for number, user, *rest in requests
+                    ],
+                    columns=REQUEST_COLUMNS,
+                )
+                history_ids = await next_ids(conn, "request_status_history", len(history))
+                await conn.copy_records_to_table(
+                    "request_status_history",
+                    records=[
+                        (row_id, pk[number], old, new, user_id(by), comment, moment)
+                        for row_id, (number, old, new, by, comment, moment) in zip(history_ids, history)
+                    ],
+                    columns=HISTORY_COLUMNS,
+                )
+                comment_ids = await next_ids(conn, "request_comments", len(comments))
+                await conn.copy_records_to_table(
+                    "request_comments",
+                    records=[
+                        (row_id, pk[number], user_id(author), text, internal, moment)
+                        for row_id, (number, author, text, internal, moment) in zip(comment_ids, comments)
+                    ],
+                    columns=COMMENT_COLUMNS,
+                )
+                totals["requests"] += len(requests)
+                totals["request_status_history"] += len(history)
+                totals["request_comments"] += len(comments)
+                elapsed = time.perf_counter() - started
+                print(f"  {totals['requests']:>10} заявок  {totals['requests'] / elapsed:>8.0f} заявок/с", flush=True)
+
+            # Счётчик активных заявок и дата регистрации не позже первой заявки
+            await conn.execute(
+                """
+                UPDATE users u
+                SET active_requests = r.active,
+                    created_at = LEAST(u.created_at, r.first_created),
+                    updated_at = GREATEST(u.updated_at, r.last_updated)
+                FROM (
+                    SELECT user_id,
+                           count(*) FILTER (WHERE status IN ('NEW', 'IN_PROGRESS')) AS active,
+                           min(created_at) AS first_created,
+                           max(updated_at) AS last_updated
+                    FROM requests
+                    WHERE request_id LIKE $1
+                    GROUP BY user_id
+                ) r
+                WHERE u.id = r.user_id
+                """,
+                REQUEST_PREFIX + "%",
+            )
+        print(f"Загружено за {time.perf_counter() - started:.1f} с: "
+              + ", ".join(f"{table} {count}" for table, count in totals.items()))
+
+        for table in totals:
+            await conn.execute(f"ANALYZE {table}")
+    finally:
+        await conn.close()
+
+    if not args.skip_stats:
+        await backfill_stats(generator.start - timedelta(days=1), args.end + timedelta(hours=1))
+
+
+async def backfill_stats(date_from: datetime, date_to: datetime) -> None:
+    from app.database.connection import AsyncSessionLocal
+    from app.services.stats_service import StatsService
+
+    started = time.perf_counter()
+    async with AsyncSessionLocal() as db:
+        buckets = await StatsService(db).backfill(date_from, date_to)
+    print(f"Статистика пересчитана: {buckets} бакетов за {time.perf_counter() - started:.1f} с")
+
+
+async def cleanup(args) -> None:
+    conn = await asyncpg.connect(database_dsn())
+    pattern = REQUEST_PREFIX + "%"
+    try:
+        period = await conn.fetchrow(
+            "SELECT min(created_at) AS date_from, max(created_at) AS date_to FROM requests WHERE request_id LIKE $1",
+            pattern,
+        )
+        async with conn.transaction():
+            seeded = "SELECT id FROM requests WHERE request_id LIKE $1"
+            for table in ("request_comments", "request_status_history", "request_executors", "idempotency_keys"):
+                await conn.execute(f"DELETE FROM {table} WHERE request_id IN ({seeded})", pattern)
+            deleted = await conn.execute("DELETE FROM requests WHERE request_id LIKE $1", pattern)
+            # Менеджеры могли оставить комментарии и историю в чужих заявках
+            await conn.execute(f"DELETE FROM request_comments WHERE user_id IN ({SEEDED_USERS})", *USER_BOUNDS)
+            await conn.execute(f"DELETE FROM request_status_history WHERE changed_by IN ({SEEDED_USERS})", *USER_BOUNDS)
+        # Проверка FK при удалении пользователя — полный просмотр истории и
+        # комментариев (индексов по авторам нет); без VACUUM просматриваются
+        # и только что удалённые строки
+        for table in ("request_comments", "request_status_history"):
+            await conn.execute(f"VACUUM {table}")
+        users = await conn.execute(f"DELETE FROM users WHERE id IN ({SEEDED_USERS})", *USER_BOUNDS)
+        print(f"Удалено: заявок {deleted.split()[-1]}, пользователей {users.split()[-1]}")
+    finally:
+        await conn.close()
+
+    if period["date_from"] is not None and not args.skip_stats:
+        await backfill_stats(period["date_from"], period["date_to"] + timedelta(hours=1))
+
+
+def parse_end(value: str) -> datetime:
+    return datetime.fromisoformat(value)
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=parse_count, default=1_000_000, help="Количество заявок (500k, 2M)")
+    parser.add_argument("--users", type=parse_count, default=0, help="Клиентов (по умолчанию заявок / 6)")
+    parser.add_argument("--managers", type=int, default=25, help="Менеджеров (is_admin), меняющих статусы")
+    parser.add_argument("--days", type=int, default=365, help="Период создания заявок, дней")
+    parser.add_argument("--end", type=parse_end, default=None,
+                        help="Конец периода, UTC (YYYY-MM-DD[THH:MM]; по умолчанию — текущий час)")
+    parser.add_argument("--comments-mean", type=float, default=1.0, help="Среднее число комментариев на заявку")
+    parser.add_argument("--seed", type=int, default=1, help="Зерно генератора")
+    parser.add_argument("--skip-stats", action="store_true", help="Не пересчитывать request_stats_hourly")
+    parser.add_argument("--cleanup", action="store_true", help="Удалить синтетические данные и выйти")
+    args = parser.parse_args()
+    if args.end is None:
+        args.end = datetime.utcnow().replace(minute=0, second=0, microsecond=0)
+
+    from app.database.connection import close_db, init_db
+
+    try:
+        await init_db()
+        if args.cleanup:
+            await cleanup(args)
+        else:
+            await seed(args)
+    finally:
+        await close_db()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+"""
+Приёмник трасс (замена OTLP-коллектора) и просмотр трасс бот -> API -> SQL.
+
+serve — принимает OTLP/HTTP JSON (POST /v1/traces) от бота и API
+(BOT_TRACE_EXPORTER=otlp, TRACE_EXPORTER=otlp), собирает сегменты сервисов
+по traceId и через --decision-wait секунд после первого спана принимает
+решение по всей трассе (хвостовое семплирование): сохраняются трассы
+с ошибкой, дольше --slow-ms, отобранные в голове (флаг sampled) и доля
+--keep-rate остальных. Сохранённые трассы пишутся строкой JSON в --output:
+  python scripts/trace_collector.py serve --port 4318 --slow-ms 500 --output logs/traces.jsonl
+
+show — дерево спанов (смещение от начала трассы, длительность) и разбивка
+собственного времени по слоям: обработчик бота, Bot API, клиент API
+(сеть и очередь), маршрут и middleware, сервис, SQL. Читает вывод serve
+и файлы экспортёров (TRACE_EXPORTER=file), сегменты разных файлов
+склеиваются по traceId:
+  python scripts/trace_collector.py show logs/traces-bot.jsonl logs/traces-api.jsonl --top 5
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from typing import Dict, Iterable, Iterator, List
+
+SERVER = 2
+
+
+def flatten(payload: dict) -> Iterator[dict]:
+    """Спаны OTLP/JSON с именем сервиса в поле service"""
+    for resource_spans in payload.get("resourceSpans", ()):
+        service = "?"
+        for attribute in resource_spans.get("resource", {}).get("attributes", ()):
+            if attribute["key"] == "service.name":
+                service = attribute["value"].get("stringValue", "?")
+        for scope_spans in resource_spans.get("scopeSpans", ()):
+            for span in scope_spans.get("spans", ()):
+                yield {**span, "service": service}
+
+
+def is_error(span: dict) -> bool:
+    return span.get("status", {}).get("code") == 2
+
+
+def span_duration_ms(span: dict) -> float:
+    return (int(span["endTimeUnixNano"]) - int(span["startTimeUnixNano"])) / 1e6
+
+
+def trace_duration_ms(spans: List[dict]) -> float:
+    start = min(int(span["startTimeUnixNano"]) for span in spans)
+    end = max(int(span["endTimeUnixNano"]) for span in spans)
+    return (end - start) / 1e6
+
+
+class TailSampler:
+    """Буфер спанов по traceId и решение по трассе целиком"""
+
+    def __init__(self, output: str, decision_wait: float, slow_ms: float, keep_rate: float):
+        directory = os.path.dirname(output)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.output = open(output, "a", encoding="utf-8")
+        self.decision_wait = decision_wait
+        self.slow_ms = slow_ms
+        self.keep_rate = keep_rate
+        self.pending: Dict[str, List[dict]] = {}
+        self.first_seen: Dict[str, float] = {}
+        self.counters = defaultdict(int)
+
+    def add(self, payload: dict) -> int:
+        count = 0
+        now = time.monotonic()
+        for span in flatten(payload):
+            trace_id = span["traceId"]
+            if trace_id not in self.pending:
+                self.pending[trace_id] = []
+                self.first_seen[trace_id] = now
+            self.pending[trace_id].append(span)
+            count += 1
+        return count
+
+    def decide(self, spans: List[dict]) -> str:
+        if any(is_error(span) for span in spans):
+            return "error"
+        if trace_duration_ms(spans) >= self.slow_ms:
+            return "slow"
+        if any(span.get("flags", 0) & 1 for span in spans):
+            return "sampled"
+        if random.random() < self.keep_rate:
+            return "random"
+        return ""
+
+    def flush(self, everything: bool = False) -> None:
+        deadline = time.monotonic() - self.decision_wait
+        ready = [trace_id for trace_id, seen in self.first_seen.items() if everything or seen <= deadline]
+        for trace_id in ready:
+            del self.first_seen[trace_id]
+            spans = self.pending.pop(trace_id)
+            reason = self.decide(spans)
+            self.counters[reason or "dropped"] += 1
+            if reason:
+                record = {"traceId": trace_id, "reason": reason, "spans": spans}
+                self.output.write(json.dumps(record, ensure_ascii=False) + "\n")
+        if ready:
+            self.output.flush()
+
+    def close(self) -> None:
+        self.flush(everything=True)
+        self.output.close()
+
+
+def build_app(sampler: TailSampler):
+    from fastapi import FastAPI, Request
+    from fastapi.responses import JSONResponse
+
+    async def flush_loop():
+        while True:
+            await asyncio.sleep(min(1.0, sampler.decision_wait))
+            sampler.flush()
+
+    @asynccontextmanager
+    async def lifespan(app):
+        task = asyncio.create_task(flush_loop())
+        yield
+        task.cancel()
+        sampler.close()
+        print("Трассы: " + ", ".join(f"{key}={value}" for key, value in sorted(sampler.counters.items())))
+
+    app = FastAPI(lifespan=lifespan)
+
+    @app.post("/v1/traces")
+    async def export(request: Request):
+        sampler.add(await request.json())
+        return JSONResponse({"partialSuccess": {}})
+
+    return app
+
+
+def load_traces(paths: Iterable[str]) -> Dict[str, List[dict]]:
+    """Спаны из файлов экспортёров и вывода serve, сгруппированные по traceId"""
+    traces: Dict[str, Dict[str, dict]] = defaultdict(dict)
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                spans = record["spans"] if "spans" in record else flatten(record)
+                for span in spans:
+                    traces[span["traceId"]][span["spanId"]] = span
+    return {trace_id: list(spans.values()) for trace_id, spans in traces.items()}
+
+
+def category(span: dict) -> str:
+    name = span["name"]
+    if name.startswith("SQL "):
+        return "SQL"
+    if name.startswith("telegram "):
+        return "Bot API"
+    if name.startswith("API "):
+        return "клиент API"
+    if name.startswith("bot "):
+        return "обработчик бота"
+    if span.get("kind") == SERVER:
+        return "маршрут"
+    return "сервис"
+
+
+def self_times(spans: List[dict]) -> Dict[str, float]:
+    """Собственное время спанов (без дочерних) по слоям, мс"""
+    children = defaultdict(float)
+    for span in spans:
+        if span.get("parentSpanId"):
+            children[span["parentSpanId"]] += span_duration_ms(span)
+    totals = defaultdict(float)
+    for span in spans:
+        totals[category(span)] += max(0.0, span_duration_ms(span) - children[span["spanId"]])
+    return totals
+
+
+def print_trace(trace_id: str, spans: List[dict]) -> None:
+    by_parent = defaultdict(list)
+    ids = {span["spanId"] for span in spans}
+    roots = []
+    for span in spans:
+        parent = span.get("parentSpanId")
+        if parent and parent in ids:
+            by_parent[parent].append(span)
+        else:
+            roots.append(span)
+    start = min(int(span["startTimeUnixNano"]) for span in spans)
+    print(f"\nТрасса {trace_id}: {trace_duration_ms(spans):.1f} мс, {len(spans)} спанов")
+
+    def walk(span: dict, depth: int) -> None:
+        offset = (int(span["startTimeUnixNano"]) - start) / 1e6
+        mark = " ОШИБКА" if is_error(span) else ""
+        print(f"  {offset:9.1f} {span_duration_ms(span):9.1f}  {'  ' * depth}{span['name']} [{span['service']}]{mark}")
+        for child in sorted(by_parent[span["spanId"]], key=lambda item: int(item["startTimeUnixNano"])):
+            walk(child, depth + 1)
+
+    for root in sorted(roots, key=lambda item: int(item["startTimeUnixNano"])):
+        walk(root, 0)
+    total = trace_duration_ms(spans)
+    print("  Собственное время:")
+    for name, value in sorted(self_times(spans).items(), key=lambda item: -item[1]):
+        print(f"    {name:<18} {value:9.1f} мс  {value / total * 100 if total else 0:5.1f}%")
+
+
+def show(args) -> None:
+    traces = load_traces(args.files)
+    if args.trace:
+        selected = [args.trace] if args.trace in traces else []
+    else:
+        selected = sorted(traces, key=lambda trace_id: -trace_duration_ms(traces[trace_id]))[:args.top]
+    if not selected:
+        print("Трассы не найдены", file=sys.stderr)
+        sys.exit(1)
+    for trace_id in selected:
+        print_trace(trace_id, traces[trace_id])
+
+
+def serve(args) -> None:
+    import uvicorn
+
+    sampler = TailSampler(args.output, args.decision_wait, args.slow_ms, args.keep_rate)
+    print(f"Коллектор: TRACE_OTLP_URL=http://{args.host}:{args.port}/v1/traces, трассы -> {args.output}")
+    uvicorn.run(build_app(sampler), host=args.host, port=args.port, log_level="warning")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    serve_parser = commands.add_parser("serve", help="Приём OTLP/HTTP JSON и хвостовое семплирование")
+    serve_parser.add_argument("--host", default="127.0.0.1")
+    serve_parser.add_argument("--port", type=int, default=4318)
+    serve_parser.add_argument("--output", default="logs/traces.jsonl")
+    serve_parser.add_argument("--decision-wait", type=float, default=5.0, help="Ожидание сегментов трассы, с")
+    serve_parser.add_argument("--slow-ms", type=float, default=500.0, help="Медленные трассы сохраняются всегда")
+    serve_parser.add_argument("--keep-rate", type=float, default=0.0, help="Доля остальных сохраняемых трасс")
+    serve_parser.set_defaults(handler=serve)
+
+    show_parser = commands.add_parser("show", help="Дерево спанов и разбивка времени по слоям")
+    show_parser.add_argument("files", nargs="+")
+    show_parser.add_argument("--trace", help="traceId")
+    show_parser.add_argument("--top", type=int, default=5, help="Самые долгие трассы")
+    show_parser.set_defaults(handler=show)
+
+    args = parser.parse_args()
+    args.handler(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Автомат вызовов API бота (bot.circuit): размыкание по доле ошибок,
+half_open после паузы, единственный пробный вызов и устаревшие результаты.
+"""
+import pytest
+
+from bot.circuit import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr("bot.circuit.time", clock)
+    return clock
+
+
+def failures(breaker, count):
+    for _ in range(count):
+        breaker.record(breaker.check(), False)
+
+
+def test_opens_at_failure_threshold(clock):
+    breaker = CircuitBreaker(window=60, failure_rate=0.5, min_calls=4, open_seconds=30)
+    breaker.record(breaker.check(), True)
+    failures(breaker, 2)
+    assert breaker.state == CLOSED
+    failures(breaker, 1)
+    assert breaker.state == OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.check()
+
+
+def test_half_open_after_cooldown_lets_one_probe(clock):
+    breaker = CircuitBreaker(min_calls=1, open_seconds=30)
+    failures(breaker, 1)
+    clock.now += 29
+    assert breaker.allow() is None
+    clock.now += 1
+    probe = breaker.allow()
+    assert probe is not None and probe.probe and breaker.state == HALF_OPEN
+    assert breaker.allow() is None
+    breaker.record(probe, False)
+    assert breaker.state == OPEN
+
+    clock.now += 30
+    breaker.record(breaker.check(), True)
+    assert breaker.state == CLOSED
+
+
+def test_stale_result_does_not_replace_probe(clock):
+    breaker = CircuitBreaker(min_calls=2, open_seconds=30)
+    slow = breaker.check()
+    failures(breaker, 2)
+    assert breaker.state == OPEN
+    clock.now += 30
+    probe = breaker.check()
+    # Ответ вызова, начатого до размыкания, пришёл во время пробного
+    breaker.record(slow, True)
+    assert breaker.state == HALF_OPEN
+    assert breaker.allow() is None
+    breaker.record(probe, False)
+    assert breaker.state == OPEN
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""
+Логирование (app.logging_config): маскирование персональных данных,
+семплирование записей по логгерам и смена уровней на ходу.
+"""
+import logging
+
+import pytest
+
+from app.logging_config import SamplingFilter, logging_state, redact_pii, set_log_levels
+
+
+def test_pii_is_redacted():
+    event = redact_pii(None, "info", {
+        "event": "phone_received",
+        "phone": "+7 (999) 123-45-67",
+        "address": "ул. Ленина, 1",
+        "error": "Ошибка для 89991234567 от 2024-05-01, чат -1001234567890",
+        "user_id": 123456789,
+    })
+    assert event["phone"] == "***67"
+    assert event["address"] == "<скрыто, 13 симв.>"
+    assert event["error"] == "Ошибка для <телефон ***67> от 2024-05-01, чат -1001234567890"
+    assert event["user_id"] == 123456789
+
+
+def test_sampling_applies_to_child_loggers_below_warning():
+    sampling = SamplingFilter({"bot": 0.0, "bot.spool": 1.0})
+
+    def record(name, level):
+        return logging.LogRecord(name, level, __file__, 1, "event", None, None)
+
+    assert not sampling.filter(record("bot.handlers", logging.INFO))
+    assert sampling.filter(record("bot.handlers", logging.WARNING))
+    assert sampling.filter(record("bot.spool", logging.DEBUG))
+    assert sampling.filter(record("app.api", logging.DEBUG))
+    assert sampling.dropped == 1
+
+
+def test_levels_change_at_runtime():
+    handlers = logging.getLogger("bot.handlers")
+    previous = handlers.level
+    try:
+        set_log_levels("bot.handlers=debug")
+        assert handlers.getEffectiveLevel() == logging.DEBUG
+        assert logging_state()["levels"]["bot.handlers"] == "DEBUG"
+        with pytest.raises(ValueError):
+            set_log_levels("bot.handlers=LOUD")
+        assert handlers.getEffectiveLevel() == logging.DEBUG
+    finally:
+        handlers.setLevel(previous)
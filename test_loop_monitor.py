@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""
+Монитор цикла событий (app.loop_monitor): остановка цикла фиксируется со
+стеком виновника, отладочный режим отмечает блокирующие вызовы.
+"""
+import asyncio
+import time
+
+from app.loop_monitor import BLOCKING_CALLS, EVENT_LOOP_STALLS, LoopMonitor
+
+
+def blocking_handler():
+    time.sleep(0.2)
+
+
+def test_stall_and_blocking_call_are_reported(monkeypatch):
+    events = []
+    monkeypatch.setattr("app.loop_monitor.logger.warning", lambda event, **fields: events.append((event, fields)))
+    stalls_before = EVENT_LOOP_STALLS._value.get()
+    sleeps_before = BLOCKING_CALLS.labels("time.sleep")._value.get()
+
+    async def scenario():
+        monitor = LoopMonitor(interval=0.02, stall_ms=50, debug=True)
+        monitor.start()
+        await asyncio.sleep(0.05)
+        blocking_handler()
+        await asyncio.sleep(0.05)
+        await monitor.stop()
+
+    asyncio.run(scenario())
+
+    assert time.sleep.__name__ == "sleep" and time.sleep.__module__ == "time"
+    assert EVENT_LOOP_STALLS._value.get() == stalls_before + 1
+    assert BLOCKING_CALLS.labels("time.sleep")._value.get() == sleeps_before + 1
+    by_event = {event: fields for event, fields in events}
+    assert "blocking_handler" in by_event["event_loop_stall"]["stack"]
+    assert by_event["blocking_call"]["site"].endswith(f"test_loop_monitor.py:{blocking_handler.__code__.co_firstlineno + 1}")
+    assert by_event["event_loop_stall_ended"]["lag_ms"] >= 150
+
+
+def test_sleep_outside_loop_is_not_reported():
+    before = BLOCKING_CALLS.labels("time.sleep")._value.get()
+
+    async def scenario():
+        monitor = LoopMonitor(interval=0.02, stall_ms=50, debug=True)
+        monitor.start()
+        await asyncio.to_thread(time.sleep, 0.01)
+        await monitor.stop()
+
+    asyncio.run(scenario())
+    assert BLOCKING_CALLS.labels("time.sleep")._value.get() == before
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Профилирование по запросу (app.profiling): CPU-профиль видит код,
+занимающий цикл событий, tracemalloc показывает рост памяти.
+"""
+import asyncio
+
+import pytest
+
+from app.profiling import ProfilerBusy, memory_tracker, profile_cpu
+
+
+def busy_function():
+    return sum(i * i for i in range(20000))
+
+
+def test_cpu_profile_attributes_time_to_busy_code():
+    async def busy(seconds: float):
+        loop = asyncio.get_running_loop()
+        end = loop.time() + seconds
+        while loop.time() < end:
+            busy_function()
+            await asyncio.sleep(0)
+
+    async def scenario():
+        task = asyncio.create_task(busy(0.7))
+        profiler = await profile_cpu(0.5, interval=0.002)
+        await task
+        return profiler
+
+    profiler = asyncio.run(scenario())
+    assert profiler.samples > 0
+    in_busy = sum(count for stack, count in profiler.stacks.items() if "busy_function (" in stack)
+    assert in_busy / profiler.samples > 0.5
+    line = profiler.collapsed().splitlines()[0]
+    stack, count = line.rsplit(" ", 1)
+    assert stack.startswith("MainThread;") and int(count) > 0
+
+
+def test_cpu_profile_is_exclusive():
+    async def scenario():
+        first = asyncio.create_task(profile_cpu(0.2))
+        await asyncio.sleep(0.01)
+        with pytest.raises(ProfilerBusy):
+            await profile_cpu(0.1)
+        await first
+
+    asyncio.run(scenario())
+
+
+def test_memory_diff_shows_growth():
+    memory_tracker.start(frames=1)
+    try:
+        retained = [bytearray(1024) for _ in range(2000)]
+        report = memory_tracker.diff(limit=5)
+    finally:
+        memory_tracker.stop()
+    assert len(retained) == 2000
+    assert report["top"][0]["size_diff_kb"] >= 2000
+    assert report["top"][0]["traceback"][0].startswith("test_profiling.py:")
+    assert not memory_tracker.active
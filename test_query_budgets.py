@@ -0,0 +1,305 @@
+#!/usr/bin/env python3
+"""
+Бюджеты SQL-запросов на эндпоинты API.
+
+Каждый эндпоинт вызывается через httpx.ASGITransport; число запросов к БД
+не должно превышать бюджет. Бюджеты равны текущему числу запросов: новый
+запрос в горячем пути (ленивая загрузка связи, лишний commit) роняет
+тест, а уменьшение — повод понизить бюджет.
+
+Тесты работают во временной БД, которая создаётся на сервере из настроек
+DB_* и удаляется после тестов модуля; рабочая БД не затрагивается. Если
+сервер недоступен или у пользователя нет права CREATEDB, тесты
+пропускаются.
+"""
+import asyncio
+import itertools
+import os
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+
+os.environ.setdefault("TELEGRAM_TOKEN", "123456:test")
+
+import httpx
+from sqlalchemy import select, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import NullPool
+
+from app.access_log import AccessLogMiddleware
+from app.config import settings
+from app.database import connection
+from app.database.models import Executor, IdempotencyKey, Request, RequestExecutor
+from app.main import app
+from app.query_stats import install_query_hooks
+from app.services import assignment
+
+TELEGRAM_IDS = itertools.count(6_000_000_000)
+ADMIN_ID = next(TELEGRAM_IDS)
+
+REQUEST_BODY = {
+    "category": "🔴 Компьютер глючит/не работает",
+    "service": "💻 Тормозит/Не включается",
+    "description": "Ноутбук не включается после обновления",
+    "work_format": "home_visit",
+    "address": "г. Москва, ул. Тестовая, д. 1, кв. 1",
+    "preferred_time": "evening",
+}
+
+# Эндпоинт -> максимум SQL-запросов
+BUDGETS = {
+    "POST /requests/ (новый пользователь)": 12,
+    "POST /requests/ (повтор Idempotency-Key)": 3,
+    "GET /requests/{request_id}": 4,
+    "GET /requests/user/{user_id}": 2,
+    "PUT /requests/{request_id}/status": 8,
+    "POST /requests/{request_id}/assign": 4,
+    "POST /requests/{request_id}/assign (переназначение)": 4,
+    "GET /requests/search": 2,
+    "GET /requests/": 2,
+    "GET /stats": 1,
+}
+
+
+async def _execute_on_server(statement: str) -> None:
+    """Выполнение команды в служебной БД postgres (CREATE/DROP DATABASE)"""
+    server = create_async_engine(
+        make_url(settings.database.url).set(database="postgres"),
+        isolation_level="AUTOCOMMIT", poolclass=NullPool,
+    )
+    try:
+        async with server.connect() as conn:
+            await conn.execute(text(statement))
+    finally:
+        await server.dispose()
+
+
+@pytest.fixture(scope="module")
+def database():
+    """Временная БД со схемой API; удаляется после тестов модуля"""
+    name = f"{settings.database.name}_budgets_{uuid.uuid4().hex[:8]}"
+    try:
+        asyncio.run(_execute_on_server(f'CREATE DATABASE "{name}"'))
+    except Exception as e:
+        pytest.skip(f"временная БД недоступна: {e}")
+    engine = create_async_engine(make_url(settings.database.url).set(database=name))
+    install_query_hooks(engine, settings.monitoring.db_slow_query_ms)
+
+    async def create_schema():
+        real_engine, connection.engine = connection.engine, engine
+        try:
+            await connection.init_db()
+        finally:
+            connection.engine = real_engine
+            await engine.dispose()
+
+    try:
+        asyncio.run(create_schema())
+        yield engine
+    finally:
+        asyncio.run(_execute_on_server(f'DROP DATABASE IF EXISTS "{name}" WITH (FORCE)'))
+
+
+@pytest.fixture
+def api(database, monkeypatch):
+    """Запуск сценария с клиентом API поверх временной БД.
+
+    Приложение отдаёт заголовок X-DB-Queries; администратор — ADMIN_ID
+    (без изменения окружения процесса).
+    """
+    sessions = async_sessionmaker(database, class_=AsyncSession, expire_on_commit=False)
+    monkeypatch.setattr(connection, "engine", database)
+    monkeypatch.setattr(connection, "AsyncSessionLocal", sessions)
+    monkeypatch.setattr(assignment, "AsyncSessionLocal", sessions)
+    monkeypatch.setattr(settings.telegram, "admin_ids", [ADMIN_ID])
+    for middleware in app.user_middleware:
+        if middleware.cls is AccessLogMiddleware:
+            monkeypatch.setitem(middleware.options, "db_queries_header", True)
+    # Стек middleware собирается заново с изменёнными параметрами
+    monkeypatch.setattr(app, "middleware_stack", None)
+
+    def run(scenario):
+        """asyncio.run с закрытием пула: соединения asyncpg привязаны к циклу событий"""
+
+        async def wrapper():
+            try:
+                # Соединение пула открыто заранее: запросы диалекта при подключении не в счёт
+                async with database.connect() as conn:
+                    await conn.execute(text("SELECT 1"))
+                transport = httpx.ASGITransport(app=app)
+                async with httpx.AsyncClient(transport=transport, base_url="http://api.test/api/v1") as client:
+                    return await scenario(client)
+            finally:
+                await database.dispose()
+
+        return asyncio.run(wrapper())
+
+    yield run
+    app.middleware_stack = None
+
+
+@pytest.fixture
+def call(query_budget):
+    """Вызов эндпоинта в пределах его бюджета"""
+
+    async def call(client: httpx.AsyncClient, name: str, method: str, url: str, **kwargs) -> httpx.Response:
+        with query_budget(BUDGETS[name], name) as stats:
+            response = await client.request(method, url, **kwargs)
+        assert response.status_code < 400, f"{name}: {response.status_code} {response.text}"
+        # Заголовок отладки считает те же запросы, что и фикстура
+        assert int(response.headers["x-db-queries"]) == stats.count
+        return response
+
+    return call
+
+
+async def create_request(client: httpx.AsyncClient, telegram_id: int, **headers) -> dict:
+    """Заявка вне бюджета — подготовка для остальных эндпоинтов"""
+    response = await client.post("/requests/", params={"telegram_id": telegram_id}, json=REQUEST_BODY, headers=headers)
+    assert response.status_code < 400, response.text
+    return response.json()
+
+
+def test_create_request(api, call):
+    telegram_id = next(TELEGRAM_IDS)
+
+    async def scenario(client):
+        await call(
+            client, "POST /requests/ (новый пользователь)", "POST", "/requests/",
+            params={"telegram_id": telegram_id}, json=REQUEST_BODY,
+            headers={"Idempotency-Key": f"budget-{telegram_id}"},
+        )
+
+    api(scenario)
+
+
+def test_create_request_idempotent_repeat(api, call):
+    telegram_id = next(TELEGRAM_IDS)
+    key = {"Idempotency-Key": f"budget-{telegram_id}"}
+
+    async def scenario(client):
+        created = await create_request(client, telegram_id, **key)
+        repeated = await call(
+            client, "POST /requests/ (повтор Idempotency-Key)", "POST", "/requests/",
+            params={"telegram_id": telegram_id}, json=REQUEST_BODY, headers=key,
+        )
+        assert repeated.json()["request_id"] == created["request_id"]
+        # Ключ, запрос с которым ещё не завершён: 409, повтор позже
+        async with connection.AsyncSessionLocal() as db:
+            db.add(IdempotencyKey(
+                user_id=created["user_id"], key=f"inflight-{telegram_id}", fingerprint="-",
+                expires_at=datetime.utcnow() + timedelta(hours=1),
+            ))
+            await db.commit()
+        inflight = await client.post(
+            "/requests/", params={"telegram_id": telegram_id}, json=REQUEST_BODY,
+            headers={"Idempotency-Key": f"inflight-{telegram_id}"},
+        )
+        assert inflight.status_code == 409, inflight.text
+
+    api(scenario)
+
+
+def test_get_request(api, call):
+    async def scenario(client):
+        created = await create_request(client, next(TELEGRAM_IDS))
+        await call(client, "GET /requests/{request_id}", "GET", f"/requests/{created['request_id']}")
+
+    api(scenario)
+
+
+def test_user_requests(api, call):
+    async def scenario(client):
+        created = await create_request(client, next(TELEGRAM_IDS))
+        await call(client, "GET /requests/user/{user_id}", "GET", f"/requests/user/{created['user_id']}")
+
+    api(scenario)
+
+
+def test_update_status(api, call):
+    telegram_id = next(TELEGRAM_IDS)
+
+    async def scenario(client):
+        created = await create_request(client, telegram_id)
+        await call(
+            client, "PUT /requests/{request_id}/status", "PUT", f"/requests/{created['request_id']}/status",
+            params={"telegram_id": telegram_id}, json={"status": "in_progress", "expected_status": "new"},
+        )
+        # Второй менеджер нажал ту же кнопку: статус уже не new
+        conflict = await client.put(
+            f"/requests/{created['request_id']}/status",
+            params={"telegram_id": telegram_id}, json={"status": "rejected", "expected_status": "new"},
+        )
+        assert conflict.status_code == 409 and conflict.headers["x-request-status"] == "in_progress"
+
+    api(scenario)
+
+
+def test_assign_and_reassign(api, call):
+    telegram_id = next(TELEGRAM_IDS)
+
+    async def scenario(client):
+        created = await create_request(client, telegram_id)
+        # Заявка уже в работе: назначение не меняет статус
+        taken = await client.put(
+            f"/requests/{created['request_id']}/status",
+            params={"telegram_id": telegram_id}, json={"status": "in_progress"},
+        )
+        assert taken.status_code == 200, taken.text
+        async with connection.AsyncSessionLocal() as db:
+            executors = [Executor(user_id=created["user_id"], specialization="budget") for _ in range(2)]
+            db.add_all(executors)
+            await db.commit()
+            executor_ids = [executor.id for executor in executors]
+        for name, executor_id in zip(
+            ("POST /requests/{request_id}/assign", "POST /requests/{request_id}/assign (переназначение)"),
+            executor_ids,
+        ):
+            assigned = await call(
+                client, name, "POST", f"/requests/{created['request_id']}/assign",
+                params={"admin_id": ADMIN_ID, "assigned_by": created["user_id"], "executor_id": executor_id},
+            )
+            assert assigned.json()["executor_id"] == executor_id
+        for url in (f"/requests/{created['request_id']}/assign", "/requests/claim"):
+            denied = await client.post(url, params={"admin_id": ADMIN_ID + 1, "assigned_by": 1, "claimed_by": 1})
+            assert denied.status_code == 403, f"{url}: {denied.status_code}"
+        async with connection.AsyncSessionLocal() as db:
+            primary = (await db.execute(
+                select(RequestExecutor.executor_id)
+                .join(Request, Request.id == RequestExecutor.request_id)
+                .where(Request.request_id == created["request_id"], RequestExecutor.is_primary.is_(True))
+            )).scalars().all()
+        assert primary == [executor_ids[1]]
+
+    api(scenario)
+
+
+def test_search(api, call):
+    async def scenario(client):
+        await create_request(client, next(TELEGRAM_IDS))
+        found = await call(client, "GET /requests/search", "GET", "/requests/search", params={"q": "ноутбук", "admin_id": ADMIN_ID})
+        assert found.json()
+        denied = await client.get("/requests/search", params={"q": "ноутбук", "admin_id": ADMIN_ID + 1})
+        assert denied.status_code == 403
+
+    api(scenario)
+
+
+def test_list_requests(api, call):
+    async def scenario(client):
+        await create_request(client, next(TELEGRAM_IDS))
+        await call(client, "GET /requests/", "GET", "/requests/", params={"per_page": 20})
+
+    api(scenario)
+
+
+def test_stats(api, call):
+    async def scenario(client):
+        await create_request(client, next(TELEGRAM_IDS))
+        await call(client, "GET /stats", "GET", "/stats", params={"admin_id": ADMIN_ID})
+        denied = await client.get("/stats", params={"admin_id": ADMIN_ID + 1})
+        assert denied.status_code == 403
+
+    api(scenario)
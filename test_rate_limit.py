@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Ограничение частоты запросов (app.rate_limit): 429 с Retry-After,
+списание только при разрешении всех лимитов, исключённые и внутренние
+сети, доверенные прокси и вытеснение корзин.
+"""
+import asyncio
+
+import httpx
+from fastapi import FastAPI
+
+from app.rate_limit import Limit, MemoryBackend, RateLimitMiddleware, parse_networks, parse_rules
+
+RULES = parse_rules('{"*": {"ip": "3/minute", "user": "1/minute"}}')
+
+
+def build_app(backend: MemoryBackend, client=("203.0.113.5", 1234), **options):
+    app = FastAPI()
+
+    @app.get("/ping")
+    async def ping():
+        return {"ok": True}
+
+    app.add_middleware(RateLimitMiddleware, backend=backend, rules=RULES, **options)
+    transport = httpx.ASGITransport(app=app, client=client)
+    return httpx.AsyncClient(transport=transport, base_url="http://api.test")
+
+
+def statuses(client: httpx.AsyncClient, requests):
+    async def scenario():
+        async with client:
+            return [await client.get("/ping", **kwargs) for kwargs in requests]
+
+    return asyncio.run(scenario())
+
+
+def test_rejection_has_retry_after_and_does_not_charge_other_buckets():
+    backend = MemoryBackend()
+    first, second, *other = statuses(build_app(backend), [
+        {"params": {"telegram_id": 1}},
+        {"params": {"telegram_id": 1}},
+        {"params": {"telegram_id": 2}},
+        {"params": {"telegram_id": 3}},
+        {"params": {"telegram_id": 4}},
+    ])
+    assert first.status_code == 200
+    assert second.status_code == 429
+    assert int(second.headers["retry-after"]) == 60
+    # Отказ по лимиту пользователя 1 не потратил токен IP: ещё два запроса проходят
+    assert [response.status_code for response in other] == [200, 200, 429]
+
+
+def test_exempt_and_internal_networks():
+    exempt = statuses(
+        build_app(MemoryBackend(), client=("127.0.0.1", 1), exempt_networks=parse_networks("127.0.0.0/8")),
+        [{"params": {"telegram_id": 1}}] * 5,
+    )
+    assert {response.status_code for response in exempt} == {200}
+
+    # Бот из docker-сети: у каждого пользователя своя корзина, корзина IP
+    # (3 в минуту) не тратится; запрос без telegram_id ограничивается по IP
+    internal = statuses(
+        build_app(MemoryBackend(), client=("172.18.0.3", 1), internal_networks=parse_networks("172.16.0.0/12")),
+        [{"params": {"telegram_id": user}} for user in range(1, 6)] + [{"params": {"telegram_id": 1}}, {}],
+    )
+    assert [response.status_code for response in internal] == [200] * 5 + [429, 200]
+
+
+def test_proxy_headers_only_from_trusted_proxies():
+    forwarded = [{"headers": {"X-Real-IP": f"198.51.100.{i}"}} for i in range(5)]
+    trusted = statuses(
+        build_app(MemoryBackend(), client=("10.0.0.2", 1), trusted_proxies=parse_networks("10.0.0.0/8")),
+        forwarded,
+    )
+    assert {response.status_code for response in trusted} == {200}
+    untrusted = statuses(build_app(MemoryBackend(), client=("203.0.113.5", 1)), forwarded)
+    assert [response.status_code for response in untrusted] == [200, 200, 200, 429, 429]
+
+
+def test_memory_backend_evicts_least_recently_used():
+    backend = MemoryBackend(max_keys=10)
+    limit = Limit.parse("1/hour")
+
+    async def scenario():
+        assert await backend.take(["hot"], [limit]) == [0.0]
+        for i in range(9):
+            await backend.take([f"cold-{i}"], [limit])
+            # Исчерпанная корзина используется постоянно и не вытесняется
+            assert (await backend.take(["hot"], [limit]))[0] > 0
+        await backend.take(["new"], [limit])
+        return await backend.take(["hot"], [limit])
+
+    assert asyncio.run(scenario())[0] > 0
+    assert "cold-0" not in backend._buckets
@@ -1,230 +1,557 @@
 #!/usr/bin/env python3
 """
-Тестовый скрипт для проверки всех возможных алгоритмов создания заявки
+Симулятор диалогов и бенчмарк обработчиков бота.
+
+Настоящие обработчики bot/handlers.py (тот же набор, что регистрирует
+main.py) получают синтетические Update. Bot API заменён заглушкой без сети,
+API заявок — httpx.MockTransport; обе заглушки могут добавлять задержку.
+
+Каталог путей не описывается вручную: он строится обходом ответов самого
+бота — от главного меню по всем кнопкам каждой клавиатуры до подтверждения
+заявки (свободный текст подставляется там, где бот ждёт описание, адрес или
+телефон). К каждому пути добавляются варианты с "⬅️ Назад" на каждом шаге:
+после возврата шаг повторяется, итоговая заявка должна совпасть.
+
+pytest проверяет все пути каталога, возвраты и параллельных пользователей
+(заявки не перемешиваются, хранилище черновиков очищается).
+
+Как скрипт — нагрузка: тысячи одновременных пользователей, задержка по
+шагам (p50/p95/p99), updates/s и рост хранилища черновиков (user_requests):
+  python test_request_flow.py
+  python test_request_flow.py --users 5000 --ramp-ms 2 --think-ms 5000 --api-latency-ms 30 --abandon-rate 0.2
 """
+import argparse
 import asyncio
+import contextlib
 import json
-from datetime import datetime
-
-# Симуляция данных пользователя
-test_user_id = 12345
-test_username = "test_user"
-
-# Тестовые сценарии
-test_scenarios = [
-    {
-        "name": "Сценарий 1: Компьютер глючит → Тормозит → Описание → Удаленная помощь → Телефон",
-        "steps": [
-            ("🔴 Компьютер глючит/не работает", "category"),
-            ("💻 Тормозит/Не включается", "service"),
-            ("Компьютер очень медленно работает, зависает при запуске программ", "description"),
-            ("💻 Удаленная помощь", "work_format"),
-            ("+7 999 123-45-67", "phone")
-        ],
-        "expected_result": {
-            "category": "🔴 Компьютер глючит/не работает",
-            "service": "💻 Тормозит/Не включается",
-            "description": "Компьютер очень медленно работает, зависает при запуске программ",
-            "work_format": "💻 Удаленная помощь",
-            "address": None,
-            "preferred_time": "⏰ Любое время",
-            "phone": "+7 999 123-45-67"
-        }
-    },
-    {
-        "name": "Сценарий 2: Установить программу → Установить программу → Описание → Выезд на дом → Адрес → Время → Телефон",
-        "steps": [
-            ("⚙️ Установить/Настроить программу", "category"),
-            ("📦 Установить программу", "service"),
-            ("Нужно установить Photoshop для работы с графикой", "description"),
-            ("🏠 Выезд на дом", "work_format"),
-            ("ул. Ленина 15, кв 5, после 18:00", "address"),
-            ("🌆 Вечер (18:00-22:00)", "preferred_time"),
-            ("+7 999 123-45-67", "phone")
-        ],
-        "expected_result": {
-            "category": "⚙️ Установить/Настроить программу",
-            "service": "📦 Установить программу",
-            "description": "Нужно установить Photoshop для работы с графикой",
-            "work_format": "🏠 Выезд на дом",
-            "address": "ул. Ленина 15, кв 5, после 18:00",
-            "preferred_time": "🌆 Вечер (18:00-22:00)",
-            "phone": "+7 999 123-45-67"
-        }
-    },
-    {
-        "name": "Сценарий 3: Свой вариант → Описание → Выезд на дом → Адрес → Время → Телефон",
-        "steps": [
-            ("✍️ Описать запрос своими словами", "category"),
-            ("Нужна помощь с настройкой домашней сети", "description"),
-            ("🏠 Выезд на дом", "work_format"),
-            ("пр. Мира 188б корп2, кв 5", "address"),
-            ("☀️ День (12:00-18:00)", "preferred_time"),
-            ("+7 999 123-45-67", "phone")
-        ],
-        "expected_result": {
-            "category": "✍️ Описать запрос своими словами",
-            "service": "✍️ Свой вариант",
-            "description": "Нужна помощь с настройкой домашней сети",
-            "work_format": "🏠 Выезд на дом",
-            "address": "пр. Мира 188б корп2, кв 5",
-            "preferred_time": "☀️ День (12:00-18:00)",
-            "phone": "+7 999 123-45-67"
-        }
-    },
-    {
-        "name": "Сценарий 4: Апгрейд → Собрать ПК с нуля → Игровой ПК → Описание → Забрать технику → Адрес → Время → Телефон",
-        "steps": [
-            ("🚀 Хочу апгрейд", "category"),
-            ("🔧 Собрать ПК с нуля", "service"),
-            ("🎮 Игровой ПК", "pc_build"),
-            ("Нужен мощный игровой компьютер для современных игр", "description"),
-            ("🚚 Забрать технику", "work_format"),
-            ("ул. Пушкина 10, кв 15", "address"),
-            ("🌅 Утро (9:00-12:00)", "preferred_time"),
-            ("+7 999 123-45-67", "phone")
-        ],
-        "expected_result": {
-            "category": "🚀 Хочу апгрейд",
-            "service": "🔧 Собрать ПК с нуля",
-            "description": "Нужен мощный игровой компьютер для современных игр",
-            "work_format": "🚚 Забрать технику",
-            "address": "ул. Пушкина 10, кв 15",
-            "preferred_time": "🌅 Утро (9:00-12:00)",
-            "phone": "+7 999 123-45-67"
-        }
-    },
-    {
-        "name": "Сценарий 5: Wi-Fi → Настроить Wi-Fi роутер → Описание → В офис → Телефон",
-        "steps": [
-            ("🌐 «Слабый Wi-Fi / новый роутер»", "category"),
-            ("📶 Настроить Wi-Fi роутер", "service"),
-            ("Нужно настроить новый роутер TP-Link для офиса", "description"),
-            ("🏢 В офис", "work_format"),
-            ("+7 999 123-45-67", "phone")
-        ],
-        "expected_result": {
-            "category": "🌐 «Слабый Wi-Fi / новый роутер»",
-            "service": "📶 Настроить Wi-Fi роутер",
-            "description": "Нужно настроить новый роутер TP-Link для офиса",
-            "work_format": "🏢 В офис",
-            "address": None,
-            "preferred_time": "⏰ Любое время",
-            "phone": "+7 999 123-45-67"
-        }
-    }
+import logging
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional, Tuple
+
+# Обработчики читают настройки при импорте
+os.environ.setdefault("BOT_SPOOL_PATH", os.path.join(tempfile.mkdtemp(prefix="request_flow_"), "spool.jsonl"))
+os.environ.setdefault("REQUESTS_GROUP_ID", "-100000000001")
+os.environ.setdefault("API_BASE_URL", "http://api.test/api/v1")
+
+import httpx
+from telegram import Update
+from telegram.ext import Application
+from telegram.request import BaseRequest, RequestData
+
+import main as bot_main
+from bot import handlers, keyboards
+
+BOT_USER = {"id": 100000001, "is_bot": True, "first_name": "FixFix", "username": "fixfix_test_bot"}
+USER_ID_BASE = 500_000_000
+MAX_PATH_STEPS = 12
+
+BACK = "⬅️ Назад"
+CONFIRM = "✅ Подтвердить заявку"
+DESCRIPTION = "Компьютер очень медленно работает, зависает при запуске программ"
+ADDRESS = "ул. Ленина 15, кв 5, после 18:00"
+PHONE = "+7 999 123-45-67"
+
+# Клавиатура ответа бота -> какой шаг ждёт бот
+MENU_STEPS = [
+    (keyboards.main_menu, "category"),
+    (keyboards.pc_build_menu, "pc_build"),
+    (keyboards.work_format_menu, "work_format"),
+    (keyboards.time_menu, "time"),
+    (keyboards.contact_menu, "phone"),
+    (keyboards.confirm_menu, "confirm"),
 ]
+# Кнопки, которые не ведут к созданию заявки
+SKIP_BUTTONS = {BACK, "📋 Мои заявки", "🔄 Изменить данные", "❌ Отменить", "📞 Отправить номер"}
+
+Step = Tuple[str, str]  # (шаг, текст пользователя)
+
+
+def buttons(reply_markup: Optional[dict]) -> List[str]:
+    if not reply_markup or "keyboard" not in reply_markup:
+        return []
+    return [button["text"] if isinstance(button, dict) else button for row in reply_markup["keyboard"] for button in row]
+
+
+def _menu_buttons(factory) -> List[str]:
+    return [button.text for row in factory().keyboard for button in row]
+
+
+MENU_BUTTONS = [(_menu_buttons(factory), step) for factory, step in MENU_STEPS]
+
 
-def simulate_request_creation(scenario):
-    """Симуляция создания заявки по сценарию"""
-    print(f"\n🧪 Тестирование: {scenario['name']}")
-    print("=" * 80)
-    
-    # Инициализация заявки
-    request = {
-        "request_id": f"FX-{datetime.now().strftime('%Y%m%d')}-001",
-        "user_id": test_user_id,
-        "username": test_username,
-        "status": "новая",
-        "created_at": datetime.now().isoformat()
+def expected_step(reply: dict) -> Optional[str]:
+    """Какой ввод ждёт бот после ответа reply; None — тупик (главное меню)"""
+    keyboard = buttons(reply.get("reply_markup"))
+    for menu, step in MENU_BUTTONS:
+        if keyboard == menu:
+            return None if step == "category" else step
+    if keyboard in ([BACK], []):
+        return "address" if "адрес" in reply.get("text", "").lower() else "description"
+    return "service"
+
+
+class StubBotRequest(BaseRequest):
+    """Bot API без сети: отвечает сразу (или с задержкой) и запоминает последний ответ в каждый чат"""
+
+    def __init__(self, latency_ms: float = 0.0):
+        self.latency = latency_ms / 1000
+        self.replies: Dict[int, dict] = {}
+        self.calls: Counter = Counter()
+        self.group_posts = 0
+        self._message_id = 0
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    async def do_request(self, url: str, method: str, request_data: Optional[RequestData] = None, **timeouts):
+        name = url.rsplit("/", 1)[-1]
+        params = request_data.parameters if request_data is not None else {}
+        self.calls[name] += 1
+        if name == "getMe":
+            return 200, json.dumps({"ok": True, "result": BOT_USER}).encode()
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        result = True
+        if name in ("sendMessage", "editMessageText"):
+            self._message_id += 1
+            chat_id = params.get("chat_id")
+            result = {
+                "message_id": params.get("message_id", self._message_id),
+                "date": int(time.time()),
+                "chat": {"id": chat_id, "type": "private"},
+                "text": params.get("text", ""),
+            }
+            if chat_id == handlers.REQUESTS_GROUP_ID:
+                self.group_posts += 1
+            else:
+                self.replies[chat_id] = params
+        return 200, json.dumps({"ok": True, "result": result}).encode()
+
+
+class StubApi:
+    """API заявок: POST /requests/ -> 201, тела заявок по telegram_id"""
+
+    def __init__(self, latency_ms: float = 0.0):
+        self.latency = latency_ms / 1000
+        self.created: Dict[int, List[dict]] = defaultdict(list)
+        self._next_id = 0
+
+    async def handle(self, request: httpx.Request) -> httpx.Response:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if request.method == "POST" and request.url.path.endswith("/requests/"):
+            body = json.loads(request.content)
+            self.created[int(request.url.params["telegram_id"])].append(body)
+            self._next_id += 1
+            return httpx.Response(
+                201,
+                json={"id": self._next_id, "request_id": f"FX-TEST-{self._next_id:06d}", "status": "new", **body},
+            )
+        return httpx.Response(404, json={"detail": "Not found"})
+
+
+def make_update(update_id: int, user_id: int, text: str) -> dict:
+    message = {
+        "message_id": update_id,
+        "date": int(time.time()),
+        "chat": {"id": user_id, "type": "private", "first_name": f"User{user_id}"},
+        "from": {"id": user_id, "is_bot": False, "first_name": f"User{user_id}", "username": f"user{user_id}"},
+        "text": text,
     }
-    
-    # Выполнение шагов
-    for i, (input_text, step_type) in enumerate(scenario['steps'], 1):
-        print(f"Шаг {i}: {step_type} → '{input_text}'")
-        
-        if step_type == "category":
-            request["category"] = input_text
-        elif step_type == "service":
-            request["service"] = input_text
-        elif step_type == "pc_build":
-            # Для сборки ПК добавляем как описание
-            request["description"] = input_text
-        elif step_type == "description":
-            request["description"] = input_text
-        elif step_type == "work_format":
-            request["work_format"] = input_text
-            # Автоматически добавляем preferred_time для форматов без выезда
-            if "🏠 Выезд на дом" not in input_text and "🚚 Забрать технику" not in input_text:
-                request["preferred_time"] = "⏰ Любое время"
-                print(f"  → Автоматически добавлено: preferred_time = '⏰ Любое время'")
-        elif step_type == "address":
-            request["address"] = input_text
-        elif step_type == "preferred_time":
-            request["preferred_time"] = input_text
-        elif step_type == "phone":
-            request["phone"] = input_text
-    
-    # Автоматически добавляем недостающие поля
-    if "✍️ Описать запрос своими словами" in request.get("category", ""):
-        if "service" not in request:
-            request["service"] = "✍️ Свой вариант"
-            print(f"  → Автоматически добавлено: service = '✍️ Свой вариант'")
-    
-    # Проверка результата
-    print(f"\n📋 Результат создания заявки:")
-    print(f"🆔 ID: {request['request_id']}")
-    print(f"📝 Категория: {request.get('category', 'Нет')}")
-    print(f"🔧 Услуга: {request.get('service', 'Нет')}")
-    print(f"📄 Описание: {request.get('description', 'Нет')}")
-    print(f"📍 Формат: {request.get('work_format', 'Нет')}")
-    print(f"🏠 Адрес: {request.get('address', 'Не требуется')}")
-    print(f"⏰ Время: {request.get('preferred_time', 'Не указано')}")
-    print(f"📞 Телефон: {request.get('phone', 'Нет')}")
-    
-    # Валидация
-    validation_errors = []
-    
-    # Проверка обязательных полей
-    required_fields = ['category', 'work_format', 'preferred_time', 'phone']
-    for field in required_fields:
-        if field not in request or not request[field]:
-            validation_errors.append(f"Отсутствует обязательное поле: {field}")
-    
-    # Проверка описания
-    if 'description' not in request or len(request.get('description', '').strip()) < 10:
-        validation_errors.append("Описание должно содержать минимум 10 символов")
-    
-    # Проверка соответствия ожидаемому результату
-    for key, expected_value in scenario['expected_result'].items():
-        if key in request:
-            actual_value = request[key]
-            if actual_value != expected_value:
-                validation_errors.append(f"Несоответствие в поле '{key}': ожидалось '{expected_value}', получено '{actual_value}'")
-    
-    if validation_errors:
-        print(f"\n❌ Ошибки валидации:")
-        for error in validation_errors:
-            print(f"  • {error}")
-        return False
+    if text.startswith("/"):
+        message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+    return {"update_id": update_id, "message": message}
+
+
+class Simulator:
+    """Приложение бота с заглушками; прогон путей от имени пользователей"""
+
+    def __init__(self, bot_latency_ms: float = 0.0, api_latency_ms: float = 0.0):
+        self.bot_request = StubBotRequest(bot_latency_ms)
+        self.api = StubApi(api_latency_ms)
+        self.application = (
+            Application.builder()
+            .token("123456:test")
+            .request(self.bot_request)
+            .get_updates_request(StubBotRequest())
+            .updater(None)
+            .build()
+        )
+        bot_main.add_handlers(self.application)
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self._update_id = 0
+
+    async def __aenter__(self):
+        await self.application.initialize()
+        handlers._api_client = httpx.AsyncClient(transport=httpx.MockTransport(self.api.handle))
+        handlers.user_requests.clear()
+        return self
+
+    async def __aexit__(self, *exc):
+        await handlers.close_api_client()
+        await self.application.shutdown()
+
+    async def send(self, user_id: int, step: str, text: str) -> Optional[dict]:
+        """Обновление от пользователя; возвращает ответ бота (None — бот промолчал)"""
+        self._update_id += 1
+        update = Update.de_json(make_update(self._update_id, user_id, text), self.application.bot)
+        self.bot_request.replies.pop(user_id, None)
+        started = time.perf_counter()
+        await self.application.process_update(update)
+        self.latencies[step].append((time.perf_counter() - started) * 1000)
+        return self.bot_request.replies.get(user_id)
+
+    async def run_path(
+        self, user_id: int, path: List[Step], think_ms: float = 0.0, rng: Optional[random.Random] = None
+    ) -> Optional[dict]:
+        """Прогон пути; think_ms — средняя пауза пользователя между шагами. Возвращает последний ответ бота"""
+        reply = await self.send(user_id, "start", "/start")
+        for step, text in path:
+            if think_ms:
+                await asyncio.sleep((rng or random).uniform(0, 2 * think_ms) / 1000)
+            reply = await self.send(user_id, step, text)
+        return reply
+
+
+def free_text(step: str) -> str:
+    return {"description": DESCRIPTION, "address": ADDRESS, "phone": PHONE}[step]
+
+
+_catalog: Optional[Tuple[List[List[Step]], List[Tuple[List[Step], str]]]] = None
+
+
+async def build_catalog(simulator: Simulator) -> Tuple[List[List[Step]], List[Tuple[List[Step], str]]]:
+    """Все пути от главного меню до подтверждения по ответам бота.
+
+    Возвращает (пути, тупики): тупик — шаг, после которого бот промолчал или
+    вернул главное меню вместо следующего вопроса. Обход идёт без задержек
+    заглушек; результат запоминается на весь процесс.
+    """
+    global _catalog
+    if _catalog is not None:
+        return _catalog
+    latencies = simulator.bot_request.latency, simulator.api.latency
+    simulator.bot_request.latency = simulator.api.latency = 0.0
+    paths: List[List[Step]] = []
+    dead_ends: List[Tuple[List[Step], str]] = []
+    probe_id = USER_ID_BASE - 1
+    frontier: List[List[Step]] = [
+        [("category", text)] for text in _menu_buttons(keyboards.main_menu) if text not in SKIP_BUTTONS
+    ]
+    while frontier:
+        prefix = frontier.pop()
+        if len(prefix) > MAX_PATH_STEPS:
+            dead_ends.append((prefix, "путь не заканчивается подтверждением"))
+            continue
+        probe_id -= 1
+        reply = await simulator.run_path(probe_id, prefix)
+        handlers.user_requests.pop(probe_id, None)
+        if reply is None:
+            dead_ends.append((prefix, "нет ответа"))
+            continue
+        step = expected_step(reply)
+        if step is None:
+            dead_ends.append((prefix, reply.get("text", "")))
+        elif step == "confirm":
+            paths.append(prefix + [("confirm", CONFIRM)])
+        elif step in ("description", "address", "phone"):
+            frontier.append(prefix + [(step, free_text(step))])
+        else:
+            for text in buttons(reply.get("reply_markup")):
+                if text not in SKIP_BUTTONS:
+                    frontier.append(prefix + [(step, text)])
+    paths.sort()
+    simulator.bot_request.latency, simulator.api.latency = latencies
+    simulator.latencies.clear()
+    _catalog = paths, dead_ends
+    return _catalog
+
+
+def back_variants(path: List[Step]) -> List[List[Step]]:
+    """Путь с возвратом на каждом шаге до подтверждения: шаг, Назад, тот же шаг"""
+    return [path[: i + 1] + [("back", BACK), path[i]] + path[i + 1 :] for i in range(len(path) - 1)]
+
+
+def expected_request(path: List[Step]) -> dict:
+    """Что должно прийти в API по пути"""
+    steps = dict(path)
+    work_format = handlers.map_work_format_to_enum(steps["work_format"])
+    expected = {"category": steps["category"], "work_format": work_format}
+    if work_format in ("home_visit", "pickup"):
+        expected["address"] = ADDRESS
+        expected["preferred_time"] = handlers.map_time_to_enum(steps["time"])
     else:
-        print(f"\n✅ Заявка создана успешно!")
-        return True
-
-def test_all_scenarios():
-    """Тестирование всех сценариев"""
-    print("🚀 Начинаю тестирование всех алгоритмов создания заявки")
-    print("=" * 80)
-    
-    successful_scenarios = 0
-    total_scenarios = len(test_scenarios)
-    
-    for scenario in test_scenarios:
-        try:
-            if simulate_request_creation(scenario):
-                successful_scenarios += 1
-        except Exception as e:
-            print(f"❌ Ошибка при тестировании сценария: {e}")
-    
-    print(f"\n📊 Результаты тестирования:")
-    print(f"✅ Успешно: {successful_scenarios}")
-    print(f"❌ Ошибок: {total_scenarios - successful_scenarios}")
-    print(f"📈 Процент успеха: {(successful_scenarios / total_scenarios) * 100:.1f}%")
-    
-    if successful_scenarios == total_scenarios:
-        print("\n🎉 Все сценарии прошли успешно! Логика создания заявок работает корректно.")
+        expected["preferred_time"] = "any"
+    return expected
+
+
+def check_result(simulator: Simulator, user_id: int, path: List[Step], reply: Optional[dict]) -> List[str]:
+    """Ошибки пути: ответ на подтверждение, тело заявки в API, очистка черновика"""
+    errors = []
+    if reply is None or not reply.get("text", "").startswith("✅ Заявка #"):
+        errors.append(f"нет подтверждения: {reply and reply.get('text')!r}")
+    created = simulator.api.created.get(user_id, [])
+    if len(created) != 1:
+        errors.append(f"в API создано заявок: {len(created)}")
     else:
-        print(f"\n⚠️ Обнаружены проблемы в {total_scenarios - successful_scenarios} сценариях.")
+        body = created[0]
+        for key, value in expected_request(path).items():
+            if body.get(key) != value:
+                errors.append(f"{key}: ожидалось {value!r}, получено {body.get(key)!r}")
+        if "address" not in expected_request(path) and "address" in body:
+            errors.append(f"лишний адрес: {body['address']!r}")
+        if len(body.get("description", "").strip()) < 10:
+            errors.append(f"описание: {body.get('description')!r}")
+    if user_id in handlers.user_requests:
+        errors.append("черновик не удалён")
+    return errors
+
+
+def describe(path: List[Step]) -> str:
+    return " → ".join(text for _, text in path)
+
+
+async def run_paths(simulator: Simulator, paths: List[List[Step]], concurrency: int, first_user: int) -> List[str]:
+    """Прогон путей (каждый — отдельный пользователь) с ограничением параллельности"""
+    semaphore = asyncio.Semaphore(concurrency)
+    failures = []
+
+    async def one(index: int, path: List[Step]) -> None:
+        user_id = first_user + index
+        async with semaphore:
+            reply = await simulator.run_path(user_id, path)
+        errors = check_result(simulator, user_id, path, reply)
+        if errors:
+            failures.append(f"{describe(path)}: {'; '.join(errors)}")
+
+    await asyncio.gather(*(one(index, path) for index, path in enumerate(paths)))
+    return failures
+
+
+@contextlib.contextmanager
+def quiet(enabled: bool = True):
+    """Отладочный вывод обработчиков (print) и журнал запросов httpx — скрыть"""
+    if not enabled:
+        yield
+        return
+    httpx_logger = logging.getLogger("httpx")
+    level = httpx_logger.level
+    httpx_logger.setLevel(logging.WARNING)
+    try:
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            yield
+    finally:
+        httpx_logger.setLevel(level)
+
+
+# ==============================================================================
+# ТЕСТЫ (pytest)
+# ==============================================================================
+def test_catalog_has_no_dead_ends():
+    async def scenario():
+        async with Simulator() as simulator:
+            return await build_catalog(simulator)
+
+    with quiet():
+        paths, dead_ends = asyncio.run(scenario())
+    assert paths
+    assert not dead_ends, "\n".join(f"{describe(path)}: {reason}" for path, reason in dead_ends)
+    categories = {dict(path)["category"] for path in paths}
+    assert categories == set(_menu_buttons(keyboards.main_menu)) - SKIP_BUTTONS
+
+
+def test_all_catalog_paths_create_request():
+    async def scenario():
+        async with Simulator() as simulator:
+            paths, _ = await build_catalog(simulator)
+            return await run_paths(simulator, paths, concurrency=50, first_user=USER_ID_BASE)
+
+    with quiet():
+        failures = asyncio.run(scenario())
+    assert not failures, "\n".join(failures[:20])
+
+
+def test_back_navigation_keeps_request():
+    async def scenario():
+        async with Simulator() as simulator:
+            paths, _ = await build_catalog(simulator)
+            # По одному пути на каждую пару (категория, формат работы): все виды шагов
+            representative = {}
+            for path in paths:
+                steps = dict(path)
+                representative.setdefault((steps["category"], steps["work_format"]), path)
+            variants = [variant for path in representative.values() for variant in back_variants(path)]
+            return await run_paths(simulator, variants, concurrency=50, first_user=USER_ID_BASE)
+
+    with quiet():
+        failures = asyncio.run(scenario())
+    assert not failures, "\n".join(failures[:20])
+
+
+def test_concurrent_users_do_not_mix_requests():
+    async def scenario():
+        async with Simulator(bot_latency_ms=1, api_latency_ms=2) as simulator:
+            paths, _ = await build_catalog(simulator)
+            rng = random.Random(1)
+            chosen = [rng.choice(paths) for _ in range(300)]
+            failures = await run_paths(simulator, chosen, concurrency=300, first_user=USER_ID_BASE)
+            return failures, len(handlers.user_requests)
+
+    with quiet():
+        failures, leftover = asyncio.run(scenario())
+    assert not failures, "\n".join(failures[:20])
+    assert leftover == 0
+
+
+# ==============================================================================
+# НАГРУЗКА (python test_request_flow.py)
+# ==============================================================================
+def percentile(values: list, pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def deep_size(value, seen: Optional[set] = None) -> int:
+    """Размер объекта вместе с вложенными dict/list/str"""
+    seen = seen if seen is not None else set()
+    if id(value) in seen:
+        return 0
+    seen.add(id(value))
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(deep_size(key, seen) + deep_size(item, seen) for key, item in value.items())
+    elif isinstance(value, (list, tuple, set)):
+        size += sum(deep_size(item, seen) for item in value)
+    return size
+
+
+async def load(args) -> dict:
+    async with Simulator(args.bot_latency_ms, args.api_latency_ms) as simulator:
+        paths, dead_ends = await build_catalog(simulator)
+        catalog = paths + [variant for path in paths for variant in back_variants(path)]
+        rng = random.Random(args.seed)
+        outcome: Counter = Counter()
+        active = {"now": 0, "peak": 0}
+        store = {"peak_entries": 0, "peak_bytes": 0}
+
+        def measure_store() -> None:
+            entries = len(handlers.user_requests)
+            if entries >= store["peak_entries"]:
+                store["peak_entries"] = entries
+                store["peak_bytes"] = deep_size(handlers.user_requests)
+
+        async def sampler() -> None:
+            while True:
+                measure_store()
+                await asyncio.sleep(args.sample_interval)
+
+        async def user(index: int) -> None:
+            await asyncio.sleep(index * args.ramp_ms / 1000)
+            path = catalog[rng.randrange(len(catalog))]
+            if rng.random() < args.abandon_rate:
+                # Пользователь уходит посреди диалога: черновик остаётся в памяти
+                path = path[: rng.randrange(1, len(path))]
+            user_id = USER_ID_BASE + index
+            active["now"] += 1
+            active["peak"] = max(active["peak"], active["now"])
+            try:
+                reply = await simulator.run_path(user_id, path, args.think_ms, rng)
+            finally:
+                active["now"] -= 1
+            if path[-1][0] != "confirm":
+                outcome["abandoned"] += 1
+            elif check_result(simulator, user_id, path, reply):
+                outcome["failed"] += 1
+            else:
+                outcome["completed"] += 1
+
+        sampling = asyncio.create_task(sampler())
+        started = time.perf_counter()
+        await asyncio.gather(*(user(index) for index in range(args.users)))
+        elapsed = time.perf_counter() - started
+        sampling.cancel()
+        measure_store()
+        residual_entries = len(handlers.user_requests)
+        residual_bytes = deep_size(handlers.user_requests)
+
+        all_latencies = [value for values in simulator.latencies.values() for value in values]
+        return {
+            "users": args.users,
+            "peak_active_users": active["peak"],
+            "catalog_paths": len(paths),
+            "catalog_paths_with_back": len(catalog),
+            "dead_ends": [f"{describe(path)}: {reason}" for path, reason in dead_ends],
+            "elapsed_s": round(elapsed, 3),
+            "updates": len(all_latencies),
+            "updates_per_s": round(len(all_latencies) / elapsed, 1) if elapsed else 0.0,
+            "outcome": dict(outcome),
+            "latency_ms": {
+                step: {
+                    "count": len(values),
+                    "p50": round(statistics.median(values), 3),
+                    "p95": round(percentile(values, 95), 3),
+                    "p99": round(percentile(values, 99), 3),
+                }
+                for step, values in list(simulator.latencies.items()) + [("all", all_latencies)]
+                if values
+            },
+            "state_store": {
+                "peak_entries": store["peak_entries"],
+                "peak_bytes": store["peak_bytes"],
+                "residual_entries": residual_entries,
+                "residual_bytes": residual_bytes,
+                "bytes_per_entry": round(store["peak_bytes"] / store["peak_entries"]) if store["peak_entries"] else 0,
+            },
+            "bot_api_calls": dict(simulator.bot_request.calls),
+            "group_posts": simulator.bot_request.group_posts,
+        }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=1000, help="Число пользователей")
+    parser.add_argument("--ramp-ms", type=float, default=20.0, help="Интервал между стартами пользователей, мс")
+    parser.add_argument("--think-ms", type=float, default=1000.0, help="Средняя пауза пользователя между шагами, мс")
+    parser.add_argument("--bot-latency-ms", type=float, default=0.0, help="Задержка ответа заглушки Bot API, мс")
+    parser.add_argument("--api-latency-ms", type=float, default=0.0, help="Задержка ответа заглушки API заявок, мс")
+    parser.add_argument("--abandon-rate", type=float, default=0.0, help="Доля пользователей, бросающих диалог")
+    parser.add_argument("--sample-interval", type=float, default=0.5, help="Период замера хранилища черновиков, с")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--verbose", action="store_true", help="Не скрывать отладочный вывод обработчиков")
+    parser.add_argument("--json", action="store_true", help="Отчёт в JSON")
+    args = parser.parse_args()
+
+    with quiet(not args.verbose):
+        report = asyncio.run(load(args))
+
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    else:
+        print(f"Каталог: {report['catalog_paths']} путей, с возвратами — {report['catalog_paths_with_back']}")
+        for dead_end in report["dead_ends"]:
+            print(f"  ❌ тупик: {dead_end}")
+        print(f"Пользователей: {args.users} (одновременно до {report['peak_active_users']}), обновлений: {report['updates']}, "
+              f"за {report['elapsed_s']:.1f} с -> {report['updates_per_s']} updates/s")
+        print(f"Итоги: {report['outcome']}")
+        print(f"\n{'step':<12} {'count':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+        for step, stats in report["latency_ms"].items():
+            print(f"{step:<12} {stats['count']:>7} {stats['p50']:>8.2f} {stats['p95']:>8.2f} {stats['p99']:>8.2f}")
+        store = report["state_store"]
+        print(f"\nЧерновики (user_requests): пик {store['peak_entries']} записей / {store['peak_bytes'] / 1024:.0f} КиБ, "
+              f"осталось {store['residual_entries']} / {store['residual_bytes'] / 1024:.0f} КиБ "
+              f"(~{store['bytes_per_entry']} Б на черновик)")
+        print(f"Вызовы Bot API: {report['bot_api_calls']}, сообщений в группу: {report['group_posts']}")
+    return 1 if report["dead_ends"] or report["outcome"].get("failed") else 0
+
 
 if __name__ == "__main__":
-    test_all_scenarios()
+    sys.exit(main())
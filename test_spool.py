@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Журнал неотправленных заявок бота (bot.spool): дозапись с правами 0600,
+переотправка, отсутствие дублей и восстановление после недописанной строки.
+"""
+import asyncio
+import json
+import os
+import stat
+
+from bot.spool import RequestSpool, SpoolRejected
+
+DRAFT = {"request_id": "FF-TEST", "phone": "+79991234567", "address": "ул. Тестовая, 1"}
+
+
+def lines(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+def test_add_is_durable_and_private(tmp_path):
+    path = str(tmp_path / "spool" / "requests.jsonl")
+    spool = RequestSpool(path)
+    asyncio.run(spool.add("key-1", 1, DRAFT))
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
+    assert [entry["key"] for entry in RequestSpool(path).pending()] == ["key-1"]
+
+
+def test_repeated_add_is_written_once(tmp_path):
+    path = str(tmp_path / "requests.jsonl")
+    spool = RequestSpool(path)
+
+    async def scenario():
+        await asyncio.gather(*(spool.add("key-1", 1, DRAFT) for _ in range(3)))
+
+    asyncio.run(scenario())
+    assert [entry["op"] for entry in lines(path)] == ["add"]
+
+
+def test_replay_stops_at_transient_error_and_keeps_rejected_drafts(tmp_path):
+    path = str(tmp_path / "requests.jsonl")
+    spool = RequestSpool(path)
+    submitted = []
+
+    async def submit(entry):
+        submitted.append(entry["key"])
+        if entry["key"] == "rejected":
+            raise SpoolRejected("422")
+        if entry["key"] == "down":
+            raise ConnectionError("API недоступен")
+        return f"FF-{entry['key']}"
+
+    async def scenario():
+        for key in ("saved", "rejected", "down", "later"):
+            await spool.add(key, 1, DRAFT)
+        return await spool.replay_once(submit)
+
+    assert asyncio.run(scenario()) == 1
+    assert submitted == ["saved", "rejected", "down"]
+    assert [entry["key"] for entry in RequestSpool(path).pending()] == ["down", "later"]
+    dead = lines(f"{path}.dead")
+    assert [(entry["key"], entry["draft"]) for entry in dead] == [("rejected", DRAFT)]
+    assert stat.S_IMODE(os.stat(f"{path}.dead").st_mode) == 0o600
+
+
+def test_drafts_are_removed_once_saved(tmp_path):
+    path = str(tmp_path / "requests.jsonl")
+    spool = RequestSpool(path)
+
+    async def submit(entry):
+        return "FF-1"
+
+    async def scenario():
+        await spool.add("key-1", 1, DRAFT)
+        await spool.replay_once(submit)
+
+    asyncio.run(scenario())
+    # Журнал сжат: персональных данных сохранённой заявки в нём не осталось
+    assert os.path.getsize(path) == 0
+
+
+def test_truncated_last_line_is_skipped(tmp_path):
+    path = str(tmp_path / "requests.jsonl")
+    asyncio.run(RequestSpool(path).add("key-1", 1, DRAFT))
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('{"op": "add", "key": "key-2", "draft": {"pho')
+
+    spool = RequestSpool(path)
+    assert [entry["key"] for entry in spool.pending()] == ["key-1"]
+    # Повторная запись после сбоя читается вместе с прежними
+    asyncio.run(spool.add("key-2", 2, DRAFT))
+    assert [entry["key"] for entry in RequestSpool(path).pending()] == ["key-1", "key-2"]
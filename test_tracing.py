@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Трассировка (app.tracing): продолжение трассы по traceparent через
+TracingMiddleware и хвостовое семплирование сегментов.
+"""
+import asyncio
+import os
+
+os.environ.setdefault("TELEGRAM_TOKEN", "123456:test")
+
+import httpx
+from fastapi import FastAPI
+
+from app.tracing import (
+    CLIENT, SERVER, SpanExporter, Tracer, TracingMiddleware, parse_traceparent, traced, tracer,
+)
+
+
+class MemoryExporter(SpanExporter):
+    """Сегменты в список (без фонового потока)"""
+
+    def __init__(self):
+        self.segments = []
+
+    def export(self, service, spans):
+        self.segments.append(spans)
+
+    def shutdown(self, timeout: float = 5.0) -> None:
+        pass
+
+
+class Service:
+    @traced
+    async def work(self):
+        tracer.record("SQL SELECT", 0.002, CLIENT)
+        return {"ok": True}
+
+
+def test_parse_traceparent():
+    trace_id, span_id = "4bf92f3577b34da6a3ce929d0e0e4736", "00f067aa0ba902b7"
+    assert parse_traceparent(f"00-{trace_id}-{span_id}-01") == (trace_id, span_id, True)
+    assert parse_traceparent(f"00-{trace_id}-{span_id}-00") == (trace_id, span_id, False)
+    assert parse_traceparent(f"00-{'0' * 32}-{span_id}-01") is None
+    assert parse_traceparent("garbage") is None
+    assert parse_traceparent(None) is None
+
+
+def test_tail_sampling_keeps_errors_and_slow_traces():
+    local = Tracer()
+    exporter = MemoryExporter()
+    local.configure("test", exporter, slow_ms=10_000, sample_rate=0.0)
+
+    with local.span("fast"):
+        local.record("SQL SELECT", 0.001)
+    assert exporter.segments == []
+
+    with local.span("failing"):
+        with local.span("child") as child:
+            child.record_error("boom")
+    assert [span.name for span in exporter.segments[-1]] == ["child", "failing"]
+
+    local.slow_ms = 0
+    with local.span("slow"):
+        pass
+    assert exporter.segments[-1][0].name == "slow"
+    assert len(exporter.segments) == 2
+
+
+def test_middleware_continues_remote_trace():
+    app = FastAPI()
+
+    @app.get("/items/{item_id}")
+    async def get_item(item_id: int):
+        return await Service().work()
+
+    app.add_middleware(TracingMiddleware)
+    exporter = MemoryExporter()
+    tracer.configure("test", exporter, slow_ms=10_000, sample_rate=0.0)
+    remote_trace, remote_span = "4bf92f3577b34da6a3ce929d0e0e4736", "00f067aa0ba902b7"
+
+    async def scenario():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            # Не отобрана в голове и быстрая — не сохраняется
+            await client.get("/items/1", headers={"traceparent": f"00-{remote_trace}-{remote_span}-00"})
+            await client.get("/items/2", headers={"traceparent": f"00-{remote_trace}-{remote_span}-01"})
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        tracer.shutdown()
+
+    assert len(exporter.segments) == 1
+    spans = {span.name: span for span in exporter.segments[0]}
+    assert set(spans) == {"GET /items/{item_id}", "Service.work", "SQL SELECT"}
+    server = spans["GET /items/{item_id}"]
+    assert server.kind == SERVER
+    assert server.trace_id == remote_trace and server.parent_id == remote_span
+    assert server.attributes["http.status_code"] == 200
+    assert spans["Service.work"].parent_id == server.span_id
+    assert spans["SQL SELECT"].parent_id == spans["Service.work"].span_id